@@ -9,9 +9,8 @@ from ._status import *
 from ._data import *
 from ._backend import *
 from ._array_backend import Array
-from . import _numpy_backend  # registers backend on import
-del _numpy_backend
 from ._log import *
+from ._trace import *
 
 import sys
 if sys.platform == 'win32':
@@ -2,7 +2,7 @@ import array
 import copy
 import ctypes
 import sys
-from ._backend import Backend, register_backend, convert_values
+from ._backend import Backend, convert_values
 from ._dbr import (ChannelType, DbrStringArray, native_int_types,
                    native_float_types, native_types, DBR_TYPES)
 
@@ -128,6 +128,3 @@ def _setup():
                    python_to_epics=python_to_epics,
                    convert_values=convert_values,
                    )
-
-
-register_backend(_setup())
@@ -1,8 +1,12 @@
 # The module global 'backend' is a SimpleNamespace. When a Backend in selected,
-# its values are filled into 'backend'. At import time, a default Backend is
-# registered and selected. The default depends on whether numpy is available.
+# its values are filled into 'backend'. On first use of 'backend', a default
+# Backend is registered and selected. The default depends on whether numpy is
+# available.
 import collections
+import importlib.util
 import logging
+import sys
+import threading
 from types import SimpleNamespace
 
 from ._dbr import (ChannelType, _LongStringChannelType, native_float_types,
@@ -15,9 +19,8 @@ __all__ = ('backend', 'Backend', 'register_backend', 'select_backend')
 logger = logging.getLogger('caproto')
 
 
-try:
-    import numpy  # noqa
-except ImportError:
+# numpy is only imported along with its backend, on first use of 'backend'.
+if importlib.util.find_spec('numpy') is None:
     default_backend = 'array'
 else:
     default_backend = 'numpy'
@@ -25,6 +28,8 @@ else:
 
 _backends = {}
 _initialized = False  # Has any backend be selected yet?
+# Held while selecting a backend, so that other threads wait for it
+_select_lock = threading.RLock()
 Backend = collections.namedtuple(
     'Backend',
     'name convert_values epics_to_python python_to_epics type_map array_types'
@@ -43,21 +48,39 @@ def register_backend(new_backend):
 
 def select_backend(name):
     global _initialized
-    _initialized = True
-    logger.debug('Selecting backend: %r', name)
-    _backend = _backends[name]
-    backend.backend_name = _backend.name
-    backend.python_to_epics = _backend.python_to_epics
-    backend.epics_to_python = _backend.epics_to_python
-    backend.type_map = _backend.type_map
-    backend.array_types = _backend.array_types
-    backend.convert_values = _backend.convert_values
-
-
-backend = SimpleNamespace(
-    backend_name=None, python_to_epics=None, epics_to_python=None,
-    type_map=None, array_types=None, convert_values=None,
-)
+    with _select_lock:
+        _initialized = True
+        logger.debug('Selecting backend: %r', name)
+        if name not in _backends and name in ('array', default_backend):
+            # The built-in backends are set up on first selection, so that
+            # importing caproto does not import numpy.
+            module = importlib.import_module(f'{__package__}._{name}_backend')
+            register_backend(module._setup())
+        _backend = _backends[name]
+        backend.backend_name = _backend.name
+        backend.python_to_epics = _backend.python_to_epics
+        backend.epics_to_python = _backend.epics_to_python
+        backend.type_map = _backend.type_map
+        backend.array_types = _backend.array_types
+        backend.convert_values = _backend.convert_values
+
+
+class _BackendNamespace(SimpleNamespace):
+    def __getattr__(self, attr):
+        # Only reached before a backend is selected, or while one is being
+        # selected: select the default one, or wait for the selection.
+        if attr.startswith('__'):
+            raise AttributeError(attr)
+        with _select_lock:
+            if not _initialized:
+                select_backend(default_backend)
+        try:
+            return self.__dict__[attr]
+        except KeyError:
+            raise AttributeError(attr) from None
+
+
+backend = _BackendNamespace()
 
 
 def encode_or_fail(s, encoding):
@@ -191,26 +214,32 @@ def _preprocess_char_to_wire(values, to_dtype, string_encoding, enum_strings):
 
 def _decode_string_list(values, string_encoding):
     'List of bytes, strings, values -> list of decoded strings'
-    def get_value(v):
-        if isinstance(v, bytes):
-            if string_encoding:  # can have bytes in ChannelString
-                return v.decode(string_encoding)
-            return v
-        if isinstance(v, str):
-            return v
-        return str(v)
-    return [get_value(v) for v in values]
+    np = sys.modules.get('numpy')
+    if np is not None and isinstance(values, np.ndarray):
+        values = values.tolist()
+    if not string_encoding:
+        # can have bytes in ChannelString
+        return [v if isinstance(v, (bytes, str)) else str(v) for v in values]
+    return [v.decode(string_encoding) if isinstance(v, bytes)
+            else v if isinstance(v, str)
+            else str(v)
+            for v in values]
 
 
 def _encode_to_string_array(values, string_encoding):
     'List of bytes, strings, values -> DbrStringArray'
-    def get_value(v):
-        if isinstance(v, bytes):
-            return v
-        if isinstance(v, str):
-            return encode_or_fail(v, string_encoding)
-        return encode_or_fail(str(v), string_encoding)
-    return DbrStringArray(get_value(v) for v in values)
+    np = sys.modules.get('numpy')
+    if np is not None and isinstance(values, np.ndarray):
+        values = values.tolist()
+    if string_encoding is None:
+        # Only bytes can be passed through; anything else fails here.
+        return DbrStringArray(
+            v if isinstance(v, bytes) else encode_or_fail(str(v), None)
+            for v in values)
+    return DbrStringArray([v if isinstance(v, bytes)
+                           else v.encode(string_encoding) if isinstance(v, str)
+                           else str(v).encode(string_encoding)
+                           for v in values])
 
 
 def _preprocess_string_from_wire(values, to_dtype, string_encoding,
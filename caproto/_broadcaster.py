@@ -4,6 +4,7 @@
 import logging
 import random
 
+from . import _trace
 from ._constants import (DEFAULT_PROTOCOL_VERSION, MAX_ID)
 from ._utils import (CLIENT, SERVER, CaprotoValueError,
                      RemoteProtocolError, ThreadsafeCounter)
@@ -96,13 +97,19 @@ class Broadcaster:
         total_commands = len(commands)
         tags = {'role': repr(self.our_role)}
         for i, command in enumerate(commands):
-            tags['counter'] = (1 + i, total_commands)
             if isinstance(command, (SearchRequest, SearchResponse)):
-                self.search_log.debug("%r", command, extra=tags)
+                log = self.search_log
             else:
-                self.log.debug("%r", command, extra=tags)
+                log = self.log
+            if log.isEnabledFor(logging.DEBUG):
+                tags['counter'] = (1 + i, total_commands)
+                log.debug("%r", command, extra=tags)
             self._process_command(self.our_role, command, history=history)
             bytes_to_send += bytes(command)
+        recorder = _trace.current_recorder
+        if recorder is not None:
+            recorder.record(_trace.SEND, _trace.UDP, self.our_role, None, None,
+                            [bytes_to_send])
         return bytes_to_send
 
     def recv(self, byteslike, address):
@@ -123,6 +130,10 @@ class Broadcaster:
         -------
         commands : list
         """
+        recorder = _trace.current_recorder
+        if recorder is not None:
+            recorder.record(_trace.RECV, _trace.UDP, self.our_role, None,
+                            address, [byteslike])
         try:
             commands = read_datagram(byteslike, address, self.their_role)
         except Exception as ex:
@@ -133,13 +144,15 @@ class Broadcaster:
                 'direction': '<<<---',
                 'role': repr(self.our_role)}
         for command in commands:
+            if isinstance(command, Beacon):
+                log = self.beacon_log
+            else:
+                log = self.log
+            if not log.isEnabledFor(logging.DEBUG):
+                continue
             tags['bytesize'] = len(command)
             for address in self.our_addresses:
                 tags['our_address'] = address
-                if isinstance(command, Beacon):
-                    log = self.beacon_log
-                else:
-                    log = self.log
                 log.debug("%r", command, extra=tags)
         return commands
 
@@ -31,6 +31,7 @@ from ._utils import (CLIENT, SERVER, NEED_DATA, DISCONNECTED, CaprotoKeyError,
 from ._dbr import (ChannelType, SubscriptionType, field_types, native_type)
 from ._constants import DEFAULT_PROTOCOL_VERSION
 from ._log import ComposableLogAdapter
+from . import _trace
 from ._status import CAStatus
 
 
@@ -155,17 +156,26 @@ class VirtualCircuit:
             list of buffers to send over a socket
         """
         buffers_to_send = []
-        tags = {'their_address': self.address,
-                'our_address': self.our_address,
-                'direction': '--->>>',
-                'role': repr(self.our_role)}
-        tags.update(extra or {})
+        # Skip building the tags for every message unless they will be used.
+        if self.log.isEnabledFor(logging.DEBUG):
+            tags = {'their_address': self.address,
+                    'our_address': self.our_address,
+                    'direction': '--->>>',
+                    'role': repr(self.our_role)}
+            tags.update(extra or {})
+        else:
+            tags = None
         for command in commands:
             self._process_command(self.our_role, command)
-            tags['bytesize'] = len(command)
-            self.log.debug("%r", command, extra=tags)
+            if tags is not None:
+                tags['bytesize'] = len(command)
+                self.log.debug("%r", command, extra=tags)
             buffers_to_send.append(memoryview(command.header))
             buffers_to_send.extend(command.buffers)
+        recorder = _trace.current_recorder
+        if recorder is not None:
+            recorder.record(_trace.SEND, _trace.TCP, self.our_role,
+                            self.our_address, self.address, buffers_to_send)
         return buffers_to_send
 
     def recv(self, *buffers):
@@ -191,6 +201,10 @@ class VirtualCircuit:
             self.log.debug('Zero-length recv; sending disconnect notification')
             commands.append(DISCONNECTED)
             return commands, 0
+        recorder = _trace.current_recorder
+        if recorder is not None:
+            recorder.record(_trace.RECV, _trace.TCP, self.our_role,
+                            self.our_address, self.address, buffers)
         self._data += b''.join(buffers)
         while True:
             (self._data,
@@ -480,7 +494,7 @@ class _BaseChannel:
             self.channel_filter = parse_channel_filter(modifiers.filter_)
         else:
             self.channel_filter = ChannelFilter(
-                ts=None, dbnd=None, arr=None, sync=None)
+                ts=None, dbnd=None, arr=None, sync=None, dec=None, rate=None)
         self.circuit = circuit
         if cid is None:
             cid = self.circuit.new_channel_id()
@@ -283,8 +283,16 @@ def extract_metadata(payload, data_type):
     "Return one of the classes in _data.py."
     if data_type < 7:
         return None
-    payload = bytearray(payload)  # Makes a copy -- maybe not necessary?
-    return dbr.DBR_TYPES[data_type].from_buffer(payload)
+    dbr_type = dbr.DBR_TYPES[data_type]
+    if isinstance(payload, dbr_type):
+        # Commands read from the wire already hold their metadata as a struct
+        # over the received bytes (see from_buffer); no need to copy it.
+        return payload
+    try:
+        return dbr_type.from_buffer(payload)
+    except TypeError:
+        # Read-only buffer, such as bytes
+        return dbr_type.from_buffer_copy(payload)
 
 
 def get_command_class(role, header):
@@ -995,7 +1003,7 @@ class EventAddResponse(Message):
 
     @property
     def metadata(self):
-        return extract_metadata(self.buffers[0], self.data_type)
+        return extract_metadata(self.buffers[0], self.header.data_type)
 
     @property
     def status(self):
@@ -1147,7 +1155,7 @@ class ReadResponse(Message):
 
     @property
     def metadata(self):
-        return extract_metadata(self.buffers[0], self.data_type)
+        return extract_metadata(self.buffers[0], self.header.data_type)
 
 
 class WriteRequest(Message):
@@ -1174,7 +1182,7 @@ class WriteRequest(Message):
 
     @property
     def metadata(self):
-        return extract_metadata(self.buffers[0], self.data_type)
+        return extract_metadata(self.buffers[0], self.header.data_type)
 
 # There is no 'WriteResponse'. See WriteNotifyRequest/WriteNotifyResponse.
 
@@ -1410,7 +1418,7 @@ class ReadNotifyResponse(Message):
 
     @property
     def metadata(self):
-        return extract_metadata(self.buffers[0], self.data_type)
+        return extract_metadata(self.buffers[0], self.header.data_type)
 
     @property
     def status(self):
@@ -1563,7 +1571,7 @@ class WriteNotifyRequest(Message):
 
     @property
     def metadata(self):
-        return extract_metadata(self.buffers[0], self.data_type)
+        return extract_metadata(self.buffers[0], self.header.data_type)
 
 
 class WriteNotifyResponse(Message):
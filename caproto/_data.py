@@ -6,6 +6,7 @@
 from collections import defaultdict, namedtuple
 from collections.abc import Iterable
 import copy
+import functools
 import time
 import weakref
 
@@ -34,6 +35,13 @@ __all__ = ('Forbidden',
            'ChannelString',
            )
 
+# ** Tuning this parameter will affect the servers' performance **
+# ** with large arrays. **
+# Values with at least this many elements are converted for the wire in a
+# worker thread, when the server serving the channel provides one, instead of
+# on the event loop.
+THREADED_CONVERSION_THRESHOLD = 2 ** 16
+
 SubscriptionUpdate = namedtuple('SubscriptionUpdate',
                                 ('sub_specs', 'metadata', 'values',
                                  'flags', 'sub'))
@@ -176,6 +184,16 @@ class ChannelAlarm:
 
 class ChannelData:
     data_type = ChannelType.LONG
+    # Set by the server when a client creates a channel to this instance. If
+    # set, this is AsyncLibraryLayer.run_in_thread of the server's library.
+    _run_in_thread = None
+    # The value converted to the wire format of its native type, as
+    # (native_type, value, enum_strings, converted). It is reused by reads of
+    # the native type and its DBR variants until the next write.
+    _wire_cache = None
+    # Count of writes, by which a conversion finishing after a write knows not
+    # to cache its (stale) result
+    _writes = 0
 
     def __init__(self, *, alarm=None, value=None, timestamp=None,
                  max_length=None, string_encoding='latin-1',
@@ -410,14 +428,39 @@ class ChannelData:
         else:
             native_to = native_type(data_type)
 
-        values = backend.convert_values(
-            values=self._data['value'],
-            from_dtype=self.data_type,
-            to_dtype=native_to,
-            string_encoding=self.string_encoding,
-            enum_strings=self._data.get('enum_strings'),
-            direction=ConversionDirection.TO_WIRE,
-        )
+        value = self._data['value']
+        enum_strings = self._data.get('enum_strings')
+        writes = self._writes
+        cache = self._wire_cache
+        if (cache is not None and cache[0] == native_to and
+                cache[1] is value and cache[2] is enum_strings):
+            values = cache[3]
+        else:
+            convert = functools.partial(
+                backend.convert_values,
+                values=value,
+                from_dtype=self.data_type,
+                to_dtype=native_to,
+                string_encoding=self.string_encoding,
+                enum_strings=enum_strings,
+                direction=ConversionDirection.TO_WIRE,
+            )
+            if (self._run_in_thread is not None and
+                    self.calculate_length(value) >=
+                    THREADED_CONVERSION_THRESHOLD):
+                # Converting (and byte-swapping) a large array takes long
+                # enough to hold up every other client; numpy releases the GIL
+                # meanwhile.
+                values = await self._run_in_thread(convert)
+            else:
+                values = convert()
+            flags = getattr(values, 'flags', None)
+            if flags is not None:
+                # Shared with every client that reads it until the next write
+                flags.writeable = False
+            if (native_to == native_type(self.data_type) and
+                    self._writes == writes):
+                self._wire_cache = (native_to, value, enum_strings, values)
 
         # for native types, there is no dbr metadata - just data
         if data_type in native_types:
@@ -518,6 +561,9 @@ class ChannelData:
 
         # TODO the next 5 lines should be done in one move
         self._data['value'] = new
+        # The new value may be the cached one, modified in place.
+        self._wire_cache = None
+        self._writes += 1
         await self.write_metadata(publish=False, **metadata)
         # Send a new event to subscribers.
         await self.publish(flags)
@@ -858,8 +904,10 @@ class ChannelNumeric(ChannelData):
                 sev = dflt_severity
                 limit = getattr(self, limit_attr)
 
+                # Record fields which were not yet instantiated (see
+                # PvpropertyData.field_inst) hold the default severities.
                 sev_prop = getattr(
-                    getattr(self, 'field_inst', None),
+                    getattr(self, '_field_inst', None),
                     severity_attr, None)
                 if sev_prop is not None:
                     # TODO sort out where ints are getting through...
@@ -8,6 +8,8 @@
 import ctypes
 import datetime
 import collections
+import struct
+import sys
 from enum import IntEnum, IntFlag
 from ._constants import (EPICS2UNIX_EPOCH, EPICS_EPOCH, MAX_STRING_SIZE,
                          MAX_UNITS_SIZE, MAX_ENUM_STRING_SIZE, MAX_ENUM_STATES)
@@ -202,12 +204,29 @@ class DbrStringArray(collections.UserList):
         res = self.data[i]
         return type(self)(res) if isinstance(i, slice) else res
 
+    def __iter__(self):
+        # UserList would otherwise iterate through __getitem__ above
+        return iter(self.data)
+
     @classmethod
     def frombuffer(cls, buf, data_count=None):
         'Create a DbrStringArray from a buffer'
         if data_count is None:
             data_count = max((1, len(buf) // MAX_STRING_SIZE))
 
+        # numpy is used only once something else has imported it.
+        np = sys.modules.get('numpy')
+        if np is not None:
+            # View the buffer as fixed-width strings; numpy strips the trailing
+            # nulls and only garbage after an embedded null is left to strip.
+            raw = np.frombuffer(buf, dtype=np.uint8)
+            size = data_count * MAX_STRING_SIZE
+            if len(raw) < size:
+                raw = np.concatenate(
+                    (raw, np.zeros(size - len(raw), dtype=np.uint8)))
+            strings = raw[:size].view(f'S{MAX_STRING_SIZE}').tolist()
+            return cls([s.partition(b'\x00')[0] for s in strings])
+
         def safely_find_eos():
             'Find null terminator, else MAX_STRING_SIZE/length of the string'
             try:
@@ -225,6 +244,9 @@ class DbrStringArray(collections.UserList):
 
     def tobytes(self):
         # numpy compat
+        np = sys.modules.get('numpy')
+        if np is not None:
+            return np.array(self.data, dtype=f'S{MAX_STRING_SIZE}').tobytes()
         return b''.join(item[:MAX_STRING_SIZE].ljust(MAX_STRING_SIZE, b'\x00')
                         for item in self)
 
@@ -274,6 +296,12 @@ class TimeStamp(DbrTypeBase):
         return datetime.datetime.utcfromtimestamp(self.timestamp)
 
 
+# Every DBR_STS_* and DBR_TIME_* struct leads with these fields. Unpacking
+# them in one go is much cheaper than going through ctypes field by field.
+_status_struct = struct.Struct('>hh')
+_time_struct = struct.Struct('>hhII')
+
+
 class TimeTypeBase(DbrTypeBase):
     '''DBR_TIME_* base'''
     # access to secondsSinceEpoch and nanoSeconds:
@@ -283,13 +311,25 @@ class TimeTypeBase(DbrTypeBase):
     @property
     def timestamp(self):
         '''Unix timestamp'''
-        return self.stamp.timestamp
+        _, _, seconds, nanoseconds = _time_struct.unpack_from(self)
+        return epics_timestamp_to_unix(seconds, nanoseconds)
+
+    def to_dict(self):
+        status, severity, seconds, nanoseconds = _time_struct.unpack_from(self)
+        return {'status': AlarmStatus(status),
+                'severity': AlarmSeverity(severity),
+                'timestamp': epics_timestamp_to_unix(seconds, nanoseconds)}
 
 
 class StatusTypeBase(DbrTypeBase):
     '''DBR_STS_* base'''
     info_fields = ('status', 'severity', )
 
+    def to_dict(self):
+        status, severity = _status_struct.unpack_from(self)
+        return {'status': AlarmStatus(status),
+                'severity': AlarmSeverity(severity)}
+
 
 class GraphicControlBase(DbrTypeBase):
     '''DBR_CTRL_* and DBR_GR_* base'''
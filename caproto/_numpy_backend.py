@@ -1,5 +1,5 @@
 import ctypes
-from ._backend import Backend, register_backend, convert_values
+from ._backend import Backend, convert_values
 from ._dbr import (ChannelType, DbrStringArray, native_types, DBR_TYPES)
 
 try:
@@ -53,7 +53,9 @@ def python_to_epics(dtype, values, *, byteswap=True, convert_from=None):
     'Convert python builtin values to epics CA'
     # NOTE: ignoring byteswap, storing everything as big-endian
     if dtype == ChannelType.STRING:
-        return DbrStringArray(values).tobytes()
+        if isinstance(values, DbrStringArray):
+            values = values.data
+        return np.array(values, dtype=type_map[dtype]).tobytes()
     elif dtype == ChannelType.CHAR:
         if isinstance(values, bytes):
             return values
@@ -61,7 +63,14 @@ def python_to_epics(dtype, values, *, byteswap=True, convert_from=None):
             assert len(values) == 1, "expected b'...', [b'...'], or [...]"
             return values[0]
 
-    return np.asarray(values).astype(type_map[dtype])
+    values = np.asarray(values)
+    if (values.dtype == type_map[dtype] and values.flags.c_contiguous and
+            not values.flags.writeable):
+        # Already big-endian, of the right type and contiguous (i.e., not a
+        # strided slice). Being read-only, as ChannelData makes the values it
+        # converts, it cannot change before it is sent; no copy needed.
+        return values
+    return values.astype(type_map[dtype])
 
 
 def _setup():
@@ -77,7 +86,3 @@ def _setup():
                    python_to_epics=python_to_epics,
                    convert_values=convert_values,
                    )
-
-
-if np is not None:
-    register_backend(_setup())
@@ -0,0 +1,292 @@
+# Record the bytes sent and received by VirtualCircuits and Broadcasters to a
+# file, for replaying later. See caproto.sync.replay.
+import logging
+import socket
+import struct
+import threading
+import time
+from collections import deque, namedtuple
+
+from ._utils import CLIENT, SERVER, CaprotoRuntimeError, CaprotoValueError
+
+__all__ = ('TraceRecord', 'TraceRecorder', 'read_trace', 'start_tracing',
+           'stop_tracing', 'get_recorder')
+logger = logging.getLogger('caproto.trace')
+
+# The recorder to which VirtualCircuit and Broadcaster report, if any
+current_recorder = None
+
+SEND = 'send'
+RECV = 'recv'
+TCP = 'TCP'
+UDP = 'UDP'
+
+FILE_MAGIC = b'CATRACE\x01'
+
+# Flags of each record
+_RECV_FLAG = 0x1
+_UDP_FLAG = 0x2
+_SERVER_FLAG = 0x4
+
+# timestamp, flags, our host and port, their host and port, data length
+_RECORD_HEADER = struct.Struct('!dBx4sH4sHI')
+
+# Maximum number of records waiting for the writer thread, after which further
+# records are dropped rather than slowing down the caller
+MAX_QUEUED_RECORDS = 100000
+# Seconds between writes of the records queued by the writer thread
+WRITE_INTERVAL = 0.1
+
+TraceRecord = namedtuple('TraceRecord',
+                         'timestamp direction transport role our_address '
+                         'their_address data')
+TraceRecord.__doc__ = '''
+The bytes of one send or receive
+
+Parameters
+----------
+timestamp : float
+    ``time.monotonic()`` of the recording process
+direction : {'send', 'recv'}
+transport : {'TCP', 'UDP'}
+role : caproto.CLIENT or caproto.SERVER
+    Role of the recording process
+our_address : (host, port) or None
+their_address : (host, port) or None
+    Not recorded for datagrams sent (or for datagrams received, in the case of
+    ``our_address``) as the Broadcaster does not know them.
+data : bytes
+'''
+
+
+def _pack_address(address):
+    if address is None:
+        return b'\x00' * 4, 0
+    host, port = address
+    try:
+        return socket.inet_aton(host), port
+    except (OSError, TypeError):
+        return b'\x00' * 4, port
+
+
+def _unpack_address(packed_host, port):
+    if packed_host == b'\x00' * 4 and port == 0:
+        return None
+    return socket.inet_ntoa(packed_host), port
+
+
+class TraceRecorder:
+    '''
+    Record the bytes sent and received to a file in a background thread
+
+    Recording only takes a copy of the bytes and queues it; the writer thread
+    packs and writes the queued records every ``WRITE_INTERVAL`` seconds. If
+    ``max_queued`` records are waiting, further records are dropped and
+    counted in ``dropped``.
+
+    Parameters
+    ----------
+    file : str or binary file-like object
+        A file name is opened for writing, and closed by :meth:`stop`.
+    max_queued : int, optional
+        Defaults to ``MAX_QUEUED_RECORDS``
+    '''
+    def __init__(self, file, *, max_queued=MAX_QUEUED_RECORDS):
+        self.file = file
+        self.max_queued = max_queued
+        self.recorded = 0
+        self.dropped = 0
+        self.bytes_written = 0
+        self._records = deque()
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._stream = None
+
+    def start(self):
+        'Open the file and start the writer thread'
+        if self._thread is not None:
+            raise CaprotoRuntimeError('TraceRecorder is already started')
+        if isinstance(self.file, str):
+            self._stream = open(self.file, 'wb')
+        else:
+            self._stream = self.file
+        self._stream.write(FILE_MAGIC)
+        self.bytes_written = len(FILE_MAGIC)
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._write_loop,
+                                        name='caproto-trace-writer',
+                                        daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        'Write the records queued so far and stop the writer thread'
+        if self._thread is None:
+            return
+        self._stop_event.set()
+        self._thread.join()
+        self._thread = None
+        if isinstance(self.file, str):
+            self._stream.close()
+        else:
+            self._stream.flush()
+        self._stream = None
+        logger.debug('Recorded %d sends and receives (%d dropped), %d bytes',
+                     self.recorded, self.dropped, self.bytes_written)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def record(self, direction, transport, role, our_address, their_address,
+               buffers):
+        '''
+        Record bytes sent or received
+
+        Parameters
+        ----------
+        direction : {'send', 'recv'}
+        transport : {'TCP', 'UDP'}
+        role : caproto.CLIENT or caproto.SERVER
+        our_address : (host, port) or None
+        their_address : (host, port) or None
+        buffers : list of bytes-like
+        '''
+        flags = 0
+        if direction == RECV:
+            flags |= _RECV_FLAG
+        if transport == UDP:
+            flags |= _UDP_FLAG
+        if role is SERVER:
+            flags |= _SERVER_FLAG
+        if len(self._records) >= self.max_queued:
+            self.dropped += 1
+            return
+        # deque.append is thread-safe; the writer thread pops from the left.
+        self._records.append((time.monotonic(), flags, our_address,
+                              their_address, b''.join(buffers)))
+        self.recorded += 1
+
+    def _write_loop(self):
+        pack = _RECORD_HEADER.pack
+        records = self._records
+        while True:
+            stop = self._stop_event.wait(WRITE_INTERVAL)
+            chunks = []
+            for _ in range(len(records)):
+                timestamp, flags, our_address, their_address, data = (
+                    records.popleft())
+                chunks.append(pack(timestamp, flags,
+                                   *_pack_address(our_address),
+                                   *_pack_address(their_address),
+                                   len(data)))
+                chunks.append(data)
+            if chunks:
+                chunk = b''.join(chunks)
+                self._stream.write(chunk)
+                # Keep the file usable if the process is killed.
+                self._stream.flush()
+                self.bytes_written += len(chunk)
+            if stop:
+                return
+
+
+def read_trace(file):
+    '''
+    Read the records of a file written by :class:`TraceRecorder`
+
+    Parameters
+    ----------
+    file : str or binary file-like object
+
+    Yields
+    ------
+    record : TraceRecord
+    '''
+    if isinstance(file, str):
+        with open(file, 'rb') as f:
+            yield from read_trace(f)
+        return
+
+    if file.read(len(FILE_MAGIC)) != FILE_MAGIC:
+        raise CaprotoValueError(f'{file!r} is not a caproto trace')
+    while True:
+        header = file.read(_RECORD_HEADER.size)
+        if not header:
+            return
+        if len(header) < _RECORD_HEADER.size:
+            raise CaprotoValueError('Trace is truncated')
+        (timestamp, flags, our_host, our_port, their_host, their_port,
+         length) = _RECORD_HEADER.unpack(header)
+        data = file.read(length)
+        if len(data) < length:
+            raise CaprotoValueError('Trace is truncated')
+        yield TraceRecord(
+            timestamp=timestamp,
+            direction=RECV if flags & _RECV_FLAG else SEND,
+            transport=UDP if flags & _UDP_FLAG else TCP,
+            role=SERVER if flags & _SERVER_FLAG else CLIENT,
+            our_address=_unpack_address(our_host, our_port),
+            their_address=_unpack_address(their_host, their_port),
+            data=data)
+
+
+def start_tracing(file, **kwargs):
+    '''
+    Record all VirtualCircuit and Broadcaster traffic of this process
+
+    Parameters
+    ----------
+    file : str or binary file-like object
+    **kwargs :
+        Passed to :class:`TraceRecorder`
+
+    Returns
+    -------
+    recorder : TraceRecorder
+        Already started. Use :func:`stop_tracing` to stop it.
+
+    Examples
+    --------
+    Record the traffic of an IOC until it exits.
+
+    >>> start_tracing('/tmp/ioc.trace')
+    >>> run(ioc.pvdb, **run_options)
+    >>> stop_tracing()
+
+    Replay the client requests against a server, as fast as possible.
+
+    $ caproto-replay /tmp/ioc.trace --speed 0
+    '''
+    global current_recorder
+    if current_recorder is not None:
+        raise CaprotoRuntimeError('Tracing is already started; call '
+                                  'stop_tracing() first')
+    recorder = TraceRecorder(file, **kwargs)
+    recorder.start()
+    current_recorder = recorder
+    return recorder
+
+
+def stop_tracing():
+    '''
+    Stop the recorder started by :func:`start_tracing`, if any
+
+    Returns
+    -------
+    recorder : TraceRecorder or None
+    '''
+    global current_recorder
+    recorder, current_recorder = current_recorder, None
+    if recorder is not None:
+        recorder.stop()
+    return recorder
+
+
+def get_recorder():
+    """
+    Return the recorder started by :func:`start_tracing`, or ``None``.
+    """
+    return current_recorder
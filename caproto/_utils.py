@@ -567,6 +567,8 @@ class RecordModifiers(enum.Flag):
     filter_deadband = enum.auto()
     filter_array = enum.auto()
     filter_synchronize = enum.auto()
+    filter_decimation = enum.auto()
+    filter_rate = enum.auto()
 
 
 RecordModifier = namedtuple('RecordModifier',
@@ -621,11 +623,13 @@ def parse_record_field(pvname):
     return RecordAndField(record_field, record, field, modifiers)
 
 
-ChannelFilter = namedtuple('ChannelFilter', 'ts dbnd arr sync')
+ChannelFilter = namedtuple('ChannelFilter', 'ts dbnd arr sync dec rate')
 # TimestampFilter is just True or None, no need for namedtuple.
 DeadbandFilter = namedtuple('DeadbandFilter', 'm d')
 ArrayFilter = namedtuple('ArrayFilter', 's i e')
 SyncFilter = namedtuple('SyncFilter', 'm s')
+DecimationFilter = namedtuple('DecimationFilter', 'n')
+RateFilter = namedtuple('RateFilter', 'max')
 
 sync_modes = set(['before', 'first', 'while', 'last', 'after', 'unless'])
 
@@ -635,13 +639,15 @@ def parse_channel_filter(filter_text):
     # https://epics.anl.gov/base/R3-15/5-docs/filters.html
 
     if not filter_text:
-        return ChannelFilter(ts=False, dbnd=None, sync=None, arr=None)
+        return ChannelFilter(ts=False, dbnd=None, sync=None, arr=None,
+                             dec=None, rate=None)
 
     # If there is a shorthand array filter, that is the only filter allowed, so
     # we parse that and return, shortcircuiting the rest.
     if filter_text.startswith('[') and filter_text.endswith(']'):
         arr = parse_arr_shorthand_filter(filter_text)
-        return ChannelFilter(ts=False, dbnd=None, sync=None, arr=arr)
+        return ChannelFilter(ts=False, dbnd=None, sync=None, arr=arr,
+                             dec=None, rate=None)
 
     try:
         filter_ = json.loads(filter_text)
@@ -662,7 +668,7 @@ def parse_channel_filter(filter_text):
                 f"were found: {filter_}")
         (mode, state), = filter_.items()
         filter_ = {"sync": {"m": mode, "s": state}}
-    valid_filters = {'ts', 'arr', 'sync', 'dbnd'}
+    valid_filters = {'ts', 'arr', 'sync', 'dbnd', 'dec', 'rate'}
     filter_keys = set(filter_)
     invalid_keys = filter_keys - valid_filters
     if invalid_keys:
@@ -672,7 +678,9 @@ def parse_channel_filter(filter_text):
     return ChannelFilter(arr=parse_arr_filter(filter_.get('arr')),
                          dbnd=parse_dbnd_filter(filter_.get('dbnd')),
                          ts=parse_ts_filter(filter_.get('ts')),
-                         sync=parse_sync_filter(filter_.get('sync')))
+                         sync=parse_sync_filter(filter_.get('sync')),
+                         dec=parse_dec_filter(filter_.get('dec')),
+                         rate=parse_rate_filter(filter_.get('rate')))
 
 
 def parse_arr_shorthand_filter(filter_text):
@@ -760,6 +768,42 @@ def parse_sync_filter(val):
     return SyncFilter(m=val['m'], s=val['s'])
 
 
+def parse_dec_filter(val):
+    if val is None:
+        return None
+    if set('n') != set(val.keys()):
+        raise FilterValidationError(
+            f"'dec' must include only 'n'. Found keys {set(val.keys())}.")
+    try:
+        n = int(val['n'])
+    except (TypeError, ValueError):
+        raise FilterValidationError(f"Unsupported value in 'dec': "
+                                    f"{val['n']!r}") from None
+    if n < 1:
+        raise FilterValidationError(f"'dec' value 'n' must be at least 1. "
+                                    f"Found {n}.")
+    return DecimationFilter(n=n)
+
+
+def parse_rate_filter(val):
+    # This is a caproto extension; it is not one of the filters that ship with
+    # EPICS. 'max' is the maximum number of updates per second.
+    if val is None:
+        return None
+    if set(['max']) != set(val.keys()):
+        raise FilterValidationError(
+            f"'rate' must include only 'max'. Found keys {set(val.keys())}.")
+    try:
+        max_rate = float(val['max'])
+    except (TypeError, ValueError):
+        raise FilterValidationError(f"Unsupported value in 'rate': "
+                                    f"{val['max']!r}") from None
+    if not max_rate > 0:
+        raise FilterValidationError(f"'rate' value 'max' must be positive. "
+                                    f"Found {max_rate}.")
+    return RateFilter(max=max_rate)
+
+
 def apply_arr_filter(arr_filter, values):
     # Apply array Channel Filter.
     if arr_filter is None:
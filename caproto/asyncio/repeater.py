@@ -0,0 +1,492 @@
+# Channel Access Repeater, using asyncio
+#
+# This does the same job as caproto.sync.repeater (see there for how the
+# repeater operates) at a lower cost per forwarded datagram, for hosts with
+# many clients:
+#
+# - Datagrams are forwarded as received, rather than parsed into commands and
+#   serialized again. Only their headers are read, and a beacon without the
+#   address of its server is patched in place.
+# - The addresses of the clients are kept ready to send to. On Linux, a
+#   datagram is sent to all clients with a single sendmmsg system call.
+# - Clients are checked for liveness on a timer, rather than on every
+#   registration.
+# - Counts of the datagrams received and forwarded are kept, and may be logged
+#   periodically.
+
+import asyncio
+import ctypes
+import ctypes.util
+import errno
+import logging
+import socket
+import struct
+import sys
+import time
+from collections import namedtuple
+
+import caproto
+from .._commands import Commands
+from .._utils import CLIENT, SERVER, get_environment_variables
+from ..sync.repeater import check_for_running_repeater, RepeaterAlreadyRunning
+
+
+__all__ = ('RepeaterProtocol', 'RepeaterStats', 'run_repeater', 'run')
+logger = logging.getLogger('caproto.repeater')
+
+# Seconds between checks that registered clients are still running
+CLIENT_CHECK_INTERVAL = 5.0
+
+RepeaterStats = namedtuple('RepeaterStats',
+                           'received forwarded sends bytes_sent beacons '
+                           'registrations clients clients_removed invalid '
+                           'send_errors batches')
+RepeaterStats.__doc__ = '''
+Counts of the datagrams handled by a RepeaterProtocol
+
+Parameters
+----------
+received : int
+    Datagrams received
+forwarded : int
+    Datagrams forwarded to (at least one) client
+sends : int
+    Datagrams sent to clients, one per forwarded datagram per client
+bytes_sent : int
+    Bytes sent to clients
+beacons : int
+    Beacons received
+registrations : int
+    Registrations received, including repeated ones
+clients : int
+    Clients currently registered
+clients_removed : int
+    Clients removed, having exited
+invalid : int
+    Datagrams received which could not be parsed, and were dropped
+send_errors : int
+    Failures to send to a client
+batches : int
+    Number of sendmmsg system calls made
+'''
+
+_header = struct.Struct('!HHHHII')
+_known_commands = set(Commands[CLIENT]) | set(Commands[SERVER])
+
+
+class _iovec(ctypes.Structure):
+    _fields_ = [('iov_base', ctypes.c_void_p),
+                ('iov_len', ctypes.c_size_t)]
+
+
+class _msghdr(ctypes.Structure):
+    _fields_ = [('msg_name', ctypes.c_void_p),
+                ('msg_namelen', ctypes.c_uint32),
+                ('msg_iov', ctypes.POINTER(_iovec)),
+                ('msg_iovlen', ctypes.c_size_t),
+                ('msg_control', ctypes.c_void_p),
+                ('msg_controllen', ctypes.c_size_t),
+                ('msg_flags', ctypes.c_int)]
+
+
+class _mmsghdr(ctypes.Structure):
+    _fields_ = [('msg_hdr', _msghdr),
+                ('msg_len', ctypes.c_uint)]
+
+
+class _sockaddr_in(ctypes.Structure):
+    _fields_ = [('sin_family', ctypes.c_ushort),
+                ('sin_port', ctypes.c_uint16),  # network byte order
+                ('sin_addr', ctypes.c_uint8 * 4),
+                ('sin_zero', ctypes.c_uint8 * 8)]
+
+
+def _find_sendmmsg():
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        sendmmsg = libc.sendmmsg
+    except (OSError, AttributeError):
+        return None
+    sendmmsg.argtypes = [ctypes.c_int, ctypes.c_void_p, ctypes.c_uint,
+                         ctypes.c_int]
+    sendmmsg.restype = ctypes.c_int
+    return sendmmsg
+
+
+_sendmmsg = _find_sendmmsg()
+
+
+class _MultiSender:
+    '''
+    Send a datagram to several addresses with one sendmmsg system call
+
+    All of the messages share one I/O vector, which points to the datagram
+    being sent, so the datagram is not copied.
+
+    Parameters
+    ----------
+    fileno : int
+        A UDP socket
+    addresses : list of (host, port)
+    '''
+    def __init__(self, fileno, addresses):
+        self.fileno = fileno
+        self.addresses = list(addresses)
+        count = len(self.addresses)
+        self._iov = _iovec()
+        self._names = (_sockaddr_in * count)()
+        self._messages = (_mmsghdr * count)()
+        for name, message, (host, port) in zip(self._names, self._messages,
+                                               self.addresses):
+            name.sin_family = socket.AF_INET
+            name.sin_port = socket.htons(port)
+            name.sin_addr[:] = socket.inet_aton(host)
+            header = message.msg_hdr
+            header.msg_name = ctypes.addressof(name)
+            header.msg_namelen = ctypes.sizeof(_sockaddr_in)
+            header.msg_iov = ctypes.pointer(self._iov)
+            header.msg_iovlen = 1
+
+    def send(self, data, start=0):
+        '''
+        Send data to the addresses, starting from addresses[start]
+
+        Returns
+        -------
+        (sent, calls) : (int, int)
+            The number of addresses sent to and of system calls made. Sending
+            stops short if the socket would block or fails to send to an
+            address; the errno is then available from ``ctypes.get_errno``.
+        '''
+        buffer = ctypes.c_char_p(data)
+        self._iov.iov_base = ctypes.cast(buffer, ctypes.c_void_p)
+        self._iov.iov_len = len(data)
+        size = ctypes.sizeof(_mmsghdr)
+        count = len(self.addresses)
+        sent = start
+        calls = 0
+        while sent < count:
+            calls += 1
+            result = _sendmmsg(self.fileno,
+                               ctypes.addressof(self._messages) + sent * size,
+                               count - sent, 0)
+            if result <= 0:
+                break
+            sent += result
+        return sent - start, calls
+
+
+class RepeaterProtocol(asyncio.DatagramProtocol):
+    '''
+    A Channel Access repeater, as an asyncio datagram protocol
+
+    Parameters
+    ----------
+    client_check_interval : float, optional
+        Seconds between checks that registered clients are still running
+    stats_interval : float, optional
+        If given, log the counts of datagrams handled every this many seconds
+    batch : bool, optional
+        Send to all clients with one sendmmsg system call, where available
+        (on Linux). Defaults to True.
+    '''
+    def __init__(self, *, client_check_interval=CLIENT_CHECK_INTERVAL,
+                 stats_interval=None, batch=True):
+        self.client_check_interval = client_check_interval
+        self.stats_interval = stats_interval
+        self.batch = batch and _sendmmsg is not None
+        # client port -> host
+        self.clients = {}
+        # server port -> dict(up_at=..., host=...)
+        self.servers = {}
+        self.checkin_threshold = get_environment_variables()[
+            'EPICS_CA_CONN_TMO']
+        self.transport = None
+        self._counts = dict.fromkeys(RepeaterStats._fields, 0)
+        self._targets = []
+        self._sender = None
+        self._packed_hosts = {}
+        self._confirmations = {}
+        self._timers = {}
+        self._last_logged = None
+
+    @property
+    def stats(self):
+        'Counts of the datagrams handled so far, as a RepeaterStats'
+        return RepeaterStats(**dict(self._counts, clients=len(self.clients)))
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self._fileno = transport.get_extra_info('socket').fileno()
+        host, port = transport.get_extra_info('sockname')[:2]
+        logger.info("Repeater is listening on %s:%d", host, port)
+        loop = asyncio.get_event_loop()
+        self._timers['check_clients'] = loop.call_later(
+            self.client_check_interval, self._check_clients)
+        if self.stats_interval:
+            self._last_logged = (time.monotonic(), self.stats)
+            self._timers['log_stats'] = loop.call_later(
+                self.stats_interval, self._log_stats)
+
+    def connection_lost(self, exc):
+        for timer in self._timers.values():
+            timer.cancel()
+
+    def _clients_changed(self):
+        self._targets = [(host, port) for port, host in self.clients.items()]
+        self._sender = (_MultiSender(self._fileno, self._targets)
+                        if self.batch and self._targets else None)
+        logger.debug('Active clients: %d servers: %d', len(self.clients),
+                     len(self.servers))
+
+    def _add_client(self, host, port):
+        if port not in self.clients:
+            self.clients[port] = host
+            logger.debug('New client %s:%d', host, port)
+            self._clients_changed()
+
+    def _remove_clients(self, addresses):
+        for host, port in addresses:
+            logger.debug('Removing client %s:%d', host, port)
+            del self.clients[port]
+        self._counts['clients_removed'] += len(addresses)
+        self._clients_changed()
+
+    def _check_clients(self):
+        'Remove clients which have exited, and servers which have not beaconed'
+        self._timers['check_clients'] = asyncio.get_event_loop().call_later(
+            self.client_check_interval, self._check_clients)
+        exited = []
+        for port, host in self.clients.items():
+            probe = socket.socket(socket.AF_INET, socket.SOCK_DGRAM,
+                                  socket.IPPROTO_UDP)
+            try:
+                probe.bind((host, port))
+            except OSError:
+                # In use, still taken by the client
+                ...
+            else:
+                exited.append((host, port))
+            finally:
+                probe.close()
+        if exited:
+            self._remove_clients(exited)
+
+        now = time.time()
+        for server_port, server_info in list(self.servers.items()):
+            if now - server_info['up_at'] > self.checkin_threshold:
+                del self.servers[server_port]
+
+    def _log_stats(self):
+        self._timers['log_stats'] = asyncio.get_event_loop().call_later(
+            self.stats_interval, self._log_stats)
+        now, stats = time.monotonic(), self.stats
+        last_time, last_stats = self._last_logged
+        self._last_logged = (now, stats)
+        elapsed = now - last_time
+        logger.info('Forwarded %.1f datagrams/s (%.1f sends/s, %.0f bytes/s) '
+                    'to %d clients; %d beacons, %d invalid datagrams, %d '
+                    'send errors in the last %.0f s',
+                    (stats.forwarded - last_stats.forwarded) / elapsed,
+                    (stats.sends - last_stats.sends) / elapsed,
+                    (stats.bytes_sent - last_stats.bytes_sent) / elapsed,
+                    stats.clients, stats.beacons - last_stats.beacons,
+                    stats.invalid - last_stats.invalid,
+                    stats.send_errors - last_stats.send_errors, elapsed)
+
+    def _confirm(self, host, port):
+        try:
+            confirmation = self._confirmations[host]
+        except KeyError:
+            confirmation = self._confirmations[host] = bytes(
+                caproto.RepeaterConfirmResponse(host))
+        self.transport.sendto(confirmation, (host, port))
+
+    def _scan(self, data, host):
+        '''
+        Check the commands in a datagram, and prepare it for forwarding
+
+        Returns the bytes to forward, which are those of data with
+        registrations removed and the address of the server filled in to
+        beacons, and whether a registration was found. Raises ValueError if
+        the datagram is not a sequence of Channel Access commands.
+        '''
+        size = len(data)
+        offset = 0
+        patched = None
+        registrations = []
+        while offset < size:
+            if size - offset < _header.size:
+                raise ValueError('Truncated header')
+            (command, payload_size, _, data_count, _,
+             parameter2) = _header.unpack_from(data, offset)
+            end = offset + _header.size + payload_size
+            if end > size or command not in _known_commands:
+                raise ValueError('Not a Channel Access command')
+            if command == caproto.Beacon.ID:
+                self._counts['beacons'] += 1
+                # Update our records of the last time each server checked in
+                # (i.e. issued a heartbeat).
+                self.servers[data_count] = dict(up_at=time.time(), host=host)
+                # As in the sync repeater, fill in the address of a server
+                # which left it up to us.
+                if parameter2 == 0:
+                    if patched is None:
+                        patched = bytearray(data)
+                    try:
+                        packed = self._packed_hosts[host]
+                    except KeyError:
+                        packed = self._packed_hosts[host] = socket.inet_aton(
+                            host)
+                    patched[offset + 12:offset + 16] = packed
+            elif command == caproto.RepeaterRegisterRequest.ID:
+                registrations.append((offset, end))
+            offset = end
+
+        if patched is not None:
+            data = bytes(patched)
+        if registrations:
+            # Do not forward registrations to other clients.
+            kept = []
+            start = 0
+            for begin, end in registrations:
+                kept.append(data[start:begin])
+                start = end
+            kept.append(data[start:])
+            data = b''.join(kept)
+        return data, bool(registrations)
+
+    def datagram_received(self, data, addr):
+        host, port = addr[:2]
+        self._counts['received'] += 1
+
+        if port in self.clients and self.clients[port] != host:
+            # broadcast only from one interface
+            return
+        elif port in self.servers and self.servers[port]['host'] != host:
+            return
+
+        if not data:
+            # An additional valid way to register is an empty message.
+            self._counts['registrations'] += 1
+            self._add_client(host, port)
+            return
+
+        try:
+            data, registered = self._scan(data, host)
+        except ValueError:
+            self._counts['invalid'] += 1
+            logger.debug('Dropping invalid datagram from %s:%d', host, port)
+            return
+
+        if registered:
+            self._counts['registrations'] += 1
+            self._add_client(host, port)
+            self._confirm(host, port)
+
+        if data:
+            self._forward(data, port)
+
+    def error_received(self, exc):
+        # Sending to a client failed. Clients which have exited are removed
+        # by _check_clients.
+        self._counts['send_errors'] += 1
+        logger.debug('Failed to send to a client: %s', exc)
+
+    def _forward(self, data, from_port):
+        'Send data to all clients other than the one at from_port'
+        targets = self._targets
+        sender = self._sender
+        if from_port in self.clients:
+            targets = [address for address in targets
+                       if address[1] != from_port]
+            sender = None
+        if sender is not None and self.transport.get_write_buffer_size():
+            # Keep datagrams in order behind those the transport has queued.
+            sender = None
+
+        start = 0
+        if sender is not None:
+            while start < len(targets):
+                sent, calls = sender.send(data, start)
+                self._counts['batches'] += calls
+                start += sent
+                if start < len(targets):
+                    if ctypes.get_errno() in (errno.EAGAIN, errno.EWOULDBLOCK):
+                        # The socket buffer is full; let the transport queue
+                        # the rest.
+                        break
+                    self._counts['send_errors'] += 1
+                    start += 1
+        for address in targets[start:]:
+            self.transport.sendto(data, address)
+
+        if targets:
+            self._counts['forwarded'] += 1
+            self._counts['sends'] += len(targets)
+            self._counts['bytes_sent'] += len(targets) * len(data)
+
+
+async def run_repeater(sock, **kwargs):
+    '''
+    Run a repeater on a bound UDP socket until cancelled
+
+    Parameters
+    ----------
+    sock : socket.socket
+        As returned by ``check_for_running_repeater``
+    **kwargs :
+        Passed to :class:`RepeaterProtocol`
+    '''
+    loop = asyncio.get_event_loop()
+    closed = loop.create_future()
+
+    class Protocol(RepeaterProtocol):
+        def connection_lost(self, exc):
+            super().connection_lost(exc)
+            if not closed.done():
+                closed.set_result(None)
+
+    transport, _ = await loop.create_datagram_endpoint(
+        lambda: Protocol(**kwargs), sock=sock)
+    try:
+        await closed
+    finally:
+        transport.close()
+
+
+def run(host='0.0.0.0', *, stats_interval=None):
+    '''
+    Run a repeater, unless one is already running
+
+    Parameters
+    ----------
+    host : str, optional
+        The interface to listen on
+    stats_interval : float, optional
+        If given, log the counts of datagrams handled every this many seconds
+    '''
+    port = get_environment_variables()['EPICS_CA_REPEATER_PORT']
+    logger.debug('Checking for another repeater....')
+    try:
+        sock = check_for_running_repeater((host, port))
+    except RepeaterAlreadyRunning:
+        logger.info('Another repeater is already running; exiting.')
+        return
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    task = loop.create_task(run_repeater(sock, stats_interval=stats_interval))
+    try:
+        loop.run_until_complete(task)
+    except KeyboardInterrupt:
+        logger.info('Keyboard interrupt; exiting.')
+        task.cancel()
+        try:
+            loop.run_until_complete(task)
+        except asyncio.CancelledError:
+            ...
+    finally:
+        loop.close()
@@ -3,9 +3,11 @@ import caproto as ca
 import asyncio
 import socket
 import sys
+from collections import deque
 
 from ..server.common import (VirtualCircuit as _VirtualCircuit,
                              Context as _Context)
+from ..server.tuning import get_performance_profile, new_event_loop
 
 
 class ServerExit(Exception):
@@ -48,6 +50,182 @@ def _get_asyncio_queue(loop):
     return AsyncioQueue
 
 
+class _CommandQueue(asyncio.Queue):
+    '''
+    Queue of the commands received by a circuit
+
+    Rather than refusing commands, it pauses reading from the client while it
+    holds ``ca.MAX_COMMAND_BACKLOG`` of them, until half of those have been
+    processed, so that a fast client is slowed down by TCP flow control.
+    '''
+    def __init__(self, transport):
+        super().__init__()
+        self.transport = transport
+        self.reading_paused = False
+
+    def _put(self, item):
+        super()._put(item)
+        if not self.reading_paused and self.qsize() >= ca.MAX_COMMAND_BACKLOG:
+            self.reading_paused = True
+            self.transport.pause_reading()
+
+    def _get(self):
+        item = super()._get()
+        if (self.reading_paused and
+                self.qsize() <= ca.MAX_COMMAND_BACKLOG // 2):
+            self.reading_paused = False
+            self.transport.resume_reading()
+        return item
+
+
+def _release_waiter(waiter):
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+class _SubscriptionQueue:
+    '''
+    Queue of the subscription updates of a circuit, with a timed get
+
+    Unlike ``asyncio.wait_for(queue.get(), timeout)``, taking an update which
+    is already queued costs neither a task nor a timer, and waiting for one
+    costs one future and, with a timeout, one timer. It is meant for a single
+    consumer, the circuit's subscription_queue_loop.
+
+    Putting an item into a full queue raises asyncio.QueueFull, even in
+    :meth:`put`: the server drops updates rather than waiting for room.
+    '''
+    def __init__(self, maxsize, *, loop):
+        self.maxsize = maxsize
+        self.loop = loop
+        self._items = deque()
+        self._waiter = None
+
+    def qsize(self):
+        return len(self._items)
+
+    def empty(self):
+        return not self._items
+
+    def full(self):
+        return len(self._items) >= self.maxsize
+
+    def clear(self):
+        self._items.clear()
+
+    def put_nowait(self, item):
+        if len(self._items) >= self.maxsize:
+            raise asyncio.QueueFull
+        self._items.append(item)
+        if self._waiter is not None:
+            _release_waiter(self._waiter)
+
+    async def put(self, item):
+        self.put_nowait(item)
+
+    def get_nowait(self):
+        try:
+            return self._items.popleft()
+        except IndexError:
+            raise asyncio.QueueEmpty from None
+
+    def get_batch_nowait(self, max_items):
+        'Remove and return up to max_items items, without waiting'
+        items = self._items
+        return [items.popleft() for _ in range(min(max_items, len(items)))]
+
+    async def _wait(self, timeout):
+        'Wait until an item is queued, or for timeout seconds'
+        waiter = self._waiter = self.loop.create_future()
+        timer = None
+        if timeout is not None:
+            timer = self.loop.call_later(timeout, _release_waiter, waiter)
+        try:
+            await waiter
+        finally:
+            self._waiter = None
+            if timer is not None:
+                timer.cancel()
+
+    async def get(self, timeout=None):
+        'Remove and return an item, or None if none is queued within timeout'
+        if not self._items:
+            await self._wait(timeout)
+            if not self._items:
+                return None
+        return self._items.popleft()
+
+    async def get_batch(self, max_items, timeout=None):
+        '''
+        Remove and return up to max_items items
+
+        Waits for up to timeout seconds for the first one, and returns an empty
+        list if none is queued by then.
+        '''
+        if not self._items:
+            await self._wait(timeout)
+        return self.get_batch_nowait(max_items)
+
+
+class _CircuitProtocol(asyncio.Protocol):
+    '''
+    The TCP connection of one client, feeding the bytes received to its circuit
+
+    While the transport's write buffer is above its high-water mark, writers
+    wait in :meth:`drain`.
+    '''
+    def __init__(self, context):
+        self.context = context
+        self.transport = None
+        self.circuit = None
+        self._writing_paused = False
+        self._drain_waiters = deque()
+
+    def getsockname(self):
+        return self.transport.get_extra_info('sockname')
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.circuit = self.context._circuit_connected(
+            self, transport.get_extra_info('peername')[:2])
+
+    def data_received(self, data):
+        self.circuit._data_received(data)
+
+    def eof_received(self):
+        # Close the transport, which calls connection_lost.
+        return False
+
+    def connection_lost(self, exc):
+        self._writing_paused = False
+        self._wake_writers()
+        if self.circuit is None:
+            # Lost before the Context made a circuit of it
+            return
+        # As a zero-length recv would, this queues ca.DISCONNECTED.
+        self.circuit._data_received(b'')
+
+    def pause_writing(self):
+        self._writing_paused = True
+
+    def resume_writing(self):
+        self._writing_paused = False
+        self._wake_writers()
+
+    def _wake_writers(self):
+        while self._drain_waiters:
+            waiter = self._drain_waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+
+    async def drain(self):
+        'Wait until the write buffer is below its high-water mark'
+        if self._writing_paused:
+            waiter = self.context.loop.create_future()
+            self._drain_waiters.append(waiter)
+            await waiter
+
+
 class AsyncioAsyncLayer(AsyncLibraryLayer):
     name = 'asyncio'
     ThreadsafeQueue = None
@@ -62,35 +240,33 @@ class AsyncioAsyncLayer(AsyncLibraryLayer):
 
         self.ThreadsafeQueue = _get_asyncio_queue(loop)
 
+    @staticmethod
+    async def run_in_thread(func, *args):
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(None, func, *args)
+
 
 class VirtualCircuit(_VirtualCircuit):
-    "Wraps a caproto.VirtualCircuit with a curio client."
+    """
+    Wraps a caproto.VirtualCircuit with the asyncio protocol of its connection
+
+    The protocol feeds received bytes to the circuit as they arrive, rather
+    than the circuit polling the socket.
+    """
     TaskCancelled = asyncio.CancelledError
 
     def __init__(self, circuit, client, context, *, loop=None):
         if loop is None:
             loop = asyncio.get_event_loop()
         self.loop = loop
-
-        class SockWrapper:
-            def __init__(self, loop, client):
-                self.loop = loop
-                self.client = client
-
-            def getsockname(self):
-                return self.client.getsockname()
-
-            async def recv(self, nbytes):
-                return (await self.loop.sock_recv(self.client, 4096))
         self._raw_lock = asyncio.Lock()
-        self._raw_client = client
-        super().__init__(circuit, SockWrapper(loop, client), context)
+        super().__init__(circuit, client, context)
+        self._tune_socket(client.transport.get_extra_info('socket'))
         self.QueueFull = asyncio.QueueFull
-        self.command_queue = asyncio.Queue(ca.MAX_COMMAND_BACKLOG,
-                                           loop=self.loop)
+        self.command_queue = _CommandQueue(client.transport)
         self.new_command_condition = asyncio.Condition(loop=self.loop)
         self.events_on = asyncio.Event(loop=self.loop)
-        self.subscription_queue = asyncio.Queue(
+        self.subscription_queue = _SubscriptionQueue(
             ca.MAX_TOTAL_SUBSCRIPTION_BACKLOG, loop=self.loop)
         self.write_event = Event(loop=self.loop)
         self._cq_task = None
@@ -100,20 +276,26 @@ class VirtualCircuit(_VirtualCircuit):
     async def get_from_sub_queue(self, timeout=None):
         # Timeouts work very differently between our server implementations,
         # so we do this little stub in its own method.
-        fut = asyncio.ensure_future(self.subscription_queue.get())
-        try:
-            return await asyncio.wait_for(fut, timeout, loop=self.loop)
-        except asyncio.TimeoutError:
-            return None
-
-    async def send(self, *commands):
-        if self.connected:
-            buffers_to_send = self.circuit.send(*commands)
-            # lock to make sure a AddEvent does not write bytes
-            # to the socket while we are sending
-            async with self._raw_lock:
-                await self.loop.sock_sendall(self._raw_client,
-                                             b''.join(buffers_to_send))
+        return await self.subscription_queue.get(timeout)
+
+    async def get_batch_from_sub_queue(self, max_items, timeout=None):
+        return await self.subscription_queue.get_batch(max_items, timeout)
+
+    def _data_received(self, bytes_received):
+        for command in self._parse_received(bytes_received):
+            self.command_queue.put_nowait(command)
+
+    async def _send_buffers(self, buffers):
+        # The caller holds self._raw_lock to make sure a AddEvent does not
+        # write bytes to the socket while we are sending
+        transport = self.client.transport
+        if transport.is_closing():
+            # The circuit is about to learn of the disconnection.
+            return
+        # The transport sends what it can right away, and buffers (rather than
+        # joins) the rest, depending on the version of Python.
+        transport.writelines(buffers)
+        await self.client.drain()
 
     async def run(self):
         self._cq_task = self.loop.create_task(self.command_queue_loop())
@@ -130,7 +312,7 @@ class VirtualCircuit(_VirtualCircuit):
 
     async def _on_disconnect(self):
         await super()._on_disconnect()
-        self._raw_client.close()
+        self.client.transport.close()
         if self._sq_task is not None:
             self._sq_task.cancel()
 
@@ -141,8 +323,11 @@ class Context(_Context):
     ServerExit = ServerExit
     TaskCancelled = asyncio.CancelledError
 
-    def __init__(self, pvdb, interfaces=None, *, loop=None):
-        super().__init__(pvdb, interfaces)
+    def __init__(self, pvdb, interfaces=None, *, loop=None,
+                 performance_profile=None, max_circuit_bytes_per_sec=None):
+        super().__init__(pvdb, interfaces,
+                         performance_profile=performance_profile,
+                         max_circuit_bytes_per_sec=max_circuit_bytes_per_sec)
         self.command_bundle_queue = asyncio.Queue()
         self.subscription_queue = asyncio.Queue()
         if loop is None:
@@ -152,13 +337,32 @@ class Context(_Context):
         self._server_tasks = []
 
     async def server_accept_loop(self, sock):
-        sock.listen()
-
-        while True:
-            client_sock, addr = await self.loop.sock_accept(sock)
-            task = self.loop.create_task(
-                self.tcp_handler(client_sock, addr))
-            self._server_tasks.append(task)
+        server = await self.loop.create_server(
+            lambda: _CircuitProtocol(self), sock=sock)
+        try:
+            # Serve until cancelled.
+            await self.loop.create_future()
+        finally:
+            server.close()
+
+    def _circuit_connected(self, protocol, addr):
+        'Called by the protocol of each new TCP client'
+        cavc = ca.VirtualCircuit(ca.SERVER, addr, None)
+        circuit = self.CircuitClass(cavc, protocol, self, loop=self.loop)
+        self.circuits.add(circuit)
+        self.log.info('Connected to new client at %s:%d (total: %d).', *addr,
+                      len(self.circuits))
+        self._server_tasks = [task for task in self._server_tasks
+                              if not task.done()]
+        self._server_tasks.append(self.loop.create_task(circuit.run()))
+        return circuit
+
+    async def circuit_disconnected(self, circuit):
+        connected = circuit in self.circuits
+        await super().circuit_disconnected(circuit)
+        if connected:
+            self.log.info('Disconnected from client at %s:%d (total: %d).',
+                          *circuit.circuit.address, len(self.circuits))
 
     async def run(self, *, log_pv_names=False):
         'Start the server'
@@ -227,7 +431,8 @@ class Context(_Context):
 
             async def send(self, bytes_to_send):
                 try:
-                    self.transport.sendto(bytes_to_send, self.address)
+                    # The socket is connected to self.address.
+                    self.transport.sendto(bytes_to_send)
                 except OSError as exc:
                     host, port = self.address
                     raise ca.CaprotoNetworkError(
@@ -238,9 +443,13 @@ class Context(_Context):
 
         reuse_port = sys.platform not in ('win32', ) and hasattr(socket, 'SO_REUSEPORT')
         for address in ca.get_beacon_address_list():
+            # Set SO_BROADCAST before connecting to a broadcast address, which
+            # uvloop's allow_broadcast would only do after.
+            sock = ca.bcast_socket()
+            sock.setblocking(False)
+            sock.connect(address)
             transport, _ = await self.loop.create_datagram_endpoint(
-                BcastLoop, remote_addr=address, allow_broadcast=True,
-                reuse_port=reuse_port)
+                BcastLoop, sock=sock)
             wrapped_transport = ConnectedTransportWrapper(transport, address)
             self.beacon_socks[address] = (interface, wrapped_transport)
 
@@ -253,13 +462,13 @@ class Context(_Context):
                 sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
             sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
             sock.setblocking(False)
-            sock.bind((interface, self.ca_server_port))
+            sock.bind((interface, self.search_port))
 
             transport, self.p = await self.loop.create_datagram_endpoint(
                 BcastLoop, sock=sock)
             self.udp_socks[interface] = TransportWrapper(transport)
             self.log.debug('UDP socket bound on %s:%d', interface,
-                           self.ca_server_port)
+                           self.search_port)
 
         tasks.append(self.loop.create_task(self.broadcaster_queue_loop()))
         tasks.append(self.loop.create_task(self.subscription_queue_loop()))
@@ -298,6 +507,8 @@ class Context(_Context):
                 task = self.loop.create_task(method(async_lib))
                 shutdown_tasks.append(task)
             await asyncio.gather(*shutdown_tasks)
+            for circuit in self.circuits:
+                circuit.client.transport.close()
             for sock in self.tcp_sockets.values():
                 sock.close()
             for sock in self.udp_socks.values():
@@ -306,20 +517,34 @@ class Context(_Context):
                 sock.close()
 
 
-async def start_server(pvdb, *, interfaces=None, log_pv_names=False):
+async def start_server(pvdb, *, interfaces=None, log_pv_names=False,
+                       performance_profile=None,
+                       max_circuit_bytes_per_sec=None):
     '''Start an asyncio server with a given PV database'''
-    ctx = Context(pvdb, interfaces)
+    ctx = Context(pvdb, interfaces, performance_profile=performance_profile,
+                  max_circuit_bytes_per_sec=max_circuit_bytes_per_sec)
     ret = await ctx.run(log_pv_names=log_pv_names)
     return ret
 
 
-def run(pvdb, *, interfaces=None, log_pv_names=False):
+def run(pvdb, *, interfaces=None, log_pv_names=False,
+        performance_profile=None, max_circuit_bytes_per_sec=None):
     """
     A synchronous function that wraps start_server and exits cleanly.
+
+    The event loop is the default one unless the performance profile (see
+    :mod:`caproto.server.tuning`) asks for uvloop.
     """
-    loop = asyncio.get_event_loop()
+    profile = get_performance_profile(performance_profile)
+    if profile.event_loop == 'default':
+        loop = asyncio.get_event_loop()
+    else:
+        loop = new_event_loop(profile)
+        asyncio.set_event_loop(loop)
     task = loop.create_task(
-        start_server(pvdb, interfaces=interfaces, log_pv_names=log_pv_names))
+        start_server(pvdb, interfaces=interfaces, log_pv_names=log_pv_names,
+                     performance_profile=profile,
+                     max_circuit_bytes_per_sec=max_circuit_bytes_per_sec))
     try:
         loop.run_until_complete(task)
     finally:
@@ -1 +1,3 @@
 from .util import *  # noqa
+from .inprocess import *  # noqa
+from .load import *  # noqa
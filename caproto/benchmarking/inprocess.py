@@ -0,0 +1,429 @@
+'''
+Benchmarks of caproto servers which need no EPICS installation
+
+The server under test is one of caproto's own (asyncio, curio or trio), run in
+a background thread of the benchmarking process and reached over localhost, so
+these may be run on any machine with caproto installed. See
+``caproto/tests/test_bench_inprocess.py`` for their use with pytest-benchmark
+and asv.
+'''
+import contextlib
+import logging
+import socket
+import threading
+import time
+import tracemalloc
+from collections import namedtuple
+
+from .. import (ChannelDouble, ChannelInteger, Broadcaster, SearchRequest,
+                SearchResponse, VersionRequest, CLIENT, DEFAULT_PROTOCOL_VERSION,
+                SEARCH_MAX_DATAGRAM_BYTES, MAX_UDP_RECV, batch_requests,
+                get_environment_variables)
+
+
+__all__ = ('BurstChannel', 'MonitorThroughput', 'make_benchmark_pvdb',
+           'run_server', 'threading_client', 'connect_channels',
+           'measure_monitor_throughput', 'measure_memory_per_channel',
+           'search_names')
+logger = logging.getLogger(__name__)
+
+# Waveform sizes, in elements, served by default
+WAVEFORM_SIZES = (4096, 65536, 1048576)
+
+MonitorThroughput = namedtuple('MonitorThroughput',
+                               'posted received dropped elapsed '
+                               'updates_per_sec')
+
+
+class BurstChannel(ChannelInteger):
+    '''
+    Writing N to this channel posts N updates of each of its targets
+
+    The updates are posted as fast as the server can, for measuring
+    subscription throughput from the server side.
+
+    Parameters
+    ----------
+    targets : list of ChannelData
+        The channels to update
+    '''
+    def __init__(self, *, targets, **kwargs):
+        super().__init__(**kwargs)
+        self.targets = list(targets)
+
+    async def verify_value(self, count):
+        for i in range(int(count)):
+            for target in self.targets:
+                if target.max_length > 1:
+                    await target.write(target.value)
+                else:
+                    await target.write(i)
+        return count
+
+
+def _make_waveform(size):
+    try:
+        import numpy as np
+    except ImportError:
+        import array
+        return array.array('d', range(size))
+    return np.arange(size, dtype=np.float64)
+
+
+def make_benchmark_pvdb(prefix='bench:', *, waveform_sizes=WAVEFORM_SIZES,
+                        channel_count=0):
+    '''
+    Make a database of channels to benchmark against
+
+    Parameters
+    ----------
+    prefix : str, optional
+        Prefix of all PV names
+    waveform_sizes : tuple of int, optional
+        Serve a double waveform ``{prefix}wf{size}`` of each size
+    channel_count : int, optional
+        Serve this many additional scalars, ``{prefix}ch{index}``, for
+        channel creation and search benchmarks
+
+    Returns
+    -------
+    pvdb : dict
+        Includes the scalar ``{prefix}scalar`` and, for each of the channels
+        to be monitored, a ``BurstChannel`` named ``{name}:burst``
+    '''
+    pvdb = {f'{prefix}scalar': ChannelDouble(value=0.0)}
+    for size in waveform_sizes:
+        pvdb[f'{prefix}wf{size}'] = ChannelDouble(value=_make_waveform(size),
+                                                  max_length=size)
+
+    for name, channel in list(pvdb.items()):
+        pvdb[f'{name}:burst'] = BurstChannel(value=0, targets=[channel])
+
+    pvdb.update((f'{prefix}ch{idx}', ChannelDouble(value=float(idx)))
+                for idx in range(channel_count))
+    return pvdb
+
+
+def _run_asyncio_server(pvdb, interfaces, server_started, stop_event,
+                        performance_profile):
+    import asyncio
+    from ..asyncio.server import Context
+    from ..server.tuning import get_performance_profile, new_event_loop
+
+    async def main():
+        ctx = Context(pvdb, interfaces,
+                      performance_profile=performance_profile)
+        task = asyncio.ensure_future(ctx.run())
+        server_started(ctx)
+        await ctx.async_layer.run_in_thread(stop_event.wait)
+        task.cancel()
+        await asyncio.wait([task])
+
+    loop = new_event_loop(get_performance_profile(performance_profile))
+    asyncio.set_event_loop(loop)
+    try:
+        loop.run_until_complete(main())
+    finally:
+        loop.close()
+
+
+def _run_curio_server(pvdb, interfaces, server_started, stop_event,
+                      performance_profile):
+    import curio
+    from ..curio.server import Context
+
+    async def main():
+        ctx = Context(pvdb, interfaces,
+                      performance_profile=performance_profile)
+        task = await curio.spawn(ctx.run)
+        server_started(ctx)
+        await ctx.async_layer.run_in_thread(stop_event.wait)
+        ctx.stop()
+        await task.join()
+
+    curio.run(main)
+
+
+def _run_trio_server(pvdb, interfaces, server_started, stop_event,
+                     performance_profile):
+    import trio
+    from ..trio.server import Context
+
+    async def main():
+        async with trio.open_nursery() as nursery:
+            ctx = Context(pvdb, interfaces,
+                          performance_profile=performance_profile)
+            nursery.start_soon(ctx.run)
+            server_started(ctx)
+            await ctx.async_layer.run_in_thread(stop_event.wait)
+            nursery.cancel_scope.cancel()
+
+    trio.run(main)
+
+
+_server_runners = {
+    'asyncio': _run_asyncio_server,
+    'curio': _run_curio_server,
+    'trio': _run_trio_server,
+}
+
+
+def _wait_for_server(ctx, timeout):
+    'Wait until the server answers searches and accepts connections'
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if ctx.port is not None and len(ctx.udp_socks) == len(ctx.interfaces):
+            host = ctx.interfaces[0]
+            if host == '0.0.0.0':
+                host = '127.0.0.1'
+            try:
+                socket.create_connection((host, ctx.port), timeout=0.5).close()
+            except OSError:
+                ...
+            else:
+                return
+        time.sleep(0.05)
+    raise TimeoutError(f'Server failed to start within {timeout} seconds')
+
+
+@contextlib.contextmanager
+def run_server(pvdb, *, async_lib='asyncio', interfaces=('127.0.0.1', ),
+               startup_timeout=5.0, performance_profile=None):
+    '''
+    [context manager] Run a caproto server in a background thread
+
+    Parameters
+    ----------
+    pvdb : dict
+        The PV database to serve
+    async_lib : {'asyncio', 'curio', 'trio'}, optional
+        The server implementation
+    interfaces : sequence of str, optional
+        Interfaces to listen on
+    startup_timeout : float, optional
+        Seconds to wait for the server to accept connections
+    performance_profile : str or PerformanceProfile, optional
+        The event loop and socket tuning of the server; see
+        :mod:`caproto.server.tuning`
+
+    Yields
+    ------
+    ctx : caproto.server.common.Context
+        The running server's context
+    '''
+    runner = _server_runners[async_lib]
+    stop_event = threading.Event()
+    started = threading.Event()
+    contexts = []
+
+    def server_started(ctx):
+        contexts.append(ctx)
+        started.set()
+
+    thread = threading.Thread(
+        target=runner, args=(pvdb, list(interfaces), server_started,
+                             stop_event, performance_profile),
+        name=f'{async_lib}-server', daemon=True)
+    thread.start()
+    try:
+        if not started.wait(startup_timeout):
+            raise TimeoutError(f'{async_lib} server failed to start')
+        ctx, = contexts
+        _wait_for_server(ctx, startup_timeout)
+        logger.debug('%s server listening on port %d', async_lib, ctx.port)
+        yield ctx
+    finally:
+        stop_event.set()
+        thread.join(startup_timeout)
+
+
+@contextlib.contextmanager
+def threading_client():
+    '''
+    [context manager] A threading client Context, disconnected on exit
+
+    Yields
+    ------
+    context : caproto.threading.client.Context
+    '''
+    from ..threading.client import Context, SharedBroadcaster
+    context = Context(broadcaster=SharedBroadcaster())
+    try:
+        yield context
+    finally:
+        context.disconnect()
+        context.broadcaster.disconnect()
+
+
+def connect_channels(context, names, *, timeout=10.0):
+    '''
+    Create channels to all of the given names and wait for them to connect
+
+    Parameters
+    ----------
+    context : caproto.threading.client.Context
+    names : list of str
+    timeout : float, optional
+
+    Returns
+    -------
+    pvs : list of caproto.threading.client.PV
+    '''
+    pvs = context.get_pvs(*names, timeout=timeout)
+    deadline = time.monotonic() + timeout
+    for pv in pvs:
+        pv.wait_for_connection(timeout=max(deadline - time.monotonic(), 0))
+    return pvs
+
+
+def measure_monitor_throughput(context, pvname, count, *, timeout=30.0):
+    '''
+    Measure the subscription updates per second received from a server
+
+    The server posts ``count`` updates to ``pvname`` as fast as it can, by way
+    of its ``BurstChannel`` (see :func:`make_benchmark_pvdb`).
+
+    Parameters
+    ----------
+    context : caproto.threading.client.Context
+    pvname : str
+        The channel to monitor
+    count : int
+        Number of updates to post
+    timeout : float, optional
+        Seconds to wait for the updates
+
+    Returns
+    -------
+    throughput : MonitorThroughput
+        The number of updates the server did not send, or which did not
+        arrive within the timeout, is reported as ``dropped``.
+    '''
+    pv, burst = connect_channels(context, [pvname, f'{pvname}:burst'])
+    received = 0
+    last_update = None
+    first_update = threading.Event()
+    done = threading.Event()
+
+    def callback(sub, response):
+        nonlocal received, last_update
+        received += 1
+        last_update = time.monotonic()
+        first_update.set()
+        if received > count:
+            done.set()
+
+    sub = pv.subscribe()
+    sub.add_callback(callback)
+    try:
+        # Wait for the update of the current value upon subscribing
+        if not first_update.wait(timeout):
+            raise TimeoutError(f'No initial subscription update for '
+                               f'{pvname}')
+        t0 = time.monotonic()
+        burst.write([count], wait=True, timeout=timeout)
+        # Updates may have been dropped by the server. Stop waiting once
+        # they have stopped arriving.
+        last = None
+        while not done.wait(0.5) and received != last:
+            if time.monotonic() - t0 > timeout:
+                break
+            last = received
+    finally:
+        sub.clear()
+
+    posted_received = received - 1
+    elapsed = last_update - t0
+    return MonitorThroughput(
+        posted=count, received=posted_received,
+        dropped=count - posted_received, elapsed=elapsed,
+        updates_per_sec=posted_received / elapsed)
+
+
+def measure_memory_per_channel(context, names, *, timeout=10.0):
+    '''
+    Measure the memory allocated per connected channel, in bytes
+
+    The allocations of both the client and, when run in-process (see
+    :func:`run_server`), the server are included. The channels are left
+    connected.
+
+    Parameters
+    ----------
+    context : caproto.threading.client.Context
+    names : list of str
+    timeout : float, optional
+
+    Returns
+    -------
+    bytes_per_channel : float
+    '''
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+        tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        connect_channels(context, names, timeout=timeout)
+        after, _ = tracemalloc.get_traced_memory()
+    finally:
+        if not tracing:
+            tracemalloc.stop()
+    return (after - before) / len(names)
+
+
+def search_names(names, *, address=None, timeout=5.0, retry_period=0.1):
+    '''
+    Search for names by UDP, using a single socket
+
+    This measures the search throughput of a server without the overhead of a
+    full client. As with a client, names not found within ``retry_period`` of
+    the last response are searched for again, as a burst of searches may
+    overflow the socket buffers.
+
+    Parameters
+    ----------
+    names : list of str
+    address : (host, port), optional
+        Defaults to localhost at ``EPICS_CA_SERVER_PORT``
+    timeout : float, optional
+        Seconds to wait for the responses
+    retry_period : float, optional
+        Seconds without a response after which to search again
+
+    Returns
+    -------
+    found : int
+        The number of names found
+    '''
+    if address is None:
+        address = ('127.0.0.1',
+                   get_environment_variables()['EPICS_CA_SERVER_PORT'])
+
+    broadcaster = Broadcaster(our_role=CLIENT)
+    version = VersionRequest(0, DEFAULT_PROTOCOL_VERSION)
+    requests = {cid: SearchRequest(name, cid, DEFAULT_PROTOCOL_VERSION)
+                for cid, name in enumerate(names)}
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    deadline = time.monotonic() + timeout
+    try:
+        while requests and time.monotonic() < deadline:
+            for batch in batch_requests(
+                    list(requests.values()),
+                    SEARCH_MAX_DATAGRAM_BYTES - len(version)):
+                sock.sendto(broadcaster.send(version, *batch), address)
+
+            while requests:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                sock.settimeout(min(remaining, retry_period))
+                try:
+                    data, addr = sock.recvfrom(MAX_UDP_RECV)
+                except socket.timeout:
+                    break
+                for command in broadcaster.recv(data, addr):
+                    if isinstance(command, SearchResponse):
+                        requests.pop(command.cid, None)
+    finally:
+        sock.close()
+    return len(names) - len(requests)
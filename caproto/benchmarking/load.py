@@ -0,0 +1,385 @@
+'''
+Generate Channel Access load on any server, for capacity planning
+
+Each of several client processes connects to a set of channels with the
+threading client, monitors some of them and writes to those it monitors at a
+fixed rate. The time from each write to the subscription update carrying the
+written value is the put-to-monitor latency.
+
+Like libca, the clients turn off subscription updates with ``EventsOff`` when
+they fall behind processing them, and back on with ``EventsOn`` when they have
+caught up. Writes for which no update arrives, whether dropped by the server
+or while updates were off, are counted as dropped updates.
+
+This is available from the shell as ``caproto-bench``.
+'''
+import json
+import logging
+import math
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from collections import namedtuple
+
+from .._dbr import ChannelType, field_types
+
+
+__all__ = ('Scenario', 'ClientResult', 'LoadResult', 'load_scenario',
+           'expand_pv_names', 'percentile', 'run_client', 'run_load')
+logger = logging.getLogger(__name__)
+
+Scenario = namedtuple('Scenario',
+                      'pv_names processes channels monitors put_rate '
+                      'data_type duration max_backlog processing_time '
+                      'timeout')
+Scenario.__new__.__defaults__ = (
+    1,         # processes
+    None,      # channels: all of pv_names
+    None,      # monitors: all channels
+    10.0,      # put_rate, per process, in Hz
+    'native',  # data_type of subscriptions
+    10.0,      # duration, in seconds
+    1000,      # max_backlog, of updates before turning events off
+    0.0,       # processing_time, per update, in seconds
+    10.0,      # timeout, for connecting and for updates to arrive
+)
+Scenario.__doc__ = '''
+Settings for a load test
+
+Parameters
+----------
+pv_names : list of str
+    Channel names, which may include ``{index}`` to be expanded to
+    ``channels`` names (see :func:`expand_pv_names`)
+processes : int, optional
+    Number of client processes
+channels : int, optional
+    Number of channels per process. Defaults to all of ``pv_names``.
+monitors : int, optional
+    Number of the channels to monitor and write to. Defaults to all.
+put_rate : float, optional
+    Writes per second, per process, spread over the monitored channels
+data_type : str, optional
+    Data type of the subscriptions, as for ``caproto-get -d``
+duration : float, optional
+    Seconds to write for
+max_backlog : int, optional
+    Number of received updates waiting to be processed at which a client
+    turns events off. Events are turned back on at half of this.
+processing_time : float, optional
+    Seconds each update takes to process, to simulate a slow client
+timeout : float, optional
+    Seconds to wait for connections, and for updates after the last write
+'''
+
+ClientResult = namedtuple('ClientResult',
+                          'index channels monitors puts updates latencies '
+                          'dropped events_off cpu_time elapsed')
+
+LoadResult = namedtuple('LoadResult',
+                        'scenario clients latency_percentiles '
+                        'updates_per_sec dropped events_off')
+
+# Latency percentiles to report
+PERCENTILES = (50, 99, 99.9)
+
+
+def expand_pv_names(pv_names, count=None):
+    '''
+    Expand ``{index}`` in PV names
+
+    Parameters
+    ----------
+    pv_names : list of str
+    count : int, optional
+        If given, names including ``{index}`` are expanded to this many names
+        (starting from 0) and the resulting list is truncated to ``count``
+
+    Returns
+    -------
+    pv_names : list of str
+    '''
+    expanded = []
+    for name in pv_names:
+        if '{index}' in name:
+            if count is None:
+                raise ValueError(f'The number of channels is required to '
+                                 f'expand {name!r}')
+            expanded.extend(name.format(index=index)
+                            for index in range(count))
+        else:
+            expanded.append(name)
+    return expanded[:count]
+
+
+def load_scenario(filename=None, **settings):
+    '''
+    Load a Scenario from a JSON or YAML file
+
+    Parameters
+    ----------
+    filename : str, optional
+        YAML is used for files ending in ``.yml`` or ``.yaml``, and requires
+        PyYAML
+    **settings :
+        Override the settings in the file. Settings of None are ignored.
+
+    Returns
+    -------
+    scenario : Scenario
+    '''
+    file_settings = {}
+    if filename is not None:
+        with open(filename) as f:
+            if filename.endswith(('.yml', '.yaml')):
+                try:
+                    import yaml
+                except ImportError:
+                    raise ImportError('PyYAML is required to read YAML '
+                                      'scenario files') from None
+                file_settings = yaml.safe_load(f)
+            else:
+                file_settings = json.load(f)
+
+    unknown = set(file_settings) - set(Scenario._fields)
+    if unknown:
+        raise ValueError(f'Unknown scenario settings in {filename}: '
+                         f'{", ".join(sorted(unknown))}')
+
+    file_settings.update((key, value) for key, value in settings.items()
+                         if value is not None)
+    if not file_settings.get('pv_names'):
+        raise ValueError('No PV names given')
+    return Scenario(**file_settings)
+
+
+def percentile(sorted_values, q):
+    '''
+    The q-th percentile of sorted values, by the nearest-rank method
+
+    Returns None if there are no values.
+    '''
+    if not sorted_values:
+        return None
+    rank = math.ceil(q / 100 * len(sorted_values))
+    return sorted_values[max(rank, 1) - 1]
+
+
+def _parse_data_type(data_type):
+    'Data type as accepted by the threading client, as in caproto-get -d'
+    try:
+        return int(data_type)
+    except (ValueError, TypeError):
+        if data_type.lower().startswith('dbr_'):
+            data_type = data_type[4:]
+        if data_type.lower() in field_types:
+            return data_type.lower()
+        return ChannelType[data_type.upper()]
+
+
+def run_client(scenario, index=0, *, barrier=None):
+    '''
+    Run one client of a load test in this process
+
+    Parameters
+    ----------
+    scenario : Scenario
+    index : int, optional
+        Which of ``scenario.processes`` this is. Values written are encoded
+        with it so that each client only matches its own writes.
+    barrier : multiprocessing.Barrier, optional
+        Waited on after connecting, to start all clients together
+
+    Returns
+    -------
+    result : ClientResult
+    '''
+    from ..threading.client import Context, SharedBroadcaster
+
+    names = expand_pv_names(scenario.pv_names, scenario.channels)
+    monitor_count = (len(names) if scenario.monitors is None
+                     else min(scenario.monitors, len(names)))
+    data_type = _parse_data_type(scenario.data_type)
+
+    received = queue.Queue()
+    # Time of each write, keyed on (pv name, value written)
+    pending = {}
+    pending_lock = threading.Lock()
+    latencies = []
+    counts = {'updates': 0, 'events_off': 0}
+    circuit_managers = set()
+    done = threading.Event()
+
+    def callback(sub, response):
+        received.put((time.monotonic(), sub.pv.name, response.data))
+
+    def process_updates():
+        events_on = True
+        while not (done.is_set() and received.empty()):
+            try:
+                t_received, name, data = received.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if scenario.processing_time:
+                time.sleep(scenario.processing_time)
+
+            counts['updates'] += 1
+            try:
+                key = (name, int(data[0]))
+            except (TypeError, ValueError, IndexError):
+                ...
+            else:
+                with pending_lock:
+                    t_sent = pending.pop(key, None)
+                if t_sent is not None:
+                    latencies.append(t_received - t_sent)
+
+            backlog = received.qsize()
+            if events_on and backlog >= scenario.max_backlog:
+                logger.debug('Client %d backlog of %d updates; turning '
+                             'events off', index, backlog)
+                for circuit_manager in circuit_managers:
+                    circuit_manager.events_off()
+                counts['events_off'] += 1
+                events_on = False
+            elif not events_on and backlog <= scenario.max_backlog // 2:
+                for circuit_manager in circuit_managers:
+                    circuit_manager.events_on()
+                events_on = True
+
+    context = Context(broadcaster=SharedBroadcaster())
+    try:
+        pvs = context.get_pvs(*names, timeout=scenario.timeout)
+        deadline = time.monotonic() + scenario.timeout
+        for pv in pvs:
+            pv.wait_for_connection(
+                timeout=max(deadline - time.monotonic(), 0))
+            circuit_managers.add(pv.circuit_manager)
+
+        monitored = pvs[:monitor_count]
+        subs = [pv.subscribe(data_type=data_type) for pv in monitored]
+        for sub in subs:
+            sub.add_callback(callback)
+
+        processor = threading.Thread(target=process_updates,
+                                     name=f'bench-client-{index}',
+                                     daemon=True)
+        processor.start()
+        if barrier is not None:
+            barrier.wait(scenario.timeout)
+
+        t0 = time.monotonic()
+        cpu0 = time.process_time()
+        puts = 0
+        if monitored and scenario.put_rate:
+            period = 1 / scenario.put_rate
+            seq = 0
+            while time.monotonic() - t0 < scenario.duration:
+                pv = monitored[seq % len(monitored)]
+                value = seq * scenario.processes + index
+                with pending_lock:
+                    pending[(pv.name, value)] = time.monotonic()
+                pv.write([value], wait=False)
+                seq += 1
+                delay = t0 + seq * period - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+            puts = seq
+
+            # Wait for the updates for the last writes
+            deadline = time.monotonic() + scenario.timeout
+            while pending and time.monotonic() < deadline:
+                updates = counts['updates']
+                time.sleep(1.0)
+                if counts['updates'] == updates and received.empty():
+                    # Updates have stopped; the rest were dropped.
+                    break
+        else:
+            time.sleep(scenario.duration)
+
+        done.set()
+        processor.join()
+        elapsed = time.monotonic() - t0
+        cpu_time = time.process_time() - cpu0
+        for sub in subs:
+            sub.clear()
+    finally:
+        done.set()
+        context.disconnect()
+        context.broadcaster.disconnect()
+
+    return ClientResult(index=index, channels=len(names),
+                        monitors=monitor_count, puts=puts,
+                        updates=counts['updates'], latencies=latencies,
+                        dropped=puts - len(latencies),
+                        events_off=counts['events_off'],
+                        cpu_time=cpu_time, elapsed=elapsed)
+
+
+def _client_process(scenario, index, barrier, results):
+    try:
+        result = run_client(scenario, index, barrier=barrier)
+    except BaseException as ex:
+        results.put(RuntimeError(f'Client {index} (pid {os.getpid()}) '
+                                 f'failed: {ex!r}'))
+        raise
+    results.put(result)
+
+
+def run_load(scenario):
+    '''
+    Run a load test with ``scenario.processes`` client processes
+
+    Parameters
+    ----------
+    scenario : Scenario
+
+    Returns
+    -------
+    result : LoadResult
+        ``latency_percentiles`` maps each of ``PERCENTILES`` to the
+        put-to-monitor latency, in seconds, of all clients combined
+    '''
+    barrier = multiprocessing.Barrier(scenario.processes)
+    results = multiprocessing.Queue()
+    processes = [
+        multiprocessing.Process(target=_client_process,
+                                args=(scenario, index, barrier, results),
+                                name=f'caproto-bench-{index}', daemon=True)
+        for index in range(scenario.processes)
+    ]
+    for process in processes:
+        process.start()
+
+    clients = []
+    try:
+        for _ in processes:
+            result = results.get(
+                timeout=scenario.duration + 3 * scenario.timeout)
+            if isinstance(result, Exception):
+                raise result
+            clients.append(result)
+    except queue.Empty:
+        raise TimeoutError('Load test clients failed to report within the '
+                           'timeout') from None
+    finally:
+        for process in processes:
+            process.join(scenario.timeout)
+            if process.is_alive():
+                process.terminate()
+
+    clients.sort(key=lambda client: client.index)
+    latencies = sorted(latency for client in clients
+                       for latency in client.latencies)
+    elapsed = max(client.elapsed for client in clients)
+    return LoadResult(
+        scenario=scenario,
+        clients=clients,
+        latency_percentiles={q: percentile(latencies, q)
+                             for q in PERCENTILES},
+        updates_per_sec=sum(client.updates for client in clients) / elapsed,
+        dropped=sum(client.dropped for client in clients),
+        events_off=sum(client.events_off for client in clients),
+    )
@@ -0,0 +1,152 @@
+"""
+This module is installed as an entry-point, available from the shell as:
+
+caproto-bench ...
+
+It can equivalently be invoked as:
+
+python3 -m caproto.commandline.bench ...
+
+For access to the underlying functionality from a Python script or interactive
+Python session, do not import this module; instead import
+caproto.benchmarking.load.
+"""
+import argparse
+import json
+from .. import set_handler, __version__
+from .._log import _set_handler_with_logger
+from .._utils import ShowVersionAction
+from ..benchmarking.load import load_scenario, run_load
+
+
+def format_result(result):
+    'Format a LoadResult as a table, per client and in total'
+    lines = [f'{"client":>8} {"channels":>9} {"monitors":>9} {"puts":>8} '
+             f'{"updates":>9} {"updates/s":>10} {"dropped":>8} '
+             f'{"events off":>10} {"cpu %":>6}']
+    for client in result.clients:
+        lines.append(
+            f'{client.index:>8} {client.channels:>9} {client.monitors:>9} '
+            f'{client.puts:>8} {client.updates:>9} '
+            f'{client.updates / client.elapsed:>10.1f} {client.dropped:>8} '
+            f'{client.events_off:>10} '
+            f'{100 * client.cpu_time / client.elapsed:>6.1f}')
+    lines.append(
+        f'{"total":>8} {"":>9} {"":>9} '
+        f'{sum(client.puts for client in result.clients):>8} '
+        f'{sum(client.updates for client in result.clients):>9} '
+        f'{result.updates_per_sec:>10.1f} {result.dropped:>8} '
+        f'{result.events_off:>10}')
+
+    latencies = ', '.join(
+        f'p{q:g} {"-" if latency is None else f"{1e3 * latency:.3f} ms"}'
+        for q, latency in result.latency_percentiles.items())
+    lines.append(f'put->monitor latency: {latencies}')
+    return '\n'.join(lines)
+
+
+def result_to_dict(result):
+    'A LoadResult as a dict, for JSON output'
+    return {
+        'scenario': result.scenario._asdict(),
+        'clients': [
+            dict(client._asdict(),
+                 latencies=None,
+                 updates_per_sec=client.updates / client.elapsed,
+                 cpu_percent=100 * client.cpu_time / client.elapsed)
+            for client in result.clients
+        ],
+        'latency_percentiles': {f'p{q:g}': latency for q, latency in
+                                result.latency_percentiles.items()},
+        'updates_per_sec': result.updates_per_sec,
+        'dropped': result.dropped,
+        'events_off': result.events_off,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=('Generate Channel Access load: write to and monitor PVs '
+                     'from several client processes and report the '
+                     'put-to-monitor latency, update rate and dropped '
+                     'updates.'),
+        epilog=f'caproto version {__version__}')
+    parser.register('action', 'show_version', ShowVersionAction)
+    parser.add_argument('pv_names', type=str, nargs='*',
+                        help=("PV (channel) names. '{index}' in a name is "
+                              "replaced by 0 to CHANNELS - 1."))
+    parser.add_argument('--scenario', type=str, default=None,
+                        help=("JSON or YAML file of settings, with the names "
+                              "of the options below (such as 'put_rate'). "
+                              "Options given on the command line take "
+                              "precedence."))
+    parser.add_argument('--processes', '-N', type=int, default=None,
+                        help="Number of client processes. Default is 1.")
+    parser.add_argument('--channels', '-M', type=int, default=None,
+                        help=("Number of channels per process. Default is "
+                              "all of the PV names given."))
+    parser.add_argument('--monitors', '-K', type=int, default=None,
+                        help=("Number of the channels to monitor and write "
+                              "to. Default is all of them."))
+    parser.add_argument('--put-rate', type=float, default=None,
+                        help=("Writes per second per process, spread over "
+                              "the monitored channels. Default is 10."))
+    parser.add_argument('--data-type', '-d', type=str, default=None,
+                        help=("Data type of the subscriptions, as for "
+                              "caproto-get -d. Default is 'native'."))
+    parser.add_argument('--duration', type=float, default=None,
+                        help="Seconds to write for. Default is 10.")
+    parser.add_argument('--max-backlog', type=int, default=None,
+                        help=("Number of unprocessed updates at which a "
+                              "client turns events off. Default is 1000."))
+    parser.add_argument('--processing-time', type=float, default=None,
+                        help=("Seconds each update takes to process, to "
+                              "simulate a slow client. Default is 0."))
+    parser.add_argument('--timeout', '-w', type=float, default=None,
+                        help=("Timeout ('wait') in seconds for connections "
+                              "and for updates after the last write. Default "
+                              "is 10."))
+    parser.add_argument('--json', action='store_true',
+                        help="Print the results as JSON.")
+    parser.add_argument('--verbose', '-v', action='count',
+                        help="Show more log messages. (Use -vvv for even more.)")
+    parser.add_argument('--no-color', action='store_true',
+                        help="Suppress ANSI color codes in log messages.")
+    parser.add_argument('--version', '-V', action='show_version',
+                        default=argparse.SUPPRESS,
+                        help="Show caproto version and exit.")
+    args = parser.parse_args()
+
+    if args.verbose:
+        if args.verbose <= 2:
+            _set_handler_with_logger(color=not args.no_color, level='DEBUG',
+                                     logger_name='caproto.benchmarking')
+        else:
+            set_handler(color=not args.no_color, level='DEBUG')
+
+    try:
+        scenario = load_scenario(
+            args.scenario, pv_names=args.pv_names or None,
+            processes=args.processes, channels=args.channels,
+            monitors=args.monitors, put_rate=args.put_rate,
+            data_type=args.data_type, duration=args.duration,
+            max_backlog=args.max_backlog,
+            processing_time=args.processing_time, timeout=args.timeout)
+        result = run_load(scenario)
+    except BaseException as exc:
+        if args.verbose:
+            # Show the full traceback.
+            raise
+        else:
+            # Print a one-line error message.
+            print(exc)
+            return
+
+    if args.json:
+        print(json.dumps(result_to_dict(result), indent=4))
+    else:
+        print(format_result(result))
+
+
+if __name__ == '__main__':
+    main()
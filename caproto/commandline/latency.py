@@ -0,0 +1,51 @@
+"""
+This module is installed as an entry-point, available from the shell as:
+
+caproto-latency ...
+
+It can equivalently be invoked as:
+
+python3 -m caproto.commandline.latency ...
+
+For access to the underlying functionality from a Python script or interactive
+Python session, do not import this module; instead import
+caproto.server.latency.
+"""
+import argparse
+from .. import __version__
+from .._utils import ShowVersionAction
+from ..server.latency import load_latency_dump, format_latency, PERCENTILES
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=('Summarize the request latency histograms written by an '
+                     'IOC\'s --latency-dump option (or '
+                     'LatencyRecorder.dump).'),
+        epilog=f'caproto version {__version__}')
+    parser.register('action', 'show_version', ShowVersionAction)
+    parser.add_argument('dump', type=str,
+                        help="The dump file.")
+    parser.add_argument('--by', choices=('command', 'pv'), default='command',
+                        help=("Show the histograms per type of command or "
+                              "per PV. Default is command."))
+    parser.add_argument('--percentiles', type=float, nargs='+',
+                        default=PERCENTILES,
+                        help=("Percentiles to show. Default is "
+                              f"{' '.join(map(str, PERCENTILES))}."))
+    parser.add_argument('--version', '-V', action='show_version',
+                        default=argparse.SUPPRESS,
+                        help="Show caproto version and exit.")
+    args = parser.parse_args()
+
+    try:
+        recorder = load_latency_dump(args.dump)
+    except (OSError, ValueError, KeyError) as exc:
+        # Print a one-line error message.
+        print(f'Could not read {args.dump}: {exc}')
+        return
+    print(format_latency(recorder, by=args.by, percentiles=args.percentiles))
+
+
+if __name__ == '__main__':
+    main()
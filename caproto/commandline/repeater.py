@@ -38,10 +38,18 @@ EPICS_CA_REPEATER_PORT. It defaults to the standard 5065. The current value is
                        help="Verbose mode. (Use -vvv for more.)")
     parser.add_argument('--no-color', action='store_true',
                         help="Suppress ANSI color codes in log messages.")
+    parser.add_argument('--asyncio', action='store_true',
+                        help=("Use the asyncio-based repeater, which forwards "
+                              "datagrams at a lower cost per client."))
+    parser.add_argument('--stats-interval', type=float, default=None,
+                        help=("Log the number of datagrams forwarded every "
+                              "STATS_INTERVAL seconds. Requires --asyncio."))
     parser.add_argument('--version', '-V', action='show_version',
                         default=argparse.SUPPRESS,
                         help="Show caproto version and exit.")
     args = parser.parse_args()
+    if args.stats_interval is not None and not args.asyncio:
+        parser.error('--stats-interval requires --asyncio')
     if args.verbose and args.verbose > 2:
         set_handler(color=not args.no_color, level='DEBUG')
     else:
@@ -53,7 +61,11 @@ EPICS_CA_REPEATER_PORT. It defaults to the standard 5065. The current value is
             level = 'INFO'
         _set_handler_with_logger(logger_name='caproto.repeater', color=not args.no_color, level=level)
     try:
-        run()
+        if args.asyncio:
+            from ..asyncio.repeater import run as run_asyncio
+            run_asyncio(stats_interval=args.stats_interval)
+        else:
+            run()
     except BaseException as exc:
         if args.verbose:
             # Show the full traceback.
@@ -0,0 +1,102 @@
+"""
+This module is installed as an entry-point, available from the shell as:
+
+caproto-replay ...
+
+It can equivalently be invoked as:
+
+python3 -m caproto.commandline.replay ...
+
+For access to the underlying functionality from a Python script or interactive
+Python session, do not import this module; instead import
+caproto.sync.replay.
+"""
+import argparse
+import json
+from .. import set_handler, __version__, get_environment_variables
+from .._log import _set_handler_with_logger
+from .._utils import ShowVersionAction
+from ..sync.replay import replay
+
+
+def format_result(result):
+    'Format a ReplayResult for printing'
+    rate = result.commands / result.elapsed if result.elapsed else 0.0
+    return '\n'.join([
+        f'circuits:       {result.circuits}',
+        f'commands:       {result.commands} ({rate:.1f}/s)',
+        f'bytes sent:     {result.bytes_sent}',
+        f'bytes received: {result.bytes_received}',
+        f'searches sent:  {result.datagrams} datagrams',
+        f'elapsed:        {result.elapsed:.3f} s',
+        f'max lag:        {1e3 * result.max_lag:.3f} ms',
+        f'unresolved:     {result.unresolved}',
+    ])
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=('Replay the client requests of a trace recorded with '
+                     'caproto.start_tracing (or an IOC\'s --trace option) '
+                     'against a server.'),
+        epilog=f'caproto version {__version__}')
+    parser.register('action', 'show_version', ShowVersionAction)
+    parser.add_argument('trace', type=str,
+                        help="The trace file.")
+    parser.add_argument('--host', type=str, default='127.0.0.1',
+                        help="Host of the server. Default is 127.0.0.1.")
+    parser.add_argument('--port', type=int, default=None,
+                        help=("TCP port of the server. Default is "
+                              "EPICS_CA_SERVER_PORT."))
+    parser.add_argument('--udp-port', type=int, default=None,
+                        help=("Port to send searches to. Default is "
+                              "EPICS_CA_SERVER_PORT."))
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help=("Speed relative to the recording, such as 2 "
+                              "for twice as fast. 0 replays as fast as "
+                              "possible. Default is 1."))
+    parser.add_argument('--timeout', '-w', type=float, default=2.0,
+                        help=("Timeout ('wait') in seconds for the server to "
+                              "create a channel before giving up on requests "
+                              "for it. Default is 2."))
+    parser.add_argument('--json', action='store_true',
+                        help="Print the results as JSON.")
+    parser.add_argument('--verbose', '-v', action='count',
+                        help="Show more log messages. (Use -vvv for even more.)")
+    parser.add_argument('--no-color', action='store_true',
+                        help="Suppress ANSI color codes in log messages.")
+    parser.add_argument('--version', '-V', action='show_version',
+                        default=argparse.SUPPRESS,
+                        help="Show caproto version and exit.")
+    args = parser.parse_args()
+
+    if args.verbose:
+        if args.verbose <= 2:
+            _set_handler_with_logger(color=not args.no_color, level='DEBUG',
+                                     logger_name='caproto.replay')
+        else:
+            set_handler(color=not args.no_color, level='DEBUG')
+
+    default_port = get_environment_variables()['EPICS_CA_SERVER_PORT']
+    try:
+        result = replay(
+            args.trace, (args.host, args.port or default_port),
+            udp_address=(args.host, args.udp_port or default_port),
+            speed=args.speed, timeout=args.timeout)
+    except BaseException as exc:
+        if args.verbose:
+            # Show the full traceback.
+            raise
+        else:
+            # Print a one-line error message.
+            print(exc)
+            return
+
+    if args.json:
+        print(json.dumps(result._asdict(), indent=4))
+    else:
+        print(format_result(result))
+
+
+if __name__ == '__main__':
+    main()
@@ -11,12 +11,58 @@ For access to the underlying functionality from a Python script or interactive
 Python session, do not import this module; instead import caproto.sync.shark.
 """
 import argparse
+import json
 import sys
-from ..sync.shark import shark
+from ..sync.shark import shark, TrafficStats
 from .. import __version__
 from .._utils import ShowVersionAction
 
 
+def _format_table(title, columns, rows):
+    widths = [max([len(str(column))] + [len(str(row[i])) for row in rows])
+              for i, column in enumerate(columns)]
+    lines = ['', title]
+    for row in [columns] + rows:
+        lines.append('  '.join(
+            f'{value:<{width}}' if i == 0 else f'{value:>{width}}'
+            for i, (value, width) in enumerate(zip(row, widths))).rstrip())
+    if not rows:
+        lines.append('(none)')
+    return lines
+
+
+def format_stats(summary):
+    'Format a TrafficStats summary as tables'
+    def estimate(hitter, unit):
+        if hitter['error']:
+            return f'{hitter[unit]} ±{hitter["error"]}'
+        return hitter[unit]
+
+    lines = [f'{summary["messages"]} messages, {summary["bytes"]} bytes in '
+             f'{summary["duration"]:.1f} s']
+    lines += _format_table(
+        'Command types', ['command', 'messages', 'bytes'],
+        [[name, totals['messages'], totals['bytes']]
+         for name, totals in summary['command_types'].items()])
+    for key, title, column in [('pvs', 'PVs', 'pv'),
+                               ('pairs', 'Client -> server', 'hosts'),
+                               ('subscriptions', 'Subscriptions',
+                                'subscription')]:
+        lines += _format_table(
+            f'{title}, by bytes', [column, 'messages', 'bytes'],
+            [[hitter['key'], hitter['messages'], estimate(hitter, 'bytes')]
+             for hitter in summary[key]])
+    for key, title, unit in [('search_rates', 'Searches by host', 'searches'),
+                             ('talkers', 'Bytes sent by host', 'bytes')]:
+        lines += _format_table(
+            f'{title}, in the last {summary["window"]:g} s',
+            ['host', unit, f'{unit}/s'],
+            [[hitter['key'], estimate(hitter, unit),
+              f'{hitter[f"{unit}_per_sec"]:.1f}']
+             for hitter in summary[key]])
+    return '\n'.join(lines)
+
+
 def main():
     parser = argparse.ArgumentParser(
         description='Parse pcap (tcpdump) output and pretty-print CA commands.',
@@ -31,12 +77,43 @@ def main():
                         default=('{timestamp} '
                                  '{src}:{transport.sport}->{dst}:{transport.dport} '
                                  '{command}'))
+    parser.add_argument('file', type=str, nargs='?', default=None,
+                        help=("pcap file to read. Default is to read from "
+                              "stdin."))
+    parser.add_argument('--processes', '-N', type=int, default=1,
+                        help=("Number of processes to split the flows of a "
+                              "pcap file among. Default is 1."))
+    parser.add_argument('--stats', action='store_true',
+                        help=("Rather than printing each command, print "
+                              "statistics of the traffic: messages and bytes "
+                              "by command type, PV, client/server pair and "
+                              "subscription, and searches and bytes per second "
+                              "by host. Memory use is bounded, so this may "
+                              "run indefinitely."))
+    parser.add_argument('--top', type=int, default=10,
+                        help=("Number of PVs, hosts, etc. to include in the "
+                              "statistics. Default is 10."))
+    parser.add_argument('--interval', type=float, default=None,
+                        help=("Print the statistics every INTERVAL seconds of "
+                              "capture time, as well as at the end."))
+    parser.add_argument('--window', type=float, default=60.0,
+                        help=("Seconds over which search and byte rates are "
+                              "computed. Default is 60."))
+    parser.add_argument('--json', action='store_true',
+                        help="Print the statistics as JSON, one line each.")
     parser.add_argument('--version', '-V', action='show_version',
                         default=argparse.SUPPRESS,
                         help="Show caproto version and exit.")
     args = parser.parse_args()
+    if args.processes > 1 and args.file is None:
+        parser.error('--processes requires a pcap file, rather than stdin')
+    parsed = shark(args.file or sys.stdin.buffer, processes=args.processes)
+    if args.stats:
+        print_stats(parsed, top=args.top, interval=args.interval,
+                    window=args.window, as_json=args.json)
+        return
     try:
-        for namespace in shark(sys.stdin.buffer):
+        for namespace in parsed:
             print(args.format.format(timestamp=namespace.timestamp,
                                      ethernet=namespace.ethernet,
                                      ip=namespace.ip,
@@ -49,5 +126,32 @@ def main():
         return
 
 
+def print_stats(parsed, *, top, interval, window, as_json):
+    'Accumulate TrafficStats of parsed commands and print their summaries'
+    def print_summary():
+        summary = stats.summary(top)
+        if as_json:
+            print(json.dumps(summary), flush=True)
+        else:
+            print(format_stats(summary), end='\n\n', flush=True)
+
+    stats = TrafficStats(window=window)
+    next_summary = None
+    try:
+        for namespace in parsed:
+            stats.add(namespace)
+            if interval is None:
+                continue
+            if next_summary is None:
+                next_summary = namespace.timestamp + interval
+            elif namespace.timestamp >= next_summary:
+                print_summary()
+                next_summary += interval * (
+                    1 + (namespace.timestamp - next_summary) // interval)
+    except KeyboardInterrupt:
+        ...
+    print_summary()
+
+
 if __name__ == '__main__':
     main()
@@ -62,6 +62,10 @@ class CurioAsyncLayer(AsyncLibraryLayer):
     Event = curio.UniversalEvent
     library = curio
 
+    @staticmethod
+    async def run_in_thread(func, *args):
+        return await curio.run_in_thread(func, *args)
+
 
 class VirtualCircuit(_VirtualCircuit):
     "Wraps a caproto.VirtualCircuit with a curio client."
@@ -69,6 +73,7 @@ class VirtualCircuit(_VirtualCircuit):
 
     def __init__(self, circuit, client, context):
         super().__init__(circuit, client, context)
+        self._tune_socket(client)
         self._raw_lock = curio.Lock()
         self.QueueFull = QueueFull
         self.command_queue = QueueWithFullError(ca.MAX_COMMAND_BACKLOG)
@@ -117,8 +122,11 @@ class Context(_Context):
     ServerExit = ServerExit
     TaskCancelled = curio.TaskCancelled
 
-    def __init__(self, pvdb, interfaces=None):
-        super().__init__(pvdb, interfaces)
+    def __init__(self, pvdb, interfaces=None, *, performance_profile=None,
+                 max_circuit_bytes_per_sec=None):
+        super().__init__(pvdb, interfaces,
+                         performance_profile=performance_profile,
+                         max_circuit_bytes_per_sec=max_circuit_bytes_per_sec)
         self._task_group = None
         # _stop_queue is used like a threading.Event, allowing a thread to stop
         # the Context in :meth:`.stop`.
@@ -131,19 +139,19 @@ class Context(_Context):
             udp_sock = ca.bcast_socket(socket)
             self.broadcaster.server_addresses.append(udp_sock.getsockname())
             try:
-                udp_sock.bind((interface, self.ca_server_port))
+                udp_sock.bind((interface, self.search_port))
             except Exception:
                 self.log.exception('UDP bind failure on interface %r:%d',
-                                   interface, self.ca_server_port)
+                                   interface, self.search_port)
                 raise
             self.log.debug('UDP socket bound on %s:%d', interface,
-                           self.ca_server_port)
+                           self.search_port)
             self.udp_socks[interface] = udp_sock
 
         async with curio.TaskGroup() as g:
             for interface, udp_sock in self.udp_socks.items():
                 self.log.debug('Broadcasting on %s:%d', interface,
-                               self.ca_server_port)
+                               self.search_port)
                 await g.spawn(self._core_broadcaster_loop, udp_sock)
 
     def _log_task_group_exceptions(self, task_group):
@@ -222,16 +230,21 @@ class Context(_Context):
         self._stop_queue.put(None)
 
 
-async def start_server(pvdb, *, interfaces=None, log_pv_names=False):
+async def start_server(pvdb, *, interfaces=None, log_pv_names=False,
+                       performance_profile=None,
+                       max_circuit_bytes_per_sec=None):
     '''Start a curio server with a given PV database'''
-    ctx = Context(pvdb, interfaces)
+    ctx = Context(pvdb, interfaces=interfaces,
+                  performance_profile=performance_profile,
+                  max_circuit_bytes_per_sec=max_circuit_bytes_per_sec)
     try:
         return await ctx.run(log_pv_names=log_pv_names)
     except ServerExit:
         pass
 
 
-def run(pvdb, *, interfaces=None, log_pv_names=False):
+def run(pvdb, *, interfaces=None, log_pv_names=False,
+        performance_profile=None, max_circuit_bytes_per_sec=None):
     """
     A synchronous function that runs server, catches KeyboardInterrupt at exit.
     """
@@ -241,6 +254,8 @@ def run(pvdb, *, interfaces=None, log_pv_names=False):
                 start_server,
                 pvdb,
                 interfaces=interfaces,
-                log_pv_names=log_pv_names))
+                log_pv_names=log_pv_names,
+                performance_profile=performance_profile,
+                max_circuit_bytes_per_sec=max_circuit_bytes_per_sec))
     except KeyboardInterrupt:
         return
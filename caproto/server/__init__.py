@@ -1,11 +1,43 @@
+import sys
+
 from .server import *  # noqa
-from . import conversion  # noqa
-from . import menus  # noqa
-from . import records  # noqa
+
+# These modules define many classes on import and are not needed by IOCs which
+# do not use records, so they are imported on first attribute access instead.
+_lazy_submodules = ('conversion', 'menus', 'records')
+
+
+def __getattr__(name):
+    if name in _lazy_submodules:
+        from importlib import import_module  # to avoid leaking into module ns
+        return import_module(f'{__name__}.{name}')
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+if sys.version_info < (3, 7):
+    # Module-level __getattr__ (PEP 562) is unavailable
+    from . import conversion  # noqa
+    from . import menus  # noqa
+    from . import records  # noqa
+del sys
 
 
-def run(pvdb, *, module_name, **kwargs):
+def run(pvdb, *, module_name, workers=1, partition='hash', hints=None,
+        trace=None, latency_sample_rate=None, latency_dump=None, **kwargs):
+    if workers > 1:
+        if trace or latency_sample_rate or latency_dump:
+            # The recorders would be forked into the workers, which would not
+            # write out what they record.
+            raise ValueError('Tracing and latency recording are not '
+                             'supported with more than one worker')
+        # Partitioned across worker processes; see caproto.server.multiprocess
+        from .multiprocess import run_partitioned
+        return run_partitioned(pvdb, module_name=module_name, workers=workers,
+                               partition=partition, hints=hints, **kwargs)
     from importlib import import_module  # to avoid leaking into module ns
+    from .server import _recording
     module = import_module(module_name)
     run = module.run
-    return run(pvdb, **kwargs)
+    with _recording(trace=trace, latency_sample_rate=latency_sample_rate,
+                    latency_dump=latency_dump):
+        return run(pvdb, **kwargs)
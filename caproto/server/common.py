@@ -10,6 +10,8 @@ from caproto import (apply_arr_filter, get_environment_variables,
                      RemoteProtocolError, CaprotoKeyError, CaprotoRuntimeError,
                      CaprotoNetworkError, ChannelType)
 from .._dbr import SubscriptionType, _LongStringChannelType
+from . import latency, tuning
+from .scheduler import FairShareScheduler
 
 
 # ** Tuning this parameters will affect the servers' performance **
@@ -20,6 +22,8 @@ from .._dbr import SubscriptionType, _LongStringChannelType
 HIGH_LOAD_TIMEOUT = 0.01
 # When a batch of subscription updates has this many bytes or more, send it.
 SUB_BATCH_THRESH = 2**16
+# Take up to this many subscription updates off a circuit's queue at once.
+SUB_QUEUE_DRAIN = 64
 # Tune this to change the max time between packets. If it's too high, the
 # client will experience long gaps when the server is under load. If it's too
 # low, the *overall* latency will be higher because the server will have to
@@ -38,6 +42,22 @@ class LoopExit(Exception):
     ...
 
 
+class ServerCounters:
+    """
+    Running totals kept by a server Context, for monitoring it
+
+    The maxima cover the time since they were last reset (to zero) by the
+    reader; see :class:`caproto.server.stats.ServerStats`.
+    """
+    __slots__ = ('bytes_received', 'search_requests', 'updates_dropped',
+                 'batches', 'batched_commands', 'batch_latency',
+                 'max_batch_size', 'max_batch_latency')
+
+    def __init__(self):
+        for attr in self.__slots__:
+            setattr(self, attr, 0)
+
+
 class Subscription(namedtuple('Subscription',
                               ('mask', 'channel_filter', 'circuit', 'channel',
                                'data_type', 'data_count', 'subscriptionid',
@@ -52,7 +72,7 @@ class Subscription(namedtuple('Subscription',
         The subscription mask indicating different properties
     channel_filter : ChannelFilter
         The channel filter specified, including timestamp, deadband,
-        array and sync options.
+        array, sync, decimation and rate options.
     circuit : VirtualCircuit
         The associated virtual circuit
     channel : ServerChannel
@@ -88,7 +108,7 @@ class SubscriptionSpec(namedtuple('SubscriptionSpec',
         The subscription mask indicating different properties
     channel_filter : ChannelFilter
         The channel filter specified, including timestamp, deadband,
-        array and sync options.
+        array, sync, decimation and rate options.
     '''
 
 
@@ -111,6 +131,22 @@ class VirtualCircuit:
         self.unexpired_updates = defaultdict(
             lambda: deque(maxlen=ca.MAX_SUBSCRIPTION_BACKLOG))
         self.most_recent_updates = {}
+        # Subscriptions using the "rate" Channel Filter map subscriptionid to
+        # (end, period) of the window opened by their last update sent, while
+        # it is open, and to the latest update held back until it closes.
+        self.rate_limit_windows = {}
+        self.rate_limited_updates = {}
+        # Subscription updates taken off the subscription queue but not yet
+        # batched by subscription_queue_loop
+        self._received_updates = deque()
+        # When latency recording is on, map id() of each sampled command not
+        # yet dequeued to its RequestTiming; the one being processed is kept
+        # in self._timing.
+        self._timings = {}
+        self._timing = None
+        # Set by _tune_socket if large payloads are to be sent corked
+        self._cork_sock = None
+        self._cork_threshold = None
         # This dict is passed to the loggers.
         self._tags = {'their_address': self.circuit.address,
                       'our_address': self.circuit.our_address,
@@ -135,6 +171,7 @@ class VirtualCircuit:
         for sub_spec, subs in self.subscriptions.items():
             for sub in subs:
                 self.context.subscriptions[sub_spec].remove(sub)
+                self.context.decimation_counters.pop(sub, None)
             # Does anything else on the Context still care about this sub_spec?
             # If not unsubscribe the Context's queue from the db_entry.
             if not self.context.subscriptions[sub_spec]:
@@ -147,9 +184,82 @@ class VirtualCircuit:
         """
         if self.connected:
             buffers_to_send = self.circuit.send(*commands)
-            # send bytes over the wire using some caproto utilities
+            cork = (self._cork_threshold is not None and
+                    sum(memoryview(buf).nbytes for buf in buffers_to_send) >=
+                    self._cork_threshold)
+            # The Context's scheduler shares the send bandwidth fairly among
+            # circuits, calling _send_buffers in turns.
             async with self._raw_lock:
-                await ca.async_send_all(buffers_to_send, self.client.sendmsg)
+                if cork:
+                    tuning.set_cork(self._cork_sock, True)
+                try:
+                    await self.context.send_scheduler.transmit(
+                        self, buffers_to_send)
+                finally:
+                    if cork:
+                        tuning.set_cork(self._cork_sock, False)
+
+    def _tune_socket(self, sock):
+        '''
+        Set the options of the Context's performance profile on the socket
+
+        Subclasses call this with the underlying socket of the circuit.
+        '''
+        profile = self.context.performance_profile
+        tuning.tune_socket(sock, profile,
+                           self.context.environ['EPICS_CA_MAX_ARRAY_BYTES'])
+        if tuning.CAN_CORK and profile.cork_threshold is not None:
+            self._cork_sock = sock
+            self._cork_threshold = profile.cork_threshold
+
+    async def _send_buffers(self, buffers):
+        '''
+        Send buffers over the TCP socket. The caller must hold self._raw_lock.
+        '''
+        # send bytes over the wire using some caproto utilities
+        await ca.async_send_all(buffers, self.client.sendmsg)
+
+    def _parse_received(self, bytes_received):
+        """
+        Parse the bytes received into commands, counting and sampling them
+
+        An empty ``bytes_received`` means that the client disconnected.
+        """
+        self.context.counters.bytes_received += len(bytes_received)
+        commands, _ = self.circuit.recv(bytes_received)
+        recorder = latency.current_recorder
+        if recorder is not None and commands:
+            for timing in recorder.sample(commands):
+                self._timings[id(timing.command)] = timing
+        return commands
+
+    def queue_depths(self):
+        """
+        Number of received commands and of subscription updates waiting
+
+        Returns
+        -------
+        commands, subscription_updates : int
+        """
+        return (self.command_queue.qsize(),
+                self.subscription_queue.qsize() + len(self._received_updates))
+
+    async def get_batch_from_sub_queue(self, max_items, timeout=None):
+        """
+        Take up to max_items updates off the subscription queue
+
+        Waits for up to ``timeout`` seconds (indefinitely if None) for the
+        first one, then takes those already queued without waiting. This
+        implementation takes one at a time; subclasses whose queue can be
+        drained more cheaply override it.
+
+        Returns
+        -------
+        refs : list
+            Weak references to EventAddResponses. Empty on timeout.
+        """
+        ref = await self.get_from_sub_queue(timeout=timeout)
+        return [] if ref is None else [ref]
 
     async def recv(self):
         """
@@ -160,7 +270,7 @@ class VirtualCircuit:
         except (ConnectionResetError, ConnectionAbortedError):
             bytes_received = []
 
-        commands, _ = self.circuit.recv(bytes_received)
+        commands = self._parse_received(bytes_received)
         for c in commands:
             try:
                 await self.command_queue.put(c)
@@ -200,6 +310,13 @@ class VirtualCircuit:
               caproto.ErrorResponse
         2. Update Channel state if applicable.
         """
+        if self._timings:
+            timing = self._timings.pop(id(command), None)
+            if timing is not None:
+                timing.mark('dequeue')
+        else:
+            timing = None
+        self._timing = timing
         try:
             self.circuit.process_command(command)
         except ca.RemoteProtocolError:
@@ -237,6 +354,14 @@ class VirtualCircuit:
 
         try:
             response = await self._process_command(command)
+            if timing is not None and not timing.pending:
+                # Send the response here, to time it.
+                timing.mark('converted')
+                if response:
+                    await self.send(*response)
+                    timing.mark('sent')
+                    response = None
+                self._record_timing(timing)
             return response
         except Exception as ex:
             if not self.connected:
@@ -258,6 +383,28 @@ class VirtualCircuit:
                                          error_message=error_message)
                         ]
 
+    def _record_timing(self, timing):
+        'Hand the timing of a finished request to the latency recorder'
+        recorder = latency.current_recorder
+        if recorder is None:
+            return
+        command = timing.command
+        pvname = None
+        if isinstance(command, (ca.CreateChanRequest, ca.SearchRequest)):
+            # Only names that are served, lest clients asking for arbitrary
+            # names grow the table of PVs without bound
+            try:
+                self.context[command.name]
+            except KeyError:
+                ...
+            else:
+                pvname = command.name
+        elif hasattr(command, 'sid'):
+            chan = self.circuit.channels_sid.get(command.sid)
+            if chan is not None:
+                pvname = chan.name
+        recorder.record(timing, pvname)
+
     async def command_queue_loop(self):
         """Reference implementation of the command queue loop
 
@@ -293,12 +440,70 @@ class VirtualCircuit:
         except LoopExit:
             ...
 
+    def hold_rate_limited_update(self, subscriptionid, command, rate):
+        """
+        Apply the "rate" Channel Filter to an update.
+
+        Returns True if the update must be held back because the subscription
+        has already been sent an update within the last ``1 / rate.max``
+        seconds. A held-back update replaces any older one for the same
+        subscription, and subscription_queue_loop, which wakes when the window
+        closes, sends it then.
+        """
+        now = time.monotonic()
+        window = self.rate_limit_windows.get(subscriptionid)
+        if window is None or (window[0] <= now and
+                              subscriptionid not in self.rate_limited_updates):
+            self.rate_limit_windows[subscriptionid] = (now + 1 / rate.max,
+                                                       1 / rate.max)
+            return False
+        self.rate_limited_updates[subscriptionid] = command
+        return True
+
+    def _pop_due_rate_limited_updates(self):
+        """Remove and return the held-back updates that are due to be sent"""
+        if not self.rate_limited_updates:
+            return []
+        now = time.monotonic()
+        windows = self.rate_limit_windows
+        due = [subscriptionid for subscriptionid in self.rate_limited_updates
+               if windows[subscriptionid][0] <= now]
+        commands = []
+        for subscriptionid in due:
+            commands.append(self.rate_limited_updates.pop(subscriptionid))
+            # Sending it opens the next window
+            period = windows[subscriptionid][1]
+            windows[subscriptionid] = (now + period, period)
+        return commands
+
+    def _rate_limit_timeout(self):
+        """
+        Time until the next window of the "rate" Channel Filter closes, or None
+
+        subscription_queue_loop waits no longer than this for more updates, so
+        that it sends any update held back meanwhile when it is due.
+        """
+        windows = self.rate_limit_windows
+        if not windows:
+            return None
+        now = time.monotonic()
+        # Forget the windows which have closed with no update held back
+        for subscriptionid in [subscriptionid
+                               for subscriptionid, (end, _) in windows.items()
+                               if end <= now and
+                               subscriptionid not in self.rate_limited_updates]:
+            del windows[subscriptionid]
+        if not windows:
+            return None
+        return max(0, min(end for end, _ in windows.values()) - now)
+
     async def subscription_queue_loop(self):
         maybe_awaitable = self.events_on.set()
         # The curio backend makes this an awaitable thing.
         if maybe_awaitable is not None:
             await maybe_awaitable
         commands = deque()
+        received = self._received_updates
         latency_limit = HIGH_LOAD_TIMEOUT
         while True:
             send_now = False
@@ -314,7 +519,10 @@ class VirtualCircuit:
                 # and it should sacrifice some latency in order to batch
                 # requests efficiently.
                 while True:
-                    ref = await self.get_from_sub_queue(timeout=HIGH_LOAD_TIMEOUT)
+                    if not received:
+                        received.extend(await self.get_batch_from_sub_queue(
+                            SUB_QUEUE_DRAIN, timeout=HIGH_LOAD_TIMEOUT))
+                    ref = received.popleft() if received else None
                     if ref is None:
                         # We have caught up with the producer. Stop batching,
                         # and optimize for low latency.
@@ -325,42 +533,56 @@ class VirtualCircuit:
                             # send them.
                             break
 
-                        # Block here until we have something to send...
-                        ref = await self.get_from_sub_queue(timeout=None)
+                        # Block here until we have something to send, or until
+                        # a window of the "rate" Channel Filter closes, when an
+                        # update held back may be due...
+                        received.extend(await self.get_batch_from_sub_queue(
+                            SUB_QUEUE_DRAIN,
+                            timeout=self._rate_limit_timeout()))
+                        ref = received.popleft() if received else None
 
                         # And, since we are in "slow producer" mode, reset the
                         # limit in preparation for the next time we enter "fast
                         # producer" mode.
                         latency_limit = HIGH_LOAD_TIMEOUT
 
-                    command = ref()
-                    if command is None:
-                        # Quota for this subscription has been exceeded.  This
-                        # client is a slow consumer. To avoid letting it get
-                        # behind, drop this message on the floor and move on.
-                        # We are dropping "old news" in favor of prioritizing
-                        # getting the "latest news" out. Note that the
-                        # reference implementation in epics-base, rsrv, does
-                        # the opposite: it drops the new news and sends the old
-                        # news. Jeff Hill has stated clearly that this should
-                        # be considered an implementation detail, not part of
-                        # the specification. The C++ implementation can save
-                        # some memory by discarding the latest updates, but it
-                        # is more useful to discard the oldest updates. Python
-                        # might as well do the more useful thing, given that
-                        # its baseline memory usage is high.
-                        num_expired += 1
-                        continue
-                    # Accumulate commands into a batch.
-                    commands.append(command)
-                    commands_bytes += len(command)
-                    now = time.monotonic()
-                    if len(commands) == 1:
-                        # Set a dealine by which will must send this oldest
-                        # command in the batch, effecitvely a limit of latency.
-                        deadline = now + latency_limit
-                    elif deadline < now:
-                        send_now = True
+                    if ref is None:
+                        # A window has closed; send any update held back.
+                        ready = self._pop_due_rate_limited_updates()
+                    else:
+                        command = ref()
+                        if command is None:
+                            # Quota for this subscription has been exceeded.  This
+                            # client is a slow consumer. To avoid letting it get
+                            # behind, drop this message on the floor and move on.
+                            # We are dropping "old news" in favor of prioritizing
+                            # getting the "latest news" out. Note that the
+                            # reference implementation in epics-base, rsrv, does
+                            # the opposite: it drops the new news and sends the old
+                            # news. Jeff Hill has stated clearly that this should
+                            # be considered an implementation detail, not part of
+                            # the specification. The C++ implementation can save
+                            # some memory by discarding the latest updates, but it
+                            # is more useful to discard the oldest updates. Python
+                            # might as well do the more useful thing, given that
+                            # its baseline memory usage is high.
+                            num_expired += 1
+                            continue
+                        ready = [command]
+                        # Do not let held-back updates wait on a busy queue.
+                        ready.extend(self._pop_due_rate_limited_updates())
+
+                    for command in ready:
+                        # Accumulate commands into a batch.
+                        commands.append(command)
+                        commands_bytes += len(command)
+                        now = time.monotonic()
+                        if len(commands) == 1:
+                            # Set a dealine by which will must send this oldest
+                            # command in the batch, effecitvely a limit of latency.
+                            deadline = now + latency_limit
+                        elif deadline < now:
+                            send_now = True
                     if commands_bytes > SUB_BATCH_THRESH:
                         send_now = True
                     # Send the batch if we are in low-latency / slow producer
@@ -374,13 +596,23 @@ class VirtualCircuit:
                 break
             try:
                 len_commands = len(commands)
+                counters = self.context.counters
                 if num_expired:
+                    counters.updates_dropped += num_expired
                     self.log.warning("High load. Dropped %d responses.", num_expired)
+                # Time since the oldest command of the batch was queued
+                latency = now - deadline + latency_limit
+                counters.batches += 1
+                counters.batched_commands += len_commands
+                counters.batch_latency += latency
+                counters.max_batch_size = max(counters.max_batch_size,
+                                              len_commands)
+                counters.max_batch_latency = max(counters.max_batch_latency,
+                                                 latency)
                 if len_commands > 1:
                     self.log.info(
                         "High load. Batched %d commands (%dB) with %.4fs latency.",
-                        len_commands, commands_bytes,
-                        now - deadline + latency_limit)
+                        len_commands, commands_bytes, latency)
 
                 # Ensure at the last possible moment that we don't send
                 # responses for Subscriptions that have been canceled at some
@@ -420,9 +652,12 @@ class VirtualCircuit:
         for sub_spec, sub in to_remove:
             self.subscriptions[sub_spec].remove(sub)
             self.most_recent_updates.pop(sub.subscriptionid, None)
+            self.rate_limit_windows.pop(sub.subscriptionid, None)
+            self.rate_limited_updates.pop(sub.subscriptionid, None)
             self.context.subscriptions[sub_spec].remove(sub)
             self.context.last_dead_band.pop(sub, None)
             self.context.last_sync_edge_update.pop(sub, None)
+            self.context.decimation_counters.pop(sub, None)
             # Does anything else on the Context still care about sub_spec?
             # If not unsubscribe the Context's queue from the db_entry.
             if not self.context.subscriptions[sub_spec]:
@@ -471,7 +706,6 @@ class VirtualCircuit:
                                pvname)
                 to_send = [ca.CreateChFailResponse(cid=command.cid)]
             else:
-
                 access = db_entry.check_access(self.client_hostname,
                                                self.client_username)
 
@@ -517,10 +751,15 @@ class VirtualCircuit:
                     # Not requesting a LONG_STRING type
                     ...
 
+            timing = self._timing
+            if timing is not None:
+                timing.mark('auth_enter')
             metadata, data = await db_entry.auth_read(
                 self.client_hostname, self.client_username,
                 read_data_type, user_address=self.circuit.address,
             )
+            if timing is not None:
+                timing.mark('auth_exit')
 
             old_version = self.circuit.protocol_version < 13
             if command.data_count > 0 or old_version:
@@ -547,14 +786,22 @@ class VirtualCircuit:
         elif isinstance(command, (ca.WriteRequest, ca.WriteNotifyRequest)):
             chan, db_entry = self._get_db_entry_from_command(command)
             client_waiting = isinstance(command, ca.WriteNotifyRequest)
+            timing = self._timing
+            if timing is not None:
+                # Finished by handle_write
+                timing.pending = True
 
             async def handle_write():
                 '''Wait for an asynchronous caput to finish'''
                 try:
+                    if timing is not None:
+                        timing.mark('auth_enter')
                     write_status = await db_entry.auth_write(
                         self.client_hostname, self.client_username,
                         command.data, command.data_type, command.metadata,
                         user_address=self.circuit.address)
+                    if timing is not None:
+                        timing.mark('auth_exit')
                 except Exception as ex:
                     self.log.exception('Invalid write request by %s (%s): %r',
                                        self.client_username,
@@ -580,7 +827,13 @@ class VirtualCircuit:
                             status=write_status,
                             data_count=db_entry.length
                         )
+                        if timing is not None:
+                            timing.mark('converted')
                         await self.send(response_command)
+                        if timing is not None:
+                            timing.mark('sent')
+                    if timing is not None:
+                        self._record_timing(timing)
                 finally:
                     maybe_awaitable = self.write_event.set()
                     # The curio backend makes this an awaitable thing.
@@ -658,6 +911,7 @@ class VirtualCircuit:
             # The client has signaled that it does not think it will be able to
             # catch up to the backlog. Clear all updates queued to be sent...
             self.unexpired_updates.clear()
+            self.rate_limited_updates.clear()
             # ...and tell the Context that any future updates from ChannelData
             # should not be added to this circuit's queue until further notice.
             self.events_on.clear()
@@ -672,17 +926,26 @@ class VirtualCircuit:
             to_send = [chan.clear()]
         elif isinstance(command, ca.EchoRequest):
             to_send = [ca.EchoResponse()]
-        if isinstance(command, ca.Message):
+        if (isinstance(command, ca.Message) and
+                self.log.isEnabledFor(logging.DEBUG)):
             tags['bytesize'] = len(command)
             self.log.debug("%r", command, extra=tags)
         return to_send
 
 
 class Context:
-    def __init__(self, pvdb, interfaces=None):
+    # Every Context, so that a PVGroup may find the one serving it.
+    _instances = weakref.WeakSet()
+    # The AsyncLibraryLayer of the server's library, set by subclasses
+    async_layer = None
+
+    def __init__(self, pvdb, interfaces=None, *, performance_profile=None,
+                 max_circuit_bytes_per_sec=None):
         if interfaces is None:
             interfaces = ca.get_server_address_list()
         self.interfaces = interfaces
+        self.performance_profile = tuning.get_performance_profile(
+            performance_profile)
         self.udp_socks = {}  # map each interface to a UDP socket for searches
         self.beacon_socks = {}  # map each interface to a UDP socket for beacons
         self.pvdb = pvdb
@@ -691,6 +954,13 @@ class Context:
         self.addresses = []
         self.circuits = set()
         self.broadcaster = ca.Broadcaster(our_role=ca.SERVER)
+        # Shares send bandwidth among circuits; see its send statistics with
+        # self.send_scheduler.stats().
+        if max_circuit_bytes_per_sec is None:
+            self.send_scheduler = FairShareScheduler(self)
+        else:
+            self.send_scheduler = FairShareScheduler(
+                self, max_bytes_per_sec=max_circuit_bytes_per_sec)
 
         self.subscriptions = defaultdict(deque)
         # Map Subscription to {'before': last_update, 'after': last_update}
@@ -698,12 +968,22 @@ class Context:
         # Channel Filter.
         self.last_sync_edge_update = defaultdict(lambda: defaultdict(dict))
         self.last_dead_band = {}
+        # Map Subscription to the number of updates seen modulo n, for
+        # Subscriptions that use the decimation ("dec") Channel Filter.
+        self.decimation_counters = {}
         self.beacon_count = 0
+        # Totals for monitoring; see caproto.server.stats.
+        self.counters = ServerCounters()
+        Context._instances.add(self)
 
         self.environ = get_environment_variables()
 
         # ca_server_port: the default tcp/udp port from the environment
         self.ca_server_port = self.environ['EPICS_CA_SERVER_PORT']
+        # the udp port on which searches are answered; the workers of a
+        # partitioned server (see caproto.server.multiprocess) set it to 0, as
+        # their front process answers searches on their behalf
+        self.search_port = self.ca_server_port
         # the specific tcp port in use by this server
         self.port = None
 
@@ -714,19 +994,34 @@ class Context:
         ignore_addresses = self.environ['EPICS_CAS_IGNORE_ADDR_LIST']
         self.ignore_addresses = ignore_addresses.split(' ')
 
+        # Record fields resolved by __getitem__ which are not in the pvdb,
+        # to their instances
+        self._aliases = {}
+        # Index of all PVs and record fields, see pvdb_with_fields
+        self._pvdb_with_fields = {}
+        # Startup and shutdown hooks, found on first use
+        self._startup_methods = None
+        self._shutdown_methods = None
+
     @property
     def pvdb_with_fields(self):
-        'Dynamically generated each time - use sparingly'
-        # TODO is static generation sufficient?
-        pvdb = {}
+        '''All PVs and record fields, by name
+
+        The index is kept and only extended by the PVs added to the pvdb since
+        the last access; it should not be modified. Note that this
+        instantiates the fields of all records.
+        '''
+        index = self._pvdb_with_fields
         for name, instance in self.pvdb.items():
-            pvdb[name] = instance
+            if index.get(name) is instance:
+                continue
+            index[name] = instance
             if hasattr(instance, 'fields'):
                 # Note that we support PvpropertyData along with ChannelData
                 # instances here (which may not have fields)
                 for field_name, field in instance.fields.items():
-                    pvdb[f'{name}.{field_name}'] = field
-        return pvdb
+                    index[f'{name}.{field_name}'] = field
+        return index
 
     async def _core_broadcaster_loop(self, udp_sock):
         while True:
@@ -789,6 +1084,9 @@ class Context:
         try:
             inst = self.pvdb[rec_field]
         except KeyError:
+            inst = self._aliases.get(rec_field)
+
+        if inst is None:
             # Finally, access 'record', see if it has 'field'
             try:
                 inst = self.pvdb[rec]
@@ -801,8 +1099,10 @@ class Context:
             except (AttributeError, KeyError):
                 raise CaprotoKeyError(f'Neither record nor field exists: '
                                       f'{rec_field}')
+            # Cache record.FIELD for later usage
+            self._aliases[rec_field] = inst
 
-        # Verify the modifiers are usable BEFORE caching rec_field in the pvdb:
+        # Verify the modifiers are usable
         if ca.RecordModifiers.long_string in (mods or {}):
             if inst.data_type not in (ChannelType.STRING,
                                       ChannelType.CHAR):
@@ -810,11 +1110,21 @@ class Context:
                     f'Long-string modifier not supported with types '
                     f'other than string or char ({inst.data_type})'
                 )
-
-        # Cache record.FIELD for later usage
-        self.pvdb[rec_field] = inst
         return inst
 
+    def _search_reply_port(self, pv_name):
+        '''
+        The TCP port to name in the reply to a search for pv_name
+
+        Returns None if pv_name is not served, in which case the search is not
+        answered.
+        '''
+        try:
+            known_pv = self[pv_name] is not None
+        except KeyError:
+            return None
+        return self.port if known_pv else None
+
     async def _broadcaster_queue_iteration(self, addr, commands):
         self.broadcaster.process_commands(commands)
         if addr in self.ignore_addresses:
@@ -826,17 +1136,13 @@ class Context:
             if isinstance(command, ca.VersionRequest):
                 version_requested = True
             elif isinstance(command, ca.SearchRequest):
-                pv_name = command.name
-                try:
-                    known_pv = self[pv_name] is not None
-                except KeyError:
-                    known_pv = False
-
-                if known_pv:
+                self.counters.search_requests += 1
+                port = self._search_reply_port(command.name)
+                if port is not None:
                     # responding with an IP of `None` tells client to get IP
                     # address from the datagram.
                     search_replies.append(
-                        ca.SearchResponse(self.port, None, command.cid,
+                        ca.SearchResponse(port, None, command.cid,
                                           ca.DEFAULT_PROTOCOL_VERSION)
                     )
 
@@ -909,11 +1215,6 @@ class Context:
             if data_count != len(values):
                 values = values[:data_count]
 
-            command = chan.subscribe(
-                data=values, metadata=metadata, data_type=sub.data_type,
-                data_count=data_count, subscriptionid=sub.subscriptionid,
-                status=1)
-
             dbnd = sub.channel_filter.dbnd
             if dbnd is not None:
                 new = values
@@ -951,6 +1252,21 @@ class Context:
                 else:
                     self.last_dead_band[sub] = new
 
+            # Decimation Channel Filter: forward only the first of every n
+            # updates to each Subscription. This is checked before the
+            # response is built so that decimated updates cost next to nothing.
+            dec = sub.channel_filter.dec
+            if dec is not None:
+                count = self.decimation_counters.get(sub, 0)
+                self.decimation_counters[sub] = (count + 1) % dec.n
+                if count:
+                    continue
+
+            command = chan.subscribe(
+                data=values, metadata=metadata, data_type=sub.data_type,
+                data_count=data_count, subscriptionid=sub.subscriptionid,
+                status=1)
+
             # Special-case for edge-triggered modes of the sync Channel
             # Filter (before, after, first, last). Only send the first
             # update to each channel.
@@ -983,6 +1299,16 @@ class Context:
                 circuit.most_recent_updates[sub.subscriptionid] = command
                 continue
 
+            # If this Subscription uses the "rate" Channel Filter and has
+            # already been sent an update within the current window, hold this
+            # one back. The circuit's subscription_queue_loop will send the
+            # latest held-back update when the window closes.
+            rate = sub.channel_filter.rate
+            if rate is not None:
+                if circuit.hold_rate_limited_update(sub.subscriptionid,
+                                                    command, rate):
+                    continue
+
             # This is an OrderedBoundedSet, a set with a maxlen, containing
             # only commands for this particular subscription.
             circuit.unexpired_updates[sub.subscriptionid].append(command)
@@ -997,6 +1323,8 @@ class Context:
                     "Critically high EventAddResponse load. Dropping all "
                     "queued responses on this circuit.")
                 circuit.subscription_queue.clear()
+                # ...including those already taken off the queue for sending
+                circuit._received_updates.clear()
                 circuit.unexpired_updates.clear()
 
     async def broadcast_beacon_loop(self):
@@ -1028,22 +1356,58 @@ class Context:
     async def circuit_disconnected(self, circuit):
         '''Notification from circuit that its connection has closed'''
         self.circuits.discard(circuit)
+        self.send_scheduler.remove_circuit(circuit)
+
+    def _find_hooks(self):
+        '''
+        Find the startup and shutdown hooks of all PVs in one pass
+
+        Along the way, allow large values of the PVs to be converted in a
+        worker thread of this server's async library.
+        '''
+        startup_methods = {}
+        shutdown_methods = {}
+        for name, instance in self.pvdb.items():
+            self._convert_in_threads(instance)
+            method = getattr(instance, 'server_startup', None)
+            if method is not None:
+                startup_methods[name] = method
+            method = getattr(instance, 'server_shutdown', None)
+            if method is not None:
+                shutdown_methods[name] = method
+            # Only include record fields which have already been
+            # instantiated; fields with startup hooks always are (see
+            # PvpropertyData).
+            field_inst = getattr(instance, '_field_inst', None)
+            if field_inst is not None:
+                for field_name, field in field_inst.pvdb.items():
+                    self._convert_in_threads(field)
+                    method = getattr(field, 'server_startup', None)
+                    if method is not None:
+                        startup_methods[f'{name}.{field_name}'] = method
+
+        self._startup_methods = startup_methods
+        self._shutdown_methods = shutdown_methods
+
+    def _convert_in_threads(self, instance):
+        'Convert large values of instance for the wire in worker threads'
+        if (self.async_layer is not None and
+                isinstance(instance, ca.ChannelData)):
+            instance._run_in_thread = self.async_layer.run_in_thread
 
     @property
     def startup_methods(self):
         'Notify all ChannelData instances of the server startup'
-        return {name: instance.server_startup
-                for name, instance in self.pvdb_with_fields.items()
-                if hasattr(instance, 'server_startup') and
-                instance.server_startup is not None}
+        if self._startup_methods is None:
+            self._find_hooks()
+        return self._startup_methods
 
     @property
     def shutdown_methods(self):
         'Notify all ChannelData instances of the server shutdown'
-        return {name: instance.server_shutdown
-                for name, instance in self.pvdb.items()
-                if hasattr(instance, 'server_shutdown') and
-                instance.server_shutdown is not None}
+        if self._shutdown_methods is None:
+            self._find_hooks()
+        return self._shutdown_methods
 
     async def _bind_tcp_sockets_with_consistent_port_number(self, make_socket):
         # Find a random port number that is free on all self.interfaces,
@@ -1071,7 +1435,13 @@ class Context:
         return port, tcp_sockets
 
     async def tcp_handler(self, client, addr):
-        '''Handler for each new TCP client to the server'''
+        '''
+        Handler for each new TCP client to the server
+
+        Used by the servers whose circuits receive with :meth:`recv`; the
+        asyncio server instead has the protocol of each connection feed its
+        circuit.
+        '''
         cavc = ca.VirtualCircuit(ca.SERVER, addr, None)
         circuit = self.CircuitClass(cavc, client, self)
         self.circuits.add(circuit)
@@ -0,0 +1,920 @@
+'''
+Load EPICS database (.db, .template and .substitutions) files
+
+:func:`load_database` reads database files, as ``dbLoadRecords`` and
+``dbLoadTemplate`` of an EPICS IOC would, and returns a :class:`DatabaseGroup`
+holding a ChannelData instance for each record, with the record fields of
+:mod:`caproto.server.records`::
+
+    from caproto.server import run
+    from caproto.server.database import load_database
+
+    db = load_database('motors.substitutions', macros={'P': 'XF:31ID:'},
+                       cache_dir='~/.cache/caproto-db')
+    run(db.pvdb, module_name='caproto.asyncio.server')
+
+Files are parsed line by line, into :class:`DatabaseRecord` tuples, with
+macros (``$(NAME)``, ``${NAME}`` and ``$(NAME=default)``) expanded. Given a
+``cache_dir``, the parsed records are kept there, keyed on the contents of the
+file and the macros, and reused for as long as the file and those it includes
+are unchanged. As in the servers, the fields of each record are only
+instantiated when first accessed; the values given to them in the database are
+set then.
+'''
+import hashlib
+import json
+import logging
+import os
+import pickle
+import re
+from collections import namedtuple
+
+from .. import (CaprotoKeyError, CaprotoRuntimeError, CaprotoValueError,
+                ChannelType, MAX_ENUM_STRING_SIZE)
+from .server import PVGroup, PVSpec
+
+__all__ = ('DatabaseRecord', 'DatabaseGroup', 'load_database',
+           'read_database', 'parse_database', 'parse_substitutions',
+           'merge_records', 'substitute_macros')
+logger = logging.getLogger(__name__)
+
+# Bump this to invalidate existing caches when the parsed form changes.
+CACHE_VERSION = 1
+# How deeply macros may refer to other macros.
+MAX_MACRO_DEPTH = 10
+SUBSTITUTIONS_EXTENSIONS = ('.substitutions', '.substitution', '.subs')
+
+_TOKEN_RE = re.compile(r'''
+    (?P<space>\s+|\#.*)
+  | "(?P<string>(?:[^"\\]|\\.)*)"
+  | (?P<word>[^\s"(){},=\#]+)
+  | (?P<punct>[(){},=])
+''', re.VERBOSE)
+# Lines holding a whole field (or info item), or the start of a record, as
+# most lines of most databases do, are taken as a single token.
+_ITEM_LINE_RE = re.compile(r'''
+    \s* (field|info) \s* \( \s* ([^\s"(){},=\#]+) \s* , \s*
+    "((?:[^"\\]|\\.)*)" \s* \) \s* (?:\#.*)? $
+''', re.VERBOSE)
+_RECORD_LINE_RE = re.compile(r'''
+    \s* g?record \s* \( \s* "?([\w*]+)"? \s* , \s*
+    "((?:[^"\\]|\\.)*)" \s* \) \s* (\{)? \s* (?:\#.*)? $
+''', re.VERBOSE)
+_ESCAPE_RE = re.compile(r'\\(.)')
+_ESCAPES = {'n': '\n', 't': '\t', 'r': '\r', '\\': '\\', '"': '"', "'": "'"}
+_MACRO_RE = re.compile(r'''
+    \$(?: \( (?P<paren>[^()${}=]*) (?:=(?P<paren_default>[^()$]*))? \)
+        | \{ (?P<brace>[^(){}$=]*) (?:=(?P<brace_default>[^{}$]*))? \} )
+''', re.VERBOSE)
+_EOF = ('eof', 'end of file', None)
+
+
+DatabaseRecord = namedtuple('DatabaseRecord',
+                            'name record_type fields info aliases')
+DatabaseRecord.__doc__ = '''
+A record, as given in a database file
+
+Attributes
+----------
+name : str
+record_type : str or None
+    None where the file only adds to a record defined earlier, as in
+    ``record("*", "name")`` or ``alias("name", "alias")``
+fields : dict
+    Field name to value, as text
+info : dict
+    Info item name to value
+aliases : tuple of str
+'''
+
+
+def substitute_macros(text, macros):
+    '''
+    Expand the EPICS macros in text
+
+    Parameters
+    ----------
+    text : str
+    macros : dict
+        Macro name to value. Values may refer to other macros.
+
+    Returns
+    -------
+    text : str
+
+    Raises
+    ------
+    CaprotoKeyError
+        For a macro with no value and no default
+    '''
+    def replace(match):
+        name = match.group('paren')
+        if name is None:
+            name, default = match.group('brace', 'brace_default')
+        else:
+            default = match.group('paren_default')
+        try:
+            return macros[name]
+        except KeyError:
+            if default is None:
+                raise CaprotoKeyError(f'Undefined macro {name!r}') from None
+            return default
+
+    for _ in range(MAX_MACRO_DEPTH):
+        if '$' not in text:
+            return text
+        text, count = _MACRO_RE.subn(replace, text)
+        if not count:
+            return text
+    if _MACRO_RE.search(text):
+        raise CaprotoValueError(f'Macros nested too deeply (or recursive) '
+                                f'in {text!r}')
+    return text
+
+
+def _unescape(text):
+    if '\\' not in text:
+        return text
+    return _ESCAPE_RE.sub(
+        lambda match: _ESCAPES.get(match.group(1), match.group(0)), text)
+
+
+def _tokenize(lines, macros, filename):
+    '''
+    Tokens of the lines, as (kind, text, line number)
+
+    Besides the tokens of the grammar, whole fields are 'item' tokens, with
+    text of (item, name, value), and starts of records are 'record' tokens,
+    with text of (record type, name).
+    '''
+    item_match = _ITEM_LINE_RE.match
+    record_match = _RECORD_LINE_RE.match
+    for lineno, line in enumerate(lines, 1):
+        if '$' in line and macros is not None:
+            if line.lstrip().startswith('#'):
+                continue
+            try:
+                line = substitute_macros(line, macros)
+            except (CaprotoKeyError, CaprotoValueError) as ex:
+                raise CaprotoValueError(f'{filename}:{lineno}: {ex}') from ex
+        match = item_match(line)
+        if match is not None:
+            item, name, value = match.groups()
+            yield 'item', (item, name, _unescape(value)), lineno
+            continue
+        match = record_match(line)
+        if match is not None:
+            record_type, name, brace = match.groups()
+            yield 'record', (record_type, _unescape(name)), lineno
+            if brace:
+                yield '{', '{', lineno
+            continue
+        pos, end = 0, len(line)
+        while pos < end:
+            match = _TOKEN_RE.match(line, pos)
+            if match is None:
+                raise CaprotoValueError(f'{filename}:{lineno}: unexpected '
+                                        f'{line[pos:].strip()!r}')
+            pos = match.end()
+            kind = match.lastgroup
+            if kind == 'space':
+                continue
+            elif kind == 'string':
+                yield kind, _unescape(match.group(kind)), lineno
+            elif kind == 'word':
+                yield kind, match.group(kind), lineno
+            else:
+                text = match.group(kind)
+                yield text, text, lineno
+
+
+class _TokenStream:
+    'Tokens with one of lookahead, and errors which say where they are'
+    def __init__(self, tokens, filename):
+        self._tokens = tokens
+        self._next = None
+        self.filename = filename
+        self.lineno = 0
+
+    def peek(self):
+        if self._next is None:
+            self._next = next(self._tokens, _EOF)
+        return self._next
+
+    def next(self):
+        token = self.peek()
+        self._next = None
+        if token[2] is not None:
+            self.lineno = token[2]
+        return token
+
+    def error(self, message):
+        raise CaprotoValueError(f'{self.filename}:{self.lineno}: {message}')
+
+    def expect(self, kind):
+        token = self.next()
+        if token[0] != kind:
+            self.error(f'expected {kind!r}, found {token[1]!r}')
+
+    def value(self):
+        'A quoted string or a bare word'
+        kind, text, _ = self.next()
+        if kind not in ('string', 'word'):
+            self.error(f'expected a value, found {text!r}')
+        return text
+
+    def field_value(self):
+        'A value, or a JSON link such as {const: 1}, as text'
+        if self.peek()[0] != '{':
+            return self.value()
+        parts = []
+        depth = 0
+        previous = None
+        while True:
+            kind, text, _ = self.next()
+            if kind == 'eof':
+                self.error('unterminated JSON value')
+            if kind == 'string':
+                text = json.dumps(text)
+            if kind in ('string', 'word') and previous in ('string', 'word'):
+                parts.append(' ')
+            parts.append(text)
+            previous = kind
+            if kind == '{':
+                depth += 1
+            elif kind == '}':
+                depth -= 1
+                if not depth:
+                    return ''.join(parts)
+
+    def skip_definition(self, keyword):
+        'Skip keyword(...) {...}, as for definitions of record types'
+        self.expect('(')
+        self._skip_to(')')
+        if self.peek()[0] == '{':
+            self.next()
+            self._skip_to('}')
+        logger.debug('%s:%d: skipped %r', self.filename, self.lineno, keyword)
+
+    def _skip_to(self, closing):
+        opening = '(' if closing == ')' else '{'
+        depth = 1
+        while depth:
+            kind = self.next()[0]
+            if kind == 'eof':
+                self.error(f'missing {closing!r}')
+            elif kind == opening:
+                depth += 1
+            elif kind == closing:
+                depth -= 1
+
+
+def _find_file(name, search_path, *, relative_to, lineno=None):
+    'Find a file included by or named in another'
+    if os.path.isabs(name):
+        candidates = [name]
+    else:
+        directories = [os.path.dirname(relative_to)] + list(search_path)
+        candidates = [os.path.join(directory, name)
+                      for directory in directories]
+    for candidate in candidates:
+        if os.path.isfile(candidate):
+            return candidate
+    where = relative_to if lineno is None else f'{relative_to}:{lineno}'
+    raise CaprotoValueError(f'{where}: cannot find {name!r} in '
+                            f'{os.pathsep.join(search_path) or "."}')
+
+
+class _FileReader:
+    'Reads each file once, keeping the digest of each as a dependency'
+    def __init__(self):
+        self.dependencies = {}
+        self._lines = {}
+
+    def lines(self, filename):
+        filename = os.path.abspath(filename)
+        if filename in self._lines:
+            return self._lines[filename]
+        with open(filename, 'rb') as f:
+            data = f.read()
+        self.dependencies[filename] = hashlib.sha256(data).hexdigest()
+        lines = self._lines[filename] = data.decode('latin-1').splitlines()
+        return lines
+
+
+def parse_database(lines, macros=None, *, filename='<string>',
+                   include_path=None, _reader=None):
+    '''
+    Parse the records of a database, one at a time
+
+    Parameters
+    ----------
+    lines : iterable of str
+        The lines of the database, such as an open file
+    macros : dict, optional
+        Macro name to value. Any other macro used by the database must have a
+        default.
+    filename : str, optional
+        Where the lines came from, for error messages and to find included
+        files relative to
+    include_path : list of str, optional
+        Directories to find included files in, after that of filename
+
+    Yields
+    ------
+    record : DatabaseRecord
+        Records may be yielded more than once, with fields to add; see
+        :func:`merge_records`.
+
+    Raises
+    ------
+    CaprotoValueError
+        For syntax errors, undefined macros and missing included files
+    '''
+    if macros is None:
+        macros = {}
+    include_path = list(include_path or [])
+    reader = _reader if _reader is not None else _FileReader()
+    tokens = _TokenStream(_tokenize(lines, macros, filename), filename)
+    while True:
+        kind, keyword, _ = tokens.next()
+        if kind == 'eof':
+            return
+        elif kind not in ('word', 'record'):
+            tokens.error(f'unexpected {keyword!r}')
+
+        if kind == 'record' or keyword in ('record', 'grecord'):
+            if kind == 'record':
+                record_type, name = keyword
+            else:
+                tokens.expect('(')
+                record_type = tokens.value()
+                tokens.expect(',')
+                name = tokens.value()
+                tokens.expect(')')
+            fields, info, aliases = {}, {}, []
+            if tokens.peek()[0] == '{':
+                tokens.next()
+                while True:
+                    kind, item, _ = tokens.next()
+                    if kind == 'item':
+                        item, item_name, value = item
+                        if item == 'field':
+                            fields[item_name] = value
+                        else:
+                            info[item_name] = value
+                        continue
+                    elif kind == '}':
+                        break
+                    tokens.expect('(')
+                    if item == 'field':
+                        field = tokens.value()
+                        tokens.expect(',')
+                        fields[field] = tokens.field_value()
+                    elif item == 'info':
+                        info_name = tokens.value()
+                        tokens.expect(',')
+                        info[info_name] = tokens.field_value()
+                    elif item == 'alias':
+                        aliases.append(tokens.value())
+                    else:
+                        tokens.error(f'unexpected {item!r} in record {name}')
+                    tokens.expect(')')
+            yield DatabaseRecord(name,
+                                 None if record_type == '*' else record_type,
+                                 fields, info, tuple(aliases))
+        elif keyword == 'alias':
+            tokens.expect('(')
+            name = tokens.value()
+            tokens.expect(',')
+            alias = tokens.value()
+            tokens.expect(')')
+            yield DatabaseRecord(name, None, {}, {}, (alias, ))
+        elif keyword == 'include':
+            included = _find_file(tokens.value(), include_path,
+                                  relative_to=filename, lineno=tokens.lineno)
+            yield from parse_database(reader.lines(included), macros,
+                                      filename=included,
+                                      include_path=include_path,
+                                      _reader=reader)
+        elif keyword in ('path', 'addpath'):
+            directories = tokens.value().split(os.pathsep)
+            if keyword == 'path':
+                include_path = directories
+            else:
+                include_path.extend(directories)
+        else:
+            # Menus, record types, devices and the like, of .dbd files
+            tokens.skip_definition(keyword)
+
+
+def _read_list(tokens):
+    'Values in braces, separated by commas or spaces'
+    tokens.expect('{')
+    values = []
+    while True:
+        kind, text, _ = tokens.peek()
+        if kind == '}':
+            tokens.next()
+            return values
+        elif kind == ',':
+            tokens.next()
+        else:
+            values.append(tokens.value())
+
+
+def _read_assignments(tokens):
+    'NAME=value pairs in braces, separated by commas or spaces'
+    tokens.expect('{')
+    assignments = {}
+    while True:
+        kind, text, _ = tokens.peek()
+        if kind == '}':
+            tokens.next()
+            return assignments
+        elif kind == ',':
+            tokens.next()
+        else:
+            name = tokens.value()
+            tokens.expect('=')
+            assignments[name] = tokens.value()
+
+
+def parse_substitutions(lines, macros=None, *, filename='<string>'):
+    '''
+    Parse a substitutions file, as read by ``dbLoadTemplate`` or ``msi``
+
+    Both the ``pattern`` form and the ``{NAME=value, ...}`` form are supported,
+    as are ``global`` definitions.
+
+    Parameters
+    ----------
+    lines : iterable of str
+    macros : dict, optional
+        Macros for all instances, which the file may override
+    filename : str, optional
+
+    Yields
+    ------
+    template : str
+        The file to load, as named in the substitutions file
+    macros : dict
+        The macros of this instance of it
+    '''
+    global_macros = dict(macros or {})
+    tokens = _TokenStream(_tokenize(lines, None, filename), filename)
+    while True:
+        kind, keyword, _ = tokens.next()
+        if kind == 'eof':
+            return
+        elif keyword == 'global':
+            global_macros.update(_read_assignments(tokens))
+            continue
+        elif keyword != 'file':
+            tokens.error(f'unexpected {keyword!r}')
+
+        template = tokens.value()
+        block_macros = dict(global_macros)
+        pattern = None
+        tokens.expect('{')
+        while True:
+            kind, text, _ = tokens.peek()
+            if kind == '}':
+                tokens.next()
+                break
+            elif kind == '{':
+                if pattern is None:
+                    instance = _read_assignments(tokens)
+                else:
+                    values = _read_list(tokens)
+                    if len(values) != len(pattern):
+                        tokens.error(f'{len(values)} values for a pattern of '
+                                     f'{len(pattern)}')
+                    instance = dict(zip(pattern, values))
+                yield template, dict(block_macros, **instance)
+            elif text == 'pattern':
+                tokens.next()
+                pattern = _read_list(tokens)
+            elif text == 'global':
+                tokens.next()
+                block_macros.update(_read_assignments(tokens))
+            else:
+                tokens.error(f'unexpected {text!r} in file {template}')
+
+
+def merge_records(records):
+    '''
+    Combine the records given more than once, as an IOC would
+
+    Fields and info items given later replace those given earlier, and aliases
+    are added.
+
+    Parameters
+    ----------
+    records : iterable of DatabaseRecord
+
+    Returns
+    -------
+    records : list of DatabaseRecord
+        One per record name, in the order in which they were first given
+    '''
+    merged = {}
+    for record in records:
+        entry = merged.get(record.name)
+        if entry is None:
+            if record.record_type is None:
+                raise CaprotoValueError(f'Record {record.name!r} is not '
+                                        f'defined')
+            merged[record.name] = [record.record_type, record.fields,
+                                   record.info, list(record.aliases)]
+            continue
+        if record.record_type not in (None, entry[0]):
+            raise CaprotoValueError(f'Record {record.name!r} of type '
+                                    f'{entry[0]} redefined as '
+                                    f'{record.record_type}')
+        entry[1] = dict(entry[1], **record.fields)
+        entry[2] = dict(entry[2], **record.info)
+        entry[3].extend(alias for alias in record.aliases
+                        if alias not in entry[3])
+    return [DatabaseRecord(name, record_type, fields, info, tuple(aliases))
+            for name, (record_type, fields, info, aliases) in merged.items()]
+
+
+def _cache_filename(filename, macros, include_path, cache_dir):
+    with open(filename, 'rb') as f:
+        digest = hashlib.sha256(f.read()).hexdigest()
+    key = repr((CACHE_VERSION, os.path.abspath(filename), digest,
+                sorted(macros.items()), list(include_path or [])))
+    key = hashlib.sha256(key.encode('utf-8')).hexdigest()
+    return os.path.join(os.path.expanduser(cache_dir), f'{key}.pickle')
+
+
+def _load_cache(cache_filename):
+    'The cached records, if the files they came from are unchanged'
+    try:
+        with open(cache_filename, 'rb') as f:
+            version, dependencies, records = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as ex:
+        logger.warning('Ignoring unreadable database cache %s: %s',
+                       cache_filename, ex)
+        return None
+    if version != CACHE_VERSION:
+        return None
+    for filename, digest in dependencies.items():
+        try:
+            with open(filename, 'rb') as f:
+                if hashlib.sha256(f.read()).hexdigest() != digest:
+                    return None
+        except OSError:
+            return None
+    return records
+
+
+def _save_cache(cache_filename, dependencies, records):
+    try:
+        os.makedirs(os.path.dirname(cache_filename), exist_ok=True)
+        temporary = f'{cache_filename}.{os.getpid()}'
+        with open(temporary, 'wb') as f:
+            pickle.dump((CACHE_VERSION, dependencies, records), f,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary, cache_filename)
+    except OSError as ex:
+        logger.warning('Failed to write database cache %s: %s',
+                       cache_filename, ex)
+
+
+def read_database(filename, macros=None, *, include_path=None,
+                  cache_dir=None):
+    '''
+    Read the records of a database or substitutions file
+
+    Parameters
+    ----------
+    filename : str
+        A database (.db or .template) file, or a substitutions file (with
+        an extension of SUBSTITUTIONS_EXTENSIONS), whose templates are found
+        relative to it or on include_path
+    macros : dict, optional
+    include_path : list of str, optional
+        Directories to find included files and templates in
+    cache_dir : str, optional
+        Where to cache the parsed records, keyed on the contents of the file
+        and the macros
+
+    Returns
+    -------
+    records : list of DatabaseRecord
+        One per record, as from :func:`merge_records`
+    '''
+    filename = os.fspath(filename)
+    macros = dict(macros or {})
+    if cache_dir is not None:
+        cache_filename = _cache_filename(filename, macros, include_path,
+                                         cache_dir)
+        records = _load_cache(cache_filename)
+        if records is not None:
+            logger.debug('Loaded %d records of %s from cache %s',
+                         len(records), filename, cache_filename)
+            return records
+
+    reader = _FileReader()
+    lines = reader.lines(filename)
+    if filename.endswith(SUBSTITUTIONS_EXTENSIONS):
+        def parse():
+            for template, instance_macros in parse_substitutions(
+                    lines, macros, filename=filename):
+                template = _find_file(
+                    substitute_macros(template, instance_macros),
+                    include_path or [], relative_to=filename)
+                yield from parse_database(
+                    reader.lines(template), instance_macros,
+                    filename=template, include_path=include_path,
+                    _reader=reader)
+        records = merge_records(parse())
+    else:
+        records = merge_records(
+            parse_database(lines, macros, filename=filename,
+                           include_path=include_path, _reader=reader))
+
+    if cache_dir is not None:
+        _save_cache(cache_filename, reader.dependencies, records)
+    return records
+
+
+def value_from_string(text, data_type, *, enum_strings=()):
+    '''
+    Convert the value of a field, as given in a database, to its data type
+
+    Raises
+    ------
+    ValueError, IndexError
+        If text is not a value of the data type
+    '''
+    if data_type in (ChannelType.STRING, ChannelType.CHAR):
+        return text
+    elif data_type == ChannelType.ENUM:
+        if text in enum_strings:
+            return text
+        return enum_strings[int(text)]
+    elif text.startswith('['):
+        return json.loads(text)
+    elif data_type in (ChannelType.DOUBLE, ChannelType.FLOAT):
+        return float(text)
+    try:
+        return int(text, 0)
+    except ValueError:
+        return int(float(text))
+
+
+def set_field_values(fields, values):
+    '''
+    Set the values of the fields of a record, as given in a database
+
+    Called as the record fields of a loaded record are instantiated. Fields
+    which the record type does not have, and values which are not valid for
+    their field, are logged and ignored.
+
+    Parameters
+    ----------
+    fields : RecordFieldGroup
+    values : dict
+        Field name to value, as text. VAL, the value of the record itself, is
+        skipped.
+    '''
+    pvdb = fields.pvdb
+    for field, text in values.items():
+        if field == 'VAL':
+            # The value of the record itself
+            continue
+        try:
+            channeldata = pvdb[field]
+        except KeyError:
+            logger.warning('%s: record type %s has no field %s',
+                           fields.parent.pvname, fields._record_type, field)
+            continue
+        if not text and channeldata.data_type != ChannelType.STRING:
+            continue
+        try:
+            value = value_from_string(
+                text, channeldata.data_type,
+                enum_strings=getattr(channeldata, 'enum_strings', ()))
+        except (ValueError, IndexError):
+            logger.warning('%s.%s: invalid value %r', fields.parent.pvname,
+                           field, text)
+            continue
+        channeldata._data['value'] = value
+
+
+# Record types with array (or long string) values: the field giving their
+# element type (or the type), the field giving their maximum length, and its
+# default
+_ARRAY_RECORDS = {
+    'aai': ('FTVL', 'NELM', 1),
+    'aao': ('FTVL', 'NELM', 1),
+    'compress': (ChannelType.DOUBLE, 'NSAM', 1),
+    'histogram': (ChannelType.LONG, 'NELM', 1),
+    'lsi': (ChannelType.CHAR, 'SIZV', 41),
+    'lso': (ChannelType.CHAR, 'SIZV', 41),
+    'printf': (ChannelType.CHAR, 'SIZV', 41),
+    'subArray': ('FTVL', 'MALM', 1),
+    'waveform': ('FTVL', 'NELM', 1),
+}
+# menuFtype, the element types of arrays
+_FTVL_TYPES = {
+    'STRING': ChannelType.STRING,
+    'CHAR': ChannelType.CHAR,
+    'UCHAR': ChannelType.CHAR,
+    'SHORT': ChannelType.INT,
+    'USHORT': ChannelType.LONG,
+    'LONG': ChannelType.LONG,
+    'ULONG': ChannelType.LONG,
+    'INT64': ChannelType.LONG,
+    'UINT64': ChannelType.LONG,
+    'FLOAT': ChannelType.FLOAT,
+    'DOUBLE': ChannelType.DOUBLE,
+    'ENUM': ChannelType.ENUM,
+}
+_ENUM_STRING_FIELDS = {
+    'bi': ('ZNAM', 'ONAM'),
+    'bo': ('ZNAM', 'ONAM'),
+    'mbbi': ('ZRST', 'ONST', 'TWST', 'THST', 'FRST', 'FVST', 'SXST', 'SVST',
+             'EIST', 'NIST', 'TEST', 'ELST', 'TVST', 'TTST', 'FTST', 'FFST'),
+}
+_ENUM_STRING_FIELDS['mbbo'] = _ENUM_STRING_FIELDS['mbbi']
+# Fields which the record fields read from the ChannelData of the record
+_LIMIT_FIELDS = {
+    'HOPR': 'upper_ctrl_limit',
+    'LOPR': 'lower_ctrl_limit',
+    'HIHI': 'upper_alarm_limit',
+    'HIGH': 'upper_warning_limit',
+    'LOW': 'lower_warning_limit',
+    'LOLO': 'lower_alarm_limit',
+}
+_NUMERIC_TYPES = (ChannelType.INT, ChannelType.LONG, ChannelType.FLOAT,
+                  ChannelType.DOUBLE)
+
+
+def _record_value_spec(record, field_class):
+    'The data type, maximum length and class kwargs of the value of a record'
+    fields = record.fields
+    kwargs = {}
+    max_length = None
+    try:
+        dtype, length_field, default_length = _ARRAY_RECORDS[
+            record.record_type]
+    except KeyError:
+        dtype = field_class._dtype
+    else:
+        if isinstance(dtype, str):
+            dtype = _FTVL_TYPES[fields.get(dtype) or 'STRING']
+        max_length = int(fields.get(length_field) or default_length)
+        if record.record_type in ('lsi', 'lso', 'printf'):
+            kwargs['report_as_string'] = True
+
+    if dtype == ChannelType.ENUM:
+        names = [fields.get(field, '')[:MAX_ENUM_STRING_SIZE - 1]
+                 for field in _ENUM_STRING_FIELDS.get(record.record_type, ())]
+        while len(names) > 2 and not names[-1]:
+            names.pop()
+        kwargs['enum_strings'] = tuple(names or ('', ))
+    elif dtype in _NUMERIC_TYPES:
+        convert = (float if dtype in (ChannelType.FLOAT, ChannelType.DOUBLE)
+                   else lambda text: int(float(text)))
+        for field, kwarg in _LIMIT_FIELDS.items():
+            if fields.get(field):
+                kwargs[kwarg] = convert(fields[field])
+        if fields.get('EGU'):
+            kwargs['units'] = fields['EGU']
+        if fields.get('PREC') and dtype in (ChannelType.FLOAT,
+                                            ChannelType.DOUBLE):
+            kwargs['precision'] = int(fields['PREC'])
+    return dtype, max_length, kwargs
+
+
+def channeldata_from_record(group, record, pvname, *, record_types=None):
+    '''
+    Create a ChannelData instance for a record of a database
+
+    Parameters
+    ----------
+    group : PVGroup
+        The group the instance belongs to
+    record : DatabaseRecord
+    pvname : str
+    record_types : dict, optional
+        Record type name to fields class; defaults to
+        ``caproto.server.records.records``
+
+    Returns
+    -------
+    channeldata : PvpropertyData
+    '''
+    if record_types is None:
+        from .records import records as record_types
+    try:
+        field_class = record_types[record.record_type]
+    except KeyError:
+        raise CaprotoValueError(f'Record {record.name!r} is of unsupported '
+                                f'type {record.record_type!r}') from None
+    try:
+        dtype, max_length, kwargs = _record_value_spec(record, field_class)
+        text = record.fields.get('VAL')
+        if text:
+            value = value_from_string(
+                text, dtype, enum_strings=kwargs.get('enum_strings', ()))
+        elif dtype == ChannelType.ENUM:
+            value = kwargs['enum_strings'][0]
+        else:
+            value = group.default_values[dtype]
+    except (ValueError, IndexError, KeyError) as ex:
+        raise CaprotoValueError(f'Invalid field of record {record.name!r}: '
+                                f'{ex}') from ex
+
+    doc = record.fields.get('DESC') or None
+    pvspec = PVSpec(attr=record.name, name=record.name, dtype=dtype,
+                    value=value, max_length=max_length,
+                    alarm_group=record.name, read_only=False, doc=doc,
+                    cls_kwargs=kwargs)
+    cls = group.type_map[dtype]
+    inst = cls(group=group, pvspec=pvspec, value=value, max_length=max_length,
+               alarm=group.alarms[record.name], pvname=pvname,
+               record=record.record_type, **kwargs)
+    inst.__doc__ = doc
+    if record.fields:
+        # Set (all but VAL) as the fields are instantiated
+        inst._initial_field_values = record.fields
+    return inst
+
+
+class DatabaseGroup(PVGroup):
+    '''
+    A group of the records of a database
+
+    Each record is a ChannelData instance of the data type of its value, with
+    the fields of its record type (see :mod:`caproto.server.records`).
+
+    Parameters
+    ----------
+    prefix : str, optional
+        Prefix for the names of all records; usually empty, as the database
+        gives full names
+    records : list of DatabaseRecord
+        As from :func:`read_database`
+    macros : dict, optional
+    parent : PVGroup, optional
+    name : str, optional
+    '''
+    def __init__(self, prefix='', *, records, macros=None, parent=None,
+                 name=None):
+        self.records = records
+        super().__init__(prefix, macros=macros, parent=parent, name=name)
+
+    def _create_pvdb(self):
+        from .records import records as record_types
+        super()._create_pvdb()
+        for record in self.records:
+            pvname = self.prefix + record.name
+            channeldata = channeldata_from_record(self, record, pvname,
+                                                  record_types=record_types)
+            for name in (pvname, ) + tuple(self.prefix + alias
+                                           for alias in record.aliases):
+                if name in self.pvdb:
+                    raise CaprotoRuntimeError(f'{name} defined multiple '
+                                              f'times')
+                self.pvdb[name] = channeldata
+            self.attr_pvdb[record.name] = channeldata
+            self.attr_to_pvname[record.name] = pvname
+
+
+def load_database(*filenames, macros=None, prefix='', include_path=None,
+                  cache_dir=None):
+    '''
+    Load the records of database and substitutions files
+
+    Parameters
+    ----------
+    *filenames : str
+        Database (.db or .template) or substitutions files, loaded in order
+    macros : dict, optional
+        Macros for all of the files
+    prefix : str, optional
+        Prefix for the names of all records
+    include_path : list of str, optional
+        Directories to find included files and templates in
+    cache_dir : str, optional
+        Where to cache the parsed records of each file
+
+    Returns
+    -------
+    group : DatabaseGroup
+        Serve ``group.pvdb``
+    '''
+    records = merge_records(
+        record
+        for filename in filenames
+        for record in read_database(filename, macros,
+                                    include_path=include_path,
+                                    cache_dir=cache_dir))
+    return DatabaseGroup(prefix, records=records)
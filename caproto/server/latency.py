@@ -0,0 +1,419 @@
+'''
+Per-request latency histograms of the server command pipeline
+
+When recording is started (:func:`start_latency_recording`, or an IOC's
+``--latency-sample-rate`` option), every server circuit time-stamps a sample
+of the requests it receives as they pass through the stages of its command
+pipeline:
+
+============== ============================================================
+Stage          Time stamped
+============== ============================================================
+``recv``       The bytes of the request were received from the socket.
+``dequeue``    The request was taken from the circuit's command queue.
+``auth_enter`` ``ChannelData.auth_read`` or ``auth_write`` was called.
+``auth_exit``  ``auth_read`` or ``auth_write`` returned.
+``converted``  The response was built, serializing the value for the wire.
+``sent``       The response was handed to the socket.
+============== ============================================================
+
+The time between consecutive stages is recorded in a histogram for the
+interval ending at the later stage: ``queue`` (waiting in the command queue),
+``dispatch`` (including waiting for a write in progress), ``auth`` (the
+getter or putter and value conversion in ChannelData), ``convert``, ``send``
+(including waiting for socket backpressure and the other circuits), and
+``total``, per type of command and per PV. Requests which do not read or
+write skip the ``auth`` stages, so that their ``convert`` interval covers all
+of their processing.
+
+The histograms are HDR-style: log-linear buckets of microseconds, with a
+bounded relative error, so that percentiles remain accurate from microseconds
+to seconds in little memory. Write them to a JSON file with
+:meth:`LatencyRecorder.dump` (or an IOC's ``--latency-dump`` option) and
+summarize them with ``caproto-latency``.
+'''
+import json
+import time
+
+from .._utils import CaprotoRuntimeError
+
+__all__ = ('Histogram', 'LatencyRecorder', 'start_latency_recording',
+           'stop_latency_recording', 'get_latency_recorder',
+           'load_latency_dump', 'format_latency')
+
+# The recorder to which server circuits report, if any
+current_recorder = None
+
+# Default fraction of requests to time
+LATENCY_SAMPLE_RATE = 0.01
+# Buckets per power of two are 2 ** (SIGNIFICANT_BITS - 1), bounding the
+# relative error of a recorded value to 2 ** -(SIGNIFICANT_BITS - 1).
+SIGNIFICANT_BITS = 7
+
+STAGES = ('recv', 'dequeue', 'auth_enter', 'auth_exit', 'converted', 'sent')
+# Name of the interval ending at each stage
+INTERVALS = {'dequeue': 'queue', 'auth_enter': 'dispatch', 'auth_exit': 'auth',
+             'converted': 'convert', 'sent': 'send'}
+# Percentiles shown by format_latency
+PERCENTILES = (50, 90, 99, 99.9)
+
+
+class Histogram:
+    '''
+    A log-linear histogram of durations, in the manner of HdrHistogram
+
+    Durations are recorded in whole microseconds. Those below
+    ``2 ** significant_bits`` microseconds are exact; larger ones fall into
+    buckets no wider than ``2 ** -(significant_bits - 1)`` of their value.
+
+    Parameters
+    ----------
+    significant_bits : int, optional
+        Defaults to ``SIGNIFICANT_BITS``
+    '''
+    def __init__(self, significant_bits=SIGNIFICANT_BITS):
+        self.significant_bits = significant_bits
+        self.counts = {}  # map bucket index to count
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def _index(self, value):
+        bits = self.significant_bits
+        shift = value.bit_length() - bits
+        if shift <= 0:
+            return value
+        # value >> shift has its top bit set, so buckets of successive
+        # shifts are contiguous.
+        return (shift << (bits - 1)) + (value >> shift)
+
+    def _bounds(self, index):
+        'Lowest and highest value of a bucket'
+        bits = self.significant_bits
+        if index < 2 ** bits:
+            return index, index
+        shift = (index >> (bits - 1)) - 1
+        top = index - (shift << (bits - 1))
+        return top << shift, ((top + 1) << shift) - 1
+
+    def record(self, seconds):
+        'Record a duration'
+        value = max(0, int(seconds * 1e6))
+        index = self._index(value)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        'Add the counts of another histogram with the same significant_bits'
+        if other.significant_bits != self.significant_bits:
+            raise ValueError('Histograms differ in significant_bits')
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.count += other.count
+        self.total += other.total
+        for attr, func in (('min', min), ('max', max)):
+            values = [value for value in (getattr(self, attr),
+                                          getattr(other, attr))
+                      if value is not None]
+            setattr(self, attr, func(values) if values else None)
+
+    @property
+    def mean(self):
+        'Mean duration in seconds'
+        return self.total / self.count / 1e6 if self.count else 0.0
+
+    def percentile(self, percent):
+        '''
+        Duration in seconds below which ``percent`` of those recorded fall
+
+        Returns the middle of the bucket in which the percentile falls, bounded
+        by the smallest and largest durations recorded.
+        '''
+        if not self.count:
+            return 0.0
+        target = max(1, percent / 100 * self.count)
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= target:
+                break
+        low, high = self._bounds(index)
+        value = min(max((low + high) / 2, self.min), self.max)
+        return value / 1e6
+
+    def to_dict(self):
+        return {'significant_bits': self.significant_bits,
+                'counts': {str(index): count
+                           for index, count in sorted(self.counts.items())},
+                'total': self.total, 'min': self.min, 'max': self.max}
+
+    @classmethod
+    def from_dict(cls, d):
+        histogram = cls(d['significant_bits'])
+        histogram.counts = {int(index): count
+                            for index, count in d['counts'].items()}
+        histogram.count = sum(histogram.counts.values())
+        histogram.total = d['total']
+        histogram.min = d['min']
+        histogram.max = d['max']
+        return histogram
+
+    def __repr__(self):
+        return (f'<Histogram count={self.count} '
+                f'p50={self.percentile(50):.6f} max={self.percentile(100):.6f}>')
+
+
+class RequestTiming:
+    '''
+    The time stamps of one sampled request
+
+    Parameters
+    ----------
+    command : caproto.Message
+    recv_time : float
+        ``time.monotonic()`` when the request was received
+    '''
+    __slots__ = ('command', 'marks', 'pending')
+
+    def __init__(self, command, recv_time):
+        self.command = command
+        self.marks = [('recv', recv_time)]
+        # Set while another task (such as a write) is to finish the timing
+        self.pending = False
+
+    def mark(self, stage):
+        'Time-stamp a stage'
+        self.marks.append((stage, time.monotonic()))
+
+
+class LatencyRecorder:
+    '''
+    Aggregates the timings of sampled requests into histograms
+
+    Parameters
+    ----------
+    sample_rate : float, optional
+        Fraction of requests to time, from 0 to 1. Every ``1 / sample_rate``-th
+        request is timed. Defaults to ``LATENCY_SAMPLE_RATE``.
+    significant_bits : int, optional
+        Of the histograms. Defaults to ``SIGNIFICANT_BITS``.
+
+    Attributes
+    ----------
+    by_command : dict
+        Maps command type name to a dict mapping interval name to Histogram
+    by_pv : dict
+        Maps PV name to a dict mapping interval name to Histogram
+    '''
+    def __init__(self, sample_rate=LATENCY_SAMPLE_RATE, *,
+                 significant_bits=SIGNIFICANT_BITS):
+        if not 0 < sample_rate <= 1:
+            raise ValueError('sample_rate must be greater than 0 and at most 1')
+        self.sample_rate = sample_rate
+        self.significant_bits = significant_bits
+        self._interval = max(1, round(1 / sample_rate))
+        self._countdown = 1
+        self.requests = 0
+        self.sampled = 0
+        self.by_command = {}
+        self.by_pv = {}
+
+    def sample(self, commands):
+        '''
+        Choose which of the commands just received to time
+
+        Returns
+        -------
+        timings : list of RequestTiming
+        '''
+        self.requests += len(commands)
+        timings = []
+        countdown = self._countdown - len(commands)
+        if countdown <= 0:
+            recv_time = time.monotonic()
+            # Sample every _interval-th command across calls.
+            for i in range(self._countdown - 1, len(commands), self._interval):
+                timings.append(RequestTiming(commands[i], recv_time))
+            countdown %= self._interval
+        self._countdown = countdown or self._interval
+        return timings
+
+    def _histograms(self, table, key):
+        try:
+            return table[key]
+        except KeyError:
+            histograms = table[key] = {}
+            return histograms
+
+    def _record(self, histograms, interval, duration):
+        try:
+            histogram = histograms[interval]
+        except KeyError:
+            histogram = histograms[interval] = Histogram(self.significant_bits)
+        histogram.record(duration)
+
+    def record(self, timing, pvname=None):
+        '''
+        Record the intervals between the stages of a finished request
+
+        Parameters
+        ----------
+        timing : RequestTiming
+        pvname : str, optional
+        '''
+        self.sampled += 1
+        tables = [self._histograms(self.by_command,
+                                   type(timing.command).__name__)]
+        if pvname is not None:
+            tables.append(self._histograms(self.by_pv, pvname))
+        marks = timing.marks
+        for (_, start), (stage, end) in zip(marks, marks[1:]):
+            for histograms in tables:
+                self._record(histograms, INTERVALS[stage], end - start)
+        for histograms in tables:
+            self._record(histograms, 'total', marks[-1][1] - marks[0][1])
+
+    def reset(self):
+        'Forget all timings recorded so far'
+        self.requests = 0
+        self.sampled = 0
+        self.by_command.clear()
+        self.by_pv.clear()
+
+    def to_dict(self):
+        return {'sample_rate': self.sample_rate,
+                'requests': self.requests,
+                'sampled': self.sampled,
+                'by_command': _tables_to_dict(self.by_command),
+                'by_pv': _tables_to_dict(self.by_pv)}
+
+    def dump(self, file):
+        '''
+        Write the histograms to a JSON file
+
+        Parameters
+        ----------
+        file : str or text file-like object
+        '''
+        if isinstance(file, str):
+            with open(file, 'w') as f:
+                return self.dump(f)
+        json.dump(self.to_dict(), file)
+
+
+def _tables_to_dict(tables):
+    return {key: {interval: histogram.to_dict()
+                  for interval, histogram in histograms.items()}
+            for key, histograms in tables.items()}
+
+
+def load_latency_dump(file):
+    '''
+    Read a file written by :meth:`LatencyRecorder.dump`
+
+    Parameters
+    ----------
+    file : str or text file-like object
+
+    Returns
+    -------
+    recorder : LatencyRecorder
+        Holding the histograms of the dump; it is not recording.
+    '''
+    if isinstance(file, str):
+        with open(file) as f:
+            return load_latency_dump(f)
+    d = json.load(file)
+    recorder = LatencyRecorder(d['sample_rate'])
+    recorder.requests = d['requests']
+    recorder.sampled = d['sampled']
+    for attr in ('by_command', 'by_pv'):
+        table = getattr(recorder, attr)
+        for key, histograms in d[attr].items():
+            table[key] = {interval: Histogram.from_dict(histogram)
+                          for interval, histogram in histograms.items()}
+    return recorder
+
+
+def format_latency(recorder, *, by='command', percentiles=PERCENTILES):
+    '''
+    Format the histograms of a recorder as a table, in milliseconds
+
+    Parameters
+    ----------
+    recorder : LatencyRecorder
+    by : {'command', 'pv'}, optional
+    percentiles : sequence of float, optional
+    '''
+    table = {'command': recorder.by_command, 'pv': recorder.by_pv}[by]
+    intervals = ['queue', 'dispatch', 'auth', 'convert', 'send', 'total']
+    width = max([len(by), *map(len, table)])
+    header = ([f'{by:<{width}}', f'{"interval":<8}', f'{"count":>8}'] +
+              [f'{"p" + format(p, "g"):>9}' for p in percentiles] +
+              [f'{"max":>9}'])
+    lines = [f'{recorder.sampled} of {recorder.requests} requests sampled '
+             f'(rate {recorder.sample_rate:g}); durations in ms',
+             '  '.join(header)]
+    for key in sorted(table):
+        histograms = table[key]
+        for interval in intervals:
+            histogram = histograms.get(interval)
+            if histogram is None:
+                continue
+            values = [histogram.percentile(p) for p in percentiles]
+            values.append(histogram.max / 1e6)
+            lines.append('  '.join(
+                [f'{key:<{width}}', f'{interval:<8}',
+                 f'{histogram.count:>8}'] +
+                [f'{1e3 * value:>9.3f}' for value in values]))
+    return '\n'.join(lines)
+
+
+def start_latency_recording(sample_rate=LATENCY_SAMPLE_RATE, **kwargs):
+    '''
+    Time a sample of the requests of all servers in this process
+
+    Parameters
+    ----------
+    sample_rate : float, optional
+        Fraction of requests to time. Defaults to ``LATENCY_SAMPLE_RATE``.
+    **kwargs :
+        Passed to :class:`LatencyRecorder`
+
+    Returns
+    -------
+    recorder : LatencyRecorder
+    '''
+    global current_recorder
+    if current_recorder is not None:
+        raise CaprotoRuntimeError('Latency recording is already started; '
+                                  'call stop_latency_recording() first')
+    current_recorder = LatencyRecorder(sample_rate, **kwargs)
+    return current_recorder
+
+
+def stop_latency_recording():
+    '''
+    Stop the recording started by :func:`start_latency_recording`, if any
+
+    Returns
+    -------
+    recorder : LatencyRecorder or None
+        With the histograms recorded
+    '''
+    global current_recorder
+    recorder, current_recorder = current_recorder, None
+    return recorder
+
+
+def get_latency_recorder():
+    """
+    Return the recorder started by :func:`start_latency_recording`, or ``None``.
+    """
+    return current_recorder
@@ -0,0 +1,632 @@
+'''
+Process record links (INP, DOL, OUT and FLNK) within the server
+
+The link fields of records are otherwise inert strings. :class:`LinkEngine`
+resolves them, once, against the ChannelData of a pvdb and then processes
+records as an EPICS IOC would, without going through Channel Access::
+
+    from caproto.server import run
+    from caproto.server.database import load_database
+    from caproto.server.links import LinkEngine
+
+    db = load_database('motors.db', macros={'P': 'XF:31ID:'})
+    engine = LinkEngine(db.pvdb)
+    run(db.pvdb, module_name='caproto.asyncio.server')
+
+Writing to a record (or to its ``PROC`` field) processes it: its input link
+(``INP``, or ``DOL`` when ``OMSL`` is ``closed_loop``) is read, its value is
+written to its output link (``OUT``) and its forward link (``FLNK``) is
+followed. The records reached from there - by forward links, output links
+with ``PP``, input links with ``PP`` of records to be processed, and input
+links with ``CP`` or ``CPP`` of those whose value changes - make up a
+processing chain, which is processed in topological order. Subscribers get one
+update per record per chain, once all of it has been processed.
+
+Links which do not resolve to a ChannelData of the pvdb (and those with the
+``CA`` modifier) are made over Channel Access, with a threading client.
+Constant, hardware (``@...``) and JSON links are not links to other records,
+and are ignored.
+'''
+import functools
+import logging
+from collections import namedtuple
+
+from .. import (AlarmSeverity, AlarmStatus, CaprotoValueError, ChannelEnum,
+                ChannelType, parse_record_field)
+from .._circuit import STRING_ENCODING
+
+__all__ = ('Link', 'LinkEngine', 'parse_link')
+logger = logging.getLogger(__name__)
+
+# ** Tuning this parameter will affect the responsiveness of the server **
+# How long, in seconds, a write to a Channel Access output or forward link may
+# wait for its channel to connect. These writes are made from a worker thread
+# and do not hold up the processing of other records.
+CA_LINK_TIMEOUT = 2.0
+
+_PROCESS_MODIFIERS = ('NPP', 'PP', 'CP', 'CPP')
+_SEVERITY_MODIFIERS = ('NMS', 'MS', 'MSS', 'MSI')
+
+Link = namedtuple('Link', 'pvname process severity ca')
+Link.__doc__ = '''
+A link to another record (or a field of one), as in ``INP``, ``OUT`` or
+``FLNK``
+
+Parameters
+----------
+pvname : str
+    The linked record, as ``record`` or ``record.FIELD``
+process : {'NPP', 'PP', 'CP', 'CPP'}
+    Whether the record is processed when linked
+severity : {'NMS', 'MS', 'MSS', 'MSI'}
+    Whether the alarm severity of an input link is maximized into the record
+ca : bool
+    True if the link must be made over Channel Access
+'''
+
+# The resolved links of one record.  Each of input, output and forward is a
+# ChannelData (local), a _ChannelAccessLink, or None.
+_RecordLinks = namedtuple('_RecordLinks',
+                          'input input_link output forward')
+
+
+def parse_link(text):
+    '''
+    Parse the text of a database link field
+
+    Parameters
+    ----------
+    text : str
+        As in ``'XF:31ID:temp.VAL PP MS'``
+
+    Returns
+    -------
+    link : Link or None
+        None for empty, constant, hardware and JSON links
+
+    Raises
+    ------
+    CaprotoValueError
+        If a modifier is unknown
+    '''
+    text = str(text).strip()
+    if not text or text[0] in '@#{"':
+        return None
+    try:
+        float(text)
+    except ValueError:
+        ...
+    else:
+        return None
+
+    pvname, *modifiers = text.split()
+    process, severity, ca = 'NPP', 'NMS', False
+    for modifier in modifiers:
+        if modifier in _PROCESS_MODIFIERS:
+            process = modifier
+        elif modifier in _SEVERITY_MODIFIERS:
+            severity = modifier
+        elif modifier == 'CA':
+            ca = True
+        else:
+            raise CaprotoValueError(
+                f'Unknown link modifier {modifier!r} in {text!r}')
+    return Link(pvname, process, severity, ca)
+
+
+def _field_text(instance, field):
+    'The text of a record field, without instantiating the record fields'
+    field_inst = instance._field_inst
+    if field_inst is not None:
+        try:
+            return str(field_inst.pvdb[field].value)
+        except KeyError:
+            return ''
+    values = instance._initial_field_values
+    if values:
+        return values.get(field, '')
+    return ''
+
+
+def _convert_value(value, source, target):
+    'Convert a value read from source for writing to target'
+    if isinstance(source, ChannelEnum) and not isinstance(target,
+                                                          ChannelEnum):
+        try:
+            value = source.enum_strings.index(value)
+        except ValueError:
+            ...
+    if isinstance(target, ChannelEnum):
+        if isinstance(value, float):
+            value = int(value)
+    elif isinstance(target.value, str) and not isinstance(value, str):
+        # Strings and long strings (as in DESC)
+        value = str(value)
+    return value
+
+
+class _ChannelAccessLink:
+    '''
+    A link made over Channel Access, with a threading client
+
+    Input links are subscribed to; the latest value and alarm state are kept
+    for the record to read when processed.
+    '''
+
+    def __init__(self, context, pvname, *, subscribe):
+        self.pvname = pvname
+        self.value = None
+        self.status = AlarmStatus.NO_ALARM
+        self.severity = AlarmSeverity.NO_ALARM
+        self.callbacks = []
+        self.pv, = context.get_pvs(pvname)
+        self.subscription = None
+        if subscribe:
+            self.subscription = self.pv.subscribe(data_type='time')
+            self.subscription.add_callback(self._update)
+
+    def __repr__(self):
+        return f'<_ChannelAccessLink {self.pvname!r} value={self.value!r}>'
+
+    def _update(self, sub, response):
+        data = response.data
+        if response.data_type == ChannelType.TIME_STRING:
+            data = [item.decode(STRING_ENCODING)
+                    if isinstance(item, bytes) else item for item in data]
+        self.value = data[0] if len(data) == 1 else data
+        self.status = response.metadata.status
+        self.severity = response.metadata.severity
+        for callback in self.callbacks:
+            callback(self)
+
+    def write(self, value):
+        self.pv.write(value, wait=False, timeout=CA_LINK_TIMEOUT)
+
+
+class LinkEngine:
+    '''
+    Resolve and process the links of the records of a pvdb
+
+    Links are resolved once, here; the records which are the start of a
+    processing chain have their ``write`` wrapped so that writing to them
+    processes the chain. Make the engine before starting the server, which
+    connects the links made over Channel Access in its startup hooks.
+
+    Parameters
+    ----------
+    pvdb : dict
+        Maps PV names to ChannelData, as served. Records are those instances
+        with a ``record_type``, such as those of
+        :func:`caproto.server.database.load_database`.
+    ca_context : caproto.threading.client.Context, optional
+        Client context for the links made over Channel Access. One is made if
+        needed and not given.
+
+    Raises
+    ------
+    CaprotoValueError
+        If a link modifier is unknown, or if the links form a cycle
+    '''
+
+    def __init__(self, pvdb, *, ca_context=None):
+        self.pvdb = pvdb
+        self.ca_context = ca_context
+        self._owns_ca_context = False
+        self._async_lib = None
+        # All of the below are keyed on id(instance)
+        self._nodes = {}
+        self._names = {}
+        self.links = {}
+        # Records processed before, and after, each record is processed
+        self._before = {}
+        self._process_next = {}
+        # Instances written to by the output link of a record
+        self._changes = {}
+        # Records processed when an instance changes (CP and CPP input links)
+        self._monitors = {}
+        self._rank = {}
+        self._chains = {}
+        # Depth of nested chains and accumulated flags, for deferred publishes
+        self._deferred = {}
+        # Records whose alarm was raised by an input link, to its status
+        self._link_alarms = {}
+        # Queues of records processed by CP input links over Channel Access
+        self._queues = {}
+        self.ca_links = []
+        self._resolve()
+        self._rank_nodes()
+        self._install_hooks()
+
+    def __repr__(self):
+        return (f'<LinkEngine records={len(self.links)} '
+                f'ca_links={len(self.ca_links)}>')
+
+    def _add_node(self, instance, name):
+        key = id(instance)
+        if key not in self._nodes:
+            self._nodes[key] = instance
+            self._names[key] = name
+        return key
+
+    def _edge(self, edges, source, target):
+        if source != target:
+            edges.setdefault(source, []).append(target)
+
+    def _resolve(self):
+        records = {}
+        for pvname, instance in self.pvdb.items():
+            if getattr(instance, 'record_type', None) is not None:
+                records.setdefault(id(instance), (pvname, instance))
+
+        for pvname, instance in records.values():
+            key = self._add_node(instance, pvname)
+            input_link = None
+            if _field_text(instance, 'INP'):
+                input_link = self._parse(instance, pvname, 'INP')
+            elif _field_text(instance, 'OMSL') in ('closed_loop', '1'):
+                input_link = self._parse(instance, pvname, 'DOL')
+            output_link = self._parse(instance, pvname, 'OUT')
+            forward_link = self._parse(instance, pvname, 'FLNK')
+            if not (input_link or output_link or forward_link):
+                continue
+
+            input_target = output_target = forward_target = None
+            if input_link is not None:
+                input_target = self._target(pvname, input_link,
+                                            subscribe=True)
+                if isinstance(input_target, tuple):
+                    input_target, _ = input_target
+                if isinstance(input_target, _ChannelAccessLink):
+                    if input_link.process in ('CP', 'CPP'):
+                        input_target.callbacks.append(
+                            functools.partial(self._ca_monitor, instance))
+                elif input_target is not None:
+                    source = self._add_node(input_target, input_link.pvname)
+                    if input_link.process == 'PP' and getattr(
+                            input_target, 'record_type', None) is not None:
+                        self._edge(self._before, key, source)
+                    elif input_link.process in ('CP', 'CPP'):
+                        self._edge(self._monitors, source, key)
+
+            if output_link is not None:
+                output_target = self._target(pvname, output_link)
+                if isinstance(output_target, tuple):
+                    # record.PROC: process the record, writing nothing
+                    record, _ = output_target
+                    output_target = None
+                    self._edge(self._process_next, key,
+                               self._add_node(record, output_link.pvname))
+                elif output_target is not None and not isinstance(
+                        output_target, _ChannelAccessLink):
+                    target = self._add_node(output_target,
+                                            output_link.pvname)
+                    self._edge(self._changes, key, target)
+                    if output_link.process == 'PP' and getattr(
+                            output_target, 'record_type', None) is not None:
+                        self._edge(self._process_next, key, target)
+
+            if forward_link is not None:
+                forward_target = self._target(pvname, forward_link,
+                                              forward=True)
+                if isinstance(forward_target, tuple):
+                    forward_target, _ = forward_target
+                if forward_target is not None and not isinstance(
+                        forward_target, _ChannelAccessLink):
+                    self._edge(self._process_next, key,
+                               self._add_node(forward_target,
+                                              forward_link.pvname))
+                    forward_target = None
+
+            self.links[key] = _RecordLinks(
+                input_target, input_link, output_target, forward_target)
+
+    def _parse(self, instance, pvname, field):
+        try:
+            return parse_link(_field_text(instance, field))
+        except CaprotoValueError as ex:
+            raise CaprotoValueError(f'{pvname}.{field}: {ex}') from None
+
+    def _target(self, pvname, link, *, subscribe=False, forward=False):
+        '''
+        Resolve a link to a local instance or a Channel Access link
+
+        A ``(record, 'PROC')`` tuple is returned for links to the ``PROC``
+        field of a local record, and None for those which are ignored.
+        '''
+        if not link.ca:
+            target = self._local_target(pvname, link)
+            if target is not None:
+                return target
+
+        name = link.pvname
+        if forward and parse_record_field(name).field is None:
+            name = f'{name}.PROC'
+        if self.ca_context is None:
+            from ..threading.client import Context
+            self.ca_context = Context()
+            self._owns_ca_context = True
+        logger.debug('%s links to %r over Channel Access', pvname, name)
+        ca_link = _ChannelAccessLink(self.ca_context, name,
+                                     subscribe=subscribe)
+        self.ca_links.append(ca_link)
+        return ca_link
+
+    def _local_target(self, pvname, link):
+        try:
+            return self.pvdb[link.pvname]
+        except KeyError:
+            ...
+        _, record, field, _ = parse_record_field(link.pvname)
+        try:
+            instance = self.pvdb[record]
+        except KeyError:
+            return None
+        if not field or field == 'VAL':
+            return instance
+        if field == 'PROC':
+            return (instance, field)
+        try:
+            return instance.get_field(field)
+        except (AttributeError, KeyError):
+            # Another IOC would not have it either
+            logger.warning('%s links to %r, which is not a field of %r',
+                           pvname, link.pvname, record)
+            return None
+
+    def _rank_nodes(self):
+        'Rank all instances in topological order, detecting cycles'
+        successors = {key: [] for key in self._nodes}
+        for edges, reverse in ((self._before, True),
+                               (self._process_next, False),
+                               (self._changes, False),
+                               (self._monitors, False)):
+            for source, targets in edges.items():
+                for target in targets:
+                    if reverse:
+                        successors[target].append(source)
+                    else:
+                        successors[source].append(target)
+
+        in_degree = dict.fromkeys(successors, 0)
+        for targets in successors.values():
+            for target in targets:
+                in_degree[target] += 1
+
+        ready = [key for key, degree in in_degree.items() if degree == 0]
+        rank = self._rank
+        while ready:
+            key = ready.pop()
+            rank[key] = len(rank)
+            for target in successors[key]:
+                in_degree[target] -= 1
+                if in_degree[target] == 0:
+                    ready.append(target)
+
+        if len(rank) < len(successors):
+            raise CaprotoValueError(
+                'Record links form a cycle: ' + ' -> '.join(
+                    self._names[key] for key in
+                    self._find_cycle(successors)))
+
+    def _find_cycle(self, successors):
+        'Find one cycle among the instances which could not be ranked'
+        key = next(key for key in successors if key not in self._rank)
+        path = []
+        seen = {}
+        while key not in seen:
+            seen[key] = len(path)
+            path.append(key)
+            key = next(target for target in successors[key]
+                       if target not in self._rank)
+        return path[seen[key]:] + [key]
+
+    def _install_hooks(self):
+        roots = set(self.links) | set(self._monitors)
+        for key in roots:
+            instance = self._nodes[key]
+            instance.write = functools.partial(self._write, instance)
+
+        for key, links in self.links.items():
+            if any(isinstance(link, _ChannelAccessLink)
+                   for link in (links.input, links.output, links.forward)):
+                instance = self._nodes[key]
+                instance.server_startup = functools.partial(
+                    self._server_startup, instance,
+                    getattr(instance, 'server_startup', None))
+
+    async def _server_startup(self, instance, startup, async_lib):
+        # Writes over Channel Access are made from a worker thread, and
+        # updates of CP links are passed back through a thread-safe queue
+        self._async_lib = async_lib
+        links = self.links[id(instance)]
+        monitored = (isinstance(links.input, _ChannelAccessLink) and
+                     links.input_link.process in ('CP', 'CPP'))
+        if startup is not None:
+            if monitored:
+                logger.warning('%s has a startup hook; its CP input link over '
+                               'Channel Access will not process it',
+                               self._names[id(instance)])
+            return await startup(async_lib)
+
+        if monitored:
+            queue = async_lib.ThreadsafeQueue()
+            self._queues[id(instance)] = queue
+            while True:
+                await queue.async_get()
+                await self.process(instance)
+
+    def _ca_monitor(self, instance, ca_link):
+        queue = self._queues.get(id(instance))
+        if queue is not None:
+            queue.put(ca_link.value)
+
+    def disconnect(self):
+        'Disconnect the Channel Access client context, if made here'
+        if self._owns_ca_context and self.ca_context is not None:
+            self.ca_context.disconnect()
+            self.ca_context = None
+
+    def chain(self, instance):
+        '''
+        The records processed, in order, when the given record is processed
+
+        Parameters
+        ----------
+        instance : ChannelData or str
+            The record, or its name
+
+        Returns
+        -------
+        chain : list of (ChannelData, bool)
+            Each instance involved and whether it is processed (or only
+            written to by an output link)
+        '''
+        if isinstance(instance, str):
+            instance = self.pvdb[instance]
+        key = id(instance)
+        try:
+            return self._chains[key]
+        except KeyError:
+            ...
+
+        process = {}
+        stack = [(key, True)]
+        while stack:
+            node, processed = stack.pop()
+            if node in process and (process[node] or not processed):
+                continue
+            process[node] = processed
+            if processed:
+                stack.extend((source, True)
+                             for source in self._before.get(node, ()))
+                stack.extend((target, True)
+                             for target in self._process_next.get(node, ()))
+                stack.extend((target, False)
+                             for target in self._changes.get(node, ()))
+            stack.extend((target, True)
+                         for target in self._monitors.get(node, ()))
+
+        rank = self._rank
+        chain = [(self._nodes[node], process[node])
+                 for node in sorted(process, key=lambda node: rank.get(node,
+                                                                       -1))]
+        self._chains[key] = chain
+        return chain
+
+    async def _write(self, instance, value, *, flags=0, **metadata):
+        'The write method of records which start a processing chain'
+        await self._process_chain(instance, (value, flags, metadata))
+
+    async def process(self, instance):
+        '''
+        Process a record and the chain of records linked from it
+
+        Parameters
+        ----------
+        instance : ChannelData or str
+            The record, or its name
+        '''
+        if isinstance(instance, str):
+            instance = self.pvdb[instance]
+        await self._process_chain(instance, None)
+
+    async def _process_chain(self, root, write):
+        chain = self.chain(root)
+        for instance, _ in chain:
+            self._defer_publish(instance)
+        try:
+            if write is not None:
+                value, flags, metadata = write
+                await type(root).write(root, value, flags=flags, **metadata)
+            for instance, processed in chain:
+                if not processed:
+                    continue
+                try:
+                    await self._process_record(instance)
+                except Exception:
+                    logger.exception('Failed to process %s',
+                                     self._names[id(instance)])
+        finally:
+            for instance, _ in chain:
+                await self._publish_deferred(instance)
+
+    def _defer_publish(self, instance):
+        key = id(instance)
+        deferred = self._deferred.get(key)
+        if deferred is None:
+            self._deferred[key] = deferred = [0, None]
+            instance.publish = functools.partial(self._collect_publish,
+                                                 deferred)
+        deferred[0] += 1
+
+    async def _collect_publish(self, deferred, flags):
+        deferred[1] = flags if deferred[1] is None else deferred[1] | flags
+
+    async def _publish_deferred(self, instance):
+        key = id(instance)
+        deferred = self._deferred[key]
+        deferred[0] -= 1
+        if deferred[0] > 0:
+            return
+        del self._deferred[key]
+        del instance.publish
+        if deferred[1] is not None:
+            await instance.publish(deferred[1])
+
+    async def _process_record(self, instance):
+        links = self.links.get(id(instance))
+        if links is None:
+            return
+
+        source = links.input
+        if source is not None:
+            if isinstance(source, _ChannelAccessLink):
+                value = source.value
+                status, severity = source.status, source.severity
+            else:
+                value = _convert_value(source.value, source, instance)
+                status, severity = source.alarm.status, source.alarm.severity
+            if value is not None:
+                await type(instance).write(instance, value)
+            # After the write, which may have set the alarm by its limits
+            if links.input_link.severity != 'NMS':
+                await self._maximize_severity(
+                    instance, links.input_link.severity, status, severity)
+
+        target = links.output
+        if isinstance(target, _ChannelAccessLink):
+            await self._write_ca(target, instance.value)
+        elif target is not None:
+            value = _convert_value(instance.value, instance, target)
+            await type(target).write(target, value)
+
+        if links.forward is not None:
+            await self._write_ca(links.forward, 1)
+
+    async def _maximize_severity(self, instance, modifier, status, severity):
+        if modifier == 'MSI' and severity != AlarmSeverity.INVALID_ALARM:
+            severity = AlarmSeverity.NO_ALARM
+        if modifier != 'MSS':
+            status = AlarmStatus.LINK
+
+        key = id(instance)
+        alarm = instance.alarm
+        if severity != AlarmSeverity.NO_ALARM:
+            if severity > alarm.severity or key in self._link_alarms:
+                self._link_alarms[key] = status
+                await alarm.write(status=status, severity=severity)
+        elif key in self._link_alarms:
+            # Clear the alarm raised by the link, unless since replaced
+            if alarm.status == self._link_alarms.pop(key):
+                await alarm.write(status=AlarmStatus.NO_ALARM,
+                                  severity=AlarmSeverity.NO_ALARM)
+
+    async def _write_ca(self, ca_link, value):
+        try:
+            if self._async_lib is None:
+                ca_link.write(value)
+            else:
+                await self._async_lib.run_in_thread(ca_link.write, value)
+        except Exception as ex:
+            logger.warning('Failed to write %r to %s: %s', value,
+                           ca_link.pvname, ex)
@@ -0,0 +1,450 @@
+'''
+Partitioned servers: one pvdb served by several worker processes
+
+A single server process is bound to one CPU. :func:`run_partitioned` splits a
+pvdb across worker processes, each of which runs an ordinary server (asyncio,
+curio or trio) for its share of the PVs on its own TCP port, with its own
+circuits. A front process answers the UDP searches for all of the PVs, replying
+with the port of the worker which owns each one, and restarts workers which
+die.
+
+This is what ``caproto.server.run(..., workers=N)`` and the ``--workers``
+option of IOCs built with ``ioc_arg_parser`` use.
+
+Workers share no state: a PV whose putter or startup hook touches another PV
+must be served by the same worker. PVs which are the same ChannelData instance
+and the fields of a record always are; keep anything else together with
+``hints`` (see :func:`group_hints`).
+'''
+import asyncio
+import logging
+import multiprocessing
+import os
+import signal
+import threading
+import time
+import zlib
+from collections import Counter
+from importlib import import_module
+
+from .. import parse_record_field
+from .._utils import CaprotoRuntimeError
+from ..asyncio.server import Context as AsyncioContext
+from .tuning import get_performance_profile, new_event_loop
+
+__all__ = ('partition_pvdb', 'group_hints', 'WorkerPool', 'run_partitioned')
+logger = logging.getLogger('caproto.ctx')
+
+# ** Tuning these parameters will affect the servers' performance **
+# How often, in seconds, the front process checks on its workers. A worker
+# which dies is restarted, at the latest, this long after.
+HEALTH_CHECK_PERIOD = 0.5
+# How long, in seconds, a worker may take to bind its TCP port.
+WORKER_STARTUP_TIMEOUT = 10.0
+# How long, in seconds, a worker may take to exit once asked to.
+WORKER_SHUTDOWN_TIMEOUT = 2.0
+
+PARTITION_METHODS = ('hash', 'prefix')
+WORKER_MODULES = ('caproto.asyncio.server', 'caproto.curio.server',
+                  'caproto.trio.server')
+
+
+def group_hints(*groups):
+    '''
+    Partition hints which keep all of the PVs of each group together
+
+    Parameters
+    ----------
+    *groups : PVGroup
+
+    Returns
+    -------
+    hints : dict
+        Maps the name of each PV of the groups (subgroups included) to the
+        prefix of its group, for ``partition_pvdb`` or ``run_partitioned``.
+    '''
+    return {pvname: group.prefix
+            for group in groups
+            for pvname in group.pvdb}
+
+
+def _record_name(pvname):
+    'The name of the record of pvname, without field or modifiers'
+    rec_field, rec, field, mods = parse_record_field(pvname)
+    return rec
+
+
+def partition_pvdb(pvdb, workers, *, by='hash', hints=None):
+    '''
+    Split a pvdb into shards which may be served independently
+
+    PVs are partitioned by key: the hint for the PV, if any, or the name of its
+    record. PVs with the same key go to the same shard, as do all names of the
+    same ChannelData instance.
+
+    Parameters
+    ----------
+    pvdb : dict
+        Maps PV names to ChannelData instances
+    workers : int
+        The number of shards
+    by : {'hash', 'prefix'}, optional
+        'hash' assigns each key to a shard by its checksum, which is stable as
+        PVs are added or removed. 'prefix' keeps the keys which share a prefix
+        (everything up to their last ':') together, balancing the number of
+        PVs in each shard.
+    hints : dict, optional
+        Maps PV names to a key of your choosing; PVs with the same hint are
+        kept together.
+
+    Returns
+    -------
+    shards : list of dict
+        ``workers`` pvdbs, some possibly empty, in which each PV of pvdb
+        appears exactly once
+    '''
+    if by not in PARTITION_METHODS:
+        raise ValueError(f'Unknown partition method {by!r}; choose from '
+                         f'{", ".join(PARTITION_METHODS)}')
+    if workers < 1:
+        raise ValueError('At least one worker is required')
+    hints = hints or {}
+
+    key_by_instance = {}
+    keys = {}
+    for pvname, channeldata in pvdb.items():
+        key = hints.get(pvname)
+        if key is None:
+            key = _record_name(pvname)
+        # An instance served under several names goes wherever it went first
+        keys[pvname] = key_by_instance.setdefault(id(channeldata), key)
+
+    if by == 'hash':
+        shard_of_key = {key: zlib.crc32(key.encode('utf-8')) % workers
+                        for key in set(keys.values())}
+    else:
+        def prefix(key):
+            return key.rpartition(':')[0] or key
+
+        sizes = Counter(prefix(key) for key in keys.values())
+        load = [0] * workers
+        shard_of_prefix = {}
+        # Largest first, each to the least loaded shard
+        for pfx, size in sorted(sizes.items(), key=lambda item: (-item[1],
+                                                                 item[0])):
+            shard = load.index(min(load))
+            shard_of_prefix[pfx] = shard
+            load[shard] += size
+        shard_of_key = {key: shard_of_prefix[prefix(key)]
+                        for key in set(keys.values())}
+
+    shards = [{} for _ in range(workers)]
+    for pvname, channeldata in pvdb.items():
+        shards[shard_of_key[keys[pvname]]][pvname] = channeldata
+    return shards
+
+
+def _watch_front(ctx, conn, front_pid):
+    '''
+    Send the TCP port of the worker to the front process once it is bound, and
+    interrupt the worker should the front process go away
+    '''
+    while ctx.port is None:
+        time.sleep(0.01)
+    conn.send(ctx.port)
+    while os.getppid() == front_pid:
+        time.sleep(HEALTH_CHECK_PERIOD)
+    logger.warning('The front process exited; stopping worker %d',
+                   os.getpid())
+    os.kill(os.getpid(), signal.SIGINT)
+
+
+def _run_worker(conn, pvdb, *, module_name, interfaces, log_pv_names,
+                performance_profile, max_circuit_bytes_per_sec):
+    'The target of each worker process'
+    front_pid = os.getppid()
+    module = import_module(module_name)
+    profile = get_performance_profile(performance_profile)
+
+    async def serve():
+        # Contexts of some libraries may only be made inside their event loop.
+        ctx = module.Context(
+            pvdb, interfaces, performance_profile=profile,
+            max_circuit_bytes_per_sec=max_circuit_bytes_per_sec)
+        # The front process answers searches for the PVs of this worker.
+        ctx.search_port = 0
+        threading.Thread(target=_watch_front, args=(ctx, conn, front_pid),
+                         daemon=True).start()
+        await ctx.run(log_pv_names=log_pv_names)
+
+    try:
+        if module_name == 'caproto.asyncio.server':
+            # The event loop of the parent, if any, is not ours to use.
+            loop = new_event_loop(profile)
+            asyncio.set_event_loop(loop)
+            loop.run_until_complete(serve())
+        elif module_name == 'caproto.curio.server':
+            import curio
+            curio.run(serve)
+        else:
+            import trio
+            trio.run(serve)
+    except KeyboardInterrupt:
+        ...
+
+
+class WorkerPool:
+    '''
+    The worker processes of a partitioned server
+
+    Workers are forked, each with its shard of the pvdb, and report the TCP
+    port they serve on. A worker which dies with an error is restarted by
+    :meth:`check`, with the values its PVs had at the start of the pool.
+
+    Parameters
+    ----------
+    shards : list of dict
+        The pvdb of each worker
+    module_name : str
+        The server each worker runs, e.g. 'caproto.asyncio.server'
+    interfaces : list, optional
+    log_pv_names : bool, optional
+    performance_profile : str or PerformanceProfile, optional
+    max_circuit_bytes_per_sec : float, optional
+    '''
+    def __init__(self, shards, *, module_name, interfaces=None,
+                 log_pv_names=False, performance_profile=None,
+                 max_circuit_bytes_per_sec=None):
+        if module_name not in WORKER_MODULES:
+            raise ValueError(f'Partitioned servers run one of '
+                             f'{", ".join(WORKER_MODULES)}; not '
+                             f'{module_name!r}')
+        try:
+            self._mp = multiprocessing.get_context('fork')
+        except ValueError:
+            raise CaprotoRuntimeError('Partitioned servers require fork(), '
+                                      'which this platform does not '
+                                      'support') from None
+        self.shards = list(shards)
+        self._worker_kwargs = dict(module_name=module_name,
+                                   interfaces=interfaces,
+                                   log_pv_names=log_pv_names,
+                                   performance_profile=performance_profile,
+                                   max_circuit_bytes_per_sec=(
+                                       max_circuit_bytes_per_sec))
+        count = len(self.shards)
+        self.processes = [None] * count
+        self.ports = [None] * count
+        self.restarts = [0] * count
+        self._conns = [None] * count
+
+    def _spawn(self, index):
+        conn, child_conn = self._mp.Pipe(duplex=False)
+        process = self._mp.Process(
+            target=_run_worker, args=(child_conn, self.shards[index]),
+            kwargs=self._worker_kwargs, name=f'caproto-worker-{index}',
+            daemon=True)
+        process.start()
+        child_conn.close()
+        self.processes[index] = process
+        self.ports[index] = None
+        self._conns[index] = conn
+        logger.debug('Started worker %d (pid %d) serving %d PVs', index,
+                     process.pid, len(self.shards[index]))
+
+    def _receive_port(self, index):
+        conn = self._conns[index]
+        try:
+            if conn.poll():
+                self.ports[index] = conn.recv()
+                logger.info('Worker %d (pid %d) listening on port %d', index,
+                            self.processes[index].pid, self.ports[index])
+        except (EOFError, OSError):
+            # The worker died before binding; check() restarts it.
+            ...
+
+    def start(self, timeout=WORKER_STARTUP_TIMEOUT):
+        'Start all workers, and wait until each has bound its TCP port'
+        for index in range(len(self.shards)):
+            self._spawn(index)
+        deadline = time.monotonic() + timeout
+        while None in self.ports:
+            for index, process in enumerate(self.processes):
+                if self.ports[index] is None and not process.is_alive():
+                    self.stop()
+                    raise CaprotoRuntimeError(
+                        f'Worker {index} exited during startup (exit code '
+                        f'{process.exitcode})')
+                self._receive_port(index)
+            if time.monotonic() > deadline:
+                self.stop()
+                raise CaprotoRuntimeError(f'Workers failed to start within '
+                                          f'{timeout} seconds')
+            time.sleep(0.01)
+
+    def check(self):
+        '''
+        Collect the ports of new workers and restart workers which died
+
+        Returns
+        -------
+        restarted : list of int
+            The indices of the restarted workers
+        '''
+        restarted = []
+        for index, process in enumerate(self.processes):
+            if self.ports[index] is None:
+                self._receive_port(index)
+            if process.is_alive():
+                continue
+            self.ports[index] = None
+            if process.exitcode == 0:
+                # A worker exits cleanly only when interrupted along with us
+                continue
+            logger.warning('Worker %d (pid %d) died with exit code %s; '
+                           'restarting it', index, process.pid,
+                           process.exitcode)
+            self._conns[index].close()
+            self.restarts[index] += 1
+            self._spawn(index)
+            restarted.append(index)
+        return restarted
+
+    def stop(self, timeout=WORKER_SHUTDOWN_TIMEOUT):
+        'Interrupt all workers, terminating those which do not exit in time'
+        for process in self.processes:
+            if process is not None and process.is_alive():
+                os.kill(process.pid, signal.SIGINT)
+        deadline = time.monotonic() + timeout
+        for process in self.processes:
+            if process is None:
+                continue
+            process.join(max(0, deadline - time.monotonic()))
+            if process.is_alive():
+                process.terminate()
+                process.join()
+        for conn in self._conns:
+            if conn is not None:
+                conn.close()
+
+
+class FrontContext(AsyncioContext):
+    '''
+    Answers searches on behalf of the workers of a partitioned server
+
+    The front process serves no circuits and calls no startup or shutdown
+    hooks; those belong to the workers. It replies to a search with the port
+    of the worker which owns the PV, and does not reply while that worker is
+    being restarted.
+
+    Parameters
+    ----------
+    pvdb : dict
+        The whole pvdb
+    pool : WorkerPool
+    owners : dict
+        Maps each name of pvdb to the index of its worker in the pool
+    interfaces : list, optional
+    loop : asyncio event loop, optional
+    performance_profile : str or PerformanceProfile, optional
+    '''
+    def __init__(self, pvdb, pool, owners, interfaces=None, *, loop=None,
+                 performance_profile=None):
+        super().__init__(pvdb, interfaces, loop=loop,
+                         performance_profile=performance_profile)
+        self.pool = pool
+        self.owners = owners
+
+    @property
+    def startup_methods(self):
+        return {}
+
+    @property
+    def shutdown_methods(self):
+        return {}
+
+    def _search_reply_port(self, pv_name):
+        if super()._search_reply_port(pv_name) is None:
+            return None
+        rec_field, rec, field, mods = parse_record_field(pv_name)
+        index = self.owners.get(rec_field, self.owners.get(rec))
+        if index is None:
+            return None
+        return self.pool.ports[index]
+
+    async def server_accept_loop(self, sock):
+        # The workers serve all circuits: leave the socket unlistened.
+        await self.loop.create_future()
+
+    async def broadcast_beacon_loop(self):
+        # The workers send beacons for the ports clients connect to.
+        ...
+
+    async def monitor_workers(self):
+        while True:
+            await asyncio.sleep(HEALTH_CHECK_PERIOD)
+            self.pool.check()
+
+    async def run(self, *, log_pv_names=False):
+        'Start answering searches and monitoring the workers'
+        monitor = self.loop.create_task(self.monitor_workers())
+        try:
+            return await super().run(log_pv_names=log_pv_names)
+        finally:
+            monitor.cancel()
+
+
+def run_partitioned(pvdb, *, module_name, workers, partition='hash',
+                    hints=None, interfaces=None, log_pv_names=False,
+                    performance_profile=None, max_circuit_bytes_per_sec=None):
+    '''
+    Serve a pvdb from several worker processes, until interrupted
+
+    Parameters
+    ----------
+    pvdb : dict
+    module_name : str
+        The server each worker runs, e.g. 'caproto.asyncio.server'
+    workers : int
+        The number of worker processes
+    partition : {'hash', 'prefix'}, optional
+        How PVs are assigned to workers; see :func:`partition_pvdb`
+    hints : dict, optional
+        Maps PV names to keys which keep them together; see
+        :func:`group_hints`
+    interfaces : list, optional
+    log_pv_names : bool, optional
+    performance_profile : str or PerformanceProfile, optional
+        Used by the workers and the front process alike
+    max_circuit_bytes_per_sec : float, optional
+        Send rate cap of each circuit of the workers; see
+        :class:`~caproto.server.scheduler.FairShareScheduler`
+    '''
+    profile = get_performance_profile(performance_profile)
+    shards = [shard for shard in partition_pvdb(pvdb, workers, by=partition,
+                                                hints=hints)
+              if shard]
+    owners = {pvname: index
+              for index, shard in enumerate(shards)
+              for pvname in shard}
+    pool = WorkerPool(shards, module_name=module_name, interfaces=interfaces,
+                      log_pv_names=log_pv_names, performance_profile=profile,
+                      max_circuit_bytes_per_sec=max_circuit_bytes_per_sec)
+    pool.start()
+    try:
+        loop = new_event_loop(profile)
+        asyncio.set_event_loop(loop)
+        ctx = FrontContext(pvdb, pool, owners, interfaces, loop=loop,
+                           performance_profile=profile)
+        task = loop.create_task(ctx.run())
+        try:
+            loop.run_until_complete(task)
+        except KeyboardInterrupt:
+            ...
+        finally:
+            task.cancel()
+            loop.run_until_complete(asyncio.gather(task,
+                                                   return_exceptions=True))
+            loop.close()
+    finally:
+        pool.stop()
@@ -247,6 +247,17 @@ class RecordFieldGroup(PVGroup):
         # automatic alarm handling
         self._alarm = parent.alarm
         self._alarm.connect(self)
+        # fields are instantiated on demand, possibly well after the alarm
+        # state last changed, so pick up its current state:
+        for prop, value in (
+                (self.alarm_acknowledge_transient,
+                 int(self._alarm.must_acknowledge_transient)),
+                (self.alarm_acknowledge_severity,
+                 self._alarm.severity_to_acknowledge),
+                (self.alarm_status, self._alarm.status),
+                (self.current_alarm_severity, self._alarm.severity)):
+            if value < len(prop.enum_strings):
+                prop._data['value'] = prop.enum_strings[value]
 
     async def publish(self, flags):
         # if SubscriptionType.DBE_ALARM in flags:
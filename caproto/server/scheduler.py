@@ -0,0 +1,308 @@
+'''
+Server-wide fair sharing of send bandwidth among virtual circuits
+
+Every circuit of a server :class:`~caproto.server.common.Context` transmits
+through one :class:`FairShareScheduler`. Outgoing buffers are split into
+chunks, and circuits that are sending at the same time take turns in a
+deficit round-robin: the circuits with data to send wait in a queue, and on
+each turn, the circuit at its head is given ``quantum * (1 + priority)`` more
+bytes of credit (its deficit), sends chunks for as long as its deficit covers
+them, and goes to the back of the queue. ``priority`` is the one the client
+requested in its VersionRequest (0-99). Credit left over at the end of a turn
+is carried to the next, for as long as the circuit has data to send. A
+circuit steps out of the queue while each of its chunks is being sent, so that
+a client which is slow to receive holds up no one else, and resumes its turn
+once the send completes. One client receiving a large image can therefore no
+longer hold the event loop while it pushes megabytes onto the wire, and small
+updates to other clients keep their latency.
+
+Optionally, each circuit's send rate may also be capped (bytes per second),
+with the ``max_circuit_bytes_per_sec`` argument of the server Context (the
+``--max-circuit-bytes-per-sec`` option of IOCs built with ``ioc_arg_parser``)
+or per circuit with :meth:`FairShareScheduler.set_max_bytes_per_sec`. A
+circuit waiting for its cap is out of the queue meanwhile.
+'''
+import time
+from collections import deque, namedtuple
+
+
+__all__ = ('FairShareScheduler', 'CircuitSendStats')
+
+
+# ** Tuning these parameters will affect the servers' performance **
+# ** under high load. **
+# Bytes that a priority-0 circuit may send in one round before yielding to
+# other circuits. A circuit with priority p may send (1 + p) times this much.
+DRR_QUANTUM = 2**16
+# Default cap on the send rate of each circuit, in bytes per second. None
+# means unlimited.
+MAX_CIRCUIT_BYTES_PER_SEC = None
+
+
+CircuitSendStats = namedtuple('CircuitSendStats',
+                              ('priority', 'bytes_sent', 'sends',
+                               'throughput', 'last_delay', 'max_delay',
+                               'mean_delay', 'max_bytes_per_sec'))
+CircuitSendStats.__doc__ = '''
+Send statistics of one circuit
+
+Attributes
+----------
+priority : int or None
+    The priority requested by the client
+bytes_sent : int
+    Total number of bytes sent
+sends : int
+    Total number of sends (each may contain several commands)
+throughput : float
+    Bytes per second, averaged since the circuit connected
+last_delay : float
+    Time the most recent send spent waiting on the scheduler, in seconds
+max_delay : float
+    Longest time any send spent waiting on the scheduler, in seconds
+mean_delay : float
+    Mean time a send spent waiting on the scheduler, in seconds
+max_bytes_per_sec : float or None
+    The send rate cap for this circuit, if any
+'''
+
+
+class _CircuitShare:
+    'Scheduling state and statistics of one circuit'
+    def __init__(self, circuit, max_bytes_per_sec):
+        self.circuit = circuit
+        self.max_bytes_per_sec = max_bytes_per_sec
+        self.deficit = 0
+        # Whether the circuit has been given its credit for the current round
+        self.in_turn = False
+        # Set when the circuit is waiting for its turn in the queue
+        self.turn = None
+        self.tokens = max_bytes_per_sec or 0
+        self.last_refill = self.connected_at = time.monotonic()
+        self.bytes_sent = 0
+        self.sends = 0
+        self.total_delay = 0.0
+        self.last_delay = 0.0
+        self.max_delay = 0.0
+
+    @property
+    def priority(self):
+        return self.circuit.circuit.priority
+
+    @property
+    def weight(self):
+        return 1 + (self.priority or 0)
+
+
+def _chunk_buffers(buffers, chunk_size):
+    '''Split a list of buffers into lists holding at most chunk_size bytes
+
+    Yields
+    ------
+    (chunk, chunk_bytes)
+    '''
+    chunk = []
+    chunk_bytes = 0
+    for buf in buffers:
+        buf = memoryview(buf).cast('B')
+        while len(buf):
+            take = min(len(buf), chunk_size - chunk_bytes)
+            chunk.append(buf[:take])
+            chunk_bytes += take
+            buf = buf[take:]
+            if chunk_bytes == chunk_size:
+                yield chunk, chunk_bytes
+                chunk = []
+                chunk_bytes = 0
+    if chunk:
+        yield chunk, chunk_bytes
+
+
+class FairShareScheduler:
+    '''
+    Deficit round-robin scheduler for circuit sends
+
+    Parameters
+    ----------
+    context : caproto.server.common.Context
+        The server context, used for access to its async library
+    quantum : int, optional
+        Bytes a priority-0 circuit may send per round
+    max_bytes_per_sec : float, optional
+        Default send rate cap applied to each new circuit
+    '''
+    def __init__(self, context, *, quantum=DRR_QUANTUM,
+                 max_bytes_per_sec=MAX_CIRCUIT_BYTES_PER_SEC):
+        self.context = context
+        self.quantum = quantum
+        self.max_bytes_per_sec = max_bytes_per_sec
+        self._shares = {}
+        # The circuits with data to send, in round-robin order. The one at the
+        # head has the turn.
+        self._active = deque()
+        # Total over all circuits, including those since disconnected
+        self.bytes_sent = 0
+
+    def _get_share(self, circuit):
+        try:
+            return self._shares[circuit]
+        except KeyError:
+            share = _CircuitShare(circuit, self.max_bytes_per_sec)
+            self._shares[circuit] = share
+            return share
+
+    def remove_circuit(self, circuit):
+        'Forget a circuit, typically when it disconnects'
+        self._shares.pop(circuit, None)
+
+    def set_max_bytes_per_sec(self, circuit, max_bytes_per_sec):
+        'Set (or, with None, remove) the send rate cap of one circuit'
+        share = self._get_share(circuit)
+        share.max_bytes_per_sec = max_bytes_per_sec
+        share.tokens = max_bytes_per_sec or 0
+        share.last_refill = time.monotonic()
+
+    async def _sleep(self, seconds):
+        await self.context.async_layer.library.sleep(seconds)
+
+    def _throttle_delay(self, share, nbytes):
+        '''
+        Token bucket enforcing the per-circuit bytes/sec cap
+
+        Returns the time to wait before sending nbytes.
+        '''
+        rate = share.max_bytes_per_sec
+        now = time.monotonic()
+        share.tokens = min(rate,
+                           share.tokens + (now - share.last_refill) * rate)
+        share.last_refill = now
+        # Allow the bucket to go into debt so that a buffer larger than one
+        # second's allowance is still sent, followed by a proportional pause.
+        share.tokens -= nbytes
+        return max(-share.tokens / rate, 0)
+
+    def _wake_head(self):
+        'Wake the circuit at the head of the queue, giving it its credit'
+        if not self._active:
+            return
+        head = self._active[0]
+        if not head.in_turn:
+            head.in_turn = True
+            head.deficit += self.quantum * head.weight
+        if head.turn is not None:
+            head.turn.set()
+
+    def _enqueue(self, share, nbytes):
+        'Queue a circuit with nbytes to send'
+        if share.in_turn and share.deficit >= nbytes:
+            # The circuit stepped out to send in the middle of its turn
+            self._active.appendleft(share)
+        else:
+            share.in_turn = False
+            self._active.append(share)
+            if len(self._active) == 1:
+                self._wake_head()
+
+    def _dequeue(self, share):
+        'Remove a circuit from the queue, passing the turn on if it had it'
+        if self._active and self._active[0] is share:
+            self._active.popleft()
+            self._wake_head()
+        else:
+            try:
+                self._active.remove(share)
+            except ValueError:
+                ...
+
+    async def _wait_turn(self, share):
+        'Wait until the circuit is at the head of the queue'
+        while self._active[0] is not share:
+            share.turn = self.context.async_layer.Event()
+            await share.turn.wait()
+        share.turn = None
+
+    async def transmit(self, circuit, buffers):
+        '''
+        Send buffers on behalf of circuit, taking turns with other circuits
+
+        The caller must hold the circuit's lock on its socket, so that no other
+        bytes are interleaved with these.
+        '''
+        share = self._get_share(circuit)
+        if not self._active and not share.max_bytes_per_sec:
+            # No circuit is waiting for its turn and this one is not capped: a
+            # send of up to one quantum goes straight out. (Larger ones still
+            # take turns, with any circuit which starts to send meanwhile.)
+            nbytes = sum(memoryview(buf).nbytes for buf in buffers)
+            if nbytes <= self.quantum:
+                await circuit._send_buffers(buffers)
+                self._count_send(share, nbytes, 0.0)
+                return
+
+        waited = 0.0
+        nbytes = 0
+        try:
+            for chunk, chunk_bytes in _chunk_buffers(buffers, self.quantum):
+                t0 = time.monotonic()
+                if share.in_turn and share.deficit < chunk_bytes:
+                    # This circuit has used up its credit. Let the other
+                    # circuits with data to send queue up before it goes to
+                    # the back.
+                    share.in_turn = False
+                    await self._sleep(0)
+                self._enqueue(share, chunk_bytes)
+                try:
+                    await self._wait_turn(share)
+                finally:
+                    # Step out of the queue while sending, so that a client
+                    # which is slow to receive holds up no one else.
+                    self._dequeue(share)
+                if share.max_bytes_per_sec:
+                    delay = self._throttle_delay(share, chunk_bytes)
+                    if delay > 0:
+                        await self._sleep(delay)
+                share.deficit -= chunk_bytes
+                waited += time.monotonic() - t0
+                await circuit._send_buffers(chunk)
+                nbytes += chunk_bytes
+        finally:
+            # Per deficit round-robin, a circuit does not bank credit while it
+            # has nothing to send.
+            share.in_turn = False
+            share.deficit = 0
+            self._count_send(share, nbytes, waited)
+
+    def _count_send(self, share, nbytes, waited):
+        'Update the statistics with a send of nbytes after waiting'
+        share.bytes_sent += nbytes
+        self.bytes_sent += nbytes
+        share.sends += 1
+        share.last_delay = waited
+        share.max_delay = max(share.max_delay, waited)
+        share.total_delay += waited
+
+    def stats(self):
+        '''
+        Per-circuit send statistics
+
+        Returns
+        -------
+        stats : dict
+            Maps each circuit's client address ``(host, port)`` to
+            :class:`CircuitSendStats`
+        '''
+        now = time.monotonic()
+        stats = {}
+        for circuit, share in list(self._shares.items()):
+            elapsed = max(now - share.connected_at, 1e-9)
+            stats[circuit.circuit.address] = CircuitSendStats(
+                priority=share.priority,
+                bytes_sent=share.bytes_sent,
+                sends=share.sends,
+                throughput=share.bytes_sent / elapsed,
+                last_delay=share.last_delay,
+                max_delay=share.max_delay,
+                mean_delay=share.total_delay / max(share.sends, 1),
+                max_bytes_per_sec=share.max_bytes_per_sec,
+            )
+        return stats
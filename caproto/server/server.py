@@ -7,10 +7,13 @@ a single asyncio library.
 For an example server implementation, see caproto.curio.server
 '''
 import argparse
+import contextlib
 import copy
 import inspect
 import logging
+import signal
 import sys
+import threading
 import time
 import warnings
 
@@ -26,6 +29,10 @@ from .. import (ChannelDouble, ChannelFloat, ChannelShort, ChannelInteger,
                 __version__)
 from .._backend import backend
 from caproto._log import set_handler, _set_handler_with_logger
+from caproto._trace import start_tracing, stop_tracing
+from .latency import (LATENCY_SAMPLE_RATE, format_latency,
+                      start_latency_recording, stop_latency_recording)
+from .tuning import PERFORMANCE_PROFILES
 
 
 module_logger = logging.getLogger(__name__)
@@ -61,8 +68,73 @@ class AsyncLibraryLayer:
     ThreadsafeQueue = None
     library = None
 
+    @staticmethod
+    async def run_in_thread(func, *args):
+        '''Call a blocking function in a worker thread and await its result
+
+        This allows CPU-heavy work, such as converting large arrays for the
+        wire, to proceed without stalling the event loop. Libraries without
+        worker threads may leave this as is, calling the function directly.
+        '''
+        return func(*args)
+
+
+# Record field group classes with per-pvproperty field overrides, shared by
+# all pvproperties using the same record type and field specification.
+_record_field_classes = {}
+
+
+def _get_record_field_class(record_type, field_spec, *, name):
+    '''Get the record field class for a record type and field overrides
+
+    Parameters
+    ----------
+    record_type : str
+        The record type, as registered with the records module
+    field_spec : tuple or None
+        Field overrides, as in ``PVSpec.fields``
+    name : str
+        Suffix for the name of a newly generated class
+
+    Returns
+    -------
+    field_class : type
+        RecordFieldGroup subclass
+    needs_instance : bool
+        True if the fields have startup hooks and must be instantiated prior
+        to the server starting
+    '''
+    from .records import records
+    base_class = records[record_type]
+    key = (base_class, field_spec)
+    try:
+        return _record_field_classes[key]
+    except KeyError:
+        pass
+
+    field_class = base_class
+    if field_spec is not None:
+        new_dict = {}
+        for (field, field_attr), func in field_spec:
+            # Copy the pvproperty so as to leave the shared base class as-is
+            prop = copy.copy(new_dict.get(field, base_class._pvs_[field]))
+            prop.pvspec = prop.pvspec._replace(**{field_attr: func})
+            new_dict[field] = prop
+
+        field_class = type(base_class.__name__ + name, (base_class, ),
+                           new_dict)
+
+    needs_instance = any(prop.pvspec.startup is not None
+                         for prop in field_class._pvs_.values())
+    _record_field_classes[key] = (field_class, needs_instance)
+    return field_class, needs_instance
+
 
 class PvpropertyData:
+    # Field name to value, as text from a database file, set on the record
+    # fields as they are instantiated (see caproto.server.database)
+    _initial_field_values = None
+
     def __init__(self, *, pvname, group, pvspec, doc=None, mock_record=None,
                  record=None, logger=None, **kwargs):
         self.pvname = pvname  # the full, expanded PV name
@@ -102,27 +174,44 @@ class PvpropertyData:
             warnings.warn(
                 '`mock_record` is deprecated. Use `pvproperty(record=)`')
 
+        self._field_inst = None
         if self.record_type is not None:
-            from .records import records
-            field_class = records[self.record_type]
-            if self.pvspec.fields is not None:
-                new_dict = dict(field_class.__dict__)
-                for (field, field_attr), func in self.pvspec.fields:
-                    prop = new_dict[field]
-                    prop.pvspec = prop.pvspec._replace(**{field_attr: func})
-
-                field_class = type(
-                    field_class.__name__ + self.name.replace('.', '_'),
-                    (field_class, ), new_dict)
-
-            self.field_inst = field_class(
+            self._field_class, needs_instance = _get_record_field_class(
+                self.record_type, self.pvspec.fields,
+                name=self.name.replace('.', '_'))
+            if needs_instance:
+                # Fields with startup hooks have to exist by server startup
+                self.field_inst
+        else:
+            self._field_class = None
+
+    @property
+    def field_inst(self):
+        '''The record field group, instantiated on first access
+
+        Most record fields are never accessed by any client, so they are only
+        created on the first search for, or access of, one of them.
+        '''
+        if self._field_inst is None and self._field_class is not None:
+            self._field_inst = self._field_class(
                 prefix='', parent=self,
                 name=f'{self.name}.fields')
+            if self._initial_field_values:
+                from .database import set_field_values
+                set_field_values(self._field_inst, self._initial_field_values)
+            if self._run_in_thread is not None:
+                # Fields created after server startup convert their values
+                # in the worker threads their record does
+                for field in self._field_inst.pvdb.values():
+                    field._run_in_thread = self._run_in_thread
+        return self._field_inst
 
-            self.fields = self.field_inst.pvdb
-        else:
-            self.field_inst = None
-            self.fields = {}
+    @property
+    def fields(self):
+        'Record field name to field instance (instantiating them if needed)'
+        if self._field_class is None:
+            return {}
+        return self.field_inst.pvdb
 
     async def read(self, data_type):
         value = await self.getter(self)
@@ -1354,6 +1443,42 @@ def template_arg_parser(*, desc, default_prefix, argv=None, macros=None,
                         help=(f"Interfaces to listen on. Default is "
                               f"{default_msg}.  Multiple entries can be "
                               f"given; separate entries by spaces."))
+    parser.add_argument('--performance-profile', default='default',
+                        choices=tuple(PERFORMANCE_PROFILES),
+                        help=("Event loop and socket tuning. 'tuned' uses "
+                              "uvloop if it is installed (with asyncio), "
+                              "sizes socket buffers for "
+                              "EPICS_CA_MAX_ARRAY_BYTES and sends large "
+                              "payloads corked. Default is 'default'."))
+    parser.add_argument('--max-circuit-bytes-per-sec', type=float,
+                        default=None, metavar='RATE',
+                        help=("Cap the rate at which the server sends to "
+                              "each client connection, in bytes per second. "
+                              "Default is no cap."))
+    parser.add_argument('--workers', type=int, default=1, metavar='N',
+                        help=("Serve the PVs from N worker processes, each "
+                              "on its own TCP port, behind a front process "
+                              "which answers searches. Not supported with "
+                              "--trace or latency recording. Default is 1."))
+    parser.add_argument('--partition', default='hash',
+                        choices=('hash', 'prefix'),
+                        help=("How PVs are assigned to workers: by a hash of "
+                              "the record name, or balanced by shared "
+                              "prefix. Default is 'hash'."))
+    parser.add_argument('--trace', type=str, default=None, metavar='FILE',
+                        help=("Record all Channel Access traffic to FILE, for "
+                              "replaying with caproto-replay."))
+    parser.add_argument('--latency-sample-rate', type=float, default=None,
+                        metavar='RATE',
+                        help=("Time this fraction of requests through the "
+                              "stages of the server, and log a summary at "
+                              f"exit. Default with --latency-dump is "
+                              f"{LATENCY_SAMPLE_RATE}."))
+    parser.add_argument('--latency-dump', type=str, default=None,
+                        metavar='FILE',
+                        help=("Write the latency histograms to FILE at exit "
+                              "(and on SIGUSR1), for summarizing with "
+                              "caproto-latency."))
     for name, default_value in macros.items():
         if default_value is None:
             parser.add_argument(f'--{name}', type=str, required=True,
@@ -1386,16 +1511,77 @@ def template_arg_parser(*, desc, default_prefix, argv=None, macros=None,
         else:
             _set_handler_with_logger(logger_name='caproto.ctx', level='INFO')
 
+        if args.workers > 1 and (args.trace or args.latency_sample_rate or
+                                 args.latency_dump):
+            # The recorders would be forked into the workers without the
+            # threads and exit handlers which write out what they record.
+            parser.error('--trace, --latency-sample-rate and --latency-dump '
+                         'are not supported with --workers')
+
         return ({'prefix': args.prefix,
                  'macros': {key: getattr(args, key) for key in macros}},
 
                 {'module_name': f'caproto.{args.async_lib}.server',
                  'log_pv_names': args.list_pvs,
-                 'interfaces': args.interfaces})
+                 'interfaces': args.interfaces,
+                 'performance_profile': args.performance_profile,
+                 'max_circuit_bytes_per_sec': args.max_circuit_bytes_per_sec,
+                 'workers': args.workers,
+                 'partition': args.partition,
+                 'trace': args.trace,
+                 'latency_sample_rate': args.latency_sample_rate,
+                 'latency_dump': args.latency_dump})
 
     return parser, split_args
 
 
+@contextlib.contextmanager
+def _recording(*, trace=None, latency_sample_rate=None, latency_dump=None):
+    '''
+    Trace and time the requests of the servers run within the context
+
+    Parameters
+    ----------
+    trace : str, optional
+        File to record a trace of all traffic to (see
+        :func:`caproto.start_tracing`)
+    latency_sample_rate : float, optional
+        Fraction of requests to time. Latency is recorded if this or
+        ``latency_dump`` is given, and defaults to ``LATENCY_SAMPLE_RATE``.
+    latency_dump : str, optional
+        File to dump the latency histograms to at the end, and on SIGUSR1.
+        Without it, the latency is logged at the end.
+    '''
+    if trace:
+        start_tracing(trace)
+    recorder = None
+    previous_handler = None
+    if latency_sample_rate or latency_dump:
+        recorder = start_latency_recording(
+            latency_sample_rate or LATENCY_SAMPLE_RATE)
+        if (latency_dump and hasattr(signal, 'SIGUSR1') and
+                threading.current_thread() is threading.main_thread()):
+            # Only the main thread may set signal handlers
+            previous_handler = signal.signal(
+                signal.SIGUSR1,
+                lambda signum, frame: recorder.dump(latency_dump))
+    try:
+        yield
+    finally:
+        if trace:
+            stop_tracing()
+        if recorder is not None:
+            stop_latency_recording()
+            if previous_handler is not None:
+                signal.signal(signal.SIGUSR1, previous_handler)
+            if latency_dump:
+                recorder.dump(latency_dump)
+            else:
+                # Logged where the server logs its startup
+                logging.getLogger('caproto.ctx').info(
+                    'Request latency:\n%s', format_latency(recorder))
+
+
 def ioc_arg_parser(*, desc, default_prefix, argv=None, macros=None,
                    supported_async_libs=None):
     """
@@ -0,0 +1,246 @@
+'''
+Statistics of a running server, published as PVs
+
+In the manner of iocStats for EPICS IOCs, :class:`ServerStats` is a PVGroup
+which, added to an IOC, publishes the load on the server that serves it: its
+clients, channels and subscriptions, the backlog of each circuit, the updates
+dropped and batched under high load, its traffic, and the lag of its event
+loop, memory and CPU usage. These are ordinary PVs, which may be monitored or
+archived like any other.
+
+.. code-block:: python
+
+    class MyIOC(PVGroup):
+        ...
+        stats = SubGroup(ServerStats, prefix='Stats:')
+
+The statistics are updated every :attr:`ServerStats.period` seconds, from
+totals which the server keeps at all times (see
+:class:`caproto.server.common.ServerCounters`), so they cost next to nothing
+between updates.
+'''
+import os
+import sys
+import time
+
+from .common import Context
+from .server import PVGroup, pvproperty
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+try:
+    import resource
+except ImportError:
+    resource = None
+
+__all__ = ('ServerStats', )
+
+# Default seconds between updates of the statistics
+STATS_PERIOD = 10.0
+# Seconds between wake-ups to measure the lag of the event loop
+LAG_PROBE_INTERVAL = 0.25
+# Number of circuits for which queue depths are published
+MAX_CIRCUITS = 1024
+
+
+def _find_context(pvdb):
+    'The Context serving the PVs of pvdb, if any'
+    pvname, data = next(iter(pvdb.items()))
+    for context in list(Context._instances):
+        try:
+            if context.pvdb[pvname] is data:
+                return context
+        except KeyError:
+            ...
+
+
+def memory_used():
+    '''
+    Resident set size of this process, in bytes
+
+    This is the peak resident set size on platforms without psutil or /proc,
+    and 0 where that is not available either.
+    '''
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        ...
+    if resource is not None:
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Reported in bytes on macOS, in kilobytes elsewhere
+        return max_rss if sys.platform == 'darwin' else max_rss * 1024
+    return 0
+
+
+class ServerStats(PVGroup):
+    '''
+    Statistics of the server serving this group, in the manner of iocStats
+
+    Rates, means and maxima cover the time since the previous update.
+
+    Parameters
+    ----------
+    prefix : str
+        Prefix for all PVs in the group
+    period : float, optional
+        Seconds between updates. Defaults to the class attribute ``period``,
+        which subclasses may override.
+    **kwargs :
+        Passed to PVGroup
+    '''
+    period = STATS_PERIOD
+
+    circuits = pvproperty(name='CA_CLNT_CNT', value=0, read_only=True,
+                          doc='Number of connected circuits')
+    channels = pvproperty(name='CA_CONN_CNT', value=0, read_only=True,
+                          doc='Number of channels, over all circuits')
+    subscriptions = pvproperty(name='SUBSCRIPTIONS', value=0, read_only=True,
+                               doc='Number of subscriptions')
+    command_queue_depths = pvproperty(
+        name='CMD_QUEUE_DEPTHS', value=[0], max_length=MAX_CIRCUITS,
+        read_only=True,
+        doc='Received commands waiting, per circuit by client address')
+    subscription_queue_depths = pvproperty(
+        name='SUB_QUEUE_DEPTHS', value=[0], max_length=MAX_CIRCUITS,
+        read_only=True,
+        doc='Subscription updates waiting, per circuit by client address')
+    max_command_queue_depth = pvproperty(
+        name='CMD_QUEUE_MAX', value=0, read_only=True,
+        doc='Most received commands waiting on any circuit')
+    max_subscription_queue_depth = pvproperty(
+        name='SUB_QUEUE_MAX', value=0, read_only=True,
+        doc='Most subscription updates waiting on any circuit')
+    updates_dropped = pvproperty(
+        name='UPDATES_DROPPED', value=0.0, read_only=True, precision=0,
+        doc='Subscription updates dropped under high load, in total')
+    batch_size = pvproperty(
+        name='SUB_BATCH_SIZE', value=0.0, read_only=True, precision=2,
+        doc='Mean number of subscription updates sent per batch')
+    max_batch_size = pvproperty(
+        name='SUB_BATCH_MAX', value=0, read_only=True,
+        doc='Most subscription updates sent in one batch')
+    batch_latency = pvproperty(
+        name='SUB_LATENCY', value=0.0, read_only=True, precision=4,
+        units='s', doc='Mean latency of the batches of subscription updates')
+    max_batch_latency = pvproperty(
+        name='SUB_LATENCY_MAX', value=0.0, read_only=True, precision=4,
+        units='s', doc='Longest latency of a batch of subscription updates')
+    search_rate = pvproperty(
+        name='SEARCH_RATE', value=0.0, read_only=True, precision=1,
+        units='1/s', doc='Search requests received per second')
+    bytes_in_rate = pvproperty(
+        name='BYTES_IN_RATE', value=0.0, read_only=True, precision=0,
+        units='B/s', doc='Bytes received per second over TCP')
+    bytes_out_rate = pvproperty(
+        name='BYTES_OUT_RATE', value=0.0, read_only=True, precision=0,
+        units='B/s', doc='Bytes sent per second over TCP')
+    loop_lag = pvproperty(
+        name='LOOP_LAG', value=0.0, read_only=True, precision=4, units='s',
+        doc='Longest that the event loop was late to wake up a task')
+    memory_used = pvproperty(
+        name='MEM_USED', value=0.0, read_only=True, precision=0, units='B',
+        doc='Resident set size of the process')
+    cpu_usage = pvproperty(
+        name='CPU_USAGE', value=0.0, read_only=True, precision=1, units='%',
+        doc='CPU time used by the process, as a percentage of one CPU')
+
+    def __init__(self, prefix, *, period=None, **kwargs):
+        super().__init__(prefix, **kwargs)
+        if period is not None:
+            self.period = period
+        self.context = None
+        self._last_totals = None
+
+    def _totals(self):
+        'Running totals from which rates are computed'
+        counters = self.context.counters
+        return dict(time=time.monotonic(),
+                    cpu_time=time.process_time(),
+                    search_requests=counters.search_requests,
+                    bytes_received=counters.bytes_received,
+                    bytes_sent=self.context.send_scheduler.bytes_sent,
+                    batches=counters.batches,
+                    batched_commands=counters.batched_commands,
+                    batch_latency=counters.batch_latency)
+
+    async def update(self, loop_lag=0.0):
+        '''
+        Update the statistics
+
+        Parameters
+        ----------
+        loop_lag : float, optional
+            The lag of the event loop measured since the previous update
+        '''
+        context = self.context
+        counters = context.counters
+        totals = self._totals()
+        last, self._last_totals = self._last_totals, totals
+        if last is None:
+            last = totals
+        delta = {key: totals[key] - last[key] for key in totals}
+        elapsed = delta['time'] or 1.0
+
+        circuits = sorted(context.circuits,
+                          key=lambda circuit: circuit.circuit.address)
+        depths = [circuit.queue_depths()
+                  for circuit in circuits[:MAX_CIRCUITS]]
+        command_depths = [commands for commands, _ in depths]
+        subscription_depths = [updates for _, updates in depths]
+        batches = delta['batches']
+
+        await self.circuits.write(len(circuits))
+        await self.channels.write(sum(len(circuit.circuit.channels)
+                                      for circuit in circuits))
+        await self.subscriptions.write(sum(map(len,
+                                               context.subscriptions.values())))
+        await self.command_queue_depths.write(command_depths or [0])
+        await self.subscription_queue_depths.write(subscription_depths or [0])
+        await self.max_command_queue_depth.write(max(command_depths,
+                                                     default=0))
+        await self.max_subscription_queue_depth.write(
+            max(subscription_depths, default=0))
+        await self.updates_dropped.write(counters.updates_dropped)
+        await self.batch_size.write(
+            delta['batched_commands'] / batches if batches else 0.0)
+        await self.max_batch_size.write(counters.max_batch_size)
+        await self.batch_latency.write(
+            delta['batch_latency'] / batches if batches else 0.0)
+        await self.max_batch_latency.write(counters.max_batch_latency)
+        counters.max_batch_size = 0
+        counters.max_batch_latency = 0
+        await self.search_rate.write(delta['search_requests'] / elapsed)
+        await self.bytes_in_rate.write(delta['bytes_received'] / elapsed)
+        await self.bytes_out_rate.write(delta['bytes_sent'] / elapsed)
+        await self.loop_lag.write(loop_lag)
+        await self.memory_used.write(memory_used())
+        await self.cpu_usage.write(100 * delta['cpu_time'] / elapsed)
+
+    @circuits.startup
+    async def circuits(self, instance, async_lib):
+        'Find the server serving this group, and update periodically'
+        self.context = _find_context(self.pvdb)
+        if self.context is None:
+            self.log.warning('%s is not served by a caproto server Context; '
+                             'not updating statistics', self.prefix)
+            return
+        sleep = async_lib.library.sleep
+        await self.update()
+        while True:
+            # Sleep in short steps, to measure how late the event loop is to
+            # wake us up.
+            loop_lag = 0.0
+            next_update = time.monotonic() + self.period
+            while True:
+                t0 = time.monotonic()
+                interval = min(LAG_PROBE_INTERVAL, next_update - t0)
+                if interval <= 0:
+                    break
+                await sleep(interval)
+                loop_lag = max(loop_lag, time.monotonic() - t0 - interval)
+            await self.update(loop_lag)
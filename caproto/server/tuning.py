@@ -0,0 +1,141 @@
+'''
+Performance profiles: event loop and socket tuning of servers
+
+A :class:`PerformanceProfile` selects the event loop of the asyncio server and
+the options set on the TCP socket of each circuit. Servers take one by name
+(see :data:`PERFORMANCE_PROFILES`) or as an instance, as in
+``run(pvdb, module_name=..., performance_profile='tuned')`` or the
+``--performance-profile`` option of IOCs built with ``ioc_arg_parser``.
+
+Whatever the profile, circuits are sent with ``TCP_NODELAY``: responses are
+small and must not wait for the acknowledgement of the previous segment.
+'''
+import logging
+import socket
+from collections import namedtuple
+
+__all__ = ('PerformanceProfile', 'PERFORMANCE_PROFILES',
+           'get_performance_profile')
+logger = logging.getLogger('caproto.ctx')
+
+# ** Tuning these parameters will affect the servers' performance **
+# Payloads of at least this many bytes are sent corked, in full segments, by
+# the "tuned" profile.
+CORK_THRESHOLD = 2**16
+# Bounds of the socket buffer sizes derived from EPICS_CA_MAX_ARRAY_BYTES. The
+# kernel applies its own maximum (net.core.wmem_max and rmem_max on Linux).
+MIN_SOCKET_BUFFER = 2**16
+MAX_SOCKET_BUFFER = 2**24
+
+# TCP_CORK is specific to Linux.
+CAN_CORK = hasattr(socket, 'TCP_CORK')
+
+
+PerformanceProfile = namedtuple('PerformanceProfile',
+                                'name event_loop size_socket_buffers '
+                                'cork_threshold')
+PerformanceProfile.__doc__ = '''
+How a server runs its event loop and tunes the sockets of its circuits
+
+Attributes
+----------
+name : str
+event_loop : {'default', 'uvloop'}
+    The asyncio event loop. uvloop is used if it is installed, and the default
+    event loop otherwise. The curio and trio servers ignore this.
+size_socket_buffers : bool
+    Whether to enlarge the send and receive buffers of each circuit's socket to
+    hold a value of EPICS_CA_MAX_ARRAY_BYTES, within ``MIN_SOCKET_BUFFER`` and
+    ``MAX_SOCKET_BUFFER``. On Linux, this disables the kernel's automatic
+    tuning of those buffers.
+cork_threshold : int or None
+    Where TCP_CORK is available, send payloads of at least this many bytes
+    corked, so that the chunks the server sends them in go out in full
+    segments. None to never cork.
+'''
+
+PERFORMANCE_PROFILES = {
+    'default': PerformanceProfile(name='default', event_loop='default',
+                                  size_socket_buffers=False,
+                                  cork_threshold=None),
+    'tuned': PerformanceProfile(name='tuned', event_loop='uvloop',
+                                size_socket_buffers=True,
+                                cork_threshold=CORK_THRESHOLD),
+}
+
+
+def get_performance_profile(profile=None):
+    '''
+    Look up a performance profile
+
+    Parameters
+    ----------
+    profile : str, PerformanceProfile or None
+        A key of PERFORMANCE_PROFILES, or a profile, which is returned as is.
+        None means 'default'.
+
+    Returns
+    -------
+    profile : PerformanceProfile
+    '''
+    if profile is None:
+        profile = 'default'
+    if isinstance(profile, PerformanceProfile):
+        return profile
+    try:
+        return PERFORMANCE_PROFILES[profile]
+    except KeyError:
+        raise ValueError(f'Unknown performance profile {profile!r}; choose '
+                         f'from {", ".join(PERFORMANCE_PROFILES)}') from None
+
+
+def new_event_loop(profile):
+    'A new asyncio event loop, of the kind the profile asks for if available'
+    import asyncio
+    if profile.event_loop == 'uvloop':
+        try:
+            import uvloop
+        except ImportError:
+            logger.warning('uvloop is not installed; using the default '
+                           'asyncio event loop.')
+        else:
+            return uvloop.new_event_loop()
+    return asyncio.new_event_loop()
+
+
+def socket_buffer_size(max_array_bytes):
+    'The socket buffer size which holds a value of max_array_bytes'
+    return max(MIN_SOCKET_BUFFER, min(MAX_SOCKET_BUFFER, max_array_bytes))
+
+
+def tune_socket(sock, profile, max_array_bytes):
+    '''
+    Set the options of the profile on the TCP socket of a circuit
+
+    Parameters
+    ----------
+    sock : socket-like
+        Anything with ``setsockopt`` and ``getsockopt``
+    profile : PerformanceProfile
+    max_array_bytes : int
+        The value of EPICS_CA_MAX_ARRAY_BYTES
+    '''
+    try:
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        if profile.size_socket_buffers:
+            size = socket_buffer_size(max_array_bytes)
+            for option in (socket.SO_SNDBUF, socket.SO_RCVBUF):
+                # Only ever enlarge the buffers.
+                if sock.getsockopt(socket.SOL_SOCKET, option) < size:
+                    sock.setsockopt(socket.SOL_SOCKET, option, size)
+    except OSError as ex:
+        logger.warning('Failed to tune socket %r: %s', sock, ex)
+
+
+def set_cork(sock, corked):
+    'Cork or uncork a TCP socket (where TCP_CORK is available)'
+    try:
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_CORK, int(corked))
+    except OSError:
+        # For instance, the client has disconnected.
+        ...
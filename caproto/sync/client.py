@@ -181,8 +181,9 @@ def make_channel(pv_name, udp_sock, priority, timeout):
             tags = {'direction': '<<<---',
                     'our_address': chan.circuit.our_address,
                     'their_address': chan.circuit.address}
+            debug = logger.isEnabledFor(logging.DEBUG)
             for command in commands:
-                if isinstance(command, ca.Message):
+                if debug and isinstance(command, ca.Message):
                     tags['bytesize'] = len(command)
                     logger.debug("%r", command, extra=tags)
                 elif command is ca.DISCONNECTED:
@@ -222,8 +223,9 @@ def _read(chan, timeout, data_type, notify, force_int_enums):
         tags = {'direction': '<<<---',
                 'our_address': chan.circuit.our_address,
                 'their_address': chan.circuit.address}
+        debug = logger.isEnabledFor(logging.DEBUG)
         for command in commands:
-            if isinstance(command, ca.Message):
+            if debug and isinstance(command, ca.Message):
                 tags['bytesize'] = len(command)
                 logger.debug("%r", command, extra=tags)
             if (isinstance(command, (ca.ReadResponse, ca.ReadNotifyResponse)) and
@@ -581,8 +583,9 @@ def _write(chan, data, metadata, timeout, data_type, notify):
             tags = {'direction': '<<<---',
                     'our_address': chan.circuit.our_address,
                     'their_address': chan.circuit.address}
+            debug = logger.isEnabledFor(logging.DEBUG)
             for command in commands:
-                if isinstance(command, ca.Message):
+                if debug and isinstance(command, ca.Message):
                     tags['bytesize'] = len(command)
                     logger.debug("%r", command, extra=tags)
                 if (isinstance(command, ca.WriteNotifyResponse) and
@@ -0,0 +1,313 @@
+'''
+Replay the client side of a recorded trace against a server
+
+A trace recorded with :func:`caproto.start_tracing`, by a client or by a
+server, holds the bytes each client sent. The replay connects a circuit to the
+server under test for each circuit in the trace and sends its requests, and
+sends its searches by UDP, at the times they were recorded (``speed=1``),
+faster or slower, or as fast as possible (``speed=0``). The server's responses
+are read and discarded, but for the server IDs of the channels it creates:
+the requests of the trace refer to the channels by the IDs which the server of
+the recording assigned, so these are mapped to the IDs assigned by the server
+under test, waiting for its response to the creation of a channel before
+sending requests for it.
+
+This is available from the shell as ``caproto-replay``.
+'''
+import logging
+import selectors
+import socket
+import time
+from collections import deque, namedtuple
+
+from .. import (CLIENT, SERVER, NEED_DATA, SearchRequest, VersionRequest,
+                CreateChanResponse, EventAddRequest, EventCancelRequest,
+                ReadRequest, WriteRequest, ClearChannelRequest,
+                ReadNotifyRequest, WriteNotifyRequest, MAX_UDP_RECV,
+                get_environment_variables)
+from .._commands import read_datagram, read_from_bytestream
+from .._trace import SEND, TCP, read_trace
+
+
+__all__ = ('ReplayResult', 'replay')
+logger = logging.getLogger('caproto.replay')
+
+# Requests which refer to a channel by its server ID (in parameter1)
+_SID_REQUESTS = (EventAddRequest, EventCancelRequest, ReadRequest,
+                 WriteRequest, ClearChannelRequest, ReadNotifyRequest,
+                 WriteNotifyRequest)
+
+ReplayResult = namedtuple('ReplayResult',
+                          'circuits commands bytes_sent bytes_received '
+                          'datagrams elapsed max_lag unresolved')
+ReplayResult.__doc__ = '''
+The outcome of a replay
+
+Parameters
+----------
+circuits : int
+    Number of circuits connected
+commands : int
+    Number of commands sent over TCP
+bytes_sent : int
+bytes_received : int
+    Sent and received over TCP
+datagrams : int
+    Number of search datagrams sent
+elapsed : float
+    Seconds from the first request sent to the last
+max_lag : float
+    The longest that any request was sent after its scheduled time
+unresolved : int
+    Number of requests not sent, as the server under test did not create
+    their channel in time or their circuit was closed
+'''
+
+
+class _Circuit:
+    'The requests of one recorded circuit, and its replay'
+    def __init__(self, key):
+        self.key = key
+        self.requests = deque()  # (timestamp, command)
+        self.recorded_cids = {}  # map recorded sid to cid
+        self.live_sids = {}  # map cid to sid of the server under test
+        self.sock = None
+        self.closed = False
+        self.data = bytearray()
+
+    def resolve(self, command):
+        '''
+        Map the server ID of a request to that of the server under test
+
+        Returns False if it is not known yet.
+        '''
+        if not isinstance(command, _SID_REQUESTS):
+            return True
+        cid = self.recorded_cids.get(command.sid)
+        if cid is None:
+            # Not created in the recording; send it as it is.
+            return True
+        sid = self.live_sids.get(cid)
+        if sid is None:
+            return False
+        command.header.parameter1 = sid
+        return True
+
+    def received(self, data):
+        self.data += data
+        while True:
+            self.data, command, _ = read_from_bytestream(self.data, SERVER)
+            if command is NEED_DATA:
+                break
+            if isinstance(command, CreateChanResponse):
+                self.live_sids[command.cid] = command.sid
+
+
+def _parse_stream(records, role):
+    'Parse commands from the TCP records of one direction of a circuit'
+    data = bytearray()
+    for record in records:
+        data += record.data
+        while True:
+            data, command, _ = read_from_bytestream(data, role)
+            if command is NEED_DATA:
+                break
+            yield record.timestamp, command
+
+
+def _plan(records):
+    '''
+    Sort the requests of a trace by circuit
+
+    Returns
+    -------
+    circuits, datagrams
+        ``datagrams`` is a list of ``(timestamp, bytes)`` of search requests
+    '''
+    to_server = {}
+    to_client = {}
+    datagrams = []
+    for record in records:
+        from_client = (record.role is CLIENT) == (record.direction == SEND)
+        if record.transport == TCP:
+            if record.role is CLIENT:
+                key = (record.our_address, record.their_address)
+            else:
+                key = (record.their_address, record.our_address)
+            streams = to_server if from_client else to_client
+            streams.setdefault(key, []).append(record)
+        elif from_client:
+            commands = read_datagram(record.data, record.their_address, CLIENT)
+            searches = [command for command in commands
+                        if isinstance(command, SearchRequest)]
+            if searches:
+                datagrams.append(
+                    (record.timestamp,
+                     b''.join(bytes(command) for command in
+                              [VersionRequest(0, searches[0].version),
+                               *searches])))
+
+    circuits = []
+    for key, stream in to_server.items():
+        circuit = _Circuit(key)
+        circuit.requests.extend(_parse_stream(stream, CLIENT))
+        for _, command in _parse_stream(to_client.get(key, []), SERVER):
+            if isinstance(command, CreateChanResponse):
+                circuit.recorded_cids[command.sid] = command.cid
+        circuits.append(circuit)
+    return circuits, datagrams
+
+
+def replay(trace, address=None, *, udp_address=None, speed=1.0, timeout=2.0,
+           linger=0.5):
+    '''
+    Replay the requests of a trace against a server
+
+    Parameters
+    ----------
+    trace : str, binary file-like object, or iterable of TraceRecord
+    address : (host, port), optional
+        Of the server under test. Defaults to localhost at
+        ``EPICS_CA_SERVER_PORT``.
+    udp_address : (host, port), optional
+        To send searches to. Defaults to the host of ``address`` at
+        ``EPICS_CA_SERVER_PORT``.
+    speed : float, optional
+        Relative to the recording: 2 replays twice as fast. 0 sends every
+        request as soon as possible.
+    timeout : float, optional
+        Seconds to wait for the server to create a channel before giving up
+        on requests for it
+    linger : float, optional
+        Seconds to keep reading responses after the last request
+
+    Returns
+    -------
+    result : ReplayResult
+    '''
+    if isinstance(trace, str) or hasattr(trace, 'read'):
+        trace = read_trace(trace)
+    circuits, datagrams = _plan(trace)
+    start_times = [circuit.requests[0][0] for circuit in circuits
+                   if circuit.requests]
+    start_times.extend(timestamp for timestamp, _ in datagrams[:1])
+    if not start_times:
+        return ReplayResult(circuits=0, commands=0, bytes_sent=0,
+                            bytes_received=0, datagrams=0, elapsed=0.0,
+                            max_lag=0.0, unresolved=0)
+    t0 = min(start_times)
+
+    port = get_environment_variables()['EPICS_CA_SERVER_PORT']
+    if address is None:
+        address = ('127.0.0.1', port)
+    if udp_address is None:
+        udp_address = (address[0], port)
+
+    def due(timestamp):
+        return (timestamp - t0) / speed if speed else 0.0
+
+    selector = selectors.DefaultSelector()
+    udp_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    datagrams = deque(datagrams)
+    counts = dict(circuits=0, commands=0, bytes_sent=0, bytes_received=0,
+                  datagrams=0, unresolved=0)
+    max_lag = 0.0
+    last_sent = 0.0
+    start = time.monotonic()
+    logger.debug('Replaying %d circuits and %d search datagrams to %s:%d',
+                 len(circuits), len(datagrams), *address)
+
+    def close(circuit):
+        selector.unregister(circuit.sock)
+        circuit.sock.close()
+        circuit.closed = True
+        counts['unresolved'] += len(circuit.requests)
+        circuit.requests.clear()
+
+    def receive(wait):
+        for key, _ in selector.select(wait):
+            circuit = key.data
+            try:
+                data = circuit.sock.recv(MAX_UDP_RECV)
+            except OSError:
+                data = b''
+            if not data:
+                logger.debug('Circuit %s closed by the server', circuit.key)
+                close(circuit)
+                continue
+            counts['bytes_received'] += len(data)
+            circuit.received(data)
+
+    try:
+        while True:
+            now = time.monotonic() - start
+            wait = None
+
+            while datagrams and due(datagrams[0][0]) <= now:
+                timestamp, datagram = datagrams.popleft()
+                udp_sock.sendto(datagram, udp_address)
+                counts['datagrams'] += 1
+                max_lag = max(max_lag, now - due(timestamp))
+                last_sent = now
+            if datagrams:
+                wait = due(datagrams[0][0]) - now
+
+            for circuit in circuits:
+                chunks = []
+                while circuit.requests:
+                    timestamp, command = circuit.requests[0]
+                    scheduled = due(timestamp)
+                    if scheduled > now:
+                        wait = (scheduled - now if wait is None
+                                else min(wait, scheduled - now))
+                        break
+                    if not circuit.resolve(command):
+                        if now - scheduled > timeout:
+                            circuit.requests.popleft()
+                            counts['unresolved'] += 1
+                            continue
+                        # Check again once responses have been read.
+                        wait = 0.01 if wait is None else min(wait, 0.01)
+                        break
+                    circuit.requests.popleft()
+                    chunks.append(bytes(command))
+                    max_lag = max(max_lag, now - scheduled)
+                if not chunks:
+                    continue
+                if circuit.sock is None:
+                    circuit.sock = socket.create_connection(address)
+                    circuit.sock.setsockopt(socket.IPPROTO_TCP,
+                                            socket.TCP_NODELAY, 1)
+                    selector.register(circuit.sock, selectors.EVENT_READ,
+                                      circuit)
+                    counts['circuits'] += 1
+                data = b''.join(chunks)
+                try:
+                    circuit.sock.sendall(data)
+                except OSError:
+                    close(circuit)
+                    continue
+                counts['commands'] += len(chunks)
+                counts['bytes_sent'] += len(data)
+                last_sent = now
+
+            if not datagrams and not any(circuit.requests
+                                         for circuit in circuits):
+                break
+            if selector.get_map():
+                receive(wait)
+            elif wait:
+                time.sleep(wait)
+
+        # Collect the responses to the last requests.
+        deadline = time.monotonic() + linger
+        while selector.get_map() and time.monotonic() < deadline:
+            receive(deadline - time.monotonic())
+    finally:
+        for circuit in circuits:
+            if circuit.sock is not None and not circuit.closed:
+                circuit.sock.close()
+        selector.close()
+        udp_sock.close()
+
+    return ReplayResult(elapsed=last_sent, max_lag=max_lag, **counts)
@@ -1,9 +1,18 @@
 import ctypes
+import heapq
+import itertools
+import math
+import multiprocessing
+import os
+import queue
+import zlib
 from dpkt.pcap import Reader
 from dpkt.ethernet import Ethernet
-from dpkt.tcp import TCP
+from dpkt.tcp import TCP, TH_SYN, TH_FIN, TH_RST
 from dpkt.udp import UDP
 from dpkt.ip import IP
+from collections import OrderedDict, deque, namedtuple
+from operator import itemgetter
 from socket import inet_ntoa
 from types import SimpleNamespace
 
@@ -23,8 +32,35 @@ from .._commands import (AccessRightsResponse, CreateChFailResponse,
                          ReadNotifyResponse, ReadResponse,
                          SearchResponse, ServerDisconnResponse,
                          VersionRequest, VersionResponse, WriteNotifyRequest,
-                         WriteNotifyResponse, WriteRequest)
-from .._utils import ValidationError
+                         WriteNotifyResponse, WriteRequest, bytelen)
+from .._utils import RESPONSE, ValidationError
+
+
+# Segments of a TCP stream held back waiting for an earlier, missing one. Past
+# this, the segment is taken to have been dropped by the capture and the rest
+# of the stream is ignored.
+MAX_OUT_OF_ORDER_SEGMENTS = 1000
+
+# TCP streams being reassembled, and flows ignored for not being Channel
+# Access, that are remembered at a time. The least recently seen are
+# forgotten first, as are those not seen for FLOW_IDLE_TIMEOUT seconds (of
+# capture time).
+MAX_TRACKED_FLOWS = 10000
+FLOW_IDLE_TIMEOUT = 300.0
+
+# Bytes of one command that a TCP stream may buffer while it is incomplete.
+# A stream claiming a larger payload is taken not to be Channel Access.
+MAX_STREAM_BUFFER = 2 ** 28
+
+# Number of frames of a pcap file read at a time and split by flow among the
+# worker processes of a parallel shark, and the number of such batches read
+# ahead of the one whose commands are being yielded
+PARALLEL_BATCH_SIZE = 1000
+PARALLEL_BATCHES_AHEAD = 16
+
+# Channel, subscription and I/O ids remembered by TrafficStats in order to
+# attribute commands to PV names. The oldest are forgotten first.
+MAX_TRACKED_IDS = 100000
 
 
 # These are similar to read_datagram and read_from_bytestream in _commands.py
@@ -48,8 +84,8 @@ def read_datagram(data, address):
         else:
             payload_bytes = None
         command = _class.from_wire(header, payload_bytes,
-                                   sender_address=address,
-                                   validate=True)
+                                   sender_address=address)
+        validate_command(command)
         commands.append(command)
     return commands
 
@@ -117,11 +153,31 @@ def read_from_bytestream(data):
 
     # Receive the buffer (zero-copy).
     payload_bytes = memoryview(data)[header_size:total_size]
-    command = class_.from_wire(header, payload_bytes, validate=True)
+    command = class_.from_wire(header, payload_bytes)
+    validate_command(command)
     # Advance the buffer.
     return data[total_size:], command, 0
 
 
+def validate_command(command):
+    """
+    Validate a command parsed from captured traffic
+
+    Unlike Message.validate, this accepts a header payload_size which is the
+    size of the payload padded to a multiple of 8 bytes: the padding of
+    received payloads is not kept.
+    """
+    try:
+        command.validate()
+    except ValidationError:
+        header = command.header
+        size = sum(bytelen(buf) for buf in command.buffers)
+        if (header.payload_size == size or
+                header.payload_size != 8 * ((size + 7) // 8) or
+                header.command != command.ID):
+            raise
+
+
 class EventAddRequestOrResponse(EventAddRequest, register=False):
     "We cannot tell if it is a request or a response."
     pass
@@ -239,25 +295,139 @@ def infer_command_class(header):
             raise ValidationError("Unknown command ID")
 
 
-def shark(file):
-    """
-    Parse pcap (tcpdump) to extract networking info and CA commands.
+def _seq_offset(seq, next_seq):
+    "Signed distance of TCP sequence number seq after next_seq (mod 2**32)"
+    return (seq - next_seq + 0x80000000) % 0x100000000 - 0x80000000
 
-    This function is also accessible via a CLI installed with caproto. Example::
 
-        sudo tcpdump -w - | caproto-shark
+class TCPStream:
+    """
+    Reassemble the bytes sent in one direction of a TCP connection
+
+    Segments are ordered by sequence number. Bytes which were already received
+    (retransmissions) are discarded, and segments which arrive ahead of a
+    missing one are held back until it arrives.
 
     Parameters
     ----------
-    file : buffer
+    seq : int, optional
+        The sequence number of the first byte of the stream. If None, the
+        stream starts with the first segment fed to it.
+    """
+    __slots__ = ('next_seq', 'buffer', 'out_of_order')
 
-    Yields
-    ------
-    command_context : SimpleNamespace
-        Contains timestamp, ethernet, src, dst, ip, transport, and command.
+    def __init__(self, seq=None):
+        self.next_seq = seq
+        self.buffer = bytearray()
+        self.out_of_order = {}
+
+    def feed(self, seq, data):
+        """
+        Add the payload of a segment to the stream
+
+        Parameters
+        ----------
+        seq : int
+            The sequence number of the first byte of data
+        data : bytes
+
+        Returns
+        -------
+        extended : bool
+            Whether new bytes were added to ``buffer``
+
+        Raises
+        ------
+        ValidationError
+            If more than ``MAX_OUT_OF_ORDER_SEGMENTS`` are waiting for a
+            missing segment
+        """
+        if self.next_seq is None:
+            self.next_seq = seq
+        offset = _seq_offset(seq, self.next_seq)
+        if offset > 0:
+            if len(data) > len(self.out_of_order.get(seq, b'')):
+                self.out_of_order[seq] = data
+            if len(self.out_of_order) > MAX_OUT_OF_ORDER_SEGMENTS:
+                raise ValidationError("Missing TCP segment")
+            return False
+        if not self._append(offset, data):
+            return False
+        while self.out_of_order:
+            for seq, data in self.out_of_order.items():
+                offset = _seq_offset(seq, self.next_seq)
+                if offset <= 0:
+                    break
+            else:
+                break
+            del self.out_of_order[seq]
+            self._append(offset, data)
+        return True
+
+    def _append(self, offset, data):
+        # The first -offset bytes of data have been received already.
+        if len(data) <= -offset:
+            return False
+        self.buffer += data[-offset:]
+        self.next_seq = (self.next_seq + len(data) + offset) & 0xffffffff
+        return True
+
+
+class _FlowTable:
     """
-    banned = set()
-    for timestamp, buffer in Reader(file):
+    State kept per flow, forgetting the flows least recently seen
+
+    Beyond ``MAX_TRACKED_FLOWS`` flows, or after ``FLOW_IDLE_TIMEOUT`` seconds
+    without a frame, the state of a flow is dropped.
+    """
+    def __init__(self):
+        # Map each flow to [timestamp last seen, state], least recent first
+        self._flows = OrderedDict()
+
+    def __contains__(self, flow):
+        return flow in self._flows
+
+    def __len__(self):
+        return len(self._flows)
+
+    def get(self, flow, timestamp):
+        "Return the state of flow, or None, noting that it was seen"
+        entry = self._flows.get(flow)
+        if entry is None:
+            return None
+        entry[0] = timestamp
+        self._flows.move_to_end(flow)
+        return entry[1]
+
+    def set(self, flow, timestamp, state):
+        self._flows[flow] = [timestamp, state]
+        self._flows.move_to_end(flow)
+
+    def discard(self, flow):
+        self._flows.pop(flow, None)
+
+    def expire(self, timestamp):
+        "Forget the flows idle since before timestamp, and any over the limit"
+        flows = self._flows
+        while flows:
+            last_seen, _ = next(iter(flows.values()))
+            if (len(flows) <= MAX_TRACKED_FLOWS and
+                    timestamp - last_seen < FLOW_IDLE_TIMEOUT):
+                break
+            flows.popitem(last=False)
+
+
+def _parse_frames(frames):
+    """
+    Parse CA commands from (frame number, timestamp, buffer) of each frame
+
+    Yields (frame number, namespace) for each command.
+    """
+    streams = _FlowTable()
+    banned = _FlowTable()
+    for frame, timestamp, buffer in frames:
+        streams.expire(timestamp)
+        banned.expire(timestamp)
         ethernet = Ethernet(buffer)
         ip = ethernet.data
         if not isinstance(ip, IP):
@@ -265,35 +435,604 @@ def shark(file):
         transport = ip.data
         if not isinstance(transport, (TCP, UDP)):
             continue
+        flow = (ip.src, transport.sport, ip.dst, transport.dport)
+        if isinstance(transport, TCP) and transport.flags & TH_SYN:
+            # A new connection, which may reuse the addresses of a banned one
+            banned.discard(flow)
+            streams.set(flow, timestamp,
+                        TCPStream((transport.seq + 1) & 0xffffffff))
+        if banned.get(flow, timestamp) is not None:
+            continue
         try:
             src = inet_ntoa(ip.src)
             dst = inet_ntoa(ip.dst)
             if isinstance(transport, TCP):
-                if (ip.src, transport.sport) in banned:
-                    continue
-                data = bytearray(transport.data)
-                while True:
-                    data, command, _ = read_from_bytestream(data)
-                    if command is NEED_DATA:
-                        break
-                    yield SimpleNamespace(timestamp=timestamp,
-                                          ethernet=ethernet,
-                                          src=src,
-                                          dst=dst,
-                                          ip=ip,
-                                          transport=transport,
-                                          command=command)
+                stream = streams.get(flow, timestamp)
+                if stream is None:
+                    # The capture started after the connection was made, or
+                    # the connection was idle long enough to be forgotten.
+                    stream = TCPStream()
+                    streams.set(flow, timestamp, stream)
+                seq = transport.seq
+                if transport.flags & TH_SYN:
+                    seq = (seq + 1) & 0xffffffff
+                if transport.data and stream.feed(seq, transport.data):
+                    while True:
+                        stream.buffer, command, _ = read_from_bytestream(
+                            stream.buffer)
+                        if command is NEED_DATA:
+                            if len(stream.buffer) > MAX_STREAM_BUFFER:
+                                raise ValidationError(
+                                    "Command too large to be Channel Access")
+                            break
+                        yield frame, SimpleNamespace(
+                            timestamp=timestamp,
+                            ethernet=ethernet,
+                            src=src,
+                            dst=dst,
+                            ip=ip,
+                            transport=transport,
+                            command=command)
+                if transport.flags & (TH_FIN | TH_RST):
+                    streams.discard(flow)
             elif isinstance(transport, UDP):
-                if (ip.src, transport.sport) in banned:
-                    continue
                 address = inet_ntoa(ip.src)
                 for command in read_datagram(transport.data, address):
-                    yield SimpleNamespace(timestamp=timestamp,
-                                          ethernet=ethernet,
-                                          src=src,
-                                          dst=dst,
-                                          ip=ip,
-                                          transport=transport,
-                                          command=command)
+                    yield frame, SimpleNamespace(
+                        timestamp=timestamp,
+                        ethernet=ethernet,
+                        src=src,
+                        dst=dst,
+                        ip=ip,
+                        transport=transport,
+                        command=command)
         except ValidationError:
-            banned.add((ip.src, transport.sport))
+            banned.set(flow, timestamp, True)
+            streams.discard(flow)
+
+
+def flow_partition(buffer, partitions):
+    """
+    Assign an Ethernet frame to one of several partitions by its flow
+
+    Both directions of a flow---the IP addresses and TCP or UDP ports of its
+    two ends---are assigned to the same partition. This reads only the fixed
+    offsets of the headers, without parsing the frame.
+
+    Parameters
+    ----------
+    buffer : bytes
+        The frame, as read from a pcap file
+    partitions : int
+
+    Returns
+    -------
+    partition : int
+        Frames other than TCP or UDP over IPv4 are assigned to partition 0.
+    """
+    if len(buffer) < 14:
+        return 0
+    offset = 14
+    ethertype = buffer[12] << 8 | buffer[13]
+    if ethertype == 0x8100 and len(buffer) >= 18:
+        # 802.1Q VLAN tag
+        offset = 18
+        ethertype = buffer[16] << 8 | buffer[17]
+    if ethertype != 0x0800 or len(buffer) < offset + 20:
+        return 0
+    if buffer[offset + 9] not in (6, 17):  # TCP, UDP
+        return 0
+    ports = offset + (buffer[offset] & 0x0f) * 4
+    end_a = buffer[offset + 12:offset + 16] + buffer[ports:ports + 2]
+    end_b = buffer[offset + 16:offset + 20] + buffer[ports + 2:ports + 4]
+    return zlib.crc32(min(end_a, end_b) + max(end_a, end_b)) % partitions
+
+
+def _picklable(namespace):
+    "Make a parsed command and its frame fit to send between processes."
+    command = namespace.command
+    # Payloads received over TCP are memoryviews of the stream buffer, which
+    # cannot be pickled; copy them (into writable buffers, as ctypes needs).
+    command.buffers = tuple(bytearray(buf) if isinstance(buf, memoryview)
+                            else buf for buf in command.buffers)
+    return namespace
+
+
+def _shark_worker(frames, results):
+    "Parse the frames of one partition of a pcap file, batch by batch."
+    parsed = []
+
+    def receive():
+        while True:
+            batch = frames.get()
+            if batch is None:
+                return
+            yield from batch
+            # _parse_frames only asks for the next frame once it is done with
+            # the last, so the batch is fully parsed here.
+            results.put(parsed[:])
+            parsed.clear()
+
+    try:
+        for frame, namespace in _parse_frames(receive()):
+            parsed.append((frame, _picklable(namespace)))
+    except BaseException as ex:
+        results.put(RuntimeError(f'shark worker (pid {os.getpid()}) failed: '
+                                 f'{ex!r}'))
+        raise
+
+
+def _receive(results, worker):
+    "The parsed commands of the next batch of frames sent to a worker"
+    while True:
+        try:
+            batch = results.get(timeout=1.0)
+        except queue.Empty:
+            if not worker.is_alive():
+                raise RuntimeError(f'{worker.name} exited with code '
+                                   f'{worker.exitcode}') from None
+            continue
+        if isinstance(batch, Exception):
+            raise batch
+        return batch
+
+
+def _shark_parallel(filename, processes):
+    frames = [multiprocessing.Queue(maxsize=PARALLEL_BATCHES_AHEAD)
+              for _ in range(processes)]
+    results = [multiprocessing.Queue() for _ in range(processes)]
+    workers = [
+        multiprocessing.Process(target=_shark_worker,
+                                args=(frames[partition], results[partition]),
+                                name=f'caproto-shark-{partition}', daemon=True)
+        for partition in range(processes)
+    ]
+    for worker in workers:
+        worker.start()
+
+    def merge_batch():
+        # Each worker parses its part of every batch; the commands of a batch
+        # are merged by frame number.
+        batches = [_receive(*args) for args in zip(results, workers)]
+        for _, namespace in heapq.merge(*batches, key=itemgetter(0)):
+            yield namespace
+
+    try:
+        pending = 0
+        with open(filename, 'rb') as file:
+            records = enumerate(Reader(file))
+            while True:
+                chunk = list(itertools.islice(records, PARALLEL_BATCH_SIZE))
+                if not chunk:
+                    break
+                batches = [[] for _ in range(processes)]
+                for frame, (timestamp, buffer) in chunk:
+                    batches[flow_partition(buffer, processes)].append(
+                        (frame, timestamp, buffer))
+                for partition, batch in enumerate(batches):
+                    frames[partition].put(batch)
+                pending += 1
+                if pending > PARALLEL_BATCHES_AHEAD:
+                    yield from merge_batch()
+                    pending -= 1
+        for partition in range(processes):
+            frames[partition].put(None)
+        for _ in range(pending):
+            yield from merge_batch()
+    finally:
+        for worker in workers:
+            if worker.is_alive():
+                worker.terminate()
+            worker.join()
+
+
+def shark(file, *, processes=1):
+    """
+    Parse pcap (tcpdump) to extract networking info and CA commands.
+
+    This function is also accessible via a CLI installed with caproto. Example::
+
+        sudo tcpdump -w - | caproto-shark
+
+    TCP segments are reassembled per flow (source and destination address and
+    port), so commands which span segments are parsed. Each command is
+    reported with the timestamp and headers of the frame which completed it.
+    Flows which are not Channel Access, or of which the capture missed a
+    segment, are ignored.
+
+    Parameters
+    ----------
+    file : buffer or str
+        A pcap stream, or the name of a pcap file
+    processes : int, optional
+        If greater than 1, the flows are split among this many worker
+        processes: the file is read here, and each worker is sent and parses
+        only the frames of its own flows. This requires a file, rather than a
+        stream such as stdin. The commands are yielded in the same order as by
+        a single process.
+
+    Yields
+    ------
+    command_context : SimpleNamespace
+        Contains timestamp, ethernet, src, dst, ip, transport, and command.
+    """
+    if processes > 1:
+        if isinstance(file, (str, os.PathLike)):
+            filename = os.fspath(file)
+        else:
+            filename = getattr(file, 'name', None)
+        if not isinstance(filename, str) or not os.path.isfile(filename):
+            raise ValueError("Parsing with more than one process requires a "
+                             "pcap file, rather than a stream.")
+        yield from _shark_parallel(filename, processes)
+    elif isinstance(file, (str, os.PathLike)):
+        with open(file, 'rb') as f:
+            yield from shark(f)
+    else:
+        frames = ((frame, timestamp, buffer)
+                  for frame, (timestamp, buffer) in enumerate(Reader(file)))
+        for _, namespace in _parse_frames(frames):
+            yield namespace
+
+
+HeavyHitter = namedtuple('HeavyHitter', 'key weight error count')
+HeavyHitter.__doc__ = '''
+An estimate of the weight of a key in a stream, from SpaceSaving
+
+Parameters
+----------
+key : hashable
+weight : int
+    The estimated total weight, which may be an overestimate by up to
+    ``error``
+error : int
+    The most by which ``weight`` may be an overestimate
+count : int
+    The number of times the key was added since it was last tracked. This is
+    exact if ``error`` is 0, and an underestimate otherwise.
+'''
+
+
+class SpaceSaving:
+    """
+    Find the heaviest keys of a stream in bounded memory
+
+    This is the Space-Saving algorithm of Metwally, Agrawal and El Abbadi,
+    with weights. At most ``capacity`` keys are tracked; a new key replaces
+    the lightest, inheriting its weight as the error of its estimate. Every
+    key with more than ``1 / capacity`` of the total weight is tracked.
+
+    Parameters
+    ----------
+    capacity : int
+        The maximum number of keys tracked
+    """
+    __slots__ = ('capacity', 'total', '_entries', '_heap', '_order')
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.total = 0
+        # key -> [weight, error, count]
+        self._entries = {}
+        # (weight, order, key), of which the weight may be out of date
+        self._heap = []
+        self._order = itertools.count()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add(self, key, weight=1):
+        "Add weight to key"
+        self.total += weight
+        entry = self._entries.get(key)
+        if entry is not None:
+            entry[0] += weight
+            entry[2] += 1
+            return
+
+        error = 0
+        if len(self._entries) >= self.capacity:
+            # Replace the lightest key, updating heap entries as we go.
+            heap = self._heap
+            while True:
+                error, _, lightest = heapq.heappop(heap)
+                current = self._entries[lightest][0]
+                if current == error:
+                    break
+                heapq.heappush(heap, (current, next(self._order), lightest))
+            del self._entries[lightest]
+
+        self._entries[key] = [error + weight, error, 1]
+        heapq.heappush(self._heap,
+                       (error + weight, next(self._order), key))
+
+    def top(self, n=None):
+        """
+        The heaviest keys, heaviest first
+
+        Parameters
+        ----------
+        n : int, optional
+            Number of keys. Defaults to all that are tracked.
+
+        Returns
+        -------
+        heavy_hitters : list of HeavyHitter
+        """
+        return _top(self._entries, n)
+
+    @classmethod
+    def merged(cls, summaries, n=None):
+        """
+        The heaviest keys of several summaries combined
+
+        The weights, errors and counts of a key are summed over the summaries.
+
+        Parameters
+        ----------
+        summaries : iterable of SpaceSaving
+        n : int, optional
+            Number of keys. Defaults to all that are tracked.
+
+        Returns
+        -------
+        heavy_hitters : list of HeavyHitter
+        """
+        combined = {}
+        for summary in summaries:
+            for key, (weight, error, count) in summary._entries.items():
+                entry = combined.setdefault(key, [0, 0, 0])
+                entry[0] += weight
+                entry[1] += error
+                entry[2] += count
+        return _top(combined, n)
+
+
+def _top(entries, n):
+    ranked = sorted(entries.items(), key=lambda item: item[1][0],
+                    reverse=True)
+    return [HeavyHitter(key, *entry) for key, entry in ranked[:n]]
+
+
+class SlidingSpaceSaving:
+    """
+    Find the heaviest keys in the last ``window`` seconds of a stream
+
+    The window is divided into ``buckets``, each summarized by a
+    :class:`SpaceSaving` of ``capacity`` keys, and slides forward one bucket
+    at a time.
+
+    Parameters
+    ----------
+    capacity : int
+        The maximum number of keys tracked per bucket
+    window : float
+        In seconds
+    buckets : int, optional
+    """
+    def __init__(self, capacity, window, buckets=6):
+        self.capacity = capacity
+        self.window = window
+        self.bucket_width = window / buckets
+        # (bucket number, SpaceSaving), oldest first
+        self._buckets = deque(maxlen=buckets)
+
+    def add(self, key, weight, timestamp):
+        "Add weight to key at timestamp (in seconds)"
+        number = math.floor(timestamp / self.bucket_width)
+        if not self._buckets or self._buckets[-1][0] < number:
+            self._buckets.append((number, SpaceSaving(self.capacity)))
+        self._buckets[-1][1].add(key, weight)
+
+    def top(self, timestamp, n=None):
+        """
+        The heaviest keys in the window ending at timestamp, heaviest first
+
+        Returns
+        -------
+        heavy_hitters : list of HeavyHitter
+        """
+        oldest = (math.floor(timestamp / self.bucket_width) -
+                  self._buckets.maxlen)
+        return SpaceSaving.merged(
+            (summary for number, summary in self._buckets if number > oldest),
+            n)
+
+
+def _command_size(command):
+    "The size of a command on the wire, in bytes"
+    return ctypes.sizeof(command.header) + command.header.payload_size
+
+
+class TrafficStats:
+    """
+    Running statistics of Channel Access traffic, in bounded memory
+
+    Add the items yielded by :func:`shark` with :meth:`add`, and get a
+    summary of the traffic so far with :meth:`summary`.
+
+    Messages and bytes are counted exactly by command type. By PV name,
+    client/server pair and subscription they are estimated for the heaviest
+    ``capacity`` keys, ranked by bytes (see :class:`SpaceSaving`). Searches
+    per second by host and bytes per second by source host ("talkers") are
+    estimated over the last ``window`` seconds.
+
+    Commands are attributed to PV names by the channel, subscription and I/O
+    ids of each circuit. For channels created before the capture started,
+    the server and id are given instead of the name.
+
+    Parameters
+    ----------
+    capacity : int, optional
+        The maximum number of keys tracked for each statistic
+    window : float, optional
+        In seconds
+    """
+    def __init__(self, capacity=1000, window=60.0):
+        self.capacity = capacity
+        self.window = window
+        self.start = None
+        self.end = None
+        self.messages = 0
+        self.bytes = 0
+        # command type -> [messages, bytes]
+        self.command_types = {}
+        self.pvs = SpaceSaving(capacity)
+        self.pairs = SpaceSaving(capacity)
+        self.subscriptions = SpaceSaving(capacity)
+        self.searches = SlidingSpaceSaving(capacity, window)
+        self.talkers = SlidingSpaceSaving(capacity, window)
+        # (circuit, kind of id, id) -> PV name
+        self._names = OrderedDict()
+
+    def _remember(self, circuit, kind, id_, name):
+        self._names[(circuit, kind, id_)] = name
+        if len(self._names) > MAX_TRACKED_IDS:
+            self._names.popitem(last=False)
+
+    def _lookup(self, circuit, kind, id_, server, *, forget=False):
+        key = (circuit, kind, id_)
+        name = self._names.pop(key, None) if forget else self._names.get(key)
+        if name is None:
+            return f'<{kind} {id_} at {server}>'
+        return name
+
+    def _pv_name(self, command, circuit, client, server):
+        "The PV name a command refers to, if any"
+        if isinstance(command, SearchRequest):
+            self._remember(client, 'search', command.cid, command.name)
+            return command.name
+        if isinstance(command, SearchResponse):
+            return self._lookup(client, 'search', command.cid, server)
+        if isinstance(command, CreateChanRequest):
+            self._remember(circuit, 'cid', command.cid, command.name)
+            return command.name
+        if isinstance(command, CreateChanResponse):
+            name = self._lookup(circuit, 'cid', command.cid, server)
+            self._remember(circuit, 'sid', command.sid, name)
+            return name
+        # The request and response to clear a channel cannot be told apart,
+        # so the ids are left to be forgotten as the oldest.
+        if isinstance(command, (AccessRightsResponse, ClearChannelRequest,
+                                CreateChFailResponse, ServerDisconnResponse)):
+            return self._lookup(circuit, 'cid', command.cid, server)
+        if isinstance(command, (ReadNotifyRequest, ReadRequest,
+                                WriteNotifyRequest)):
+            name = self._lookup(circuit, 'sid', command.sid, server)
+            self._remember(circuit, 'ioid', command.ioid, name)
+            return name
+        if isinstance(command, (ReadNotifyResponse, ReadResponse,
+                                WriteNotifyResponse)):
+            return self._lookup(circuit, 'ioid', command.ioid, server,
+                                forget=True)
+        if isinstance(command, WriteRequest):
+            return self._lookup(circuit, 'sid', command.sid, server)
+        if isinstance(command, EventCancelRequest):
+            return self._lookup(circuit, 'subscription',
+                                command.subscriptionid, server)
+        if isinstance(command, EventAddRequest):
+            name = self._lookup(circuit, 'sid', command.sid, server)
+            self._remember(circuit, 'subscription', command.subscriptionid,
+                           name)
+            return name
+        if isinstance(command, (EventAddResponse, EventCancelResponse)):
+            return self._lookup(circuit, 'subscription',
+                                command.subscriptionid, server,
+                                forget=isinstance(command,
+                                                  EventCancelResponse))
+        return None
+
+    def add(self, namespace):
+        """
+        Add a command to the statistics
+
+        Parameters
+        ----------
+        namespace : SimpleNamespace
+            As yielded by :func:`shark`
+        """
+        command = namespace.command
+        timestamp = namespace.timestamp
+        size = _command_size(command)
+        if self.start is None:
+            self.start = timestamp
+        self.end = timestamp
+        self.messages += 1
+        self.bytes += size
+        totals = self.command_types.setdefault(type(command).__name__, [0, 0])
+        totals[0] += 1
+        totals[1] += size
+
+        source = f'{namespace.src}:{namespace.transport.sport}'
+        destination = f'{namespace.dst}:{namespace.transport.dport}'
+        if command.DIRECTION is RESPONSE:
+            client, server = destination, source
+            client_host, server_host = namespace.dst, namespace.src
+        else:
+            client, server = source, destination
+            client_host, server_host = namespace.src, namespace.dst
+        # Some commands cannot be told to be requests or responses, so the
+        # circuit is identified regardless of direction.
+        circuit = tuple(sorted((source, destination)))
+
+        self.pairs.add(f'{client_host} -> {server_host}', size)
+        self.talkers.add(namespace.src, size, timestamp)
+        if isinstance(command, SearchRequest):
+            self.searches.add(namespace.src, 1, timestamp)
+
+        name = self._pv_name(command, circuit, client, server)
+        if name is not None:
+            self.pvs.add(name, size)
+        if isinstance(command, EventAddResponse):
+            self.subscriptions.add(
+                f'{name} ({client} #{command.subscriptionid})', size)
+
+    def summary(self, n=10):
+        """
+        Summarize the traffic so far
+
+        Parameters
+        ----------
+        n : int, optional
+            Number of heaviest keys of each statistic to include
+
+        Returns
+        -------
+        summary : dict
+            Suitable for encoding as JSON. Estimates of the heaviest keys are
+            given as dicts of ``key``, ``bytes`` (or ``searches``),
+            ``messages`` and ``error`` (see :class:`HeavyHitter`).
+        """
+        def heavy(hitters, unit='bytes'):
+            return [{'key': hitter.key, unit: hitter.weight,
+                     'messages': hitter.count, 'error': hitter.error}
+                    for hitter in hitters]
+
+        def rates(hitters, unit):
+            return [{'key': hitter.key, f'{unit}_per_sec': hitter.weight / span,
+                     unit: hitter.weight, 'error': hitter.error}
+                    for hitter in hitters]
+
+        end = self.end if self.end is not None else 0.0
+        duration = end - self.start if self.start is not None else 0.0
+        # The window covers less than its length at the start of a capture.
+        span = max(min(self.window, duration), 1e-6)
+        return {
+            'start': self.start,
+            'end': self.end,
+            'duration': duration,
+            'messages': self.messages,
+            'bytes': self.bytes,
+            'window': self.window,
+            'command_types': {
+                name: {'messages': messages, 'bytes': bytes_}
+                for name, (messages, bytes_) in sorted(
+                    self.command_types.items(), key=lambda item: item[1][1],
+                    reverse=True)
+            },
+            'pvs': heavy(self.pvs.top(n)),
+            'pairs': heavy(self.pairs.top(n)),
+            'subscriptions': heavy(self.subscriptions.top(n)),
+            'search_rates': rates(self.searches.top(end, n), 'searches'),
+            'talkers': rates(self.talkers.top(end, n), 'bytes'),
+        }
@@ -8,7 +8,7 @@ import asv
 
 from collections import OrderedDict, defaultdict
 
-from datetime import datetime
+from datetime import datetime, timezone
 from pytest_benchmark.fixture import BenchmarkFixture
 from pytest_benchmark.utils import NameWrapper
 
@@ -22,7 +22,8 @@ def pytest_bench_machine_to_asv(root, *, node, machine, system, release, cpu,
     'Pytest-benchmark machine infomation to asv'
     asv_defaults = asv.machine.Machine.get_defaults()
     return dict(arch=machine,
-                cpu=cpu['brand'],
+                # py-cpuinfo>=5 renamed 'brand' to 'brand_raw'
+                cpu=cpu.get('brand_raw', cpu.get('brand')),
                 machine=node,
                 os='{} {}'.format(system, release),
                 ram=asv.util.human_file_size(asv_defaults['ram']),
@@ -30,6 +31,15 @@ def pytest_bench_machine_to_asv(root, *, node, machine, system, release, cpu,
                 )
 
 
+def datetime_to_js_timestamp(dt):
+    'Datetime -> asv timestamp, for any version of asv'
+    try:
+        return asv.util.datetime_to_js_timestamp(dt)
+    except TypeError:
+        # asv>=0.6 requires timezone-aware datetimes
+        return asv.util.datetime_to_js_timestamp(dt.astimezone(timezone.utc))
+
+
 def get_bench_name(fullname, name):
     if name in asv_metadata:
         return name
@@ -43,8 +53,8 @@ def single_asv_bench_result(*, start_dt, end_dt, fullname, options, stats,
     'Single benchmark result -> asv format'
     # non-parameterized version
     return dict(
-        started_at=asv.util.datetime_to_js_timestamp(start_dt),
-        ended_at=asv.util.datetime_to_js_timestamp(end_dt),
+        started_at=datetime_to_js_timestamp(start_dt),
+        ended_at=datetime_to_js_timestamp(end_dt),
         results=dict(stats=dict(min=stats['min'],
                                 max=stats['max'],
                                 mean=stats['mean'],
@@ -168,7 +178,7 @@ def pytest_bench_to_asv(root):
 
     bench_results = dict(
         commit_hash=commit_info['id'],
-        date=asv.util.datetime_to_js_timestamp(commit_dt),
+        date=datetime_to_js_timestamp(commit_dt),
         python=python_version,
         params=params,  # TODO
         profiles={},  # TODO
@@ -242,6 +252,10 @@ def pytest_benchmark_update_json(config, benchmarks, output_json):
                          'asv results not saved')
 
 
+# Keyword arguments to pytest.mark.parametrize which are not parameters
+parametrize_options = {'indirect', 'ids', 'scope'}
+
+
 def get_all_params_from_marked_test(node_or_func):
     'Returns (all_param_names, all_param_values)'
     # TODO: important - verify ordering of kwargs
@@ -251,11 +265,12 @@ def get_all_params_from_marked_test(node_or_func):
     arg_values = []
     kwarg_names = []
     kwarg_values = []
-    for pinfo in decorated_test.pytestmark:
+    for pinfo in getattr(decorated_test, 'pytestmark', []):
         if pinfo.name != 'parametrize':
             continue
         _arg_names, _arg_values = pinfo.args[::2], pinfo.args[1::2]
-        _kwarg_names = list(sorted(pinfo.kwargs.keys()))
+        _kwarg_names = list(sorted(key for key in pinfo.kwargs
+                                   if key not in parametrize_options))
         _kwarg_values = [pinfo.kwargs[key] for key in _kwarg_names]
         arg_names += _arg_names
         arg_values += _arg_values
@@ -281,7 +296,7 @@ class AsvBenchmarkFixture(BenchmarkFixture):
         callspec = self.node.callspec
         params = OrderedDict(
             (arg, callspec.params[arg])
-            for arg in callspec.metafunc.fixturenames
+            for arg in self.node.fixturenames
             if arg in callspec.params
         )
 
@@ -301,10 +316,10 @@ class AsvBenchmarkFixture(BenchmarkFixture):
                     param_string=param_string,
                     )
 
-    def __call__(self, function_to_benchmark, *args, **kwargs):
+    def _run_with_metadata(self, run, function_to_benchmark, *args, **kwargs):
         start_dt = datetime.now()
         try:
-            ret = super().__call__(function_to_benchmark, *args, **kwargs)
+            ret = run(function_to_benchmark, *args, **kwargs)
         finally:
             end_dt = datetime.now()
 
@@ -324,6 +339,14 @@ class AsvBenchmarkFixture(BenchmarkFixture):
 
         return ret
 
+    def __call__(self, function_to_benchmark, *args, **kwargs):
+        return self._run_with_metadata(super().__call__, function_to_benchmark,
+                                       *args, **kwargs)
+
+    def pedantic(self, target, *args, **kwargs):
+        return self._run_with_metadata(super().pedantic, target, *args,
+                                       **kwargs)
+
 
 @pytest.fixture(scope="function")
 def asv_bench(request):
@@ -20,10 +20,12 @@ if __name__ == '__main__':
         from caproto.commandline.put import main as put_cli
         from caproto.commandline.monitor import main as monitor_cli
         from caproto.commandline.repeater import main as repeater_cli
+        from caproto.commandline.bench import main as bench_cli
         entry_point = {'caproto-get': get_cli,
                        'caproto-put': put_cli,
                        'caproto-monitor': monitor_cli,
                        'caproto-repeater': repeater_cli,
+                       'caproto-bench': bench_cli,
                        }[script]
         print("--------------------------------------")
         print(f"Running {script} with coverage")
@@ -0,0 +1,133 @@
+'''
+Benchmarks against caproto's own servers, which need no EPICS installation
+
+Each server is run in a background thread by
+``caproto.benchmarking.run_server``, and accessed with the threading client.
+The asyncio server is benchmarked on both the default event loop and, if it is
+installed, uvloop ('asyncio-uvloop'), under the same load.
+'''
+import pytest
+pytest.importorskip('pytest_benchmark')
+import logging
+import time
+
+from caproto.benchmarking import (make_benchmark_pvdb, run_server,
+                                  threading_client, connect_channels,
+                                  measure_monitor_throughput,
+                                  measure_memory_per_channel, search_names)
+from caproto.server.tuning import PERFORMANCE_PROFILES
+
+
+logger = logging.getLogger('caproto')
+
+async_libs = ['asyncio', 'asyncio-uvloop', 'curio', 'trio']
+waveform_sizes = [4096, 65536, 1048576]
+prefix = 'bench:'
+
+# Number of subscription updates to post, by array size
+monitor_counts = {1: 10000, 4096: 1000, 65536: 100, 1048576: 10}
+
+# Parametrize a test by server, as benchmark parameters are taken from marks
+with_servers = pytest.mark.parametrize('server', async_libs, indirect=True)
+
+
+@pytest.fixture(scope='module')
+def server(request):
+    async_lib, _, event_loop = request.param.partition('-')
+    pytest.importorskip(event_loop or async_lib)
+    profile = PERFORMANCE_PROFILES['default']
+    if event_loop:
+        profile = profile._replace(name=request.param, event_loop=event_loop)
+    logger.setLevel('INFO')
+    pvdb = make_benchmark_pvdb(prefix, waveform_sizes=waveform_sizes,
+                               channel_count=10000)
+    with run_server(pvdb, async_lib=async_lib,
+                    performance_profile=profile) as ctx:
+        yield ctx
+
+
+@pytest.fixture
+def client(server):
+    with threading_client() as context:
+        yield context
+
+
+def pvname_for_size(size):
+    return f'{prefix}scalar' if size == 1 else f'{prefix}wf{size}'
+
+
+@with_servers
+@pytest.mark.parametrize('size', [1] + waveform_sizes)
+def test_get(benchmark, server, client, size):
+    pv, = connect_channels(client, [pvname_for_size(size)])
+
+    def get():
+        assert len(pv.read().data) == size
+
+    benchmark(get)
+
+
+@with_servers
+@pytest.mark.parametrize('size', [1] + waveform_sizes)
+def test_put(benchmark, server, client, size):
+    pv, = connect_channels(client, [pvname_for_size(size)])
+    value = list(range(size))
+
+    def put():
+        pv.write(value, wait=True)
+
+    benchmark(put)
+
+
+@with_servers
+@pytest.mark.parametrize('size', [1] + waveform_sizes)
+def test_monitor_throughput(benchmark, server, client, size):
+    pvname = pvname_for_size(size)
+    count = monitor_counts[size]
+    results = []
+
+    def monitor():
+        results.append(measure_monitor_throughput(client, pvname, count))
+
+    benchmark.pedantic(monitor, rounds=3)
+    benchmark.extra_info['updates_per_sec'] = max(
+        result.updates_per_sec for result in results)
+    benchmark.extra_info['dropped'] = sum(
+        result.dropped for result in results)
+    assert all(result.received > 0 for result in results)
+
+
+@with_servers
+@pytest.mark.parametrize('count', [100, 10000])
+def test_search(benchmark, server, count):
+    names = [f'{prefix}ch{idx}' for idx in range(count)]
+    address = ('127.0.0.1', server.ca_server_port)
+
+    def search():
+        assert search_names(names, address=address) == count
+
+    benchmark.pedantic(search, rounds=3)
+
+
+@with_servers
+@pytest.mark.parametrize('count', [100, 10000])
+def test_channel_creation(benchmark, server, count):
+    names = [f'{prefix}ch{idx}' for idx in range(count)]
+    elapsed = []
+
+    def create():
+        with threading_client() as context:
+            t0 = time.monotonic()
+            connect_channels(context, names, timeout=60)
+            elapsed.append(time.monotonic() - t0)
+
+    benchmark.pedantic(create, rounds=3)
+    benchmark.extra_info['channels_per_sec'] = count / min(elapsed)
+
+
+@with_servers
+def test_memory_per_channel(benchmark, server, client):
+    names = [f'{prefix}ch{idx}' for idx in range(1000)]
+    bytes_per_channel = benchmark.pedantic(
+        measure_memory_per_channel, args=(client, names), rounds=1)
+    benchmark.extra_info['bytes_per_channel'] = bytes_per_channel
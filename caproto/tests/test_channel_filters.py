@@ -179,3 +179,70 @@ def test_dbnd_filter(request, caproto_ioc, context, filter, expected):
     pv.write((3.16,))
     time.sleep(0.2)
     assert [res.data[0] for res in responses] == expected
+
+
+@pytest.mark.parametrize('filter, expected',
+                         [('{"dec": {"n": 1}}', [0, 1, 2, 3, 4, 5, 6, 7, 8]),
+                          ('{"dec": {"n": 2}}', [0, 2, 4, 6, 8]),
+                          ('{"dec": {"n": 4}}', [0, 4, 8]),
+                          ('{"dec": {"n": 100}}', [0]),
+                          ])
+def test_dec_filter(request, caproto_ioc, context, filter, expected):
+    full_responses = []
+    responses = []
+
+    def full_cache(sub, response):
+        full_responses.append(response)
+
+    def cache(sub, response):
+        responses.append(response)
+
+    full_pv, pv = context.get_pvs(caproto_ioc.pvs['int'],
+                                  caproto_ioc.pvs['int'] + '.' + filter)
+    full_pv.wait_for_connection()
+    pv.wait_for_connection()
+    full_pv.write((0,), wait=True)
+
+    full_sub = full_pv.subscribe()
+    full_sub.add_callback(full_cache)
+    sub = pv.subscribe()
+    sub.add_callback(cache)
+    time.sleep(0.2)
+    for value in range(1, 9):
+        full_pv.write((value,), wait=True)
+    time.sleep(0.2)
+    assert [res.data[0] for res in responses] == expected
+    assert len(full_responses) == 9
+
+    # The decimated subscription must put proportionally fewer bytes on the
+    # wire than its undecimated counterpart.
+    full_bytes = sum(len(res) for res in full_responses)
+    dec_bytes = sum(len(res) for res in responses)
+    assert dec_bytes * len(full_responses) == full_bytes * len(expected)
+
+
+def test_rate_filter(request, caproto_ioc, context):
+    responses = []
+
+    def cache(sub, response):
+        responses.append(response)
+
+    full_pv, pv = context.get_pvs(caproto_ioc.pvs['int'],
+                                  caproto_ioc.pvs['int'] + '.{"rate": {"max": 5}}')
+    full_pv.wait_for_connection()
+    pv.wait_for_connection()
+    full_pv.write((0,), wait=True)
+
+    sub = pv.subscribe()
+    sub.add_callback(cache)
+    time.sleep(0.2)
+    # Write at ~100 Hz for one second; at most 5 Hz should be forwarded.
+    for value in range(1, 101):
+        full_pv.write((value,), wait=False)
+        time.sleep(0.01)
+    time.sleep(0.5)
+    values = [res.data[0] for res in responses]
+    assert values[0] == 0
+    # The latest value must be delivered when the final window closes.
+    assert values[-1] == 100
+    assert len(values) <= 2 + 5 * 1.5
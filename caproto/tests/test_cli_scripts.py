@@ -1,3 +1,4 @@
+import json
 import sys
 import pytest
 import subprocess
@@ -220,3 +221,25 @@ def test_monitor(args, ioc):
                          **os_kwargs)
 
     _subprocess_communicate(p, 'camonitor', timeout=2.0)
+
+
+@pytest.mark.parametrize('args',
+                         [('-N', '1', '--put-rate', '20'),
+                          ('-N', '2', '--put-rate', '50', '-d', 'time'),
+                          ('-N', '1', '-K', '0', '--json'),
+                          ])
+def test_bench(args, ioc, tmpdir):
+    scenario = str(tmpdir.join('scenario.json'))
+    with open(scenario, 'w') as f:
+        json.dump({'pv_names': [ioc.pvs['int']], 'duration': 1,
+                   'timeout': 3}, f)
+
+    command = 'caproto-bench'
+    p = subprocess.Popen([sys.executable, '-um', 'caproto.tests.example_runner',
+                          '--script', command, '--scenario', scenario] +
+                         list(args),
+                         stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    stdout, stderr = p.communicate(timeout=20.0)
+    dump_process_output(command, stdout, stderr)
+    assert p.poll() == 0
+    assert b'updates_per_sec' in stdout or b'updates/s' in stdout
@@ -395,3 +395,36 @@ def test_long_to_wire(backends, from_dtype, to_dtype, values, expected,
     run_conversion_test(values=values, from_dtype=from_dtype,
                         to_dtype=to_dtype, expected=expected,
                         direction=TO_WIRE, **kwargs)
+
+
+@pytest.mark.parametrize('dtype', (INT, FLOAT, LONG, DOUBLE))
+def test_big_endian_to_wire_without_copy(backends, dtype):
+    values = backend.python_to_epics(dtype, [1, 2, 3], byteswap=True)
+    if backend.backend_name == 'numpy':
+        # The caller's array might change before it is sent: it is copied
+        copied = backend.python_to_epics(dtype, values, byteswap=True)
+        assert copied is not values
+        assert bytes(copied) == bytes(values)
+        values.flags.writeable = False
+    # Already in wire format (and, with numpy, read-only): no copy is made.
+    assert backend.python_to_epics(dtype, values, byteswap=True) is values
+    # ... unless it is a strided slice, which cannot be sent as-is.
+    strided = backend.python_to_epics(dtype, values[::2], byteswap=True)
+    assert memoryview(strided).contiguous
+
+
+@pytest.mark.parametrize(
+    'buf, data_count, expected',
+    [(b'abc', None, [b'abc']),
+     (b'abc', 2, [b'abc', b'']),
+     (b'abc\x00garbage'.ljust(40, b'\x00') + b'def', 2, [b'abc', b'def']),
+     (b'x' * 45, None, [b'x' * 40]),
+     (memoryview(b'abc'.ljust(40, b'\x00') * 3), None, [b'abc'] * 3),
+     ]
+)
+def test_string_array_frombuffer(buf, data_count, expected):
+    strings = DbrStringArray.frombuffer(buf, data_count)
+    assert isinstance(strings, DbrStringArray)
+    assert list(strings) == expected
+    assert DbrStringArray(expected).tobytes() == b''.join(
+        s.ljust(40, b'\x00') for s in expected)
@@ -0,0 +1,244 @@
+import textwrap
+
+import pytest
+
+import caproto as ca
+from caproto.benchmarking import make_database, run_server
+from caproto.benchmarking.inprocess import connect_channels, threading_client
+from caproto.server import database
+from caproto.server.database import (DatabaseRecord, load_database,
+                                     merge_records, parse_database,
+                                     parse_substitutions, read_database,
+                                     substitute_macros)
+
+
+DB = '''\
+# A comment with an $(UNDEFINED) macro
+record(ai, "$(P)temperature") {
+    field(DESC, "Temperature")
+    field(EGU, "degC")
+    field(PREC, "2")
+    field(HOPR, "100")
+    field(LOPR, "-$(RANGE=50)")
+    field(VAL, "21.5")
+    field(INP, "$(P)sensor CP MS")
+    info(autosaveFields, "VAL")
+    alias("$(P)temp")
+}
+
+record(bo, "$(P)heater")
+{
+    field(ZNAM, "Off")
+    field(ONAM, "On")
+    field(VAL, "1")
+    field(FLNK, {const: "$(P)temperature"})
+}
+
+grecord(waveform,"$(P)trace") { field(FTVL,DOUBLE) field(NELM,16) }
+record(mbbi, "$(P)mode") {
+    field(ZRST, "Idle")
+    field(ONST, "Running")
+    field(TWST, "Fault")
+}
+record(stringin, "$(P)name") {
+    field(VAL, "a \\"quoted\\" name")
+}
+record("*", "$(P)heater") {
+    field(DESC, "Heater")
+}
+alias("$(P)heater", "$(P)htr")
+'''
+
+
+def test_substitute_macros():
+    macros = {'P': 'XF:31ID{Dev:1}', 'R': '$(P)R', 'LOOP': '$(LOOP)'}
+    assert substitute_macros('$(P)A ${P}B', macros) == \
+        'XF:31ID{Dev:1}A XF:31ID{Dev:1}B'
+    assert substitute_macros('$(R)', macros) == 'XF:31ID{Dev:1}R'
+    assert substitute_macros('$(Q=$(P))$(N=1)', macros) == 'XF:31ID{Dev:1}1'
+    assert substitute_macros('no macros, $5', macros) == 'no macros, $5'
+    with pytest.raises(ca.CaprotoKeyError):
+        substitute_macros('$(Q)', macros)
+    with pytest.raises(ca.CaprotoValueError):
+        substitute_macros('$(LOOP)', macros)
+
+
+def test_parse_database():
+    records = list(parse_database(DB.splitlines(), {'P': 'x:'}))
+    assert [record.name for record in records] == [
+        'x:temperature', 'x:heater', 'x:trace', 'x:mode', 'x:name',
+        'x:heater', 'x:heater']
+    temperature, heater, trace, mode, name = records[:5]
+    assert temperature == DatabaseRecord(
+        'x:temperature', 'ai',
+        {'DESC': 'Temperature', 'EGU': 'degC', 'PREC': '2', 'HOPR': '100',
+         'LOPR': '-50', 'VAL': '21.5', 'INP': 'x:sensor CP MS'},
+        {'autosaveFields': 'VAL'}, ('x:temp', ))
+    assert heater.fields['FLNK'] == '{const: "x:temperature"}'
+    assert trace.fields == {'FTVL': 'DOUBLE', 'NELM': '16'}
+    assert name.fields['VAL'] == 'a "quoted" name'
+    assert records[5].record_type is None
+    assert records[6] == DatabaseRecord('x:heater', None, {}, {},
+                                        ('x:htr', ))
+
+    merged = merge_records(records)
+    assert len(merged) == 5
+    assert merged[1].fields['DESC'] == 'Heater'
+    assert merged[1].aliases == ('x:htr', )
+
+
+@pytest.mark.parametrize('text, message', [
+    ('record(ai, "a") {\n    field(DESC "no comma")\n}', '<string>:2:'),
+    ('record(ai, "$(P)a")', 'Undefined macro'),
+    ('record(ai, "a") {\n    unknown(X, "1")\n}', 'unknown'),
+    ('record(ai, "a") {\n', 'expected'),
+])
+def test_parse_database_errors(text, message):
+    with pytest.raises(ca.CaprotoValueError, match=message):
+        list(parse_database(text.splitlines()))
+
+
+def test_merge_records_errors():
+    with pytest.raises(ca.CaprotoValueError):
+        merge_records([DatabaseRecord('a', None, {}, {}, ())])
+    with pytest.raises(ca.CaprotoValueError):
+        merge_records([DatabaseRecord('a', 'ai', {}, {}, ()),
+                       DatabaseRecord('a', 'ao', {}, {}, ())])
+
+
+def test_parse_substitutions():
+    text = '''
+    global { P=x: }
+    file "motor.db" {
+        pattern { M, ADDR }
+        { m1, 1 }
+        { m2, "2" }
+    }
+    file counter.db {
+        { C=c1, P=y: }
+        global { P=z: }
+        { C=c2 }
+    }
+    '''
+    assert list(parse_substitutions(text.splitlines(), {'TOP': '/'})) == [
+        ('motor.db', {'TOP': '/', 'P': 'x:', 'M': 'm1', 'ADDR': '1'}),
+        ('motor.db', {'TOP': '/', 'P': 'x:', 'M': 'm2', 'ADDR': '2'}),
+        ('counter.db', {'TOP': '/', 'P': 'y:', 'C': 'c1'}),
+        ('counter.db', {'TOP': '/', 'P': 'z:', 'C': 'c2'}),
+    ]
+    with pytest.raises(ca.CaprotoValueError):
+        list(parse_substitutions(['file a.db { pattern {A B} {1} }']))
+
+
+def write(path, text):
+    path.write_text(textwrap.dedent(text))
+    return str(path)
+
+
+def test_read_database_substitutions(tmp_path):
+    (tmp_path / 'db').mkdir()
+    write(tmp_path / 'db' / 'common.db', '''
+        record(stringin, "$(P)$(M):NAME") {
+            field(VAL, "$(M)")
+        }
+    ''')
+    write(tmp_path / 'db' / 'motor.template', '''
+        record(ao, "$(P)$(M)") {
+            field(DESC, "Motor $(M)")
+        }
+        include "common.db"
+    ''')
+    subs = write(tmp_path / 'motors.substitutions', '''
+        file "$(DB)/motor.template" {
+            pattern { M }
+            { m1 }
+            { m2 }
+        }
+    ''')
+    records = read_database(subs, {'P': 'x:', 'DB': 'db'})
+    assert [record.name for record in records] == [
+        'x:m1', 'x:m1:NAME', 'x:m2', 'x:m2:NAME']
+    assert records[2].fields['DESC'] == 'Motor m2'
+
+    with pytest.raises(ca.CaprotoValueError, match='cannot find'):
+        read_database(subs, {'P': 'x:', 'DB': 'elsewhere'})
+
+
+def test_read_database_cache(tmp_path, monkeypatch):
+    db = write(tmp_path / 'a.db', '''
+        record(ai, "$(P)a") {
+            field(VAL, "1")
+        }
+        include "b.db"
+    ''')
+    b = tmp_path / 'b.db'
+    write(b, 'record(ai, "$(P)b")\n')
+    cache_dir = str(tmp_path / 'cache')
+
+    records = read_database(db, {'P': 'x:'}, cache_dir=cache_dir)
+    assert len(list((tmp_path / 'cache').iterdir())) == 1
+
+    def fail(*args, **kwargs):
+        raise AssertionError('parsed again')
+
+    with monkeypatch.context() as m:
+        m.setattr(database, 'parse_database', fail)
+        assert read_database(db, {'P': 'x:'}, cache_dir=cache_dir) == records
+        with pytest.raises(AssertionError):
+            # Other macros are cached separately
+            read_database(db, {'P': 'y:'}, cache_dir=cache_dir)
+
+    # A change to an included file invalidates the cache
+    write(b, 'record(ai, "$(P)c")\n')
+    records = read_database(db, {'P': 'x:'}, cache_dir=cache_dir)
+    assert [record.name for record in records] == ['x:a', 'x:c']
+
+
+def test_load_database(tmp_path):
+    db = write(tmp_path / 'test.db', DB)
+    group = load_database(db, macros={'P': 'x:'})
+    assert set(group.pvdb) == {'x:temperature', 'x:temp', 'x:heater',
+                               'x:htr', 'x:trace', 'x:mode', 'x:name'}
+
+    temperature = group.pvdb['x:temperature']
+    assert group.pvdb['x:temp'] is temperature
+    assert temperature.value == 21.5
+    assert temperature.units == 'degC'
+    assert temperature.precision == 2
+    assert temperature.lower_ctrl_limit == -50
+    assert temperature.__doc__ == 'Temperature'
+    assert temperature.record_type == 'ai'
+    # Fields are instantiated on first access, with the values of the db
+    assert temperature._field_inst is None
+    assert temperature.fields['INP'].value == 'x:sensor CP MS'
+    assert temperature.fields['EGU'].value == 'degC'
+    assert temperature.fields['HOPR'].value == 100
+
+    heater = group.pvdb['x:heater']
+    assert heater.enum_strings == ('Off', 'On')
+    assert heater.value == 'On'
+    assert heater.__doc__ == 'Heater'
+    assert group.pvdb['x:mode'].enum_strings == ('Idle', 'Running', 'Fault')
+
+    trace = group.pvdb['x:trace']
+    assert trace.data_type == ca.ChannelType.DOUBLE
+    assert trace.max_length == 16
+
+
+def test_load_database_errors(tmp_path):
+    db = write(tmp_path / 'test.db', 'record(nosuchtype, "a")\n')
+    with pytest.raises(ca.CaprotoValueError, match='nosuchtype'):
+        load_database(db)
+
+
+def test_serve_database(tmp_path):
+    db = write(tmp_path / 'bench.db', make_database({
+        (f'db:ao{i}', 'ao'): {'VAL': i, 'EGU': 'mm'} for i in range(100)}))
+    group = load_database(db)
+    with run_server(group.pvdb, async_lib='asyncio'):
+        with threading_client() as client:
+            ao, egu, rtyp = connect_channels(
+                client, ['db:ao42', 'db:ao42.EGU', 'db:ao42.RTYP'])
+            assert list(ao.read().data) == [42.0]
+            assert egu.read().data == [b'mm']
+            assert rtyp.read().data == [b'ao']
@@ -2,6 +2,7 @@ import ctypes
 import pytest
 
 import caproto as ca
+from caproto._commands import read_from_bytestream
 from caproto._constants import (MAX_STRING_SIZE, MAX_UNITS_SIZE,
                                 MAX_ENUM_STATES, MAX_ENUM_STRING_SIZE)
 
@@ -511,3 +512,35 @@ def test_dict_parameters(dbr, expected_dbr):
         'no_str', 'strs'}
     remaining = field_names - set(info_dict.keys()) - valid_to_skip
     assert len(remaining) == 0, 'fields not captured in info_keys'
+
+
+@pytest.mark.parametrize('dbr, expected_dbr', dbr_types)
+def test_dict_matches_fields(dbr, expected_dbr):
+    # DBR_STS_* and DBR_TIME_* unpack their leading fields with struct;
+    # make sure they agree with the ctypes fields.
+    inst = dbr()
+    if hasattr(inst, 'status'):
+        inst.status = ca.AlarmStatus.HIHI
+        inst.severity = ca.AlarmSeverity.MAJOR_ALARM
+    if hasattr(inst, 'stamp'):
+        inst.secondsSinceEpoch = 1000000
+        inst.nanoSeconds = 500
+    info_dict = inst.to_dict()
+    for field in inst.info_fields:
+        assert info_dict[field] == getattr(inst, field)
+
+
+def test_extract_metadata_without_copy():
+    metadata = ca.DBR_TYPES[ca.ChannelType.TIME_DOUBLE](
+        status=ca.AlarmStatus.HIHI)
+    res = ca.EventAddResponse(data=[1.5], data_type=ca.ChannelType.TIME_DOUBLE,
+                              data_count=1, status=1, subscriptionid=0,
+                              metadata=metadata)
+    wire = bytearray(bytes(res.header) + b''.join(bytes(buf) for buf in
+                                                  res.buffers))
+    _, received, _ = read_from_bytestream(wire, ca.SERVER)
+    # The metadata is a view on the received bytes.
+    assert received.metadata is received.metadata
+    assert ctypes.addressof(received.metadata) == (
+        ctypes.addressof(ctypes.c_char.from_buffer(wire, ctypes.sizeof(res.header))))
+    assert received.metadata.status == ca.AlarmStatus.HIHI
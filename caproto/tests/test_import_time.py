@@ -0,0 +1,98 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+
+# Time to import each of the modules below in a fresh interpreter, in seconds,
+# as measured with Python 3.8 and numpy installed (the best of a few runs).
+# Wall-clock times depend on the machine, so they are only checked when the
+# CAPROTO_IMPORT_TIME_TEST environment variable is set.
+IMPORT_TIMES = {
+    'caproto': 0.10,
+    'caproto.sync.client': 0.11,
+    'caproto.threading.client': 0.11,
+    'caproto.server': 0.12,
+}
+# A timing test fails when an import takes longer than its time above plus
+# this margin, in seconds.
+IMPORT_TIME_MARGIN = 0.15
+# The best of this many imports is compared, to weed out noise.
+IMPORT_REPEATS = 3
+
+
+def import_times(module):
+    '''
+    Import module in a fresh interpreter with ``python -X importtime``
+
+    Returns
+    -------
+    times : dict
+        Maps the name of each module imported to its cumulative import time,
+        in seconds
+    '''
+    output = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        stderr=subprocess.PIPE, universal_newlines=True, check=True).stderr
+
+    times = {}
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line.split('|')
+        times[name.strip()] = int(cumulative) * 1e-6
+    return times
+
+
+@pytest.mark.skipif(sys.version_info < (3, 7),
+                    reason='Requires python -X importtime and PEP 562')
+@pytest.mark.parametrize(
+    'module, not_imported',
+    [('caproto', {'caproto.server', 'numpy'}),
+     ('caproto.sync.client', {'caproto.server', 'curio', 'trio', 'numpy'}),
+     ('caproto.threading.client', {'caproto.server', 'curio', 'trio',
+                                   'numpy'}),
+     ('caproto.server', {'caproto.server.conversion', 'caproto.server.menus',
+                         'caproto.server.records', 'numpy'}),
+     ]
+)
+def test_heavy_modules_not_imported(module, not_imported):
+    assert not (not_imported & set(import_times(module)))
+
+
+@pytest.mark.skipif(sys.version_info < (3, 7),
+                    reason='Requires python -X importtime')
+@pytest.mark.skipif(os.environ.get('CAPROTO_IMPORT_TIME_TEST') is None,
+                    reason='Set CAPROTO_IMPORT_TIME_TEST to check import times')
+@pytest.mark.parametrize('module', list(IMPORT_TIMES))
+def test_import_time(module):
+    best = min(import_times(module)[module] for _ in range(IMPORT_REPEATS))
+    assert best < IMPORT_TIMES[module] + IMPORT_TIME_MARGIN
+
+
+def test_backend_selected_on_first_use_in_threads():
+    # The default backend is only selected on first use, and other threads
+    # using it meanwhile wait for the selection
+    code = '''
+import threading
+import caproto
+
+errors = []
+
+
+def use_backend():
+    try:
+        caproto.backend.array_types
+    except Exception as ex:
+        errors.append(ex)
+
+
+threads = [threading.Thread(target=use_backend) for _ in range(8)]
+for thread in threads:
+    thread.start()
+for thread in threads:
+    thread.join()
+assert not errors, errors
+'''
+    subprocess.run([sys.executable, '-c', code], check=True)
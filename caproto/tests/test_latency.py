@@ -0,0 +1,145 @@
+import io
+import random
+import signal
+import socket
+import threading
+
+import pytest
+
+import caproto as ca
+from caproto.benchmarking import run_server
+from caproto.benchmarking.inprocess import connect_channels, threading_client
+from caproto.server import latency
+from caproto.server.latency import (Histogram, LatencyRecorder,
+                                    format_latency, load_latency_dump)
+
+
+def test_histogram():
+    random.seed(0)
+    values = sorted(random.lognormvariate(-7, 1.5) for _ in range(10000))
+    histogram = Histogram()
+    for value in values:
+        histogram.record(value)
+    assert histogram.count == len(values)
+    relative_error = 2 ** -(histogram.significant_bits - 1)
+    for percent in (1, 50, 90, 99, 99.9):
+        expected = values[int(percent / 100 * len(values)) - 1]
+        assert (histogram.percentile(percent) ==
+                pytest.approx(expected, rel=relative_error, abs=2e-6))
+    assert histogram.max == int(values[-1] * 1e6)
+    assert histogram.percentile(100) == pytest.approx(values[-1],
+                                                      rel=relative_error)
+    assert histogram.mean == pytest.approx(sum(values) / len(values),
+                                           rel=1e-3)
+
+    # Small durations are exact.
+    small = Histogram()
+    for value in (5e-6, 5e-6, 7e-6):
+        small.record(value)
+    assert small.percentile(50) == 5e-6
+    assert small.percentile(100) == 7e-6
+
+    small.merge(histogram)
+    assert small.count == len(values) + 3
+    assert small.min == min(histogram.min, 5)
+    copy = Histogram.from_dict(small.to_dict())
+    assert copy.counts == small.counts
+    assert copy.percentile(99) == small.percentile(99)
+
+
+@pytest.mark.parametrize('sample_rate, batches, expected',
+                         [(1, [3, 2], 5),
+                          (0.25, [3, 2, 7, 1, 1, 4], 5),
+                          (0.1, [5, 4], 1)])
+def test_sampling(sample_rate, batches, expected):
+    recorder = LatencyRecorder(sample_rate)
+    sampled = []
+    for size in batches:
+        commands = [object() for _ in range(size)]
+        sampled.extend(timing.command for timing in recorder.sample(commands))
+    assert len(sampled) == expected
+    assert recorder.requests == sum(batches)
+
+
+@pytest.fixture
+def recorder():
+    recorder = latency.start_latency_recording(1)
+    try:
+        yield recorder
+    finally:
+        latency.stop_latency_recording()
+
+
+def create_missing_channel(port, pvname):
+    'Ask the server at port for a channel it does not serve'
+    with socket.create_connection(('127.0.0.1', port)) as sock:
+        circuit = ca.VirtualCircuit(ca.CLIENT, sock.getpeername(), 0)
+        chan = ca.ClientChannel(pvname, circuit)
+        sock.sendall(b''.join(circuit.send(
+            ca.VersionRequest(priority=0, version=ca.DEFAULT_PROTOCOL_VERSION),
+            ca.HostNameRequest('latency'), ca.ClientNameRequest('latency'),
+            chan.create())))
+        while True:
+            commands, _ = circuit.recv(sock.recv(4096))
+            if any(isinstance(command, ca.CreateChFailResponse)
+                   for command in commands):
+                return
+
+
+@pytest.mark.parametrize('async_lib', ['asyncio', 'curio', 'trio'])
+def test_server_latency(recorder, async_lib):
+    pvdb = {'latency:a': ca.ChannelDouble(value=0.0)}
+    with run_server(pvdb, async_lib=async_lib) as ctx:
+        with threading_client() as client:
+            pv, = connect_channels(client, ['latency:a'])
+            for i in range(5):
+                pv.write([float(i)], wait=True)
+                assert pv.read().data[0] == i
+        create_missing_channel(ctx.port, 'latency:missing')
+
+    read = recorder.by_command['ReadNotifyRequest']
+    write = recorder.by_command['WriteNotifyRequest']
+    for histograms in (read, write):
+        assert set(histograms) == {'queue', 'dispatch', 'auth', 'convert',
+                                   'send', 'total'}
+        assert histograms['total'].count == 5
+    assert 'CreateChanRequest' in recorder.by_command
+    assert 'VersionRequest' in recorder.by_command
+    assert recorder.by_pv['latency:a']['auth'].count == 10
+    # Names which are not served are not tabulated
+    assert recorder.by_command['CreateChanRequest']['total'].count == 2
+    assert set(recorder.by_pv) == {'latency:a'}
+
+    stream = io.StringIO()
+    recorder.dump(stream)
+    stream.seek(0)
+    loaded = load_latency_dump(stream)
+    assert loaded.sampled == recorder.sampled
+    assert (loaded.by_pv['latency:a']['total'].counts ==
+            recorder.by_pv['latency:a']['total'].counts)
+    assert 'WriteNotifyRequest' in format_latency(loaded)
+    assert 'latency:a' in format_latency(loaded, by='pv')
+
+
+def test_recording_for_server_lifetime(tmp_path):
+    from caproto.server.server import _recording
+    dump = tmp_path / 'latency.json'
+
+    def run_in_thread():
+        # Off the main thread, no SIGUSR1 handler is installed
+        with _recording(latency_dump=str(dump)):
+            assert latency.get_latency_recorder() is not None
+
+    thread = threading.Thread(target=run_in_thread)
+    thread.start()
+    thread.join()
+    assert latency.get_latency_recorder() is None
+    assert load_latency_dump(str(dump)).sampled == 0
+
+    if hasattr(signal, 'SIGUSR1'):
+        handler = signal.getsignal(signal.SIGUSR1)
+        with _recording(latency_sample_rate=1):
+            assert signal.getsignal(signal.SIGUSR1) is handler
+        with _recording(latency_dump=str(dump)):
+            assert signal.getsignal(signal.SIGUSR1) is not handler
+        assert signal.getsignal(signal.SIGUSR1) is handler
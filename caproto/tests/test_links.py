@@ -0,0 +1,226 @@
+import asyncio
+import collections
+import time
+
+import pytest
+
+import caproto as ca
+from caproto.asyncio.server import AsyncioAsyncLayer
+from caproto.benchmarking import make_database, run_server
+from caproto.benchmarking.inprocess import connect_channels, threading_client
+from caproto.server.database import load_database
+from caproto.server.links import Link, LinkEngine, parse_link
+
+
+@pytest.mark.parametrize('text, link', [
+    ('', None),
+    ('1.5', None),
+    ('@asyn(PORT) VALUE', None),
+    ('{const: 3}', None),
+    ('a:b', Link('a:b', 'NPP', 'NMS', False)),
+    ('a:b.EGU PP MS', Link('a:b.EGU', 'PP', 'MS', False)),
+    ('a:b NMS CP', Link('a:b', 'CP', 'NMS', False)),
+    ('a:b CA MSI', Link('a:b', 'NPP', 'MSI', True)),
+])
+def test_parse_link(text, link):
+    assert parse_link(text) == link
+
+
+def test_parse_link_invalid():
+    with pytest.raises(ca.CaprotoValueError):
+        parse_link('a:b XX')
+
+
+def make_group(tmp_path, records):
+    filename = tmp_path / 'links.db'
+    filename.write_text(make_database(records))
+    return load_database(str(filename))
+
+
+@pytest.fixture
+def publishes(monkeypatch):
+    'Count the subscription updates published, by PV name'
+    counts = collections.Counter()
+    publish = ca.ChannelData.publish
+
+    async def counting_publish(self, flags):
+        counts[self.pvname] += 1
+        return await publish(self, flags)
+
+    monkeypatch.setattr(ca.ChannelData, 'publish', counting_publish)
+    return counts
+
+
+def test_processing_chain(tmp_path, publishes):
+    group = make_group(tmp_path, {
+        ('src', 'ao'): {'OUT': 'left PP', 'FLNK': 'right'},
+        ('left', 'ao'): {'FLNK': 'sum'},
+        ('right', 'ai'): {'INP': 'src', 'FLNK': 'sum'},
+        ('sum', 'ai'): {'INP': 'left NPP'},
+        ('watch', 'ai'): {'INP': 'sum CP'},
+        ('text', 'stringin'): {'INP': 'watch PP'},
+        ('desc', 'ao'): {'OUT': 'text.DESC'},
+        ('other', 'ai'): {'INP': 'nothing'},
+    })
+    pvdb = group.pvdb
+    engine = LinkEngine(pvdb)
+    # Links to records which are not local are made over Channel Access
+    assert [link.pvname for link in engine.ca_links] == ['nothing']
+    engine.disconnect()
+
+    chain = [(instance.pvname, processed)
+             for instance, processed in engine.chain('src')]
+    assert [name for name, _ in chain] == [
+        'src', 'left', 'right', 'sum', 'watch']
+    # Each record comes after those it depends upon
+    for before, after in [('src', 'left'), ('src', 'right'),
+                          ('left', 'sum'), ('right', 'sum'),
+                          ('sum', 'watch')]:
+        assert chain.index((before, True)) < chain.index((after, True))
+
+    asyncio.run(pvdb['src'].write(2.5))
+    for name in ('src', 'left', 'right', 'sum', 'watch'):
+        assert pvdb[name].value == 2.5
+        # One update per record per chain, although sum is processed by
+        # both left and right
+        assert publishes[name] == 1
+    # text is not in the chain: its input link from watch is not CP
+    assert pvdb['text'].value == ''
+
+    asyncio.run(engine.process('text'))
+    assert pvdb['text'].value == '2.5'
+
+    asyncio.run(pvdb['desc'].write(7.5))
+    assert pvdb['text'].fields['DESC'].value == '7.5'
+    # Not processed: text.DESC was written without processing text
+    assert publishes['text'] == 1
+
+
+def test_process_field(tmp_path):
+    group = make_group(tmp_path, {
+        ('counter', 'ai'): {'INP': 'source', 'FLNK': 'copy'},
+        ('source', 'ai'): {'VAL': 4},
+        ('copy', 'ao'): {'DOL': 'counter', 'OMSL': 'closed_loop'},
+    })
+    pvdb = group.pvdb
+    LinkEngine(pvdb)
+
+    async def process():
+        await pvdb['counter'].fields['PROC'].write('1')
+
+    asyncio.run(process())
+    assert pvdb['counter'].value == 4
+    assert pvdb['copy'].value == 4
+
+
+def test_enum_links(tmp_path):
+    group = make_group(tmp_path, {
+        ('switch', 'bo'): {'ZNAM': 'Off', 'ONAM': 'On', 'OUT': 'level PP'},
+        ('level', 'ao'): {'FLNK': 'light'},
+        ('light', 'bi'): {'ZNAM': 'Dark', 'ONAM': 'Lit', 'INP': 'level'},
+    })
+    pvdb = group.pvdb
+    LinkEngine(pvdb)
+    asyncio.run(pvdb['switch'].write('On'))
+    assert pvdb['level'].value == 1
+    assert pvdb['light'].value == 'Lit'
+
+
+def test_maximize_severity(tmp_path):
+    group = make_group(tmp_path, {
+        ('source', 'ai'): {},
+        ('ms', 'ai'): {'INP': 'source PP MS'},
+        ('msi', 'ai'): {'INP': 'source PP MSI'},
+        ('nms', 'ai'): {'INP': 'source PP'},
+    })
+    pvdb = group.pvdb
+    engine = LinkEngine(pvdb)
+
+    async def process(severity):
+        await pvdb['source'].alarm.write(status=ca.AlarmStatus.READ,
+                                         severity=severity)
+        for name in ('ms', 'msi', 'nms'):
+            await engine.process(name)
+
+    asyncio.run(process(ca.AlarmSeverity.MAJOR_ALARM))
+    assert pvdb['ms'].alarm.severity == ca.AlarmSeverity.MAJOR_ALARM
+    assert pvdb['ms'].alarm.status == ca.AlarmStatus.LINK
+    assert pvdb['msi'].alarm.severity == ca.AlarmSeverity.NO_ALARM
+    assert pvdb['nms'].alarm.severity == ca.AlarmSeverity.NO_ALARM
+
+    asyncio.run(process(ca.AlarmSeverity.NO_ALARM))
+    assert pvdb['ms'].alarm.severity == ca.AlarmSeverity.NO_ALARM
+    assert pvdb['ms'].alarm.status == ca.AlarmStatus.NO_ALARM
+
+
+def test_cycle(tmp_path):
+    group = make_group(tmp_path, {
+        ('a', 'ao'): {'FLNK': 'b'},
+        ('b', 'ao'): {'OUT': 'c PP'},
+        ('c', 'ai'): {'FLNK': 'a'},
+    })
+    with pytest.raises(ca.CaprotoValueError, match='cycle'):
+        LinkEngine(group.pvdb)
+
+
+def test_channel_access_links(tmp_path):
+    remote = {'remote:in': ca.ChannelDouble(value=0),
+              'remote:out': ca.ChannelDouble(value=0)}
+    group = make_group(tmp_path, {
+        ('local', 'ao'): {'DOL': 'remote:in CP', 'OMSL': 'closed_loop',
+                          'OUT': 'remote:out'},
+        ('forced', 'ai'): {'INP': 'local CA'},
+    })
+    pvdb = group.pvdb
+
+    async def wait_for(predicate, timeout=10):
+        deadline = time.monotonic() + timeout
+        while not predicate():
+            assert time.monotonic() < deadline
+            await asyncio.sleep(0.05)
+
+    async def test(client):
+        loop = asyncio.get_event_loop()
+        async_lib = AsyncioAsyncLayer(loop)
+        task = loop.create_task(pvdb['local'].server_startup(async_lib))
+        try:
+            remote_in, remote_out = await loop.run_in_executor(
+                None, connect_channels, client, ['remote:in', 'remote:out'])
+            await loop.run_in_executor(None, remote_in.write, [3.0])
+            await wait_for(lambda: pvdb['local'].value == 3.0)
+            await wait_for(lambda: remote['remote:out'].value == 3.0)
+        finally:
+            task.cancel()
+
+    with run_server(remote, async_lib='asyncio'):
+        with threading_client() as client:
+            engine = LinkEngine(pvdb, ca_context=client)
+            assert sorted(link.pvname for link in engine.ca_links) == [
+                'local', 'remote:in', 'remote:out']
+            asyncio.run(test(client))
+
+
+def test_served_links(tmp_path):
+    group = make_group(tmp_path, {
+        ('setpoint', 'ao'): {'OUT': 'readback PP'},
+        ('readback', 'ai'): {'FLNK': 'count'},
+        ('count', 'longin'): {},
+    })
+    LinkEngine(group.pvdb)
+    with run_server(group.pvdb, async_lib='asyncio'):
+        with threading_client() as client:
+            setpoint, readback = connect_channels(
+                client, ['setpoint', 'readback'])
+            updates = []
+
+            def callback(sub, response):
+                updates.append(response.data[0])
+
+            sub = readback.subscribe()
+            sub.add_callback(callback)
+            setpoint.write([4.5], wait=True)
+            deadline = time.monotonic() + 5
+            while 4.5 not in updates:
+                assert time.monotonic() < deadline
+                time.sleep(0.05)
+            assert readback.read().data[0] == 4.5
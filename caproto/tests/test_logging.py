@@ -105,3 +105,42 @@ def test_noninterfering_handlers():
     assert len(info_handler.records) == 1
     assert len(debug_handler.records) == 2
     assert set(info_handler.records).issubset(debug_handler.records)
+
+
+def test_circuit_send_tags():
+    "Messages are tagged for the filters only when debug logging is enabled."
+    import caproto as ca
+
+    class TestHandler(logging.Handler):
+        def __init__(self):
+            self.records = []
+            super().__init__()
+
+        def emit(self, record):
+            self.records.append(record)
+
+    circuit = ca.VirtualCircuit(our_role=ca.CLIENT,
+                                address=('127.0.0.1', 5064), priority=0)
+    circuit.our_address = ('127.0.0.1', 40000)
+    handler = TestHandler()
+    handler.addFilter(PVFilter('a', level='WARNING', exclusive=True))
+    log = logging.getLogger('caproto.circ')
+    log.addHandler(handler)
+    level = log.level
+    try:
+        log.setLevel('DEBUG')
+        circuit.send(ca.VersionRequest(priority=0, version=13),
+                     extra={'pv': 'a'})
+        circuit.send(ca.HostNameRequest('b'), extra={'pv': 'b'})
+        record, = handler.records
+        assert record.pv == 'a'
+        assert record.bytesize == 16
+        assert record.direction == '--->>>'
+
+        handler.records.clear()
+        log.setLevel('INFO')
+        circuit.send(ca.ClientNameRequest('a'), extra={'pv': 'a'})
+        assert not handler.records
+    finally:
+        log.setLevel(level)
+        log.removeHandler(handler)
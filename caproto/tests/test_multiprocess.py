@@ -0,0 +1,140 @@
+import os
+import signal
+import sys
+import time
+
+import pytest
+
+import caproto as ca
+from caproto.benchmarking.inprocess import connect_channels, threading_client
+from caproto.server import PVGroup, SubGroup, pvproperty
+from caproto.server.multiprocess import (WorkerPool, group_hints,
+                                         partition_pvdb)
+
+from .conftest import run_example_ioc
+
+pytestmark = pytest.mark.skipif(sys.platform == 'win32',
+                                reason='Partitioned servers require fork')
+
+
+class Axis(PVGroup):
+    setpoint = pvproperty(value=0.0)
+    readback = pvproperty(value=0.0)
+
+
+class Stage(PVGroup):
+    x = SubGroup(Axis, prefix='x:')
+    y = SubGroup(Axis, prefix='y:')
+    z = SubGroup(Axis, prefix='z:')
+
+
+def make_pvdb():
+    shared = ca.ChannelDouble(value=0)
+    pvdb = {f'dev{i}:pv{j}': ca.ChannelDouble(value=i)
+            for i in range(8) for j in range(4)}
+    pvdb['rec'] = ca.ChannelDouble(value=0)
+    pvdb['rec.EGU'] = ca.ChannelString(value='mm')
+    pvdb['alias1'] = shared
+    pvdb['alias2'] = shared
+    return pvdb
+
+
+def shard_of(shards, pvname):
+    index, = [i for i, shard in enumerate(shards) if pvname in shard]
+    return index
+
+
+@pytest.mark.parametrize('by', ['hash', 'prefix'])
+@pytest.mark.parametrize('workers', [1, 2, 3])
+def test_partition_pvdb(by, workers):
+    pvdb = make_pvdb()
+    shards = partition_pvdb(pvdb, workers, by=by)
+    assert len(shards) == workers
+    assert sorted(name for shard in shards for name in shard) == sorted(pvdb)
+    assert shard_of(shards, 'rec') == shard_of(shards, 'rec.EGU')
+    assert shard_of(shards, 'alias1') == shard_of(shards, 'alias2')
+    if by == 'prefix':
+        for i in range(8):
+            assert len({shard_of(shards, f'dev{i}:pv{j}')
+                        for j in range(4)}) == 1
+        sizes = [len(shard) for shard in shards]
+        assert max(sizes) - min(sizes) <= 4
+    # The assignment depends on nothing but the names
+    assert partition_pvdb(pvdb, workers, by=by) == shards
+
+
+def test_partition_pvdb_hints():
+    stage = Stage(prefix='stage:')
+    hints = group_hints(stage.x, stage.y)
+    assert set(hints) == set(stage.x.pvdb) | set(stage.y.pvdb)
+    shards = partition_pvdb(stage.pvdb, 4, hints=hints)
+    for axis in (stage.x, stage.y):
+        assert len({shard_of(shards, pvname) for pvname in axis.pvdb}) == 1
+
+
+def test_partition_pvdb_invalid():
+    with pytest.raises(ValueError):
+        partition_pvdb(make_pvdb(), 2, by='random')
+    with pytest.raises(ValueError):
+        partition_pvdb(make_pvdb(), 0)
+
+
+def test_worker_pool_restart():
+    shards = partition_pvdb(make_pvdb(), 2, by='prefix')
+    pool = WorkerPool(shards, module_name='caproto.asyncio.server',
+                      interfaces=['127.0.0.1'])
+    pool.start()
+    try:
+        assert None not in pool.ports
+        assert len(set(pool.ports)) == 2
+        pid = pool.processes[0].pid
+        os.kill(pid, signal.SIGKILL)
+        pool.processes[0].join()
+        assert pool.check() == [0]
+        assert pool.restarts == [1, 0]
+        assert pool.processes[0].pid != pid
+        deadline = time.monotonic() + 10
+        while pool.ports[0] is None and time.monotonic() < deadline:
+            time.sleep(0.05)
+            assert pool.check() == []
+        assert pool.ports[0] is not None
+    finally:
+        pool.stop()
+    assert not any(process.is_alive() for process in pool.processes)
+
+
+@pytest.mark.parametrize('async_lib', ['asyncio', 'curio', 'trio'])
+def test_partitioned_ioc(request, prefix, async_lib):
+    pytest.importorskip(async_lib)
+    run_example_ioc('caproto.ioc_examples.simple', request=request,
+                    args=['--prefix', prefix, '--async-lib', async_lib,
+                          '--workers', '2', '--partition', 'hash',
+                          '--list-pvs'],
+                    pv_to_check=f'{prefix}A')
+
+    from caproto.ioc_examples.simple import SimpleIOC
+    pvdb = SimpleIOC(prefix=prefix).pvdb
+    shards = [shard for shard in partition_pvdb(pvdb, 2) if shard]
+
+    with threading_client() as client:
+        pvs = connect_channels(client, list(pvdb))
+        ports = {}
+        for pv in pvs:
+            assert pv.read().data is not None
+            ports[pv.name] = pv.circuit_manager.circuit.address[1]
+        # PVs are served by the worker which owns them
+        for shard in shards:
+            assert len({ports[pvname] for pvname in shard}) == 1
+        assert len(set(ports.values())) == len(shards)
+
+
+@pytest.mark.parametrize('option', [['--trace', 'trace.bin'],
+                                    ['--latency-dump', 'latency.json'],
+                                    ['--latency-sample-rate', '0.5']])
+def test_workers_reject_recording(option):
+    from caproto.server import template_arg_parser
+    parser, split_args = template_arg_parser(desc='test',
+                                             default_prefix='test:')
+    args = parser.parse_args(['--workers', '2'] + option)
+    with pytest.raises(SystemExit):
+        split_args(args)
@@ -111,3 +111,71 @@ def test_mock_deprecation():
 
     ioc = TestIOC(prefix='a')
     assert ioc.ai.record_type == 'ai'
+
+
+def test_lazy_fields():
+    import curio
+    from caproto.server import PVGroup, pvproperty
+    from caproto.server.records import AiFields
+
+    class TestIOC(PVGroup):
+        ai = pvproperty(value=0.0, record='ai')
+        ai2 = pvproperty(value=0.0, record='ai')
+
+        @ai2.fields.disable.putter
+        async def ai2(fields, instance, value):
+            ...
+
+        scanned = pvproperty(value=0.0, record='ai')
+
+        @scanned.fields.scan_rate.startup
+        async def scanned(fields, instance, async_lib):
+            ...
+
+    ioc = TestIOC(prefix='a:')
+    assert ioc.ai._field_inst is None
+
+    # Fields with startup hooks are required at server startup
+    assert ioc.scanned._field_inst is not None
+
+    # Alarm changes prior to instantiation are reflected in the fields
+    curio.run(ioc.ai.alarm.write(status=AlarmStatus.HIHI,
+                                 severity=AlarmSeverity.MAJOR_ALARM))
+    assert ioc.ai.get_field('STAT').value == 'HIHI'
+    assert ioc.ai.get_field('SEVR').value == 'MAJOR'
+    assert ioc.ai._field_inst is not None
+
+    # Records sharing a field specification share the generated class,
+    # without modifying that of the record type
+    other_ioc = TestIOC(prefix='b:')
+    assert type(ioc.ai2.field_inst) is type(other_ioc.ai2.field_inst)
+    assert type(ioc.ai2.field_inst) is not AiFields
+    assert AiFields.disable.put is None
+
+
+def test_context_field_index():
+    from caproto.server import PVGroup, pvproperty
+    from caproto.server.common import Context
+
+    class TestIOC(PVGroup):
+        ai = pvproperty(value=0.0, record='ai')
+        unused = pvproperty(value=0.0, record='ai')
+
+        @ai.startup
+        async def ai(self, instance, async_lib):
+            ...
+
+    ioc = TestIOC(prefix='a:')
+    ctx = Context(ioc.pvdb, interfaces=['127.0.0.1'])
+    assert list(ctx.startup_methods) == ['a:ai']
+    assert ctx.startup_methods is ctx.startup_methods
+    assert ioc.unused._field_inst is None
+
+    # Record fields are resolved without adding them to the pvdb
+    assert ctx['a:ai.HIHI'] is ioc.ai.get_field('HIHI')
+    assert ctx['a:ai.'] is ioc.ai
+    assert set(ctx.pvdb) == {'a:ai', 'a:unused'}
+
+    pvdb_with_fields = ctx.pvdb_with_fields
+    assert pvdb_with_fields['a:unused.HIHI'] is ioc.unused.get_field('HIHI')
+    assert ctx.pvdb_with_fields is pvdb_with_fields
@@ -1,6 +1,11 @@
+import asyncio
 import logging
+import socket
+import threading
+import time
 
 import curio
+import pytest
 
 import caproto as ca
 from .epics_test_utils import run_caget
@@ -29,3 +34,85 @@ def test_sync_repeater(ioc):
 
     with curio.Kernel() as kernel:
         kernel.run(check_repeater)
+
+
+@pytest.mark.parametrize('batch', [True, False])
+def test_asyncio_repeater(batch):
+    from caproto.asyncio.repeater import RepeaterProtocol
+
+    loop = asyncio.new_event_loop()
+    started = threading.Event()
+    endpoint = {}
+
+    async def serve():
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.bind(('127.0.0.1', 0))
+        transport, protocol = await loop.create_datagram_endpoint(
+            lambda: RepeaterProtocol(batch=batch, client_check_interval=0.1),
+            sock=sock)
+        endpoint.update(transport=transport, protocol=protocol,
+                        address=sock.getsockname())
+        started.set()
+
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    asyncio.run_coroutine_threadsafe(serve(), loop).result(5)
+    started.wait(5)
+    protocol = endpoint['protocol']
+    address = endpoint['address']
+
+    def client_socket():
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.bind(('127.0.0.1', 0))
+        sock.settimeout(2)
+        return sock
+
+    try:
+        clients = [client_socket() for _ in range(3)]
+        for sock in clients[:2]:
+            sock.sendto(bytes(ca.RepeaterRegisterRequest('0.0.0.0')),
+                        address)
+            data, _ = sock.recvfrom(1024)
+            assert isinstance(ca.Broadcaster(ca.CLIENT).recv(data, address)[0],
+                              ca.RepeaterConfirmResponse)
+        # An empty datagram also registers a client.
+        clients[2].sendto(b'', address)
+        deadline = time.monotonic() + 2
+        while len(protocol.clients) < 3 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert len(protocol.clients) == 3
+
+        server = client_socket()
+        beacon = ca.Beacon(13, 5064, 1, '0.0.0.0')
+        server.sendto(bytes(beacon), address)
+        for sock in clients:
+            data, _ = sock.recvfrom(1024)
+            forwarded, = ca.Broadcaster(ca.CLIENT).recv(data, address)
+            assert isinstance(forwarded, ca.Beacon)
+            # The repeater fills in the address of the server.
+            assert forwarded.address == '127.0.0.1'
+            assert forwarded.server_port == 5064
+
+        server.sendto(b'not a channel access datagram', address)
+        time.sleep(0.1)
+
+        # Clients which exit are removed.
+        clients.pop().close()
+        deadline = time.monotonic() + 2
+        while len(protocol.clients) > 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        stats = protocol.stats
+        assert stats.clients == 2
+        assert stats.clients_removed == 1
+        assert stats.registrations == 3
+        assert stats.beacons == 1
+        assert stats.forwarded == 1
+        assert stats.sends == 3
+        assert stats.invalid == 1
+        assert stats.batches == (1 if protocol.batch else 0)
+    finally:
+        loop.call_soon_threadsafe(endpoint['transport'].close)
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(5)
+        loop.close()
@@ -0,0 +1,121 @@
+import types
+
+import curio
+import pytest
+
+from caproto.curio.server import CurioAsyncLayer
+from caproto.server.scheduler import FairShareScheduler
+
+
+class FakeCircuit:
+    def __init__(self, name, priority, log):
+        self.name = name
+        self.circuit = types.SimpleNamespace(priority=priority,
+                                             address=(name, 5064))
+        self.log = log
+
+    async def _send_buffers(self, buffers):
+        self.log.append((self.name, sum(len(buf) for buf in buffers)))
+
+
+@pytest.fixture
+def scheduler():
+    context = types.SimpleNamespace(async_layer=CurioAsyncLayer)
+    return FairShareScheduler(context, quantum=1000)
+
+
+def test_scheduler_fair_share(scheduler):
+    log = []
+    heavy = FakeCircuit('heavy', 0, log)
+    priority = FakeCircuit('priority', 2, log)
+    small = FakeCircuit('small', 0, log)
+
+    async def main():
+        async with curio.TaskGroup() as g:
+            await g.spawn(scheduler.transmit, heavy, [b'x' * 10000])
+            await g.spawn(scheduler.transmit, priority, [b'y' * 10000])
+            await g.spawn(scheduler.transmit, small, [b'z' * 10])
+
+    curio.run(main)
+    assert sorted(log) == sorted([('heavy', 1000)] * 10 +
+                                 [('priority', 1000)] * 10 +
+                                 [('small', 10)])
+    # The small send is not held up behind either large one: it goes out
+    # within the first round.
+    assert log.index(('small', 10)) <= 4
+    # While both large sends are in progress, priority 2 gets (about) 3x the
+    # share of priority 0.
+    names = [name for name, _ in log]
+    last_priority = len(names) - 1 - names[::-1].index('priority')
+    assert 1.5 * names[:last_priority].count('heavy') <= 10
+
+    stats = scheduler.stats()
+    assert stats[('heavy', 5064)].bytes_sent == 10000
+    assert stats[('small', 5064)].max_delay < stats[('heavy', 5064)].max_delay
+    assert stats[('priority', 5064)].priority == 2
+    assert stats[('small', 5064)].sends == 1
+
+
+def test_scheduler_idle_fast_path(scheduler, monkeypatch):
+    log = []
+    circuit = FakeCircuit('idle', 0, log)
+
+    async def no_turn(share):
+        raise AssertionError('an idle send should not wait for its turn')
+
+    monkeypatch.setattr(scheduler, '_wait_turn', no_turn)
+    curio.run(scheduler.transmit, circuit, [b'x' * 600, b'y' * 400])
+    # Sent as given, not in chunks
+    assert log == [('idle', 1000)]
+    stats = scheduler.stats()[('idle', 5064)]
+    assert (stats.bytes_sent, stats.sends) == (1000, 1)
+
+
+def test_scheduler_rate_cap(scheduler):
+    log = []
+    circuit = FakeCircuit('capped', 0, log)
+    scheduler.set_max_bytes_per_sec(circuit, 20000)
+
+    async def main():
+        t0 = await curio.clock()
+        # 20kB burst allowance, then 10kB at 20kB/sec
+        await scheduler.transmit(circuit, [b'x' * 30000])
+        return await curio.clock() - t0
+
+    elapsed = curio.run(main)
+    assert elapsed >= 0.45
+    assert sum(nbytes for _, nbytes in log) == 30000
+    assert scheduler.stats()[('capped', 5064)].max_bytes_per_sec == 20000
+
+
+def test_scheduler_capped_circuit_yields(scheduler):
+    log = []
+    capped = FakeCircuit('capped', 0, log)
+    other = FakeCircuit('other', 0, log)
+    scheduler.set_max_bytes_per_sec(capped, 10000)
+
+    async def main():
+        async with curio.TaskGroup() as g:
+            await g.spawn(scheduler.transmit, capped, [b'x' * 20000])
+            await curio.sleep(0.05)
+            await g.spawn(scheduler.transmit, other, [b'y' * 5000])
+
+    curio.run(main)
+    # The other circuit sends all of its data while the capped one waits
+    names = [name for name, _ in log]
+    assert names[-1] == 'capped'
+    assert scheduler.stats()[('other', 5064)].max_delay < 0.05
+
+
+def test_scheduler_context_cap():
+    import caproto.curio.server
+    from caproto.server import template_arg_parser
+
+    ctx = caproto.curio.server.Context({}, ['127.0.0.1'],
+                                       max_circuit_bytes_per_sec=1000)
+    assert ctx.send_scheduler.max_bytes_per_sec == 1000
+
+    parser, split_args = template_arg_parser(desc='test',
+                                             default_prefix='test:')
+    args = parser.parse_args(['--max-circuit-bytes-per-sec', '5e5'])
+    assert args.max_circuit_bytes_per_sec == 5e5
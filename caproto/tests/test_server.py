@@ -2,6 +2,7 @@ import ast
 import asyncio
 import copy
 import datetime
+import socket
 import sys
 import time
 
@@ -362,3 +363,221 @@ def test_data_copy(cls, kwargs):
     patch_alarm(args1)
     patch_alarm(args2)
     assert args1 == args2
+
+
+@pytest.mark.parametrize('length, threaded', [(4, False), (16, True)])
+def test_threaded_conversion(monkeypatch, length, threaded):
+    curio = pytest.importorskip('curio')
+    monkeypatch.setattr(ca._data, 'THREADED_CONVERSION_THRESHOLD', 8)
+    calls = []
+
+    async def run_in_thread(func, *args):
+        calls.append(func)
+        return await curio.run_in_thread(func, *args)
+
+    reference = ca.ChannelDouble(value=list(range(length)))
+    _, expected = curio.run(reference.read(ChannelType.TIME_DOUBLE))
+
+    inst = ca.ChannelDouble(value=list(range(length)))
+    inst._run_in_thread = run_in_thread
+    _, values = curio.run(inst.read(ChannelType.TIME_DOUBLE))
+    assert bytes(values) == bytes(expected)
+    assert len(calls) == (1 if threaded else 0)
+
+
+def test_wire_value_cache():
+    curio = pytest.importorskip('curio')
+    inst = ca.ChannelDouble(value=[1.0, 2.0, 3.0])
+    _, native = curio.run(inst.read(ChannelType.DOUBLE))
+    _, time_values = curio.run(inst.read(ChannelType.TIME_DOUBLE))
+    # Reads of the native type and its DBR variants share one conversion
+    assert time_values is native
+    _, as_long = curio.run(inst.read(ChannelType.LONG))
+    assert as_long is not native
+
+    curio.run(inst.write([4.0, 5.0, 6.0]))
+    _, native_after_write = curio.run(inst.read(ChannelType.DOUBLE))
+    assert native_after_write is not native
+    assert list(native_after_write) != list(native)
+
+
+def test_context_threaded_conversion():
+    pytest.importorskip('curio')
+    from caproto.curio.server import Context, CurioAsyncLayer
+    from caproto.server import PVGroup, pvproperty
+
+    class Group(PVGroup):
+        waveform = pvproperty(value=[0.0] * 4, record='waveform')
+
+    group = Group(prefix='conv:')
+    ctx = Context(group.pvdb, ['127.0.0.1'])
+    ctx.startup_methods
+    run_in_thread = CurioAsyncLayer.run_in_thread
+    assert group.waveform._run_in_thread is run_in_thread
+    # Fields instantiated later, too
+    assert ctx['conv:waveform.DESC']._run_in_thread is run_in_thread
+
+
+def test_context_caches_fields_not_modifiers():
+    from caproto.server import PVGroup, pvproperty
+    from caproto.server.common import Context
+
+    class Group(PVGroup):
+        waveform = pvproperty(value=[0.0] * 4, record='waveform')
+
+    group = Group(prefix='mods:')
+    ctx = Context(group.pvdb, ['127.0.0.1'])
+    desc = ctx['mods:waveform.DESC']
+    for delta in range(10):
+        assert ctx['mods:waveform.DESC$'] is desc
+        assert ctx[f'mods:waveform.DESC{{"dbnd":{{"d":{delta}}}}}'] is desc
+        assert ctx[f'mods:waveform.{{"dbnd":{{"d":{delta}}}}}'] is (
+            group.waveform)
+    assert set(ctx._aliases) == {'mods:waveform.DESC'}
+
+
+def test_wire_value_cache_write_during_conversion(monkeypatch):
+    curio = pytest.importorskip('curio')
+    np = pytest.importorskip('numpy')
+    monkeypatch.setattr(ca._data, 'THREADED_CONVERSION_THRESHOLD', 8)
+    value = np.arange(16, dtype=float)
+    inst = ca.ChannelDouble(value=value)
+
+    async def run_in_thread(func, *args):
+        converted = await curio.run_in_thread(func, *args)
+        # The same array, modified in place, is written while the read is
+        # converting it.
+        value[:] = -1
+        await inst.write(value)
+        return converted
+
+    inst._run_in_thread = run_in_thread
+    _, before = curio.run(inst.read(ChannelType.DOUBLE))
+    assert list(before) == list(range(16))
+    # The converted value is shared, and so may not be modified
+    assert not before.flags.writeable
+    inst._run_in_thread = None
+    _, after = curio.run(inst.read(ChannelType.DOUBLE))
+    assert list(after) == [-1] * 16
+
+
+def test_asyncio_stalled_client():
+    from caproto.benchmarking import run_server
+    from caproto.benchmarking.inprocess import (connect_channels,
+                                                threading_client)
+    from caproto.server.scheduler import DRR_QUANTUM
+
+    length = 2 ** 17  # 1 MiB of doubles
+    pvdb = {'stall:image': ca.ChannelDouble(value=[0.0] * length)}
+    with run_server(pvdb, async_lib='asyncio') as ctx:
+        # A client which subscribes to the image, then stops reading.
+        sock = socket.create_connection(('127.0.0.1', ctx.port))
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+        circuit = ca.VirtualCircuit(ca.CLIENT, sock.getpeername(), 0)
+        chan = ca.ClientChannel('stall:image', circuit)
+        sock.sendall(b''.join(circuit.send(
+            ca.VersionRequest(priority=0, version=ca.DEFAULT_PROTOCOL_VERSION),
+            ca.HostNameRequest('stall'), ca.ClientNameRequest('stall'),
+            chan.create())))
+        while chan.states[ca.CLIENT] is not ca.CONNECTED:
+            commands, _ = circuit.recv(sock.recv(4096))
+            for command in commands:
+                circuit.process_command(command)
+        sock.sendall(b''.join(circuit.send(chan.subscribe())))
+
+        try:
+            with threading_client() as client:
+                pv, = connect_channels(client, ['stall:image'])
+                for i in range(10):
+                    pv.write([float(i)] * length, wait=True, timeout=5)
+                stalled, = [server_circuit for server_circuit in ctx.circuits
+                            if server_circuit.circuit.address ==
+                            sock.getsockname()]
+                # The client is served while the server buffers no more than
+                # a high-water mark and one chunk for the stalled client.
+                buffered = stalled.client.transport.get_write_buffer_size()
+                assert 0 < buffered <= 2 ** 16 + DRR_QUANTUM
+                assert pv.read(timeout=5).data[0] == 9
+        finally:
+            sock.close()
+
+
+def test_asyncio_connection_lost_before_circuit():
+    from caproto.asyncio.server import _CircuitProtocol
+
+    protocol = _CircuitProtocol(context=None)
+    protocol.pause_writing()
+    # The connection may be lost before the Context makes a circuit of it
+    protocol.connection_lost(ConnectionResetError())
+    assert protocol.circuit is None
+
+
+def test_asyncio_subscription_queue():
+    from caproto.asyncio.server import _SubscriptionQueue
+
+    async def test():
+        loop = asyncio.get_event_loop()
+        queue = _SubscriptionQueue(3, loop=loop)
+        t0 = time.monotonic()
+        assert await queue.get(0.05) is None
+        assert time.monotonic() - t0 >= 0.04
+        assert await queue.get_batch(10, 0) == []
+
+        for item in range(3):
+            await queue.put(item)
+        with pytest.raises(asyncio.QueueFull):
+            queue.put_nowait(3)
+        assert await queue.get_batch(2) == [0, 1]
+        assert await queue.get() == 2
+        with pytest.raises(asyncio.QueueEmpty):
+            queue.get_nowait()
+
+        # A waiting get is woken by a put, well before its timeout.
+        loop.call_later(0.01, queue.put_nowait, 'update')
+        t0 = time.monotonic()
+        assert await queue.get_batch(10, timeout=5) == ['update']
+        assert time.monotonic() - t0 < 1
+
+        getter = loop.create_task(queue.get())
+        await asyncio.sleep(0)
+        getter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await getter
+        queue.put_nowait('after')
+        assert await queue.get(0) == 'after'
+
+    asyncio.get_event_loop().run_until_complete(test())
+
+
+def test_rate_limit_hold_and_flush(monkeypatch):
+    import types
+    from caproto.server import common
+
+    now = 100.0
+    monkeypatch.setattr(common, 'time',
+                        types.SimpleNamespace(monotonic=lambda: now))
+    client = types.SimpleNamespace(getsockname=lambda: ('127.0.0.1', 5064))
+    circuit = common.VirtualCircuit(
+        ca.VirtualCircuit(ca.SERVER, ('127.0.0.1', 50000), None), client,
+        context=None)
+    rate = ca.parse_channel_filter('{"rate": {"max": 4}}').rate
+
+    assert circuit._rate_limit_timeout() is None
+    assert not circuit.hold_rate_limited_update(1, 'first', rate)
+    # The window of the update sent is timed, with no wakeup queued
+    assert circuit._rate_limit_timeout() == pytest.approx(0.25)
+    now += 0.125
+    assert circuit.hold_rate_limited_update(1, 'second', rate)
+    assert circuit.hold_rate_limited_update(1, 'third', rate)
+    assert circuit._pop_due_rate_limited_updates() == []
+    assert circuit._rate_limit_timeout() == pytest.approx(0.125)
+    now += 0.125
+    assert circuit._pop_due_rate_limited_updates() == ['third']
+    # Sending the held-back update opened another window
+    assert circuit.hold_rate_limited_update(1, 'fourth', rate)
+    now += 0.25
+    assert circuit._pop_due_rate_limited_updates() == ['fourth']
+    now += 0.25
+    # The window closed with nothing held back
+    assert circuit._rate_limit_timeout() is None
+    assert not circuit.hold_rate_limited_update(1, 'fifth', rate)
@@ -0,0 +1,46 @@
+import time
+
+import pytest
+
+import caproto as ca
+from caproto.benchmarking import run_server
+from caproto.benchmarking.inprocess import connect_channels, threading_client
+from caproto.server.stats import ServerStats, memory_used
+
+
+def test_memory_used():
+    assert memory_used() > 0
+
+
+@pytest.mark.parametrize('async_lib', ['asyncio', 'curio', 'trio'])
+def test_server_stats(async_lib):
+    group = ServerStats('stats:', period=0.2)
+    pvdb = dict(group.pvdb)
+    pvdb['stats:value'] = ca.ChannelDouble(value=0.0)
+    with run_server(pvdb, async_lib=async_lib) as ctx:
+        with threading_client() as client:
+            value_pv, circuits_pv = connect_channels(
+                client, ['stats:value', 'stats:CA_CLNT_CNT'])
+            responses = []
+
+            def callback(sub, response):
+                responses.append(response)
+
+            value_pv.subscribe().add_callback(callback)
+            for i in range(10):
+                value_pv.write([float(i)], wait=True)
+            deadline = time.monotonic() + 5
+            while time.monotonic() < deadline:
+                time.sleep(0.1)
+                if (circuits_pv.read().data[0] == 1 and
+                        group.subscriptions.value == 1):
+                    break
+            assert group.context is ctx
+            assert responses
+            assert group.channels.value == 2
+            assert list(group.command_queue_depths.value) == [0]
+            assert group.bytes_in_rate.value > 0
+            assert group.memory_used.value > 0
+            assert ctx.counters.search_requests >= 2
+            assert ctx.counters.batched_commands >= ctx.counters.batches > 0
+            assert ctx.send_scheduler.bytes_sent > 0
@@ -0,0 +1,61 @@
+import socket
+
+import pytest
+
+import caproto as ca
+from caproto.benchmarking import run_server
+from caproto.benchmarking.inprocess import connect_channels, threading_client
+from caproto.server import tuning
+from caproto.server.tuning import (PERFORMANCE_PROFILES, PerformanceProfile,
+                                   get_performance_profile)
+
+
+def test_get_performance_profile():
+    assert get_performance_profile(None) is PERFORMANCE_PROFILES['default']
+    assert get_performance_profile('tuned').event_loop == 'uvloop'
+    custom = PERFORMANCE_PROFILES['default']._replace(name='custom')
+    assert get_performance_profile(custom) is custom
+    assert isinstance(custom, PerformanceProfile)
+    with pytest.raises(ValueError):
+        get_performance_profile('fastest')
+
+
+def test_socket_buffer_size():
+    assert tuning.socket_buffer_size(16384) == tuning.MIN_SOCKET_BUFFER
+    assert tuning.socket_buffer_size(10_000_000) == 10_000_000
+    assert tuning.socket_buffer_size(2**30) == tuning.MAX_SOCKET_BUFFER
+
+
+@pytest.mark.parametrize('profile', ['default', 'tuned'])
+def test_tune_socket(profile):
+    profile = PERFORMANCE_PROFILES[profile]
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sndbuf = sock.getsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF)
+        tuning.tune_socket(sock, profile, 2**20)
+        assert sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY)
+        tuned_sndbuf = sock.getsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF)
+        if profile.size_socket_buffers:
+            assert tuned_sndbuf >= sndbuf
+        else:
+            assert tuned_sndbuf == sndbuf
+
+
+@pytest.mark.parametrize('async_lib', ['asyncio', 'curio', 'trio'])
+@pytest.mark.parametrize('profile', ['default', 'tuned'])
+def test_server_performance_profile(async_lib, profile):
+    pytest.importorskip(async_lib)
+    length = 2 ** 15
+    pvdb = {'tuning:wf': ca.ChannelDouble(value=[0.0] * length)}
+    with run_server(pvdb, async_lib=async_lib,
+                    performance_profile=profile) as ctx:
+        assert ctx.performance_profile is PERFORMANCE_PROFILES[profile]
+        with threading_client() as client:
+            pv, = connect_channels(client, ['tuning:wf'])
+            for i in range(3):
+                # Payloads this large are sent corked by the tuned profile.
+                pv.write([float(i)] * length, wait=True)
+                assert list(pv.read().data) == [float(i)] * length
+            circuit, = ctx.circuits
+            corked = (tuning.CAN_CORK and
+                      PERFORMANCE_PROFILES[profile].cork_threshold)
+            assert (circuit._cork_sock is not None) == bool(corked)
@@ -1,5 +1,21 @@
+import io
+import itertools
+import json
+import random
 from pathlib import Path
-from ..sync.shark import shark
+from socket import inet_aton
+
+import pytest
+from dpkt.ethernet import Ethernet, ETH_TYPE_IP
+from dpkt.ip import IP, IP_PROTO_TCP
+from dpkt.pcap import Reader, Writer
+from dpkt.tcp import TCP, TH_ACK, TH_SYN
+
+import caproto as ca
+from ..commandline.shark import format_stats
+from ..sync import shark as shark_module
+from ..sync.shark import (shark, HeavyHitter, SlidingSpaceSaving, SpaceSaving,
+                          TrafficStats)
 
 
 data_dir = Path(__file__).parent / 'data'
@@ -18,3 +34,164 @@ def test_udp_traffic():
     # tcpdump -U -w example_udp_data.pcap port 5064
     with open(data_dir / 'example_udp_data.pcap', 'rb') as file:
         list(shark(file))
+
+
+def make_segments(src, dst, sport, dport, commands, *, mss=1448,
+                  seq=1000):
+    "TCP segments (SYN first) carrying commands, as Ethernet frames"
+    def frame(seq, flags, data=b''):
+        tcp = TCP(sport=sport, dport=dport, seq=seq, flags=flags, data=data)
+        ip = IP(src=inet_aton(src), dst=inet_aton(dst), p=IP_PROTO_TCP,
+                data=tcp)
+        return bytes(Ethernet(type=ETH_TYPE_IP, data=ip))
+
+    stream = b''.join(bytes(command) for command in commands)
+    frames = [frame(seq, TH_SYN)]
+    for start in range(0, len(stream), mss):
+        frames.append(frame(seq + 1 + start, TH_ACK,
+                            stream[start:start + mss]))
+    return frames
+
+
+def write_pcap(file, frames):
+    writer = Writer(file, snaplen=65535)
+    for timestamp, frame in enumerate(frames):
+        writer.writepkt(frame, ts=timestamp)
+    file.flush()
+    file.seek(0)
+
+
+def make_responses(count):
+    commands = [ca.VersionResponse(13)]
+    for subscriptionid in range(count):
+        commands.append(ca.EventAddResponse(
+            data=list(range(20000)), data_type=ca.ChannelType.DOUBLE,
+            data_count=20000, status=1, subscriptionid=subscriptionid))
+        commands.append(ca.EventAddResponse(
+            data=[subscriptionid], data_type=ca.ChannelType.LONG,
+            data_count=1, status=1, subscriptionid=subscriptionid))
+    return commands
+
+
+@pytest.mark.parametrize('order', ['in order', 'shuffled', 'retransmitted'])
+def test_tcp_reassembly(order):
+    commands = make_responses(3)
+    syn, *frames = make_segments('10.0.0.1', '10.0.0.2', 5064, 40000,
+                                 commands)
+    if order == 'shuffled':
+        random.Random(0).shuffle(frames)
+    elif order == 'retransmitted':
+        frames = [frame for frame in frames for _ in range(2)]
+        frames[5:5] = frames[:3]
+
+    file = io.BytesIO()
+    write_pcap(file, [syn] + frames)
+    parsed = list(shark(file))
+    assert [namespace.command for namespace in parsed] == commands
+    assert parsed[0].src == '10.0.0.1'
+    assert parsed[0].transport.sport == 5064
+
+
+def test_stream_buffer_limit(monkeypatch):
+    monkeypatch.setattr(shark_module, 'MAX_STREAM_BUFFER', 10000)
+    commands = make_responses(1)
+    file = io.BytesIO()
+    write_pcap(file, make_segments('10.0.0.1', '10.0.0.2', 5064, 40000,
+                                   commands))
+    # The 160 kB response does not fit: the flow is dropped rather than
+    # buffered.
+    assert [namespace.command for namespace in shark(file)] == commands[:1]
+
+
+def test_flow_table_expiry(monkeypatch):
+    monkeypatch.setattr(shark_module, 'MAX_TRACKED_FLOWS', 2)
+    monkeypatch.setattr(shark_module, 'FLOW_IDLE_TIMEOUT', 10)
+    flows = shark_module._FlowTable()
+    for timestamp, flow in enumerate('abc'):
+        flows.set(flow, timestamp, flow.upper())
+        flows.expire(timestamp)
+    # The least recently seen is forgotten first
+    assert 'a' not in flows and len(flows) == 2
+    assert flows.get('b', 3) == 'B'
+    flows.set('d', 4, 'D')
+    flows.expire(4)
+    assert 'c' not in flows and 'b' in flows
+    # Idle flows are forgotten
+    flows.get('d', 12)
+    flows.expire(13.5)
+    assert 'b' not in flows and 'd' in flows
+
+
+@pytest.mark.parametrize('batch_size', [1000, 3])
+def test_parallel(tmp_path, monkeypatch, batch_size):
+    monkeypatch.setattr(shark_module, 'PARALLEL_BATCH_SIZE', batch_size)
+    flows = [make_segments(f'10.0.0.{host}', '10.0.0.100', 5064,
+                           40000 + host, make_responses(2))
+             for host in range(1, 5)]
+    # Interleave the flows
+    frames = [frame for frames in itertools.zip_longest(*flows)
+              for frame in frames if frame is not None]
+    with open(data_dir / 'example_udp_data.pcap', 'rb') as file:
+        frames.extend(buffer for _, buffer in Reader(file))
+    filename = tmp_path / 'parallel.pcap'
+    with open(filename, 'wb') as file:
+        write_pcap(file, frames)
+
+    def summarize(parsed):
+        return [(namespace.timestamp, namespace.src, namespace.dst,
+                 namespace.transport.sport, namespace.command)
+                for namespace in parsed]
+
+    expected = summarize(shark(filename))
+    assert len(expected) == 4 * len(make_responses(2)) + 16
+    assert summarize(shark(filename, processes=3)) == expected
+
+
+def test_parallel_requires_file():
+    with pytest.raises(ValueError):
+        next(shark(io.BytesIO(), processes=2))
+
+
+def test_space_saving():
+    summary = SpaceSaving(10)
+    rng = random.Random(0)
+    # Three heavy keys among many light ones
+    for i in range(10000):
+        summary.add(rng.choice(['a', 'b', 'c']) if i % 2 else i, weight=2)
+    assert len(summary) == 10
+    assert summary.total == 20000
+    top = summary.top(3)
+    assert sorted(hitter.key for hitter in top) == ['a', 'b', 'c']
+    for hitter in top:
+        # The estimates are within the error of the true weights
+        assert hitter.weight - hitter.error <= 2 * hitter.count
+        assert hitter.weight >= 2 * 5000 // 3 * 0.9
+
+
+def test_sliding_space_saving():
+    summary = SlidingSpaceSaving(10, window=60, buckets=6)
+    summary.add('old', 100, timestamp=0)
+    summary.add('new', 1, timestamp=55)
+    assert [hitter.key for hitter in summary.top(59)] == ['old', 'new']
+    summary.add('new', 1, timestamp=70)
+    assert summary.top(70) == [HeavyHitter('new', 2, 0, 2)]
+
+
+def test_traffic_stats():
+    stats = TrafficStats(window=60)
+    for name in ('example_tcp_data.pcap', 'example_udp_data.pcap'):
+        for namespace in shark(data_dir / name):
+            stats.add(namespace)
+    summary = stats.summary(5)
+    assert summary['messages'] == 38
+    assert summary['command_types']['SearchRequest']['messages'] == 4
+    pv, = summary['pvs']
+    assert pv['key'] == 'rpi:color'
+    assert pv['error'] == 0
+    subscription, = summary['subscriptions']
+    assert subscription['messages'] == 4
+    search_rate, = summary['search_rates']
+    assert search_rate['key'] == '192.168.86.21'
+    assert search_rate['searches'] == 4
+    json.dumps(summary)
+    assert 'rpi:color' in format_stats(summary)
@@ -0,0 +1,98 @@
+import io
+
+import pytest
+
+import caproto as ca
+from caproto.benchmarking import run_server
+from caproto.sync.replay import replay
+
+
+@pytest.fixture
+def trace():
+    'Record to a BytesIO, returning its contents when done'
+    stream = io.BytesIO()
+    ca.start_tracing(stream)
+    try:
+        yield stream
+    finally:
+        ca.stop_tracing()
+
+
+def client_session(port, sid):
+    '''
+    Write to 'trace:a' with a client circuit, faking the server's responses
+
+    The server assigns ``sid`` to the channel.
+    '''
+    circuit = ca.VirtualCircuit(ca.CLIENT, ('127.0.0.1', port), priority=0)
+    circuit.our_address = ('127.0.0.1', 50000)
+    chan = ca.ClientChannel('trace:a', circuit, cid=1)
+
+    def respond(*commands):
+        data = b''.join(bytes(command) for command in commands)
+        for command in circuit.recv(data)[0]:
+            circuit.process_command(command)
+
+    circuit.send(chan.version(), chan.host_name('host'),
+                 chan.client_name('user'))
+    respond(ca.VersionResponse(13))
+    circuit.send(chan.create())
+    respond(ca.AccessRightsResponse(cid=1, access_rights=3),
+            ca.CreateChanResponse(data_type=ca.ChannelType.DOUBLE,
+                                  data_count=1, cid=1, sid=sid))
+    circuit.send(chan.write([5.0], notify=True, ioid=0))
+
+
+def test_record_and_read(trace):
+    client_session(5064, sid=100)
+    broadcaster = ca.Broadcaster(our_role=ca.CLIENT)
+    search = broadcaster.send(ca.VersionRequest(0, 13),
+                              ca.SearchRequest('trace:a', 1, 13))
+    broadcaster.recv(bytes(ca.VersionResponse(13)), ('127.0.0.1', 5064))
+    assert ca.get_recorder().recorded == 7
+    ca.stop_tracing()
+    assert ca.get_recorder() is None
+
+    records = list(ca.read_trace(io.BytesIO(trace.getvalue())))
+    assert [(record.direction, record.transport) for record in records] == [
+        ('send', 'TCP'), ('recv', 'TCP'), ('send', 'TCP'), ('recv', 'TCP'),
+        ('send', 'TCP'), ('send', 'UDP'), ('recv', 'UDP')]
+    assert all(record.role is ca.CLIENT for record in records)
+    tcp = records[0]
+    assert tcp.our_address == ('127.0.0.1', 50000)
+    assert tcp.their_address == ('127.0.0.1', 5064)
+    assert records[5].data == search
+    assert records[5].our_address is None
+    assert records[6].their_address == ('127.0.0.1', 5064)
+    timestamps = [record.timestamp for record in records]
+    assert timestamps == sorted(timestamps)
+
+    with pytest.raises(ca.CaprotoValueError):
+        list(ca.read_trace(io.BytesIO(b'not a trace')))
+
+
+@pytest.mark.parametrize('speed', [0, 1])
+def test_replay(trace, speed):
+    # Requests refer to the channel by the sid of the recording, which the
+    # server under test will not assign.
+    client_session(5064, sid=100)
+    ca.stop_tracing()
+
+    pvdb = {'trace:a': ca.ChannelDouble(value=0.0)}
+    with run_server(pvdb) as ctx:
+        result = replay(io.BytesIO(trace.getvalue()),
+                        ('127.0.0.1', ctx.port), speed=speed)
+    assert result.circuits == 1
+    assert result.commands == 5
+    assert result.unresolved == 0
+    assert result.bytes_received > 0
+    assert pvdb['trace:a'].value == 5.0
+
+
+def test_tracing_for_server_lifetime(tmp_path):
+    from caproto._trace import get_recorder
+    from caproto.server.server import _recording
+    with _recording(trace=str(tmp_path / 'ioc.trace')):
+        assert get_recorder() is not None
+    assert get_recorder() is None
+    assert list(ca.read_trace(str(tmp_path / 'ioc.trace'))) == []
@@ -94,6 +94,14 @@ records_to_check = [
      ('x.VAL', 'x', 'VAL',
       ca.RecordModifier(ca.RecordModifiers.filtered, '{}'),
       )],
+    ['x.VAL{"dec":{"n":4}}',
+     ('x.VAL', 'x', 'VAL',
+      ca.RecordModifier(ca.RecordModifiers.filtered, '{"dec":{"n":4}}')
+      )],
+    ['x.VAL{"rate":{"max":10}}',
+     ('x.VAL', 'x', 'VAL',
+      ca.RecordModifier(ca.RecordModifiers.filtered, '{"rate":{"max":10}}')
+      )],
     ['x.NAME${}',
      ('x.NAME', 'x', 'NAME',
       ca.RecordModifier(ca.RecordModifiers.filtered |
@@ -125,6 +133,18 @@ bad_filters = [
      ('x', 'x', None,
       ca.RecordModifier(ca.RecordModifiers.filtered, '{"none":null}'),
       )],
+    ['x.{"dec":{"n":0}}',
+     ('x', 'x', None,
+      ca.RecordModifier(ca.RecordModifiers.filtered, '{"dec":{"n":0}}'),
+      )],
+    ['x.{"dec":{"m":4}}',
+     ('x', 'x', None,
+      ca.RecordModifier(ca.RecordModifiers.filtered, '{"dec":{"m":4}}'),
+      )],
+    ['x.{"rate":{"max":0}}',
+     ('x', 'x', None,
+      ca.RecordModifier(ca.RecordModifiers.filtered, '{"rate":{"max":0}}'),
+      )],
 ]
 
 
@@ -1398,7 +1398,8 @@ class VirtualCircuitManager:
                 self.disconnect()
                 return
 
-        tags = self._tags
+        # The name of the PV this command concerns, for logging
+        pv_name = None
         if command is ca.DISCONNECTED:
             self._disconnected()
         elif isinstance(command, (ca.VersionResponse,)):
@@ -1410,8 +1411,7 @@ class VirtualCircuitManager:
             ioid_info = self.ioids.pop(command.ioid)
             deadline = ioid_info['deadline']
             pv = ioid_info['pv']
-            tags = tags.copy()
-            tags['pv'] = pv.name
+            pv_name = pv.name
             if deadline is not None and time.monotonic() > deadline:
                 self.log.warning("Ignoring late response with ioid=%d regarding "
                                  "PV named %s because "
@@ -1444,13 +1444,11 @@ class VirtualCircuitManager:
                 # This method submits jobs to the Contexts's
                 # ThreadPoolExecutor for user callbacks.
                 sub.process(command)
-                tags = tags.copy()
-                tags['pv'] = sub.pv.name
+                pv_name = sub.pv.name
         elif isinstance(command, ca.AccessRightsResponse):
             pv = self.pvs[command.cid]
             pv.access_rights_changed(command.access_rights)
-            tags = tags.copy()
-            tags['pv'] = pv.name
+            pv_name = pv.name
         elif isinstance(command, ca.EventCancelResponse):
             # TODO Any way to add the pv name to tags here?
             ...
@@ -1462,21 +1460,23 @@ class VirtualCircuitManager:
                 pv.channel = chan
                 pv.channel_ready.set()
             pv.connection_state_changed('connected', chan)
-            tags = tags.copy()
-            tags['pv'] = pv.name
+            pv_name = pv.name
         elif isinstance(command, (ca.ServerDisconnResponse,
                                   ca.ClearChannelResponse)):
             pv = self.pvs[command.cid]
             pv.connection_state_changed('disconnected', None)
-            tags = tags.copy()
-            tags['pv'] = pv.name
+            pv_name = pv.name
             # NOTE: pv remains valid until server goes down
         elif isinstance(command, ca.EchoResponse):
             # The important effect here is that it will have updated
             # self.last_tcp_receipt when the bytes flowed through
             # self.received.
             ...
-        if isinstance(command, ca.Message):
+        if (isinstance(command, ca.Message) and
+                self.log.isEnabledFor(logging.DEBUG)):
+            tags = self._tags
+            if pv_name is not None:
+                tags = {**tags, 'pv': pv_name}
             tags['bytesize'] = len(command)
             self.log.debug("%r", command, extra=tags)
 
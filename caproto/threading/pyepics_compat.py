@@ -14,6 +14,7 @@ from .client import (Context, SharedBroadcaster, AUTOMONITOR_MAXLENGTH,
 from caproto import (AccessRights, field_types, ChannelType, SubscriptionType,
                      CaprotoTimeoutError, CaprotoValueError,
                      CaprotoRuntimeError, CaprotoNotImplementedError)
+from .._dbr import TimeTypeBase, _time_struct
 
 
 __all__ = ('PV', 'get_pv', 'caget', 'caput')
@@ -32,42 +33,55 @@ def ensure_connection(func):
     return inner
 
 
+# Map DBR struct attribute to pyepics metadata key
+_DBR_METADATA_ARGS = {
+    'status': 'status',
+    'severity': 'severity',
+    'precision': 'precision',
+    'units': 'units',
+    'upper_disp_limit': 'upper_disp_limit',
+    'lower_disp_limit': 'lower_disp_limit',
+    'upper_alarm_limit': 'upper_alarm_limit',
+    'upper_warning_limit': 'upper_warning_limit',
+    'lower_warning_limit': 'lower_warning_limit',
+    'lower_alarm_limit': 'lower_alarm_limit',
+    'upper_ctrl_limit': 'upper_ctrl_limit',
+    'lower_ctrl_limit': 'lower_ctrl_limit',
+    'strs': 'enum_strs',
+}
+
+# Cache of DBR type -> the (attribute, key) pairs of _DBR_METADATA_ARGS it has
+_dbr_metadata_fields = {}
+
+
 def _parse_dbr_metadata(dbr_data):
     'DBR data -> pyepics metadata dict'
-    ret = {}
-
-    arg_map = {'status': 'status',
-               'severity': 'severity',
-               'precision': 'precision',
-               'units': 'units',
-               'upper_disp_limit': 'upper_disp_limit',
-               'lower_disp_limit': 'lower_disp_limit',
-               'upper_alarm_limit': 'upper_alarm_limit',
-               'upper_warning_limit': 'upper_warning_limit',
-               'lower_warning_limit': 'lower_warning_limit',
-               'lower_alarm_limit': 'lower_alarm_limit',
-               'upper_ctrl_limit': 'upper_ctrl_limit',
-               'lower_ctrl_limit': 'lower_ctrl_limit',
-               'strs': 'enum_strs',
-               # 'secondsSinceEpoch': 'posixseconds',
-               # 'nanoSeconds': 'nanoseconds',
-               }
-
-    for attr, arg in arg_map.items():
-        if hasattr(dbr_data, attr):
-            ret[arg] = getattr(dbr_data, attr)
+    if isinstance(dbr_data, TimeTypeBase):
+        # The common case for monitors: unpack status, severity and time
+        # stamp at once rather than through the ctypes fields.
+        status, severity, seconds, nanoseconds = _time_struct.unpack_from(
+            dbr_data)
+        return {'status': status,
+                'severity': severity,
+                'posixseconds': seconds,
+                'nanoseconds': nanoseconds,
+                'timestamp': ca.epics_timestamp_to_unix(seconds, nanoseconds),
+                }
+
+    dbr_type = type(dbr_data)
+    try:
+        fields = _dbr_metadata_fields[dbr_type]
+    except KeyError:
+        fields = tuple((attr, arg) for attr, arg in _DBR_METADATA_ARGS.items()
+                       if hasattr(dbr_data, attr))
+        _dbr_metadata_fields[dbr_type] = fields
+
+    ret = {arg: getattr(dbr_data, attr) for attr, arg in fields}
 
     if ret.get('enum_strs', None):
         ret['enum_strs'] = tuple(k.value.decode(STR_ENC) for
                                  k in ret['enum_strs'] if k.value)
 
-    if hasattr(dbr_data, 'nanoSeconds'):
-        ret['posixseconds'] = dbr_data.secondsSinceEpoch
-        ret['nanoseconds'] = dbr_data.nanoSeconds
-        timestamp = ca.epics_timestamp_to_unix(dbr_data.secondsSinceEpoch,
-                                               dbr_data.nanoSeconds)
-        ret['timestamp'] = timestamp
-
     if 'units' in ret:
         ret['units'] = ret['units'].decode(STR_ENC)
 
@@ -85,6 +85,10 @@ class TrioAsyncLayer(AsyncLibraryLayer):
     Event = Event
     library = trio
 
+    @staticmethod
+    async def run_in_thread(func, *args):
+        return await trio.to_thread.run_sync(func, *args)
+
 
 class VirtualCircuit(_VirtualCircuit):
     "Wraps a caproto.VirtualCircuit with a trio client."
@@ -92,6 +96,7 @@ class VirtualCircuit(_VirtualCircuit):
 
     def __init__(self, circuit, client, context):
         super().__init__(circuit, client, context)
+        self._tune_socket(client)
         self._raw_lock = trio.Lock()
         self.nursery = context.nursery
         self.QueueFull = trio.WouldBlock
@@ -110,6 +115,10 @@ class VirtualCircuit(_VirtualCircuit):
         self.write_event = Event()
         self.events_on = trio.Event()
 
+    def queue_depths(self):
+        return tuple(chan[0].statistics().current_buffer_used
+                     for chan in (self.command_chan, self.subscription_chan))
+
     async def run(self):
         await self.nursery.start(self.command_queue_loop)
         await self.nursery.start(self.subscription_queue_loop)
@@ -169,8 +178,11 @@ class Context(_Context):
     ServerExit = ServerExit
     TaskCancelled = trio.Cancelled
 
-    def __init__(self, pvdb, interfaces=None):
-        super().__init__(pvdb, interfaces)
+    def __init__(self, pvdb, interfaces=None, *, performance_profile=None,
+                 max_circuit_bytes_per_sec=None):
+        super().__init__(pvdb, interfaces,
+                         performance_profile=performance_profile,
+                         max_circuit_bytes_per_sec=max_circuit_bytes_per_sec)
         self.nursery = None
         self.command_chan = open_memory_channel(ca.MAX_COMMAND_BACKLOG)
         self.command_bundle_queue = self.command_chan.send
@@ -185,18 +197,18 @@ class Context(_Context):
             self.broadcaster.server_addresses.append(
                 safe_getsockname(udp_sock))
             try:
-                await udp_sock.bind((interface, self.ca_server_port))
+                await udp_sock.bind((interface, self.search_port))
             except Exception:
                 self.log.exception('UDP bind failure on interface %r',
                                    interface)
                 raise
             self.log.debug('UDP socket bound on %s:%d', interface,
-                           self.ca_server_port)
+                           self.search_port)
             self.udp_socks[interface] = udp_sock
 
         for interface, udp_sock in self.udp_socks.items():
             self.log.debug('Broadcasting on %s:%d', interface,
-                           self.ca_server_port)
+                           self.search_port)
             self.nursery.start_soon(self._core_broadcaster_loop, udp_sock)
 
         task_status.started()
@@ -286,21 +298,26 @@ class Context(_Context):
         finally:
             self.log.info('Server exiting....')
             async_lib = TrioAsyncLayer()
-            async with trio.open_nursery() as nursery:
-                for name, method in self.shutdown_methods.items():
-                    self.log.debug('Calling shutdown method %r', name)
-
-                    async def shutdown(task_status):
-                        task_status.started()
-                        await method(async_lib)
-
-                    await nursery.start(shutdown)
-            for sock in self.tcp_sockets.values():
-                sock.close()
-            for sock in self.udp_socks.values():
-                sock.close()
-            for _interface, sock in self.beacon_socks.values():
-                sock.close()
+            try:
+                async with trio.open_nursery() as nursery:
+                    for name, method in self.shutdown_methods.items():
+                        self.log.debug('Calling shutdown method %r', name)
+
+                        async def shutdown(task_status):
+                            task_status.started()
+                            await method(async_lib)
+
+                        await nursery.start(shutdown)
+            finally:
+                # The nursery raises Cancelled if the server was cancelled;
+                # close the sockets regardless, so that the port is released.
+                for sock in self.tcp_sockets.values():
+                    sock.close()
+                for sock in self.udp_socks.values():
+                    sock.close()
+                for _interface, sock in self.beacon_socks.values():
+                    sock.close()
+                self.beacon_sock.close()
 
     def stop(self):
         'Stop the server'
@@ -311,13 +328,18 @@ class Context(_Context):
         nursery.cancel_scope.cancel()
 
 
-async def start_server(pvdb, *, interfaces=None, log_pv_names=False):
+async def start_server(pvdb, *, interfaces=None, log_pv_names=False,
+                       performance_profile=None,
+                       max_circuit_bytes_per_sec=None):
     '''Start a trio server with a given PV database'''
-    ctx = Context(pvdb, interfaces=interfaces)
+    ctx = Context(pvdb, interfaces=interfaces,
+                  performance_profile=performance_profile,
+                  max_circuit_bytes_per_sec=max_circuit_bytes_per_sec)
     return (await ctx.run(log_pv_names=log_pv_names))
 
 
-def run(pvdb, *, interfaces=None, log_pv_names=False):
+def run(pvdb, *, interfaces=None, log_pv_names=False,
+        performance_profile=None, max_circuit_bytes_per_sec=None):
     """
     A synchronous function that runs server, catches KeyboardInterrupt at exit.
     """
@@ -327,6 +349,8 @@ def run(pvdb, *, interfaces=None, log_pv_names=False):
                 start_server,
                 pvdb,
                 interfaces=interfaces,
-                log_pv_names=log_pv_names))
+                log_pv_names=log_pv_names,
+                performance_profile=performance_profile,
+                max_circuit_bytes_per_sec=max_circuit_bytes_per_sec))
     except KeyboardInterrupt:
         return
@@ -74,6 +74,9 @@ setup(name='caproto',
               'caproto-monitor = caproto.commandline.monitor:main',
               'caproto-repeater = caproto.commandline.repeater:main',
               'caproto-shark = caproto.commandline.shark:main',
+              'caproto-bench = caproto.commandline.bench:main',
+              'caproto-replay = caproto.commandline.replay:main',
+              'caproto-latency = caproto.commandline.latency:main',
               'caproto-defaultdict-server = caproto.ioc_examples.defaultdict_server:main',
               'caproto-spoof-beamline = caproto.ioc_examples.spoof_beamline:main',
           ],